@@ -53,14 +53,25 @@ logger = logging.getLogger(__name__)
 class EvaluationRunner:
     """Runner для batch evaluation"""
     
-    def __init__(self, rag_service_url: str = "http://localhost:8020"):
+    def __init__(
+        self,
+        rag_service_url: str = "http://localhost:8020",
+        rerank: Optional[bool] = None,
+        context_packing: Optional[bool] = None
+    ):
         """
         Initialize Evaluation Runner
         
         Args:
             rag_service_url: URL RAG service для получения ответов бота
+            rerank: Cross-encoder rerank в /rag/ask (None - настройка RAG service);
+                    два run с False/True - дельта качества ответов от rerank
+            context_packing: Упаковка контекста в бюджет токенов в /rag/ask
+                    (None - настройка RAG service), аналогично rerank
         """
         self.rag_service_url = rag_service_url
+        self.rerank = rerank
+        self.context_packing = context_packing
         self.http_client: Optional[httpx.AsyncClient] = None
         self.db_pool: Optional[asyncpg.Pool] = None
         self.golden_dataset_manager = None  # Will be set in __aenter__
@@ -132,7 +143,12 @@ class EvaluationRunner:
             timeout_seconds=timeout_seconds,
             status="running",
             started_at=datetime.now(timezone.utc),
-            progress=0.0
+            progress=0.0,
+            metadata={
+                name: value
+                for name, value in (("rerank", self.rerank), ("context_packing", self.context_packing))
+                if value is not None
+            } or None
         )
         
         # Сохранить в БД
@@ -330,6 +346,11 @@ class EvaluationRunner:
         if item.telegram_context.group_id:
             request_data["group_id"] = item.telegram_context.group_id
         
+        if self.rerank is not None:
+            request_data["rerank"] = self.rerank
+        if self.context_packing is not None:
+            request_data["context_packing"] = self.context_packing
+        
         # Отправить запрос
         response = await self.http_client.post(
             f"{self.rag_service_url}/rag/ask",
@@ -666,7 +687,9 @@ async def run_evaluation_batch(
     model_provider: str = "openrouter",
     model_name: str = "gpt-4o-mini",
     parallel_workers: int = 4,
-    timeout_seconds: int = 300
+    timeout_seconds: int = 300,
+    rerank: Optional[bool] = None,
+    context_packing: Optional[bool] = None
 ) -> EvaluationRun:
     """
     Utility function для запуска batch evaluation
@@ -678,11 +701,13 @@ async def run_evaluation_batch(
         model_name: Название модели
         parallel_workers: Количество воркеров
         timeout_seconds: Timeout
+        rerank: Cross-encoder rerank в /rag/ask (None - настройка RAG service)
+        context_packing: Упаковка контекста в /rag/ask (None - настройка RAG service)
         
     Returns:
         EvaluationRun с результатами
     """
-    async with EvaluationRunner() as runner:
+    async with EvaluationRunner(rerank=rerank, context_packing=context_packing) as runner:
         return await runner.run_evaluation(
             dataset_name=dataset_name,
             run_name=run_name,
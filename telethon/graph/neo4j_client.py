@@ -465,6 +465,101 @@ class Neo4jClient:
             logger.error(f"❌ Failed to get tag relationships: {e}")
             return []
     
+    async def get_tag_relationships_batch(
+        self,
+        tag_names: List[str],
+        limit: int = 20
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Batch: связи нескольких тегов одним запросом (co-occurrence)
+        
+        Args:
+            tag_names: Имена тегов
+            limit: Количество связанных тегов на каждый тег
+            
+        Returns:
+            {tag_name: [{"tag": ..., "weight": ..., "posts_count": ...}]} -
+            для каждого запрошенного тега (без связей - пустой список)
+            
+        Best practice: один UNWIND запрос и одна session вместо N отдельных
+        """
+        if not self.enabled or not self.driver or not tag_names:
+            return {}
+        
+        start = time.time()
+        try:
+            async with self.driver.session() as session:
+                query = """
+                UNWIND $tag_names AS tag_name
+                MATCH (t1:Tag {name: tag_name})-[r:RELATED_TO]-(t2:Tag)
+                WITH tag_name, r, t2
+                ORDER BY r.weight DESC
+                WITH tag_name, collect({
+                    tag: t2.name,
+                    weight: r.weight,
+                    posts_count: t2.usage_count
+                })[..$limit] AS related
+                RETURN tag_name, related
+                """
+                
+                result = await session.run(query, tag_names=tag_names, limit=limit)
+                
+                relationships = {tag_name: [] for tag_name in tag_names}
+                async for record in result:
+                    relationships[record["tag_name"]] = list(record["related"] or [])
+                
+                record_graph_query('get_tag_relationships_batch', time.time() - start, success=True)
+                return relationships
+                
+        except Exception as e:
+            record_graph_query('get_tag_relationships_batch', time.time() - start, success=False)
+            logger.error(f"❌ Failed to get tag relationships batch: {e}")
+            return {}
+    
+    async def get_top_tag_relationships(self, limit: int = 5000) -> List[Dict[str, Any]]:
+        """
+        Самые сильные RELATED_TO связи графа (для in-memory копии)
+        
+        Args:
+            limit: Количество связей
+            
+        Returns:
+            Связи по убыванию weight:
+            [{"tag1": "ai", "tag2": "ml", "weight": 15}]
+        """
+        if not self.enabled or not self.driver:
+            return []
+        
+        start = time.time()
+        try:
+            async with self.driver.session() as session:
+                query = """
+                MATCH (t1:Tag)-[r:RELATED_TO]->(t2:Tag)
+                RETURN t1.name AS tag1,
+                       t2.name AS tag2,
+                       r.weight AS weight
+                ORDER BY r.weight DESC
+                LIMIT $limit
+                """
+                
+                result = await session.run(query, limit=limit)
+                
+                edges = []
+                async for record in result:
+                    edges.append({
+                        "tag1": record["tag1"],
+                        "tag2": record["tag2"],
+                        "weight": record["weight"]
+                    })
+                
+                record_graph_query('get_top_tag_relationships', time.time() - start, success=True)
+                return edges
+                
+        except Exception as e:
+            record_graph_query('get_top_tag_relationships', time.time() - start, success=False)
+            logger.error(f"❌ Failed to get top tag relationships: {e}")
+            return []
+    
     @graph_query_latency.labels(query_type='get_user_interests').time() if PROMETHEUS_AVAILABLE and graph_query_latency else lambda x: x
     async def get_user_interests(
         self,
@@ -749,6 +844,78 @@ class Neo4jClient:
             logger.error(f"❌ Failed to expand with graph: {e}")
             return []
     
+    async def count_post_nodes(self, post_ids: List[int], batch_size: int = 1000) -> int:
+        """
+        Подсчитать существующие Post nodes (dry run для retention)
+
+        Args:
+            post_ids: ID постов
+            batch_size: Размер пачки UNWIND
+
+        Returns:
+            Количество найденных nodes
+        """
+        if not self.enabled or not self.driver or not post_ids:
+            return 0
+
+        query = """
+        UNWIND $post_ids AS pid
+        MATCH (p:Post {id: pid})
+        RETURN count(p) AS count
+        """
+
+        total = 0
+        async with self.driver.session() as session:
+            for i in range(0, len(post_ids), batch_size):
+                result = await session.run(query, post_ids=post_ids[i:i + batch_size])
+                record = await result.single()
+                total += record["count"] if record else 0
+
+        return total
+
+    async def delete_post_nodes(self, post_ids: List[int], batch_size: int = 1000) -> int:
+        """
+        Удалить Post nodes со всеми связями (retention)
+
+        Best practice: UNWIND + DETACH DELETE пачками, каждая пачка -
+        отдельная транзакция (ограничивает память и время блокировок).
+        Tag и Channel nodes остаются - они общие для других постов.
+
+        Args:
+            post_ids: ID постов
+            batch_size: Размер пачки UNWIND
+
+        Returns:
+            Количество удаленных nodes
+        """
+        if not self.enabled or not self.driver or not post_ids:
+            return 0
+
+        query = """
+        UNWIND $post_ids AS pid
+        MATCH (p:Post {id: pid})
+        DETACH DELETE p
+        RETURN count(p) AS deleted
+        """
+
+        start = time.time()
+        total = 0
+        try:
+            async with self.driver.session() as session:
+                for i in range(0, len(post_ids), batch_size):
+                    result = await session.run(query, post_ids=post_ids[i:i + batch_size])
+                    record = await result.single()
+                    total += record["deleted"] if record else 0
+
+            record_graph_query('delete_post_nodes', time.time() - start)
+            logger.info(f"🗑️ Neo4j: deleted {total} Post nodes")
+            return total
+
+        except Exception as e:
+            record_graph_query('delete_post_nodes', time.time() - start, success=False)
+            logger.error(f"❌ Failed to delete post nodes: {e}")
+            raise
+
     async def close(self):
         """
         Закрыть Neo4j driver
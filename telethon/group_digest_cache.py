@@ -0,0 +1,283 @@
+"""
+Group Digest Cache
+Кеш результатов дайджестов групп и анализа упоминаний
+
+Ключ - диапазон сообщений (group_id, первый/последний message id),
+отпечаток их содержимого и версия конфигурации агентов:
+- повторные /group_digest за тот же период отдаются из кеша
+- одинаковый контекст упоминания анализируется один раз, даже если
+  запросы приходят одновременно (in-flight запросы объединяются)
+- резюме окон map-фазы condenser хранятся по message_id первого
+  сообщения окна: дайджест за перекрывающийся период сжимает только
+  новые сообщения
+
+Redis shared между контейнерами; без Redis - in-memory fallback.
+"""
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import redis
+
+try:
+    from observability.metrics import group_digest_cache_total
+except ImportError:
+    group_digest_cache_total = None
+
+logger = logging.getLogger(__name__)
+
+# Максимум резюме окон на группу (старые по message_id вытесняются)
+MAX_WINDOWS_PER_GROUP = 500
+
+# Максимум ключей in-memory fallback
+MAX_MEMORY_ENTRIES = 1000
+
+
+def _json_default(value: Any) -> Any:
+    """Сериализация Pydantic объектов и datetime в результатах агентов"""
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def _record(kind: str, result: str):
+    if group_digest_cache_total:
+        group_digest_cache_total.labels(kind=kind, result=result).inc()
+
+
+class GroupDigestCache:
+    """Кеш дайджестов и анализов упоминаний по диапазону сообщений"""
+
+    def __init__(self, redis_client=None):
+        self.result_ttl = int(os.getenv("GROUP_DIGEST_CACHE_TTL", "86400"))    # 24 часа
+        self.window_ttl = int(os.getenv("GROUP_DIGEST_WINDOW_TTL", "172800"))  # 48 часов
+
+        # In-memory fallback: key -> (expires_at, value)
+        self._memory: Dict[str, Any] = {}
+        # Запросы в работе: key -> Future
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        if redis_client is not None:
+            self.redis_client = redis_client
+            return
+
+        redis_host = os.getenv("REDIS_HOST", "redis")
+        redis_port = int(os.getenv("REDIS_PORT", 6379))
+        redis_password = os.getenv("REDIS_PASSWORD")
+
+        try:
+            redis_kwargs = {
+                "host": redis_host,
+                "port": redis_port,
+                "decode_responses": True
+            }
+            if redis_password:
+                redis_kwargs["password"] = redis_password
+
+            self.redis_client = redis.Redis(**redis_kwargs)
+            self.redis_client.ping()
+            logger.info(f"✅ GroupDigestCache подключен к Redis ({redis_host}:{redis_port})")
+        except Exception as e:
+            self.redis_client = None
+            logger.warning(f"⚠️ GroupDigestCache: Redis недоступен, in-memory кеш ({e})")
+
+    # ------------------------------------------------------------------
+    # Ключи
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def range_key(messages: List[Any]) -> Optional[str]:
+        """
+        Ключ диапазона сообщений "first-last:fingerprint"
+
+        Fingerprint учитывает id и текст: правка сообщения внутри
+        диапазона дает новый ключ. None, если у сообщений нет id.
+        """
+        ids = [getattr(msg, 'id', None) for msg in messages]
+        if not ids or not all(isinstance(msg_id, int) for msg_id in ids):
+            return None
+
+        payload = "\n".join(
+            f"{msg_id}:{getattr(msg, 'text', '') or ''}" for msg_id, msg in zip(ids, messages)
+        )
+        fingerprint = hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+        return f"{min(ids)}-{max(ids)}:{fingerprint}"
+
+    @staticmethod
+    def digest_key(group_id: int, range_key: str, version: str) -> str:
+        return f"group_digest:{version}:{group_id}:{range_key}"
+
+    @staticmethod
+    def mention_key(chat_id: Any, mentioned_user: str, range_key: str, version: str) -> str:
+        return f"group_mention:{version}:{chat_id}:{mentioned_user.lower()}:{range_key}"
+
+    @staticmethod
+    def windows_key(group_id: int, version: str) -> str:
+        return f"group_digest_windows:{version}:{group_id}"
+
+    # ------------------------------------------------------------------
+    # Результаты
+    # ------------------------------------------------------------------
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Результат из кеша или None"""
+        try:
+            if self.redis_client:
+                data = self.redis_client.get(key)
+                return json.loads(data) if data else None
+
+            entry = self._memory.get(key)
+            if entry and entry[0] > time.monotonic():
+                return copy.deepcopy(entry[1])
+            self._memory.pop(key, None)
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка чтения кеша {key}: {e}")
+        return None
+
+    def set(self, key: str, value: Dict[str, Any], ttl: Optional[int] = None):
+        """Сохранить результат (JSON, TTL по умолчанию result_ttl)"""
+        ttl = ttl or self.result_ttl
+        try:
+            data = json.dumps(value, ensure_ascii=False, default=_json_default)
+            if self.redis_client:
+                self.redis_client.setex(key, ttl, data)
+            else:
+                self._prune_memory()
+                self._memory[key] = (time.monotonic() + ttl, json.loads(data))
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка записи кеша {key}: {e}")
+
+    async def get_or_compute(
+        self,
+        kind: str,
+        key: Optional[str],
+        compute: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """
+        Результат из кеша или compute() с объединением одинаковых запросов
+
+        Args:
+            kind: Тип результата для метрик (digest, mention)
+            key: Ключ кеша (None - без кеширования)
+            compute: Корутина генерации результата
+
+        Returns:
+            Результат (из кеша - с полем cached=True)
+        """
+        if key is None:
+            return await compute()
+
+        cached = self.get(key)
+        if cached is not None:
+            _record(kind, "hit")
+            logger.info(f"♻️ {kind} из кеша: {key}")
+            cached["cached"] = True
+            return cached
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            _record(kind, "coalesced")
+            logger.info(f"⏳ {kind}: ожидание такого же запроса в работе ({key})")
+            return copy.deepcopy(await asyncio.shield(inflight))
+
+        _record(kind, "miss")
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await compute()
+            self.set(key, result)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # Исключение получат ожидающие запросы; без них - не логировать как необработанное
+                future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def _prune_memory(self):
+        """Удалить истекшие ключи, при переполнении - самые старые"""
+        if len(self._memory) < MAX_MEMORY_ENTRIES:
+            return
+        now = time.monotonic()
+        for key in [key for key, (expires_at, _) in self._memory.items() if expires_at <= now]:
+            del self._memory[key]
+        while len(self._memory) >= MAX_MEMORY_ENTRIES:
+            del self._memory[next(iter(self._memory))]
+
+    # ------------------------------------------------------------------
+    # Резюме окон map-фазы
+    # ------------------------------------------------------------------
+
+    def load_windows(self, group_id: int, version: str) -> Dict[int, Dict[str, Any]]:
+        """Резюме окон прошлых дайджестов группы {start_id: window}"""
+        key = self.windows_key(group_id, version)
+        try:
+            if self.redis_client:
+                raw = self.redis_client.hgetall(key)
+            else:
+                entry = self._memory.get(key)
+                raw = entry[1] if entry and entry[0] > time.monotonic() else {}
+            return {int(start_id): json.loads(window) for start_id, window in raw.items()}
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка чтения окон группы {group_id}: {e}")
+            return {}
+
+    def save_windows(
+        self,
+        group_id: int,
+        version: str,
+        windows: List[Dict[str, Any]],
+        reused: int = 0
+    ):
+        """Сохранить новые резюме окон (старейшие по message_id вытесняются)"""
+        if group_digest_cache_total:
+            if reused:
+                group_digest_cache_total.labels(kind="window", result="hit").inc(reused)
+            if windows:
+                group_digest_cache_total.labels(kind="window", result="miss").inc(len(windows))
+        if not windows:
+            return
+
+        key = self.windows_key(group_id, version)
+        mapping = {
+            str(window["start_id"]): json.dumps(window, ensure_ascii=False)
+            for window in windows
+        }
+        try:
+            if self.redis_client:
+                pipe = self.redis_client.pipeline()
+                pipe.hset(key, mapping=mapping)
+                pipe.expire(key, self.window_ttl)
+                pipe.execute()
+
+                start_ids = self.redis_client.hkeys(key)
+                if len(start_ids) > MAX_WINDOWS_PER_GROUP:
+                    stale = sorted(start_ids, key=int)[:len(start_ids) - MAX_WINDOWS_PER_GROUP]
+                    self.redis_client.hdel(key, *stale)
+            else:
+                self._prune_memory()
+                entry = self._memory.get(key)
+                stored = dict(entry[1]) if entry and entry[0] > time.monotonic() else {}
+                stored.update(mapping)
+                if len(stored) > MAX_WINDOWS_PER_GROUP:
+                    for start_id in sorted(stored, key=int)[:len(stored) - MAX_WINDOWS_PER_GROUP]:
+                        del stored[start_id]
+                self._memory[key] = (time.monotonic() + self.window_ttl, stored)
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка записи окон группы {group_id}: {e}")
+
+
+# Глобальный экземпляр
+group_digest_cache = GroupDigestCache()
@@ -2,6 +2,8 @@
 Group Digest Generator
 Генерация дайджестов диалогов в Telegram группах через n8n multi-agent workflows
 Поддерживает как n8n, так и прямую LangChain интеграцию
+
+Результаты кешируются по диапазону сообщений (group_digest_cache)
 """
 import logging
 import os
@@ -11,6 +13,7 @@ from datetime import datetime, timedelta, timezone
 from telethon.tl.types import Message
 from dotenv import load_dotenv
 import telegram_formatter
+from group_digest_cache import group_digest_cache
 
 load_dotenv()
 
@@ -26,6 +29,9 @@ class GroupDigestGenerator:
         self.use_langchain_direct = os.getenv("USE_LANGCHAIN_DIRECT", "false").lower() == "true"
         self.use_v2_pipeline = os.getenv("USE_DIGEST_V2", "true").lower() == "true"
         
+        # Кеш результатов по диапазону сообщений
+        self.cache = group_digest_cache
+        
         if self.use_langchain_direct:
             # LangChain Direct Integration
             logger.info("🚀 Инициализация LangChain Direct Integration")
@@ -93,11 +99,21 @@ class GroupDigestGenerator:
             limited_messages = messages[:max_messages]
             
             # Выбор метода генерации
-            if self.use_langchain_direct:
-                return await self._generate_with_langchain(user_id, group_id, limited_messages, hours)
-            else:
+            async def generate() -> Dict[str, Any]:
+                if self.use_langchain_direct:
+                    return await self._generate_with_langchain(user_id, group_id, limited_messages, hours)
                 return await self._generate_with_n8n(user_id, group_id, limited_messages, hours)
             
+            # Тот же диапазон сообщений той же группы - результат из кеша
+            # (дайджест не зависит от пользователя)
+            range_key = self.cache.range_key(limited_messages)
+            cache_key = self.cache.digest_key(group_id, range_key, self._cache_version()) if range_key else None
+            
+            result = await self.cache.get_or_compute("digest", cache_key, generate)
+            if "period" in result:
+                result["period"] = f"{hours}ч"
+            return result
+            
         except Exception as e:
             logger.error(f"❌ Ошибка генерации дайджеста: {e}")
             raise
@@ -124,12 +140,24 @@ class GroupDigestGenerator:
         try:
             logger.info("🚀 Генерация через LangChain Direct Integration")
             
+            # Резюме окон прошлых дайджестов: сжимаются только новые сообщения
+            version = self._cache_version()
+            cached_windows = self.cache.load_windows(group_id, version)
+            
             # Вызов LangChain Orchestrator
             result = await self.orchestrator.generate_digest(
                 messages=messages,
                 hours=hours,
                 user_id=user_id,
-                group_id=group_id
+                group_id=group_id,
+                cached_windows=cached_windows
+            )
+            
+            self.cache.save_windows(
+                group_id,
+                version,
+                result.get("window_summaries", []),
+                reused=result.get("reused_windows", 0)
             )
             
             # Проверяем успешность генерации
@@ -272,6 +300,13 @@ class GroupDigestGenerator:
             logger.error(f"❌ Ошибка n8n генерации: {e}")
             raise
     
+    def _cache_version(self) -> str:
+        """Версия генератора для ключей кеша: смена пайплайна или промптов сбрасывает кеш"""
+        if self.use_langchain_direct:
+            from langchain_agents.config import config as langchain_config
+            return f"langchain-{langchain_config.cache_version}"
+        return "n8n-v2" if self.use_v2_pipeline else "n8n-v1"
+    
     def _extract_topics_from_langchain_result(self, digest_obj) -> List[str]:
         """Извлечение тем из результата LangChain для совместимости"""
         try:
@@ -366,14 +401,20 @@ class GroupDigestGenerator:
     async def analyze_mention(
         self,
         mentioned_user: str,
-        context_messages: List[Message]
+        context_messages: List[Message],
+        chat_id: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         Анализирует контекст упоминания пользователя через n8n workflow
         
+        Одинаковый контекст (чат, диапазон сообщений, пользователь)
+        анализируется один раз - повторные и параллельные запросы
+        получают результат из кеша.
+        
         Args:
             mentioned_user: Username упомянутого пользователя
             context_messages: Список сообщений контекста (до/после упоминания)
+            chat_id: ID чата (по умолчанию - chat_id сообщений контекста)
             
         Returns:
             {
@@ -383,6 +424,26 @@ class GroupDigestGenerator:
                 "key_points": List[str]
             }
         """
+        if chat_id is None and context_messages:
+            chat_id = getattr(context_messages[0], 'chat_id', None)
+        
+        range_key = self.cache.range_key(context_messages)
+        cache_key = None
+        if range_key and isinstance(chat_id, int):
+            cache_key = self.cache.mention_key(chat_id, mentioned_user, range_key, "n8n-mention")
+        
+        return await self.cache.get_or_compute(
+            "mention",
+            cache_key,
+            lambda: self._analyze_mention_with_n8n(mentioned_user, context_messages)
+        )
+    
+    async def _analyze_mention_with_n8n(
+        self,
+        mentioned_user: str,
+        context_messages: List[Message]
+    ) -> Dict[str, Any]:
+        """Анализ контекста упоминания через n8n workflow (без кеша)"""
         try:
             logger.info(f"🔍 Анализ упоминания @{mentioned_user}")
             logger.info(f"   Контекст: {len(context_messages)} сообщений")
@@ -1,14 +1,21 @@
 """
 Group Monitor Service
 Real-time мониторинг упоминаний пользователей в Telegram группах
+
+Контекст упоминания берется из кольцевого буфера последних сообщений
+группы (заполняется тем же NewMessage handler), при промахе - одним
+запросом истории вокруг упоминания. Серия упоминаний в одной ветке
+обсуждения за MENTION_DEBOUNCE_SECONDS анализируется один раз.
 """
 import asyncio
+import bisect
 import logging
 import os
-from typing import Dict, List, Optional
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
 from datetime import datetime, timezone
-from telethon import TelegramClient, events
-from telethon.tl.types import Message
+from telethon import TelegramClient, events, utils
+from telethon.tl.types import Message, PeerChannel
 
 from database import SessionLocal
 from models import User, Group, GroupMention, GroupSettings, user_group
@@ -16,6 +23,16 @@ from shared_auth_manager import shared_auth_manager
 from group_digest_generator import group_digest_generator
 from dotenv import load_dotenv
 
+try:
+    from rag_service.telegram_sender import telegram_sender, PRIORITY_NOTIFICATION
+except ImportError:
+    # Fallback для тестов (rag_service/ добавлен в sys.path напрямую)
+    try:
+        from telegram_sender import telegram_sender, PRIORITY_NOTIFICATION
+    except ImportError:
+        telegram_sender = None
+        PRIORITY_NOTIFICATION = None
+
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
@@ -32,6 +49,16 @@ class GroupMonitorService:
         # Группы для мониторинга: {user_telegram_id: [group_ids]}
         self.monitored_groups: Dict[int, List[int]] = {}
         
+        # Последние сообщения групп: {(user_telegram_id | None, chat_id): deque[Message]}
+        # (по возрастанию id, см. _buffer_key)
+        self.buffer_size = int(os.getenv("MENTION_CONTEXT_BUFFER_SIZE", "200"))
+        self.message_buffers: Dict[Tuple[Optional[int], int], Deque[Message]] = {}
+        
+        # Debounce упоминаний: {(user_telegram_id, chat_id, thread_id): pending}
+        self.mention_debounce = float(os.getenv("MENTION_DEBOUNCE_SECONDS", "5"))
+        self._pending_mentions: Dict[Tuple[int, int, Optional[int]], Dict[str, Any]] = {}
+        self._mention_tasks: Set[asyncio.Task] = set()
+        
         logger.info("✅ GroupMonitorService инициализирован")
     
     async def start_monitoring(self, user_telegram_id: int) -> bool:
@@ -101,6 +128,9 @@ class GroupMonitorService:
             async def mention_handler(event):
                 """Обработчик новых сообщений в группах"""
                 try:
+                    # Контекст будущих упоминаний - без запросов к Telegram
+                    self._buffer_message(user_telegram_id, event.chat_id, event.message)
+                    
                     # Проверяем упоминание
                     if not event.message.text:
                         return
@@ -121,7 +151,7 @@ class GroupMonitorService:
                     
                     if mentioned:
                         logger.info(f"🔔 Упоминание @{username} в группе {event.chat_id}")
-                        await self._process_mention(user_telegram_id, event)
+                        self._schedule_mention(user_telegram_id, event)
                         
                 except Exception as e:
                     logger.error(f"❌ Ошибка в mention_handler: {e}")
@@ -151,15 +181,136 @@ class GroupMonitorService:
             if user_telegram_id in self.monitored_groups:
                 del self.monitored_groups[user_telegram_id]
             
+            # Отложенные упоминания больше не обрабатываем
+            for key in [key for key in self._pending_mentions if key[0] == user_telegram_id]:
+                del self._pending_mentions[key]
+            
+            # Буферы обычных групп видны только этому аккаунту
+            for key in [key for key in self.message_buffers if key[0] == user_telegram_id]:
+                del self.message_buffers[key]
+            
             logger.info(f"🛑 Мониторинг остановлен для {user_telegram_id}")
     
-    async def _process_mention(self, user_telegram_id: int, event):
+    @staticmethod
+    def _buffer_key(user_telegram_id: Optional[int], chat_id: int) -> Tuple[Optional[int], int]:
+        """
+        Ключ буфера группы
+        
+        В супергруппах (-100...) id сообщений общие для всех участников -
+        один буфер на группу. В обычных группах id сообщений свои у каждого
+        аккаунта, поэтому буфер - на пару (пользователь, группа).
+        """
+        if utils.resolve_id(chat_id)[1] is PeerChannel:
+            return None, chat_id
+        return user_telegram_id, chat_id
+    
+    def _buffer_message(self, user_telegram_id: int, chat_id: int, message: Message):
+        """
+        Добавить сообщение в кольцевой буфер группы
+        
+        Handler каждого пользователя супергруппы получает то же сообщение -
+        повторы (id не больше последнего) пропускаются.
+        """
+        key = self._buffer_key(user_telegram_id, chat_id)
+        buffer = self.message_buffers.get(key)
+        if buffer is None:
+            buffer = self.message_buffers[key] = deque(maxlen=self.buffer_size)
+        
+        if buffer and message.id <= buffer[-1].id:
+            return
+        buffer.append(message)
+    
+    def _context_from_buffer(
+        self,
+        user_telegram_id: Optional[int],
+        chat_id: int,
+        first_message_id: int,
+        message_id: int,
+        context_size: int
+    ) -> Optional[List[Message]]:
+        """
+        Контекст из буфера: context_size до первого упоминания серии,
+        сами упоминания и до context_size после последнего
+        
+        Returns:
+            Список сообщений или None, если в буфере не хватает истории
+        """
+        buffer = self.message_buffers.get(self._buffer_key(user_telegram_id, chat_id))
+        if not buffer:
+            return None
+        
+        ids = [msg.id for msg in buffer]
+        start = bisect.bisect_left(ids, first_message_id)
+        end = bisect.bisect_left(ids, message_id)
+        
+        if start < context_size or end >= len(ids) or ids[end] != message_id or ids[start] != first_message_id:
+            return None
+        
+        messages = list(buffer)
+        return messages[start - context_size:end + context_size + 1]
+    
+    @staticmethod
+    def _thread_id(message: Message) -> Optional[int]:
+        """ID ветки обсуждения (топик форума) или None для общего чата"""
+        reply_to = getattr(message, 'reply_to', None)
+        if not reply_to:
+            return None
+        
+        top_id = getattr(reply_to, 'reply_to_top_id', None)
+        if isinstance(top_id, int):
+            return top_id
+        if getattr(reply_to, 'forum_topic', False) is True:
+            return getattr(reply_to, 'reply_to_msg_id', None)
+        return None
+    
+    def _schedule_mention(self, user_telegram_id: int, event):
+        """
+        Отложить обработку упоминания на mention_debounce секунд
+        
+        Упоминания в той же ветке за это время объединяются: анализируется
+        контекст от первого до последнего упоминания серии. Заодно в буфер
+        успевают попасть сообщения после упоминания.
+        """
+        key = (user_telegram_id, event.chat_id, self._thread_id(event.message))
+        
+        pending = self._pending_mentions.get(key)
+        if pending:
+            pending["event"] = event
+            pending["count"] += 1
+            logger.info(f"⏳ Упоминание объединено с серией ({pending['count']} в ветке {key[1]}/{key[2]})")
+            return
+        
+        self._pending_mentions[key] = {
+            "event": event,
+            "first_message_id": event.message.id,
+            "count": 1
+        }
+        task = asyncio.create_task(self._flush_mention(key))
+        self._mention_tasks.add(task)
+        task.add_done_callback(self._mention_tasks.discard)
+    
+    async def _flush_mention(self, key: Tuple[int, int, Optional[int]]):
+        """Обработать серию упоминаний после паузы debounce"""
+        await asyncio.sleep(self.mention_debounce)
+        
+        pending = self._pending_mentions.pop(key, None)
+        if not pending:
+            return
+        
+        await self._process_mention(
+            key[0],
+            pending["event"],
+            first_message_id=pending["first_message_id"]
+        )
+    
+    async def _process_mention(self, user_telegram_id: int, event, first_message_id: Optional[int] = None):
         """
         Обработка упоминания пользователя
         
         Args:
             user_telegram_id: Telegram ID упомянутого пользователя
-            event: Telethon NewMessage event
+            event: Telethon NewMessage event (последнее упоминание серии)
+            first_message_id: ID первого упоминания серии (debounce)
         """
         try:
             logger.info(f"📝 Обработка упоминания для {user_telegram_id}")
@@ -188,7 +339,9 @@ class GroupMonitorService:
                     client, 
                     event.chat_id, 
                     event.message.id,
-                    context_size
+                    context_size,
+                    first_message_id=first_message_id,
+                    user_telegram_id=user_telegram_id
                 )
                 
                 # Анализируем через n8n workflow
@@ -196,7 +349,8 @@ class GroupMonitorService:
                 me = await client.get_me()
                 analysis = await group_digest_generator.analyze_mention(
                     mentioned_user=me.username or str(user_telegram_id),
-                    context_messages=context_messages
+                    context_messages=context_messages,
+                    chat_id=event.chat_id
                 )
                 
                 # Получаем информацию о группе
@@ -240,46 +394,48 @@ class GroupMonitorService:
         client: TelegramClient, 
         chat_id: int, 
         message_id: int,
-        context_size: int = 5
+        context_size: int = 5,
+        first_message_id: Optional[int] = None,
+        user_telegram_id: Optional[int] = None
     ) -> List[Message]:
         """
         Получить контекст вокруг упоминания (N сообщений до/после)
         
+        Сначала из буфера группы; при промахе - один запрос истории:
+        offset_id=упоминание, add_offset=-(N+1) возвращает N сообщений
+        после, само упоминание и сообщения до него.
+        
         Args:
             client: Telethon клиент
             chat_id: ID группы
             message_id: ID сообщения с упоминанием
             context_size: Количество сообщений до/после
+            first_message_id: ID первого упоминания серии (по умолчанию message_id)
+            user_telegram_id: Владелец клиента (буфер обычной группы - свой у аккаунта)
             
         Returns:
-            Список сообщений (контекст)
+            Список сообщений (контекст) по возрастанию id
         """
+        first_message_id = min(first_message_id or message_id, message_id)
+        
+        buffered = self._context_from_buffer(
+            user_telegram_id, chat_id, first_message_id, message_id, context_size
+        )
+        if buffered is not None:
+            logger.info(f"📨 Контекст из буфера: {len(buffered)} сообщений")
+            return buffered
+        
         try:
-            messages = []
+            # Серия упоминаний расширяет окно (не больше одного запроса - 100 сообщений)
+            limit = min(2 * context_size + 1 + (message_id - first_message_id), 100)
             
-            # Получаем сообщения до упоминания
-            async for msg in client.iter_messages(
+            messages = await client.get_messages(
                 chat_id,
-                limit=context_size,
+                limit=limit,
                 offset_id=message_id,
-                reverse=False
-            ):
-                messages.insert(0, msg)  # Добавляем в начало
-            
-            # Получаем само сообщение с упоминанием
-            mention_msg = await client.get_messages(chat_id, ids=message_id)
-            if mention_msg:
-                messages.append(mention_msg)
-            
-            # Получаем сообщения после упоминания
-            async for msg in client.iter_messages(
-                chat_id,
-                limit=context_size,
-                min_id=message_id,
-                reverse=True
-            ):
-                if msg.id != message_id:  # Пропускаем само упоминание
-                    messages.append(msg)
+                add_offset=-(context_size + 1)
+            )
+            messages = sorted((msg for msg in messages if msg), key=lambda msg: msg.id)
             
             logger.info(f"📨 Получено {len(messages)} сообщений контекста")
             return messages
@@ -305,12 +461,6 @@ class GroupMonitorService:
             event: Telethon event
         """
         try:
-            # Получаем клиент
-            client = self.active_monitors.get(user_telegram_id)
-            if not client:
-                logger.error(f"❌ Клиент не найден для отправки уведомления")
-                return
-            
             # Формируем ссылку на сообщение
             message_link = f"https://t.me/c/{str(event.chat_id)[4:]}/{event.message.id}"
             
@@ -321,12 +471,30 @@ class GroupMonitorService:
                 message_link=message_link
             )
             
-            # Отправляем уведомление в личные сообщения
-            await client.send_message(
-                user_telegram_id,
-                notification,
-                parse_mode='HTML'
-            )
+            if telegram_sender and telegram_sender.enabled:
+                # Через бота: общая outbound очередь (rate limit, retry_after),
+                # уведомления идут раньше массовой рассылки дайджестов
+                delivered = await telegram_sender.send_message(
+                    user_telegram_id,
+                    notification,
+                    priority=PRIORITY_NOTIFICATION,
+                    idempotency_key=f"mention:{event.chat_id}:{event.message.id}:{user_telegram_id}"
+                )
+                if not delivered:
+                    logger.error(f"❌ Уведомление не доставлено пользователю {user_telegram_id}")
+                    return
+            else:
+                # Fallback: личные сообщения через клиент пользователя
+                client = self.active_monitors.get(user_telegram_id)
+                if not client:
+                    logger.error(f"❌ Клиент не найден для отправки уведомления")
+                    return
+                
+                await client.send_message(
+                    user_telegram_id,
+                    notification,
+                    parse_mode='HTML'
+                )
             
             logger.info(f"📬 Уведомление отправлено пользователю {user_telegram_id}")
             
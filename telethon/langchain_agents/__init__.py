@@ -2,7 +2,7 @@
 LangChain Agents для Telegram Bot Group Digest Generation
 
 Портирование n8n workflows в прямую LangChain интеграцию с использованием LCEL.
-Архитектура: 9 агентов в sequential pipeline с conditional execution.
+Архитектура: 9 агентов в графе зависимостей (DAG) с conditional execution.
 """
 
 from .base import BaseAgent
@@ -8,6 +8,7 @@
 import logging
 import asyncio
 from abc import ABC, abstractmethod
+from contextlib import nullcontext
 from typing import Dict, Any, Optional, List, Type
 from datetime import datetime, timezone
 
@@ -20,10 +21,21 @@ from pydantic import BaseModel
 from .config import config
 from .observability import get_langfuse_config, log_agent_metrics
 
+# Общий регулятор GigaChat (Redis): приоритет - из gigachat_priority, по умолчанию digest
+try:
+    from rag_service.gigachat_governor import gigachat_governor
+except ImportError:
+    gigachat_governor = None
+
 
 logger = logging.getLogger(__name__)
 
 
+def gigachat_slot():
+    """Слот GigaChat для одного вызова LLM (без регулятора - без ограничений)"""
+    return gigachat_governor.slot() if gigachat_governor else nullcontext()
+
+
 class BaseAgent(Runnable, ABC):
     """
     Базовый класс для всех LangChain агентов с Pydantic structured output
@@ -131,12 +143,13 @@ class BaseAgent(Runnable, ABC):
             # 1. Подготовка user message
             user_message = await self._process_input(input_data)
             
-            # 2. Вызов LLM с timeout
+            # 2. Вызов LLM с timeout (ожидание слота GigaChat в timeout не входит)
             try:
-                result = await asyncio.wait_for(
-                    self.chain.ainvoke({"user_message": user_message}, **kwargs),
-                    timeout=self.timeout
-                )
+                async with gigachat_slot():
+                    result = await asyncio.wait_for(
+                        self.chain.ainvoke({"user_message": user_message}, **kwargs),
+                        timeout=self.timeout
+                    )
             except asyncio.TimeoutError:
                 logger.error(f"⏰ Timeout агента {self.agent_name} ({self.timeout}s)")
                 raise TimeoutError(f"Agent {self.agent_name} timeout after {self.timeout}s")
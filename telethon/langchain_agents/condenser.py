@@ -0,0 +1,351 @@
+"""
+Message Condenser - map-reduce сжатие диалога перед агентами
+
+Для активных групп история за 24ч не помещается в контекст модели, а
+каждый из 9 агентов читает ее заново. Condenser выполняется один раз:
+
+1. Берет статистику участников и ссылки из DialogueFacts
+   (extractors - точные счетчики без LLM вместо оценок модели)
+2. Если диалог меньше condense_threshold_tokens - отдает его как есть
+3. Иначе (map) режет сообщения на окна по window_tokens и сжимает окна
+   параллельно (не больше concurrency одновременно), затем (reduce)
+   склеивает резюме окон; если результат все еще больше target_tokens -
+   сжимает резюме повторно
+
+Агенты получают CondensedDialogue.text вместо сырых сообщений.
+
+Резюме окон привязаны к message_id первого сообщения окна: при повторном
+дайджесте за перекрывающийся период (cached_windows) окна, совпадающие по
+сообщениям, берутся из кеша, и LLM сжимает только новые сообщения.
+"""
+
+import asyncio
+import hashlib
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .config import config
+from .extractors import DialogueFacts, DialogueMessage, extract_dialogue_facts
+
+
+logger = logging.getLogger(__name__)
+
+# Максимум повторных reduce-проходов
+MAX_REDUCE_DEPTH = 3
+
+CONDENSE_SYSTEM_PROMPT = """Ты сжимаешь фрагмент диалога Telegram группы для дальнейшего анализа.
+
+Сохрани:
+- кто что сказал (реальные usernames, без изменений)
+- темы, решения, открытые вопросы, договоренности, разногласия
+- время важных событий (HH:MM)
+- ссылки и упомянутые ресурсы
+
+Пиши кратко, по пунктам, на русском языке. Не добавляй ничего, чего нет в диалоге."""
+
+
+def estimate_tokens(text: str) -> int:
+    """Оценка числа токенов (консервативно для кириллицы: ~3 символа на токен)"""
+    return len(text) // 3 + 1
+
+
+@dataclass
+class CondensedDialogue:
+    """Общее сжатое представление диалога для всех агентов"""
+    text: str
+    message_count: int
+    speaker_stats: List[Dict[str, Any]] = field(default_factory=list)
+    external_links: List[str] = field(default_factory=list)
+    telegram_links: List[str] = field(default_factory=list)
+    mentions: List[str] = field(default_factory=list)
+    windows: int = 0
+    reused_windows: int = 0
+    condensed: bool = False
+    source_tokens: int = 0
+    # Новые резюме окон map-фазы для кеша: start_id, count, fingerprint, summary
+    window_summaries: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+
+def extract_speaker_stats(
+    messages: List[DialogueMessage],
+    facts: Optional[DialogueFacts] = None
+) -> List[Dict[str, Any]]:
+    """Число сообщений и время первой/последней реплики по участникам"""
+    facts = facts or extract_dialogue_facts(messages)
+    return [
+        {key: speaker[key] for key in ("username", "message_count", "first_seen", "last_seen")}
+        for speaker in facts.speakers
+    ]
+
+
+def extract_links(
+    messages: List[DialogueMessage],
+    facts: Optional[DialogueFacts] = None
+) -> Dict[str, List[str]]:
+    """Ссылки (внешние / t.me) в порядке появления и @упоминания без дублей"""
+    facts = facts or extract_dialogue_facts(messages)
+    return {
+        "external_links": [link["url"] for link in facts.external_links],
+        "telegram_links": [link["url"] for link in facts.telegram_links],
+        "mentions": [mention["username"] for mention in facts.mentions]
+    }
+
+
+def split_windows(lines: List[str], window_tokens: int) -> List[List[str]]:
+    """Разбить строки на окна не больше window_tokens (строка не режется)"""
+    windows: List[List[str]] = []
+    current: List[str] = []
+    current_tokens = 0
+
+    for line in lines:
+        line_tokens = estimate_tokens(line)
+        if current and current_tokens + line_tokens > window_tokens:
+            windows.append(current)
+            current, current_tokens = [], 0
+        current.append(line)
+        current_tokens += line_tokens
+
+    if current:
+        windows.append(current)
+    return windows
+
+
+def window_fingerprint(messages: List[DialogueMessage]) -> str:
+    """Отпечаток окна: меняется при правке или удалении сообщения"""
+    payload = "\n".join(f"{m.message_id}:{m.username}:{m.text}" for m in messages)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def plan_windows(
+    messages: List[DialogueMessage],
+    lines: List[str],
+    window_tokens: int,
+    cached_windows: Optional[Dict[int, Dict[str, Any]]] = None
+) -> List[Tuple[int, int, Optional[str]]]:
+    """
+    Разбить сообщения на окна map-фазы с переиспользованием кеша
+
+    Окно из кеша берется целиком, если с его start_id начинается та же
+    последовательность сообщений (совпадает fingerprint); остальные
+    сообщения режутся по window_tokens, как в split_windows.
+
+    Returns:
+        [(start, end, cached_summary | None)] - срезы messages[start:end]
+    """
+    plan: List[Tuple[int, int, Optional[str]]] = []
+    cached_windows = cached_windows or {}
+    start: Optional[int] = None
+    tokens = 0
+    i = 0
+
+    while i < len(messages):
+        entry = cached_windows.get(messages[i].message_id) if messages[i].message_id is not None else None
+        if entry:
+            end = i + entry["count"]
+            if end <= len(messages) and window_fingerprint(messages[i:end]) == entry["fingerprint"]:
+                if start is not None:
+                    plan.append((start, i, None))
+                    start = None
+                plan.append((i, end, entry["summary"]))
+                i = end
+                continue
+
+        line_tokens = estimate_tokens(lines[i])
+        if start is not None and tokens + line_tokens > window_tokens:
+            plan.append((start, i, None))
+            start = None
+        if start is None:
+            start, tokens = i, 0
+        tokens += line_tokens
+        i += 1
+
+    if start is not None:
+        plan.append((start, len(messages), None))
+    return plan
+
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * 3
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit('\n', 1)[0] + "\n[...]"
+
+
+class MessageCondenser:
+    """Map-reduce сжатие диалога"""
+
+    def __init__(
+        self,
+        summarize: Optional[Callable[[str], Awaitable[str]]] = None,
+        condense_threshold_tokens: Optional[int] = None,
+        window_tokens: Optional[int] = None,
+        target_tokens: Optional[int] = None,
+        concurrency: Optional[int] = None
+    ):
+        """
+        Args:
+            summarize: Корутина сжатия фрагмента (по умолчанию GigaChat через LCEL)
+            condense_threshold_tokens: Диалоги меньше порога не сжимаются
+            window_tokens: Размер окна map-фазы
+            target_tokens: Целевой размер сжатого текста
+            concurrency: Одновременных вызовов LLM в map-фазе
+        """
+        self.condense_threshold_tokens = condense_threshold_tokens or config.CONDENSE_THRESHOLD_TOKENS
+        self.window_tokens = window_tokens or config.CONDENSE_WINDOW_TOKENS
+        self.target_tokens = target_tokens or config.CONDENSE_TARGET_TOKENS
+        self.concurrency = concurrency or config.CONDENSE_CONCURRENCY
+        self.window_timeout = config.agent_timeouts["message_condenser"]
+        self._summarize = summarize
+        self._chain = None
+
+    async def summarize(self, fragment: str) -> str:
+        """Сжать фрагмент диалога"""
+        if self._summarize:
+            return await self._summarize(fragment)
+
+        if self._chain is None:
+            from langchain_core.output_parsers import StrOutputParser
+            from langchain_core.prompts import ChatPromptTemplate
+            from .config import get_llm_for_agent
+
+            prompt = ChatPromptTemplate.from_messages([
+                ("system", CONDENSE_SYSTEM_PROMPT),
+                ("human", "{fragment}")
+            ])
+            self._chain = prompt | get_llm_for_agent("fact_extraction") | StrOutputParser()
+
+        from .base import gigachat_slot
+
+        async with gigachat_slot():
+            return await self._chain.ainvoke({"fragment": fragment})
+
+    async def condense(
+        self,
+        messages: List[DialogueMessage],
+        facts: Optional[DialogueFacts] = None,
+        cached_windows: Optional[Dict[int, Dict[str, Any]]] = None
+    ) -> CondensedDialogue:
+        """
+        Построить сжатое представление диалога
+
+        Args:
+            messages: Сообщения в хронологическом порядке
+            facts: Уже посчитанные факты диалога (иначе считаются здесь)
+            cached_windows: Резюме окон прошлых дайджестов {start_id: window}
+
+        Returns:
+            CondensedDialogue
+        """
+        lines = [msg.format() for msg in messages]
+        raw_text = "\n".join(lines)
+        source_tokens = estimate_tokens(raw_text)
+
+        facts = facts or extract_dialogue_facts(messages)
+        links = extract_links(messages, facts)
+        result = CondensedDialogue(
+            text=raw_text,
+            message_count=len(messages),
+            speaker_stats=extract_speaker_stats(messages, facts),
+            source_tokens=source_tokens,
+            **links
+        )
+
+        if source_tokens <= self.condense_threshold_tokens:
+            return result
+
+        # Map: окна сжимаются параллельно, совпавшие с кешем не сжимаются повторно
+        windows = plan_windows(messages, lines, self.window_tokens, cached_windows)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        window_budget = max(self.target_tokens // len(windows), 50)
+
+        async def condense_window(fragment: str, span: str) -> Tuple[str, bool]:
+            """Резюме фрагмента и признак успешного сжатия LLM"""
+            async with semaphore:
+                try:
+                    summary = await asyncio.wait_for(self.summarize(fragment), timeout=self.window_timeout)
+                    ok = True
+                except Exception as e:
+                    # Fallback: начало окна без LLM - лучше, чем потерять окно
+                    logger.warning(f"⚠️ Фрагмент {span} не сжат: {e or type(e).__name__}")
+                    summary = _truncate_to_tokens(fragment, window_budget)
+                    ok = False
+            return summary.strip(), ok
+
+        async def map_window(start: int, end: int, cached: Optional[str]) -> str:
+            span = self._span(lines[start], lines[end - 1])
+            if cached is not None:
+                return f"{span}\n{cached}"
+
+            summary, ok = await condense_window("\n".join(lines[start:end]), span)
+            if ok and messages[start].message_id is not None:
+                result.window_summaries.append({
+                    "start_id": messages[start].message_id,
+                    "count": end - start,
+                    "fingerprint": window_fingerprint(messages[start:end]),
+                    "summary": summary
+                })
+            return f"{span}\n{summary}"
+
+        summaries = await asyncio.gather(*[map_window(*window) for window in windows])
+        result.reused_windows = sum(1 for window in windows if window[2] is not None)
+
+        # Reduce: повторное сжатие, пока не уложимся в target_tokens
+        condensed_text = "\n\n".join(summaries)
+        depth = 0
+        while estimate_tokens(condensed_text) > self.target_tokens and depth < MAX_REDUCE_DEPTH and len(summaries) > 1:
+            depth += 1
+            groups = split_windows(summaries, self.window_tokens)
+            if len(groups) == len(summaries):
+                break
+            spans = [self._span(group[0], group[-1]) for group in groups]
+            reduced = await asyncio.gather(*[
+                condense_window("\n\n".join(group), span) for group, span in zip(groups, spans)
+            ])
+            summaries = [f"{span}\n{summary}" for span, (summary, _) in zip(spans, reduced)]
+            condensed_text = "\n\n".join(summaries)
+
+        condensed_text = _truncate_to_tokens(condensed_text, self.target_tokens)
+
+        result.text = self._render(result, condensed_text, len(windows))
+        result.windows = len(windows)
+        result.condensed = True
+
+        logger.info(
+            f"🗜️ Диалог сжат: {len(messages)} сообщений, {source_tokens} → {result.tokens} токенов "
+            f"({len(windows)} окон, из кеша {result.reused_windows}, reduce x{depth})"
+        )
+        return result
+
+    @staticmethod
+    def _span(first: str, last: str) -> str:
+        """
+        Диапазон сообщений фрагмента "[1-45]"
+
+        first/last - строки сообщений "[1] user: ..." или резюме окон "[1-45]\n..."
+        """
+        def bounds(line: str) -> List[str]:
+            if not line.startswith('['):
+                return []
+            return line[1:line.find(']')].split('-')
+
+        first_bounds, last_bounds = bounds(first), bounds(last)
+        if first_bounds and last_bounds:
+            return f"[{first_bounds[0]}-{last_bounds[-1]}]"
+        return "[...]"
+
+    @staticmethod
+    def _render(result: CondensedDialogue, condensed_text: str, windows: int) -> str:
+        speakers = ", ".join(
+            f"{s['username']} ({s['message_count']})" for s in result.speaker_stats[:30]
+        )
+        return (
+            f"СЖАТЫЙ ДИАЛОГ: {result.message_count} сообщений, {windows} фрагментов\n"
+            f"УЧАСТНИКИ (сообщений): {speakers}\n"
+            f"ССЫЛКИ: {len(result.external_links)} внешних, {len(result.telegram_links)} Telegram\n\n"
+            f"{condensed_text}"
+        )
@@ -4,6 +4,7 @@
 Интеграция с GigaChat через gpt2giga-proxy и настройки для всех агентов.
 """
 
+import hashlib
 import os
 from dataclasses import dataclass
 from typing import Dict, Any
@@ -31,6 +32,15 @@ class LangChainConfig:
     AGENT_TIMEOUT: float = 30.0
     ORCHESTRATOR_TIMEOUT: float = 120.0
     
+    # Map-reduce сжатие диалога (condenser.py), в оценочных токенах
+    CONDENSE_THRESHOLD_TOKENS: int = 6000   # Меньше - агенты получают диалог как есть
+    CONDENSE_WINDOW_TOKENS: int = 3000      # Размер окна map-фазы
+    CONDENSE_TARGET_TOKENS: int = 4000      # Целевой размер сжатого диалога
+    CONDENSE_CONCURRENCY: int = 4           # Параллельных вызовов LLM в map-фазе
+    
+    # Версия промптов/графа агентов - поднимать при изменении промптов
+    AGENTS_VERSION: str = "1"
+    
     # Langfuse settings
     LANGFUSE_PUBLIC_KEY: str = os.getenv("LANGFUSE_PUBLIC_KEY", "")
     LANGFUSE_SECRET_KEY: str = os.getenv("LANGFUSE_SECRET_KEY", "")
@@ -66,6 +76,7 @@ class LangChainConfig:
     def agent_timeouts(self) -> Dict[str, float]:
         """Timeout'ы для разных агентов"""
         return {
+            "message_condenser": 30.0,  # на одно окно
             "dialogue_assessor": 15.0,
             "topic_extractor": 30.0,
             "emotion_analyzer": 30.0,
@@ -77,6 +88,27 @@ class LangChainConfig:
             "supervisor_synthesizer": 45.0
         }
     
+    @property
+    def cache_version(self) -> str:
+        """
+        Версия конфигурации агентов для ключей кеша дайджестов
+        
+        Меняется при смене промптов (AGENTS_VERSION), моделей, температур
+        или параметров сжатия - старые результаты перестают переиспользоваться.
+        """
+        fingerprint = "|".join(str(value) for value in (
+            self.AGENTS_VERSION,
+            self.GIGACHAT_MODEL,
+            self.GIGACHAT_PRO_MODEL,
+            self.TEMPERATURE_CONSERVATIVE,
+            self.TEMPERATURE_CREATIVE,
+            self.TEMPERATURE_SYNTHESIS,
+            self.CONDENSE_THRESHOLD_TOKENS,
+            self.CONDENSE_WINDOW_TOKENS,
+            self.CONDENSE_TARGET_TOKENS
+        ))
+        return hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()[:12]
+    
     @classmethod
     def from_env(cls) -> "LangChainConfig":
         """Создать конфиг из environment variables"""
@@ -88,6 +120,11 @@ class LangChainConfig:
             TEMPERATURE_CONSERVATIVE=float(os.getenv("TEMPERATURE_CONSERVATIVE", cls.TEMPERATURE_CONSERVATIVE)),
             TEMPERATURE_CREATIVE=float(os.getenv("TEMPERATURE_CREATIVE", cls.TEMPERATURE_CREATIVE)),
             TEMPERATURE_SYNTHESIS=float(os.getenv("TEMPERATURE_SYNTHESIS", cls.TEMPERATURE_SYNTHESIS)),
+            CONDENSE_THRESHOLD_TOKENS=int(os.getenv("CONDENSE_THRESHOLD_TOKENS", cls.CONDENSE_THRESHOLD_TOKENS)),
+            CONDENSE_WINDOW_TOKENS=int(os.getenv("CONDENSE_WINDOW_TOKENS", cls.CONDENSE_WINDOW_TOKENS)),
+            CONDENSE_TARGET_TOKENS=int(os.getenv("CONDENSE_TARGET_TOKENS", cls.CONDENSE_TARGET_TOKENS)),
+            CONDENSE_CONCURRENCY=int(os.getenv("CONDENSE_CONCURRENCY", cls.CONDENSE_CONCURRENCY)),
+            AGENTS_VERSION=os.getenv("DIGEST_AGENTS_VERSION", cls.AGENTS_VERSION),
             LANGFUSE_PUBLIC_KEY=os.getenv("LANGFUSE_PUBLIC_KEY", ""),
             LANGFUSE_SECRET_KEY=os.getenv("LANGFUSE_SECRET_KEY", ""),
             LANGFUSE_HOST=os.getenv("LANGFUSE_HOST", cls.LANGFUSE_HOST)
@@ -5,6 +5,9 @@ Context Links Agent
 Использует GigaChat для анализа ссылок с Pydantic structured output.
 
 Условный агент: активен при detail_level == comprehensive OR has_links == true
+
+Если orchestrator передал dialogue_facts, ссылки и упоминания берутся из
+них без вызова LLM (extractors.build_context_links).
 """
 
 import logging
@@ -12,7 +15,8 @@ from typing import Dict, Any, List
 import re
 
 from .base import BaseAgent
-from .config import get_llm_for_agent
+from .config import config, get_llm_for_agent
+from .extractors import build_context_links
 from .schemas import ContextLinksOutput
 
 logger = logging.getLogger(__name__)
@@ -68,9 +72,21 @@ class ContextLinksAgent(BaseAgent):
             system_prompt=system_prompt,
             agent_name="context_links",
             output_model=ContextLinksOutput,
-            timeout=30.0
+            timeout=config.agent_timeouts["context_links"]
         )
     
+    async def ainvoke(self, input_data: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        """Детерминированный результат из dialogue_facts, иначе - LLM"""
+        facts = input_data.get("dialogue_facts")
+        if facts is None:
+            return await super().ainvoke(input_data, **kwargs)
+
+        output = build_context_links(facts)
+        return {
+            "pydantic_result": output,
+            "processed_result": await self._process_output(output, input_data)
+        }
+    
     async def _process_input(self, input_data: Dict[str, Any]) -> str:
         """Формирование user message для анализа ссылок"""
         messages_text = input_data.get("messages_text", input_data.get("messages", ""))
@@ -85,10 +101,17 @@ class ContextLinksAgent(BaseAgent):
         else:
             has_links = False
         
+        # Ссылки, извлеченные из исходных сообщений (сжатый диалог может их не содержать)
+        extracted = input_data.get("extracted_links") or {}
+        found_links = extracted.get("external_links", [])[:50] + extracted.get("telegram_links", [])[:50]
+        found_links_text = "\n".join(f"- {url}" for url in found_links) if found_links else "нет"
+        
         user_message = f"""Проанализируй ссылки и ресурсы в диалоге.
 
 УРОВЕНЬ ДЕТАЛИЗАЦИИ: {detail_level}
 НАЛИЧИЕ ССЫЛОК: {has_links}
+НАЙДЕННЫЕ ССЫЛКИ:
+{found_links_text}
 
 ДИАЛОГ:
 {messages_text}
@@ -0,0 +1,124 @@
+"""
+DAG Executor для агентов дайджеста
+
+Каждый агент объявляет, результаты каких агентов ему нужны (depends_on).
+Executor запускает агента, как только готовы все его зависимости, поэтому
+независимые агенты выполняются параллельно:
+
+    dialogue_assessor
+      ├── topic_extractor ──┬── context_summarizer ──┐
+      ├── emotion_analyzer ─┤── key_moments ─────────┤
+      ├── speaker_analyzer ─┴── timeline_builder ────┼── supervisor_synthesizer
+      └── context_links ─────────────────────────────┘
+
+Упавший агент не останавливает зависимых: они получают input_data без
+его ключа (как и в последовательном pipeline). Агент с condition=False
+пропускается, его зависимые тоже не ждут.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AgentNode:
+    """Узел графа агентов"""
+    name: str
+    agent: Any
+    output_key: str
+    depends_on: List[str] = field(default_factory=list)
+    # condition(input_data) -> bool, проверяется когда готовы зависимости
+    condition: Optional[Callable[[Dict[str, Any]], bool]] = None
+
+
+def validate_graph(nodes: List[AgentNode]):
+    """Проверить, что зависимости существуют и граф ацикличен"""
+    names = {node.name for node in nodes}
+    for node in nodes:
+        missing = [dep for dep in node.depends_on if dep not in names]
+        if missing:
+            raise ValueError(f"Агент {node.name} зависит от неизвестных агентов: {missing}")
+
+    # Kahn: если топологическая сортировка не покрыла все узлы - есть цикл
+    pending = {node.name: set(node.depends_on) for node in nodes}
+    while pending:
+        ready = [name for name, deps in pending.items() if not deps]
+        if not ready:
+            raise ValueError(f"Цикл в графе агентов: {sorted(pending)}")
+        for name in ready:
+            del pending[name]
+        for deps in pending.values():
+            deps.difference_update(ready)
+
+
+async def run_graph(
+    nodes: List[AgentNode],
+    input_data: Dict[str, Any],
+    execute: Callable[[AgentNode, Dict[str, Any]], Awaitable[Any]]
+) -> Dict[str, str]:
+    """
+    Выполнить граф агентов
+
+    Args:
+        nodes: Узлы графа
+        input_data: Общие входные данные; результаты агентов сохраняются
+            в input_data[node.output_key]
+        execute: Корутина запуска одного агента (получает snapshot input_data,
+            возвращает значение для output_key или None)
+
+    Returns:
+        {agent_name: "done" | "skipped"}
+    """
+    validate_graph(nodes)
+
+    by_name = {node.name: node for node in nodes}
+    remaining = {node.name: set(node.depends_on) for node in nodes}
+    states: Dict[str, str] = {}
+    running: Dict[asyncio.Task, str] = {}
+
+    def finish(name: str, state: str):
+        states[name] = state
+        for deps in remaining.values():
+            deps.discard(name)
+
+    def start_ready():
+        # Пропуск агента может освободить следующих - повторяем до стабилизации
+        progress = True
+        while progress:
+            progress = False
+            for name in [n for n, deps in remaining.items() if not deps]:
+                del remaining[name]
+                node = by_name[name]
+
+                if node.condition is not None and not node.condition(input_data):
+                    logger.info(f"⏭️ {name}: пропущен (условие не выполнено)")
+                    finish(name, "skipped")
+                    progress = True
+                    continue
+
+                # Snapshot: завершившиеся позже параллельные ветки не меняют
+                # входные данные уже запущенного агента
+                task = asyncio.create_task(execute(node, dict(input_data)))
+                running[task] = name
+
+    try:
+        start_ready()
+        while running:
+            done, _ = await asyncio.wait(running.keys(), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = running.pop(task)
+                result = task.result()
+                if result is not None:
+                    input_data[by_name[name].output_key] = result
+                finish(name, "done")
+            start_ready()
+    finally:
+        for task in running:
+            task.cancel()
+
+    return states
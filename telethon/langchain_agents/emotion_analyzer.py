@@ -9,7 +9,7 @@ import logging
 from typing import Dict, Any, List
 
 from .base import BaseAgent
-from .config import get_llm_for_agent
+from .config import config, get_llm_for_agent
 from .schemas import EmotionsOutput
 
 logger = logging.getLogger(__name__)
@@ -66,7 +66,7 @@ class EmotionAnalyzerAgent(BaseAgent):
             system_prompt=system_prompt,
             agent_name="emotion_analyzer",
             output_model=EmotionsOutput,
-            timeout=30.0
+            timeout=config.agent_timeouts["emotion_analyzer"]
         )
     
     async def _process_input(self, input_data: Dict[str, Any]) -> str:
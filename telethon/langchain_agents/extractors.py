@@ -0,0 +1,375 @@
+"""
+Deterministic Extractors - факты диалога без LLM
+
+Счетчики сообщений, граф ответов, ссылки, @упоминания и активность во
+времени вычисляются напрямую из Telethon Message за один проход.
+Из них строятся выходы агентов по их Pydantic схемам:
+
+- ContextLinksOutput - полностью без LLM
+- TimelineOutput - фазы по паузам в активности, события по самым
+  обсуждаемым сообщениям (без LLM)
+- SpeakersOutput - статистика и group_dynamics без LLM, LLM только
+  для интерпретации ролей и вклада (при ошибке - эвристические роли)
+"""
+
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+from .schemas import (
+    ContextLink,
+    ContextLinksOutput,
+    GroupDynamics,
+    Speaker,
+    SpeakersOutput,
+    TimelineEvent,
+    TimelineOutput
+)
+
+
+# URL и упоминания
+URL_PATTERN = re.compile(r'https?://[^\s<>"\')\]]+')
+TELEGRAM_URL_PATTERN = re.compile(r'https?://(www\.)?(t\.me|telegram\.me)/')
+MENTION_PATTERN = re.compile(r'(?<![\w@])@([A-Za-z][A-Za-z0-9_]{3,31})')
+
+# Пауза, после которой начинается новая фаза обсуждения
+PHASE_GAP = timedelta(minutes=30)
+
+
+@dataclass
+class DialogueMessage:
+    """Сообщение диалога в нормализованном виде"""
+    index: int
+    username: str
+    timestamp: str
+    text: str
+    message_id: Optional[int] = None
+    reply_to: Optional[int] = None
+    sent_at: Optional[datetime] = None
+
+    def format(self) -> str:
+        if self.timestamp:
+            return f"[{self.index}] {self.username} ({self.timestamp}): {self.text}"
+        return f"[{self.index}] {self.username}: {self.text}"
+
+
+@dataclass
+class Phase:
+    """Отрезок активности между паузами > PHASE_GAP"""
+    start: DialogueMessage
+    end: DialogueMessage
+    message_count: int = 0
+    participants: Counter = field(default_factory=Counter)
+    messages: List[DialogueMessage] = field(default_factory=list)
+
+
+@dataclass
+class DialogueFacts:
+    """Факты диалога, посчитанные за один проход"""
+    message_count: int = 0
+    speakers: List[Dict[str, Any]] = field(default_factory=list)
+    reply_edges: List[Dict[str, Any]] = field(default_factory=list)
+    external_links: List[Dict[str, Any]] = field(default_factory=list)
+    telegram_links: List[Dict[str, Any]] = field(default_factory=list)
+    mentions: List[Dict[str, Any]] = field(default_factory=list)
+    phases: List[Phase] = field(default_factory=list)
+    replies_by_message: Dict[int, int] = field(default_factory=dict)
+    reply_count: int = 0
+
+
+def extract_dialogue_facts(messages: List[DialogueMessage]) -> DialogueFacts:
+    """
+    Посчитать факты диалога за один проход
+
+    Args:
+        messages: Сообщения в хронологическом порядке
+
+    Returns:
+        DialogueFacts
+    """
+    speakers: Dict[str, Dict[str, Any]] = {}
+    author_by_id: Dict[int, str] = {}
+    replies_by_message: Counter = Counter()
+    edges: Counter = Counter()
+    links: Dict[str, Dict[str, Any]] = {}
+    mentions: Counter = Counter()
+    phases: List[Phase] = []
+    reply_count = 0
+
+    for msg in messages:
+        speaker = speakers.get(msg.username)
+        if speaker is None:
+            speaker = speakers[msg.username] = {
+                "username": msg.username,
+                "message_count": 0,
+                "questions": 0,
+                "replies_sent": 0,
+                "replies_received": 0,
+                "links_shared": 0,
+                "first_seen": msg.timestamp,
+                "last_seen": msg.timestamp
+            }
+        speaker["message_count"] += 1
+        if msg.timestamp:
+            speaker["first_seen"] = speaker["first_seen"] or msg.timestamp
+            speaker["last_seen"] = msg.timestamp
+        if "?" in msg.text:
+            speaker["questions"] += 1
+
+        # Граф ответов (reply_to указывает на сообщение из того же окна)
+        if msg.message_id is not None:
+            author_by_id[msg.message_id] = msg.username
+        if msg.reply_to is not None:
+            reply_count += 1
+            replies_by_message[msg.reply_to] += 1
+            target = author_by_id.get(msg.reply_to)
+            if target is not None and target != msg.username:
+                speaker["replies_sent"] += 1
+                speakers[target]["replies_received"] += 1
+                edges[(msg.username, target)] += 1
+
+        # Ссылки и упоминания
+        for url in URL_PATTERN.findall(msg.text):
+            url = url.rstrip('.,;:!?')
+            link = links.get(url)
+            if link is None:
+                link = links[url] = {
+                    "url": url,
+                    "count": 0,
+                    "first_sender": msg.username,
+                    "first_seen": msg.timestamp,
+                    "telegram": bool(TELEGRAM_URL_PATTERN.match(url))
+                }
+            link["count"] += 1
+            speaker["links_shared"] += 1
+        for username in MENTION_PATTERN.findall(msg.text):
+            mentions[f"@{username}"] += 1
+
+        # Фазы активности
+        phase = phases[-1] if phases else None
+        if (
+            phase is None
+            or (msg.sent_at and phase.end.sent_at and msg.sent_at - phase.end.sent_at > PHASE_GAP)
+        ):
+            phase = Phase(start=msg, end=msg)
+            phases.append(phase)
+        phase.end = msg
+        phase.message_count += 1
+        phase.participants[msg.username] += 1
+        phase.messages.append(msg)
+
+    return DialogueFacts(
+        message_count=len(messages),
+        speakers=sorted(speakers.values(), key=lambda s: s["message_count"], reverse=True),
+        reply_edges=[
+            {"from": source, "to": target, "count": count}
+            for (source, target), count in edges.most_common()
+        ],
+        external_links=[link for link in links.values() if not link["telegram"]],
+        telegram_links=[link for link in links.values() if link["telegram"]],
+        mentions=[{"username": name, "count": count} for name, count in mentions.most_common()],
+        phases=phases,
+        replies_by_message=dict(replies_by_message),
+        reply_count=reply_count
+    )
+
+
+def _relevance(count: int) -> str:
+    if count >= 3:
+        return "high"
+    if count == 2:
+        return "medium"
+    return "low"
+
+
+def _link_title(url: str) -> str:
+    """Заголовок без запроса к странице: домен + путь"""
+    parsed = urlparse(url)
+    title = (parsed.netloc + parsed.path).rstrip('/')
+    return title[:200] or url[:200]
+
+
+def build_context_links(facts: DialogueFacts, limit: int = 10) -> ContextLinksOutput:
+    """ContextLinksOutput из фактов диалога (без LLM)"""
+    def to_links(items: List[Dict[str, Any]], link_type: str) -> List[ContextLink]:
+        ranked = sorted(items, key=lambda link: link["count"], reverse=True)[:limit]
+        return [
+            ContextLink(
+                url=link["url"],
+                title=_link_title(link["url"]),
+                link_type=link_type,
+                relevance=_relevance(link["count"])
+            )
+            for link in ranked
+        ]
+
+    return ContextLinksOutput(
+        external_links=to_links(facts.external_links, "external"),
+        telegram_links=to_links(facts.telegram_links, "telegram"),
+        mentions=[mention["username"] for mention in facts.mentions[:limit]]
+    )
+
+
+def _snippet(text: str, length: int = 120) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= length else text[:length - 1] + "…"
+
+
+def build_timeline(facts: DialogueFacts, max_events: int = 15, max_phases: int = 5) -> TimelineOutput:
+    """
+    TimelineOutput из фактов диалога (без LLM)
+
+    - discussion_phases: крупнейшие отрезки активности между паузами
+    - timeline_events: начало каждой фазы и самые обсуждаемые сообщения
+      (по числу ответов)
+    """
+    total = max(facts.message_count, 1)
+
+    def significance(share: float) -> str:
+        if share >= 0.3:
+            return "high"
+        if share >= 0.1:
+            return "medium"
+        return "low"
+
+    def top_participants(counter: Counter) -> List[str]:
+        return [name[:50] for name, _ in counter.most_common(3)]
+
+    def span(phase: Phase) -> str:
+        if phase.start.timestamp and phase.end.timestamp:
+            return f"{phase.start.timestamp}-{phase.end.timestamp}"
+        return phase.start.timestamp or ""
+
+    events = []
+    for phase in facts.phases:
+        key_message = max(
+            phase.messages,
+            key=lambda m: facts.replies_by_message.get(m.message_id, 0) if m.message_id is not None else 0
+        )
+        events.append((phase.start.index, TimelineEvent(
+            timestamp=phase.start.timestamp or "--:--",
+            event=_snippet(f"Обсуждение ({phase.message_count} сообщ.), начал {phase.start.username}: {phase.start.text}", 200),
+            participants=top_participants(phase.participants),
+            significance=significance(phase.message_count / total)
+        )))
+
+        replies = facts.replies_by_message.get(key_message.message_id, 0) if key_message.message_id is not None else 0
+        if replies >= 2 and key_message is not phase.start:
+            events.append((key_message.index, TimelineEvent(
+                timestamp=key_message.timestamp or "--:--",
+                event=_snippet(f"{key_message.username} ({replies} ответов): {key_message.text}", 200),
+                participants=[key_message.username[:50]],
+                significance="high" if replies >= 5 else "medium"
+            )))
+
+    # Самые значимые события, в хронологическом порядке
+    rank = {"high": 0, "medium": 1, "low": 2}
+    selected = sorted(events, key=lambda e: rank[e[1].significance])[:max_events]
+    timeline_events = [event for _, event in sorted(selected, key=lambda e: e[0])]
+
+    largest = sorted(facts.phases, key=lambda p: p.message_count, reverse=True)[:max_phases]
+    discussion_phases = [
+        f"{span(phase)}: {phase.message_count} сообщ. ({', '.join(top_participants(phase.participants))})"
+        for phase in sorted(largest, key=lambda p: p.start.index)
+    ]
+
+    return TimelineOutput(
+        timeline_events=timeline_events,
+        discussion_phases=discussion_phases,
+        topic_evolution=[]
+    )
+
+
+def activity_level(speaker: Dict[str, Any], total: int) -> str:
+    share = speaker["message_count"] / max(total, 1)
+    if share >= 0.2:
+        return "high"
+    if share >= 0.05:
+        return "medium"
+    return "low"
+
+
+def heuristic_role(speaker: Dict[str, Any], total: int, top_received: int) -> str:
+    """Роль по статистике (fallback, когда LLM недоступна)"""
+    count = speaker["message_count"]
+    share = count / max(total, 1)
+    if share >= 0.3 or (top_received and speaker["replies_received"] == top_received and share >= 0.15):
+        return "leader"
+    if speaker["questions"] / count >= 0.5:
+        return "questioner"
+    if speaker["replies_sent"] / count >= 0.5:
+        return "supporter"
+    if share < 0.02:
+        return "observer"
+    return "contributor"
+
+
+def build_speakers(
+    facts: DialogueFacts,
+    roles: Optional[Dict[str, Any]] = None,
+    limit: int = 20
+) -> SpeakersOutput:
+    """
+    SpeakersOutput: статистика из фактов, роли из LLM (или эвристика)
+
+    Args:
+        facts: Факты диалога
+        roles: {username: Speaker из LLM} - интерпретация ролей и вклада
+        limit: Максимум участников
+    """
+    roles = roles or {}
+    total = facts.message_count
+    top_received = max((s["replies_received"] for s in facts.speakers), default=0)
+
+    speakers = []
+    for stats in facts.speakers[:limit]:
+        interpreted = roles.get(stats["username"])
+        contribution_types = []
+        if stats["questions"]:
+            contribution_types.append("question")
+        if stats["replies_sent"]:
+            contribution_types.append("answer")
+        if stats["links_shared"]:
+            contribution_types.append("resource")
+
+        speakers.append(Speaker(
+            username=stats["username"][:50],
+            role=interpreted.role if interpreted else heuristic_role(stats, total, top_received),
+            activity_level=activity_level(stats, total),
+            message_count=stats["message_count"],
+            contribution_types=(interpreted.contribution_types if interpreted else contribution_types),
+            key_contributions=(interpreted.key_contributions if interpreted else []),
+            detailed_role=(interpreted.detailed_role if interpreted else "")
+        ))
+
+    def top_by(key: str) -> str:
+        best = max(facts.speakers, key=lambda s: s[key], default=None)
+        return best["username"][:50] if best and best[key] > 0 else ""
+
+    reply_share = facts.reply_count / max(total, 1)
+    collaboration = "high" if reply_share >= 0.4 else "medium" if reply_share >= 0.15 else "low"
+
+    return SpeakersOutput(
+        speakers=speakers,
+        group_dynamics=GroupDynamics(
+            dominant_speaker=top_by("message_count"),
+            most_helpful=top_by("replies_sent"),
+            most_questions=top_by("questions"),
+            collaboration_level=collaboration
+        )
+    )
+
+
+def format_speaker_stats(facts: DialogueFacts, limit: int = 20) -> str:
+    """Таблица статистики участников для промпта"""
+    lines = []
+    for s in facts.speakers[:limit]:
+        lines.append(
+            f"- {s['username']}: {s['message_count']} сообщ., вопросов {s['questions']}, "
+            f"ответил другим {s['replies_sent']}, получил ответов {s['replies_received']}, "
+            f"ссылок {s['links_shared']}"
+        )
+    return "\n".join(lines)
@@ -11,7 +11,7 @@ import logging
 from typing import Dict, Any, List
 
 from .base import BaseAgent
-from .config import get_llm_for_agent
+from .config import config, get_llm_for_agent
 from .schemas import KeyMomentsOutput
 
 logger = logging.getLogger(__name__)
@@ -56,7 +56,7 @@ class KeyMomentsAgent(BaseAgent):
             system_prompt=system_prompt,
             agent_name="key_moments",
             output_model=KeyMomentsOutput,
-            timeout=30.0
+            timeout=config.agent_timeouts["key_moments"]
         )
     
     async def _process_input(self, input_data: Dict[str, Any]) -> str:
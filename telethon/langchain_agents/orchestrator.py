@@ -1,10 +1,12 @@
 """
-Enhanced Digest Orchestrator - управление последовательностью агентов с мониторингом
+Enhanced Digest Orchestrator - управление графом агентов с мониторингом
 
-Центральный компонент для управления 9-агентной sequential pipeline.
-Использует LCEL для параллельного и последовательного выполнения агентов.
+Центральный компонент для управления 9 агентами. Агенты объявляют
+зависимости (dag.AgentNode.depends_on), DAG executor запускает каждого,
+как только готовы его входные данные - независимые агенты идут параллельно.
 
 Архитектура:
+0. Message Condenser (map-reduce, только для больших диалогов) → общий компактный диалог
 1. Dialogue Assessor (эвристики) → detail_level, dialogue_type
 2. Topic Extractor (GigaChat) → topics с приоритетами
 3. Emotion Analyzer (GigaChat-Pro) → overall_tone, atmosphere
@@ -21,8 +23,6 @@ import asyncio
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timezone
 
-from langchain_core.runnables import RunnableParallel, RunnableSequence
-
 from .assessor import DialogueAssessorAgent
 from .topic_extractor import TopicExtractorAgent
 from .emotion_analyzer import EmotionAnalyzerAgent
@@ -32,7 +32,10 @@ from .key_moments import KeyMomentsAgent
 from .timeline import TimelineBuilderAgent
 from .context_links import ContextLinksAgent
 from .supervisor import SupervisorSynthesizerAgent
+from .condenser import CondensedDialogue, MessageCondenser
+from .extractors import DialogueFacts, DialogueMessage, extract_dialogue_facts
 from .config import config
+from .dag import AgentNode, run_graph
 from .schemas import AgentStatus
 from .observability import log_orchestrator_metrics
 
@@ -42,10 +45,10 @@ logger = logging.getLogger(__name__)
 
 class DigestOrchestrator:
     """
-    Оркестратор для управления последовательностью агентов LangChain
+    Оркестратор для управления графом агентов LangChain
     
     Обеспечивает:
-    - Sequential и parallel execution агентов
+    - Parallel execution агентов по готовности зависимостей (DAG)
     - Error handling с fallback
     - Мониторинг статуса каждого агента
     - Структурированное логирование
@@ -66,11 +69,66 @@ class DigestOrchestrator:
         self.context_links = ContextLinksAgent()
         self.supervisor = SupervisorSynthesizerAgent()
         
+        # Map-reduce сжатие диалога перед агентами
+        self.condenser = MessageCondenser()
+        
         # Мониторинг статуса агентов
         self.agents_status: List[AgentStatus] = []
         
+        self.agent_graph = self._build_agent_graph()
+        
         logger.info("✅ Все агенты инициализированы")
     
+    def _build_agent_graph(self) -> List[AgentNode]:
+        """
+        Граф зависимостей агентов
+        
+        depends_on - чьи результаты агент читает из input_data
+        (см. _process_input соответствующего агента).
+        """
+        detailed = self._is_detailed
+        
+        return [
+            AgentNode("dialogue_assessor", self.assessor, "assessment"),
+            AgentNode("topic_extractor", self.topic_extractor, "topics", ["dialogue_assessor"]),
+            AgentNode("emotion_analyzer", self.emotion_analyzer, "emotions", ["dialogue_assessor"]),
+            AgentNode("speaker_analyzer", self.speaker_analyzer, "speakers", ["dialogue_assessor"]),
+            AgentNode("context_links", self.context_links, "context_links", ["dialogue_assessor"]),
+            AgentNode(
+                "context_summarizer", self.summarizer, "summary",
+                ["dialogue_assessor", "topic_extractor", "emotion_analyzer", "speaker_analyzer"]
+            ),
+            AgentNode(
+                "key_moments", self.key_moments, "key_moments",
+                ["dialogue_assessor", "topic_extractor", "emotion_analyzer"],
+                condition=detailed
+            ),
+            # Хронология строится из dialogue_facts (без LLM) - из результатов агентов
+            # нужна только оценка диалога для condition
+            AgentNode(
+                "timeline_builder", self.timeline, "timeline", ["dialogue_assessor"],
+                condition=detailed
+            ),
+            AgentNode(
+                "supervisor_synthesizer", self.supervisor, "final_digest",
+                [
+                    "dialogue_assessor", "topic_extractor", "emotion_analyzer",
+                    "speaker_analyzer", "context_summarizer", "key_moments",
+                    "timeline_builder", "context_links"
+                ]
+            )
+        ]
+    
+    @staticmethod
+    def _is_detailed(input_data: Dict[str, Any]) -> bool:
+        """Key Moments и Timeline только для detailed/comprehensive"""
+        assessment = input_data.get("assessment")
+        if isinstance(assessment, dict):
+            detail_level = assessment.get('detail_level', 'standard')
+        else:
+            detail_level = getattr(assessment, 'detail_level', 'standard')
+        return detail_level in ["detailed", "comprehensive"]
+    
     def _record_agent_status(self, agent_name: str, status: str, execution_time: float, 
                            error_message: Optional[str] = None, output_summary: Optional[str] = None):
         """Записать статус выполнения агента"""
@@ -91,17 +149,18 @@ class DigestOrchestrator:
         elif status == "fallback":
             logger.warning(f"🔄 {agent_name}: fallback used - {error_message} ({execution_time:.2f}s)")
     
-    def _format_messages_for_analysis(self, messages: List[Any]) -> str:
+    def _extract_dialogue(self, messages: List[Any]) -> List[DialogueMessage]:
         """
-        Форматирование сообщений для анализа агентами
+        Нормализация сообщений Telegram
 
         Args:
             messages: Список сообщений Telegram
 
         Returns:
-            Отформатированный текст диалога
+            Список DialogueMessage (index, username, timestamp, text,
+            message_id, reply_to, sent_at)
         """
-        formatted_lines = []
+        dialogue = []
 
         for i, msg in enumerate(messages, 1):
             # Извлечение данных сообщения
@@ -122,27 +181,89 @@ class DigestOrchestrator:
 
             # Извлечение времени (опционально)
             timestamp = ""
+            sent_at = None
             if hasattr(msg, 'date') and msg.date:
                 timestamp = msg.date.strftime("%H:%M")
+                if isinstance(msg.date, datetime):
+                    sent_at = msg.date
 
-            # Формирование строки
-            if timestamp:
-                line = f"[{i}] {username} ({timestamp}): {text}"
-            else:
-                line = f"[{i}] {username}: {text}"
+            # ID и reply_to для графа ответов (опционально)
+            message_id = getattr(msg, 'id', None)
+            reply_to = getattr(msg, 'reply_to_msg_id', None)
+
+            dialogue.append(DialogueMessage(
+                index=i,
+                username=username,
+                timestamp=timestamp,
+                text=text,
+                message_id=message_id if isinstance(message_id, int) else None,
+                reply_to=reply_to if isinstance(reply_to, int) else None,
+                sent_at=sent_at
+            ))
+
+        return dialogue
+
+    def _format_messages_for_analysis(self, messages: List[Any]) -> str:
+        """
+        Форматирование сообщений для анализа агентами
 
-            formatted_lines.append(line)
+        Args:
+            messages: Список сообщений Telegram
+
+        Returns:
+            Отформатированный текст диалога
+        """
+        formatted_lines = [msg.format() for msg in self._extract_dialogue(messages)]
 
         logger.debug(f"Отформатировано {len(formatted_lines)} сообщений")
         return "\n".join(formatted_lines)
 
+    async def _condense_dialogue(
+        self,
+        dialogue: List[DialogueMessage],
+        facts: Optional[DialogueFacts] = None,
+        cached_windows: Optional[Dict[int, Dict[str, Any]]] = None
+    ) -> CondensedDialogue:
+        """
+        Стадия сжатия перед агентами (map-reduce для больших диалогов)
+
+        При ошибке агенты получают исходный диалог.
+        """
+        start_time = asyncio.get_event_loop().time()
+
+        try:
+            condensed = await self.condenser.condense(dialogue, facts, cached_windows)
+            execution_time = asyncio.get_event_loop().time() - start_time
+
+            if condensed.condensed:
+                summary = (
+                    f"{condensed.source_tokens} → {condensed.tokens} токенов, {condensed.windows} окон "
+                    f"(из кеша {condensed.reused_windows})"
+                )
+            else:
+                summary = f"без сжатия ({condensed.source_tokens} токенов)"
+            self._record_agent_status("message_condenser", "success", execution_time, output_summary=summary)
+            return condensed
+
+        except Exception as e:
+            execution_time = asyncio.get_event_loop().time() - start_time
+            self._record_agent_status("message_condenser", "fallback", execution_time, error_message=str(e))
+            return CondensedDialogue(
+                text="\n".join(msg.format() for msg in dialogue),
+                message_count=len(dialogue)
+            )
+
     async def _execute_agent_with_monitoring(self, agent, agent_name: str, input_data: Dict[str, Any]) -> Optional[Any]:
-        """Выполнить агента с мониторингом"""
+        """Выполнить агента с мониторингом и timeout из config.agent_timeouts"""
         start_time = asyncio.get_event_loop().time()
+        timeout = config.agent_timeouts.get(agent_name, config.AGENT_TIMEOUT)
         
         try:
             # Агент теперь возвращает словарь с pydantic_result и processed_result
-            agent_output = await agent.ainvoke(input_data)
+            try:
+                agent_output = await asyncio.wait_for(agent.ainvoke(input_data), timeout=timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"Agent {agent_name} timeout after {timeout}s")
             pydantic_result = agent_output["pydantic_result"]
             processed_result = agent_output["processed_result"]
 
@@ -275,7 +396,8 @@ class DigestOrchestrator:
         messages: List[Any], 
         hours: int = 24,
         user_id: Optional[int] = None,
-        group_id: Optional[int] = None
+        group_id: Optional[int] = None,
+        cached_windows: Optional[Dict[int, Dict[str, Any]]] = None
     ) -> Dict[str, Any]:
         """
         Генерация дайджеста группы через LangChain агентов
@@ -285,9 +407,10 @@ class DigestOrchestrator:
             hours: Период в часах
             user_id: ID пользователя
             group_id: ID группы
+            cached_windows: Резюме окон map-фазы прошлых дайджестов {start_id: window}
             
         Returns:
-            Словарь с результатами дайджеста
+            Словарь с результатами дайджеста (window_summaries - новые резюме окон для кеша)
         """
         start_time = asyncio.get_event_loop().time()
         
@@ -300,159 +423,40 @@ class DigestOrchestrator:
         self.agents_status.clear()
         
         try:
-            # Форматирование сообщений
-            formatted_messages = self._format_messages_for_analysis(messages)
+            # Детерминированные факты (участники, ответы, ссылки, фазы) - один проход без LLM;
+            # speakers/timeline/context_links строятся из них вместо разбора диалога моделью
+            dialogue = self._extract_dialogue(messages)
+            facts = extract_dialogue_facts(dialogue)
+
+            # Сжатие диалога: все агенты читают общее компактное представление
+            condensed = await self._condense_dialogue(dialogue, facts, cached_windows)
             
             # Подготовка входных данных
             input_data = {
-                "messages": formatted_messages,
+                "messages": condensed.text,
+                "message_count": condensed.message_count,
+                "dialogue_facts": facts,
+                "speaker_stats": condensed.speaker_stats,
+                "extracted_links": {
+                    "external_links": condensed.external_links,
+                    "telegram_links": condensed.telegram_links,
+                    "mentions": condensed.mentions
+                },
                 "hours": hours,
                 "user_id": user_id,
                 "group_id": group_id
             }
             
-            # Phase 1: Dialogue Assessor (LLM-based анализ)
-            logger.info("📊 Phase 1: Dialogue Assessor")
-            assessment = await self._execute_agent_with_monitoring(
-                self.assessor, "dialogue_assessor", input_data
-            )
-            if assessment:
-                input_data["assessment"] = assessment
-                # Безопасное получение значений
-                if isinstance(assessment, dict):
-                    detail_level = assessment.get('detail_level', 'standard')
-                    dialogue_type = assessment.get('dialogue_type', 'discussion')
-                else:
-                    detail_level = getattr(assessment, 'detail_level', 'standard')
-                    dialogue_type = getattr(assessment, 'dialogue_type', 'discussion')
-                logger.info(f"   Уровень детализации: {detail_level}")
-                logger.info(f"   Тип диалога: {dialogue_type}")
-            else:
-                # Fallback значения
-                assessment = {
-                    'detail_level': 'standard',
-                    'dialogue_type': 'discussion'
-                }
-                input_data["assessment"] = assessment
-                logger.warning(f"   Fallback: detail_level=standard, dialogue_type=discussion")
-            
-            # Phase 2-3: Topics + Emotions (PARALLEL execution)
-            logger.info("🔄 Phase 2-3: Topics + Emotions (Parallel)")
-            
-            # Параллельное выполнение Topics и Emotions
-            topics_task = asyncio.create_task(
-                self._execute_agent_with_monitoring(self.topic_extractor, "topic_extractor", input_data)
-            )
-            emotions_task = asyncio.create_task(
-                self._execute_agent_with_monitoring(self.emotion_analyzer, "emotion_analyzer", input_data)
-            )
-            
-            topics, emotions = await asyncio.gather(topics_task, emotions_task)
-            
-            if topics:
-                pydantic_topics, processed_topics = self._extract_agent_data(topics)
-                input_data["topics"] = pydantic_topics if pydantic_topics else processed_topics
-                topics_count = len(pydantic_topics.topics) if pydantic_topics and hasattr(pydantic_topics, 'topics') else 0
-                logger.info(f"   Извлечено тем: {topics_count}")
-            else:
-                logger.warning("   Topics: fallback (нет данных)")
-                
-            if emotions:
-                pydantic_emotions, processed_emotions = self._extract_agent_data(emotions)
-                input_data["emotions"] = pydantic_emotions if pydantic_emotions else processed_emotions
-                tone = pydantic_emotions.overall_tone if pydantic_emotions and hasattr(pydantic_emotions, 'overall_tone') else 'unknown'
-                logger.info(f"   Тон: {tone}")
-            else:
-                logger.warning("   Emotions: fallback (нет данных)")
-            
-            # Phase 4: Speaker Analyzer
-            logger.info("👥 Phase 4: Speaker Analyzer")
-            speakers = await self._execute_agent_with_monitoring(
-                self.speaker_analyzer, "speaker_analyzer", input_data
-            )
-            
-            if speakers:
-                pydantic_speakers, processed_speakers = self._extract_agent_data(speakers)
-                input_data["speakers"] = pydantic_speakers if pydantic_speakers else processed_speakers
-                speakers_count = len(pydantic_speakers.speakers) if pydantic_speakers and hasattr(pydantic_speakers, 'speakers') else 0
-                logger.info(f"   Участников проанализировано: {speakers_count}")
-            else:
-                logger.warning("   Speakers: fallback (нет данных)")
-            
-            # Phase 5: Context Summarizer
-            logger.info("📝 Phase 5: Context Summarizer")
-            summary = await self._execute_agent_with_monitoring(
-                self.summarizer, "context_summarizer", input_data
-            )
-            
-            if summary:
-                pydantic_summary, processed_summary = self._extract_agent_data(summary)
-                input_data["summary"] = pydantic_summary if pydantic_summary else processed_summary
-                points_count = len(pydantic_summary.summary.main_points) if pydantic_summary and hasattr(pydantic_summary, 'summary') else 0
-                logger.info(f"   Основных пунктов: {points_count}")
-            else:
-                logger.warning("   Summary: fallback (нет данных)")
-            
-            # Phase 6: Key Moments (conditional)
-            detail_level = assessment.get('detail_level', 'standard') if isinstance(assessment, dict) else getattr(assessment, 'detail_level', 'standard')
-            if detail_level in ["detailed", "comprehensive"]:
-                logger.info("🔑 Phase 6: Key Moments")
-                key_moments = await self._execute_agent_with_monitoring(
-                    self.key_moments, "key_moments", input_data
-                )
-                
-                if key_moments:
-                    pydantic_key_moments, processed_key_moments = self._extract_agent_data(key_moments)
-                    input_data["key_moments"] = pydantic_key_moments if pydantic_key_moments else processed_key_moments
-                    decisions_count = len(pydantic_key_moments.key_decisions) if pydantic_key_moments and hasattr(pydantic_key_moments, 'key_decisions') else 0
-                    questions_count = len(pydantic_key_moments.critical_questions) if pydantic_key_moments and hasattr(pydantic_key_moments, 'critical_questions') else 0
-                    logger.info(f"   Решений: {decisions_count}, Вопросов: {questions_count}")
-                else:
-                    logger.warning("   Key Moments: fallback (нет данных)")
-            else:
-                logger.info("⏭️ Phase 6: Key Moments (пропущен - уровень детализации слишком низкий)")
-            
-            # Phase 7: Timeline Builder (conditional)
-            if detail_level in ["detailed", "comprehensive"]:
-                logger.info("⏰ Phase 7: Timeline Builder")
-                timeline = await self._execute_agent_with_monitoring(
-                    self.timeline, "timeline_builder", input_data
-                )
-                
-                if timeline:
-                    pydantic_timeline, processed_timeline = self._extract_agent_data(timeline)
-                    input_data["timeline"] = pydantic_timeline if pydantic_timeline else processed_timeline
-                    events_count = len(pydantic_timeline.timeline_events) if pydantic_timeline and hasattr(pydantic_timeline, 'timeline_events') else 0
-                    logger.info(f"   Событий: {events_count}")
-                else:
-                    logger.warning("   Timeline: fallback (нет данных)")
-            else:
-                logger.info("⏭️ Phase 7: Timeline Builder (пропущен - уровень детализации слишком низкий)")
-            
-            # Phase 8: Context Links (always)
-            logger.info("🔗 Phase 8: Context Links")
-            context_links = await self._execute_agent_with_monitoring(
-                self.context_links, "context_links", input_data
-            )
-            
-            if context_links:
-                pydantic_context_links, processed_context_links = self._extract_agent_data(context_links)
-                input_data["context_links"] = pydantic_context_links if pydantic_context_links else processed_context_links
-                external_count = len(pydantic_context_links.external_links) if pydantic_context_links and hasattr(pydantic_context_links, 'external_links') else 0
-                telegram_count = len(pydantic_context_links.telegram_links) if pydantic_context_links and hasattr(pydantic_context_links, 'telegram_links') else 0
-                logger.info(f"   Внешних ссылок: {external_count}, Telegram ссылок: {telegram_count}")
-            else:
-                logger.warning("   Context Links: fallback (нет данных)")
+            # Статус агентов нужен supervisor для метаданных
+            input_data["agents_status"] = self.agents_status
             
-            # Phase 9: Supervisor Synthesizer (финальный агент)
-            logger.info("🎭 Phase 9: Supervisor Synthesizer")
+            states = await run_graph(self.agent_graph, input_data, self._run_agent_node)
             
-            # Добавляем статус агентов в метаданные
-            input_data["agents_status"] = self.agents_status
+            skipped = [name for name, state in states.items() if state == "skipped"]
+            if skipped:
+                logger.info(f"⏭️ Пропущены (уровень детализации слишком низкий): {', '.join(skipped)}")
             
-            final_digest = await self._execute_agent_with_monitoring(
-                self.supervisor, "supervisor_synthesizer", input_data
-            )
+            final_digest = input_data.get("final_digest")
             
             if final_digest:
                 # final_digest уже является Pydantic объектом (возвращается из _execute_agent_with_monitoring)
@@ -478,7 +482,9 @@ class DigestOrchestrator:
                     "success": True,
                     "digest": final_result,
                     "agents_status": self.agents_status,
-                    "execution_time": total_time
+                    "execution_time": total_time,
+                    "window_summaries": condensed.window_summaries,
+                    "reused_windows": condensed.reused_windows
                 }
             else:
                 raise Exception("Supervisor Synthesizer failed to generate digest")
@@ -494,6 +500,41 @@ class DigestOrchestrator:
                 "execution_time": total_time
             }
     
+    async def _run_agent_node(self, node: AgentNode, input_data: Dict[str, Any]) -> Optional[Any]:
+        """
+        Выполнить узел графа
+        
+        Returns:
+            Значение для input_data[node.output_key] или None (агент упал)
+        """
+        result = await self._execute_agent_with_monitoring(node.agent, node.name, input_data)
+        
+        if node.name == "dialogue_assessor":
+            if result:
+                if isinstance(result, dict):
+                    detail_level = result.get('detail_level', 'standard')
+                    dialogue_type = result.get('dialogue_type', 'discussion')
+                else:
+                    detail_level = getattr(result, 'detail_level', 'standard')
+                    dialogue_type = getattr(result, 'dialogue_type', 'discussion')
+                logger.info(f"   Уровень детализации: {detail_level}")
+                logger.info(f"   Тип диалога: {dialogue_type}")
+                return result
+            
+            # Fallback значения
+            logger.warning(f"   Fallback: detail_level=standard, dialogue_type=discussion")
+            return {
+                'detail_level': 'standard',
+                'dialogue_type': 'discussion'
+            }
+        
+        if not result:
+            logger.warning(f"   {node.name}: fallback (нет данных)")
+            return None
+        
+        pydantic_result, processed_result = self._extract_agent_data(result)
+        return pydantic_result if pydantic_result else processed_result
+    
     def _log_agents_summary(self):
         """Логировать сводку по статусу агентов"""
         logger.info("📊 Сводка по агентам:")
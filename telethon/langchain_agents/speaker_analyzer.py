@@ -5,6 +5,11 @@ Speaker Analyzer Agent
 Использует GigaChat для анализа участников с Pydantic structured output.
 
 ВАЖНО: Сохраняет реальные usernames, не заменяет на user1, user2!
+
+Если orchestrator передал dialogue_facts, счетчики, активность и
+group_dynamics считаются без LLM (extractors.build_speakers); модель
+только интерпретирует роли и вклад. При ошибке LLM роли определяются
+эвристикой по статистике.
 """
 
 import logging
@@ -12,7 +17,8 @@ from typing import Dict, Any, List
 from collections import Counter
 
 from .base import BaseAgent
-from .config import get_llm_for_agent
+from .config import config, get_llm_for_agent
+from .extractors import build_speakers, format_speaker_stats
 from .schemas import SpeakersOutput
 
 logger = logging.getLogger(__name__)
@@ -87,9 +93,28 @@ class SpeakerAnalyzerAgent(BaseAgent):
             system_prompt=system_prompt,
             agent_name="speaker_analyzer",
             output_model=SpeakersOutput,
-            timeout=30.0
+            timeout=config.agent_timeouts["speaker_analyzer"]
         )
     
+    async def ainvoke(self, input_data: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        """Роли из LLM + статистика из dialogue_facts (если есть)"""
+        facts = input_data.get("dialogue_facts")
+        if facts is None:
+            return await super().ainvoke(input_data, **kwargs)
+
+        roles = {}
+        if facts.speakers:
+            result = await super().ainvoke(input_data, **kwargs)
+            interpreted = result.get("pydantic_result")
+            if isinstance(interpreted, SpeakersOutput):
+                roles = {speaker.username: speaker for speaker in interpreted.speakers}
+
+        output = build_speakers(facts, roles)
+        return {
+            "pydantic_result": output,
+            "processed_result": await self._process_output(output, input_data)
+        }
+    
     async def _process_input(self, input_data: Dict[str, Any]) -> str:
         """Формирование user message для анализа участников"""
         # Поддержка как messages_text, так и messages
@@ -100,9 +125,30 @@ class SpeakerAnalyzerAgent(BaseAgent):
         else:
             detail_level = "standard"
         
-        # Извлечение реальных usernames для контекста
-        usernames = self._extract_real_usernames(messages_text)
-        usernames_context = ", ".join(usernames) if usernames else "не определены"
+        # Статистика посчитана без LLM - модель определяет только роли и вклад
+        facts = input_data.get("dialogue_facts")
+        if facts is not None:
+            return f"""Определи роли и вклад участников диалога.
+
+УРОВЕНЬ ДЕТАЛИЗАЦИИ: {detail_level}
+СТАТИСТИКА УЧАСТНИКОВ (точная, не пересчитывай):
+{format_speaker_stats(facts)}
+
+ДИАЛОГ:
+{messages_text}
+
+Для каждого участника из статистики укажи role, contribution_types, key_contributions и detailed_role.
+message_count перепиши из статистики. КРИТИЧНО: используй только реальные usernames!"""
+        
+        # Реальные usernames: точная статистика из condenser или парсинг текста
+        speaker_stats = input_data.get("speaker_stats")
+        if speaker_stats:
+            usernames_context = ", ".join(
+                f"{s['username']} ({s['message_count']} сообщ.)" for s in speaker_stats
+            )
+        else:
+            usernames = self._extract_real_usernames(messages_text)
+            usernames_context = ", ".join(usernames) if usernames else "не определены"
         
         user_message = f"""Проанализируй роли участников в диалоге.
 
@@ -9,7 +9,7 @@ import logging
 from typing import Dict, Any, List
 
 from .base import BaseAgent
-from .config import get_llm_for_agent
+from .config import config, get_llm_for_agent
 from .schemas import SummarizerOutput
 
 logger = logging.getLogger(__name__)
@@ -68,7 +68,7 @@ class ContextSummarizerAgent(BaseAgent):
             system_prompt=system_prompt,
             agent_name="context_summarizer",
             output_model=SummarizerOutput,
-            timeout=30.0
+            timeout=config.agent_timeouts["context_summarizer"]
         )
     
     async def _process_input(self, input_data: Dict[str, Any]) -> str:
@@ -12,7 +12,7 @@ from typing import Dict, Any, List
 from datetime import datetime, timezone
 
 from .base import BaseAgent
-from .config import get_llm_for_agent
+from .config import config, get_llm_for_agent
 from .schemas import SupervisorOutput
 
 logger = logging.getLogger(__name__)
@@ -78,7 +78,7 @@ HTML ОГРАНИЧЕНИЯ:
             system_prompt=system_prompt,
             agent_name="supervisor_synthesizer",
             output_model=SupervisorOutput,
-            timeout=45.0
+            timeout=config.agent_timeouts["supervisor_synthesizer"]
         )
     
     async def _process_input(self, input_data: Dict[str, Any]) -> str:
@@ -5,6 +5,10 @@ Timeline Builder Agent
 Использует GigaChat для построения хронологии с Pydantic structured output.
 
 Условный агент: активен при detail_level >= detailed
+
+Если orchestrator передал dialogue_facts, хронология строится без LLM:
+фазы - по паузам в активности, события - по самым обсуждаемым сообщениям
+(extractors.build_timeline).
 """
 
 import logging
@@ -12,7 +16,8 @@ from typing import Dict, Any, List
 from datetime import datetime, timezone
 
 from .base import BaseAgent
-from .config import get_llm_for_agent
+from .config import config, get_llm_for_agent
+from .extractors import build_timeline
 from .schemas import TimelineOutput
 
 logger = logging.getLogger(__name__)
@@ -69,9 +74,21 @@ class TimelineBuilderAgent(BaseAgent):
             system_prompt=system_prompt,
             agent_name="timeline_builder",
             output_model=TimelineOutput,
-            timeout=30.0
+            timeout=config.agent_timeouts["timeline_builder"]
         )
     
+    async def ainvoke(self, input_data: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        """Детерминированный результат из dialogue_facts, иначе - LLM"""
+        facts = input_data.get("dialogue_facts")
+        if facts is None:
+            return await super().ainvoke(input_data, **kwargs)
+
+        output = build_timeline(facts)
+        return {
+            "pydantic_result": output,
+            "processed_result": await self._process_output(output, input_data)
+        }
+    
     async def _process_input(self, input_data: Dict[str, Any]) -> str:
         """Формирование user message для построения хронологии"""
         messages_text = input_data.get("messages_text", input_data.get("messages", ""))
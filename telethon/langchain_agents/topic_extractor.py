@@ -9,7 +9,7 @@ import logging
 from typing import Dict, Any, List
 
 from .base import BaseAgent
-from .config import get_llm_for_agent
+from .config import config, get_llm_for_agent
 from .schemas import TopicsOutput
 
 logger = logging.getLogger(__name__)
@@ -58,7 +58,7 @@ class TopicExtractorAgent(BaseAgent):
             system_prompt=system_prompt,
             agent_name="topic_extractor",
             output_model=TopicsOutput,
-            timeout=30.0
+            timeout=config.agent_timeouts["topic_extractor"]
         )
     
     async def _process_input(self, input_data: Dict[str, Any]) -> str:
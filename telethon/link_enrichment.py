@@ -0,0 +1,539 @@
+"""
+Link Enrichment
+Обогащение постов контентом ссылок (Crawl4AI) вне цикла парсинга
+
+Парсер только ставит пост в очередь (enqueue), страницы загружают
+фоновые воркеры:
+- ограниченная конкурентность (LINK_ENRICHMENT_CONCURRENCY)
+- кеш контента по нормализованному URL с TTL: ссылка, которую
+  публикуют многие каналы и подписчики, загружается один раз;
+  неудачные загрузки кешируются на короткий срок (negative cache)
+- одновременные запросы одного URL объединяются
+- вежливость к сайтам: не больше LINK_ENRICHMENT_PER_DOMAIN запросов
+  к домену одновременно и пауза LINK_ENRICHMENT_DOMAIN_DELAY между ними
+
+Уже проиндексированный пост после обогащения переиндексируется в RAG
+(callback on_enriched).
+
+Посты в очереди записываются в Redis (link_enrichment:pending) до
+обработки: после рестарта или переполнения очереди они ставятся в
+очередь повторно, а не теряются.
+
+Redis shared между контейнерами; без Redis - in-memory fallback.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httpx
+import redis
+
+from database import SessionLocal
+from models import IndexingStatus, Post
+
+try:
+    from observability.metrics import link_enrichment_cache_total, link_enrichment_queue_size
+except ImportError:
+    link_enrichment_cache_total = None
+    link_enrichment_queue_size = None
+
+logger = logging.getLogger(__name__)
+
+URL_RE = re.compile(r'https?://[^\s<>"{}|\\^`\[\]]+')
+
+# Знаки препинания, захваченные regex в конце URL ("см. https://site.ru/a.")
+TRAILING_PUNCTUATION = ".,;:!?)»\"'"
+
+# Параметры отслеживания - не влияют на контент страницы
+TRACKING_PARAMS = frozenset({"fbclid", "gclid", "yclid", "_openstat", "igshid", "ref", "ref_src", "si"})
+
+# Максимум контента ссылки в Post.enriched_content (символов)
+MAX_CONTENT_LENGTH = 3000
+
+# Статусы записи кеша
+STATUS_OK = "ok"          # Контент получен
+STATUS_EMPTY = "empty"    # Страница без достаточного контента (стабильно - полный TTL)
+STATUS_FAILED = "failed"  # Timeout/ошибка Crawl4AI (negative TTL)
+
+# Максимум ключей in-memory fallback и доменов в состоянии politeness
+MAX_MEMORY_ENTRIES = 5000
+MAX_TRACKED_DOMAINS = 1000
+
+# Посты, ожидающие обогащения: {post_id: url}
+PENDING_KEY = "link_enrichment:pending"
+
+
+def extract_urls(text: str) -> List[str]:
+    """URL из текста поста (без знаков препинания в конце)"""
+    if not text:
+        return []
+    return [url.rstrip(TRAILING_PUNCTUATION) for url in URL_RE.findall(text)]
+
+
+def normalize_url(url: str) -> str:
+    """
+    Ключ URL для кеша и объединения запросов
+
+    Схема и хост в нижнем регистре, без www. и стандартного порта, без
+    фрагмента, utm_* и прочих параметров отслеживания, параметры
+    отсортированы, без завершающего "/".
+    """
+    parts = urlsplit(url.strip().rstrip(TRAILING_PUNCTUATION))
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = host if port in (None, 80, 443) else f"{host}:{port}"
+
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), netloc, path, urlencode(query), ""))
+
+
+def _record(result: str):
+    if link_enrichment_cache_total:
+        link_enrichment_cache_total.labels(result=result).inc()
+
+
+class LinkContentCache:
+    """Кеш контента ссылок по нормализованному URL"""
+
+    def __init__(self, redis_client=None):
+        self.ttl = int(os.getenv("LINK_CACHE_TTL", "604800"))                # 7 дней
+        self.negative_ttl = int(os.getenv("LINK_CACHE_NEGATIVE_TTL", "3600"))  # 1 час
+
+        # In-memory fallback: key -> (expires_at, value)
+        self._memory: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._pending: Dict[int, str] = {}
+
+        if redis_client is not None:
+            self.redis_client = redis_client
+            return
+
+        redis_host = os.getenv("REDIS_HOST", "redis")
+        redis_port = int(os.getenv("REDIS_PORT", 6379))
+        redis_password = os.getenv("REDIS_PASSWORD")
+
+        try:
+            redis_kwargs = {
+                "host": redis_host,
+                "port": redis_port,
+                "decode_responses": True
+            }
+            if redis_password:
+                redis_kwargs["password"] = redis_password
+
+            self.redis_client = redis.Redis(**redis_kwargs)
+            self.redis_client.ping()
+            logger.info(f"✅ LinkContentCache подключен к Redis ({redis_host}:{redis_port})")
+        except Exception as e:
+            self.redis_client = None
+            logger.warning(f"⚠️ LinkContentCache: Redis недоступен, in-memory кеш ({e})")
+
+    @staticmethod
+    def key(normalized_url: str) -> str:
+        return f"link_content:v1:{hashlib.sha1(normalized_url.encode('utf-8')).hexdigest()}"
+
+    def get(self, normalized_url: str) -> Optional[Dict[str, Any]]:
+        """Запись кеша {"status", "content"} или None"""
+        key = self.key(normalized_url)
+        try:
+            if self.redis_client:
+                data = self.redis_client.get(key)
+                return json.loads(data) if data else None
+
+            entry = self._memory.get(key)
+            if entry and entry[0] > time.monotonic():
+                return dict(entry[1])
+            self._memory.pop(key, None)
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка чтения кеша ссылок {normalized_url}: {e}")
+        return None
+
+    def set(self, normalized_url: str, status: str, content: str = ""):
+        """Сохранить результат загрузки (failed - negative TTL)"""
+        key = self.key(normalized_url)
+        ttl = self.negative_ttl if status == STATUS_FAILED else self.ttl
+        value = {"status": status, "content": content}
+        try:
+            if self.redis_client:
+                self.redis_client.setex(key, ttl, json.dumps(value, ensure_ascii=False))
+            else:
+                self._prune_memory()
+                self._memory[key] = (time.monotonic() + ttl, value)
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка записи кеша ссылок {normalized_url}: {e}")
+
+    def add_pending(self, post_id: int, url: str):
+        """Запомнить пост в очереди обогащения (переживает рестарт с Redis)"""
+        try:
+            if self.redis_client:
+                self.redis_client.hset(PENDING_KEY, str(post_id), url)
+            else:
+                self._pending[post_id] = url
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка записи очереди обогащения (пост {post_id}): {e}")
+
+    def remove_pending(self, post_id: int):
+        """Пост обработан (успешно или нет)"""
+        try:
+            if self.redis_client:
+                self.redis_client.hdel(PENDING_KEY, str(post_id))
+            else:
+                self._pending.pop(post_id, None)
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка записи очереди обогащения (пост {post_id}): {e}")
+
+    def pending(self) -> Dict[int, str]:
+        """Посты, ожидающие обогащения: {post_id: url}"""
+        try:
+            if self.redis_client:
+                return {int(post_id): url for post_id, url in self.redis_client.hgetall(PENDING_KEY).items()}
+            return dict(self._pending)
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка чтения очереди обогащения: {e}")
+            return {}
+
+    def _prune_memory(self):
+        if len(self._memory) < MAX_MEMORY_ENTRIES:
+            return
+        now = time.monotonic()
+        for key in [k for k, (expires_at, _) in self._memory.items() if expires_at <= now]:
+            del self._memory[key]
+        # Все записи живые - вытесняем самые старые
+        while len(self._memory) >= MAX_MEMORY_ENTRIES:
+            self._memory.pop(next(iter(self._memory)))
+
+
+class LinkEnrichmentWorker:
+    """Фоновые воркеры обогащения постов контентом ссылок"""
+
+    def __init__(
+        self,
+        cache: Optional[LinkContentCache] = None,
+        on_enriched: Optional[Callable[[List[int]], Awaitable[Any]]] = None,
+        concurrency: Optional[int] = None,
+        per_domain: Optional[int] = None,
+        domain_delay: Optional[float] = None,
+        queue_size: Optional[int] = None
+    ):
+        """
+        Args:
+            cache: Кеш контента (по умолчанию - общий link_content_cache)
+            on_enriched: Корутина для уже проиндексированных постов после обогащения
+            concurrency: Число воркеров (LINK_ENRICHMENT_CONCURRENCY)
+            per_domain: Одновременных запросов к домену (LINK_ENRICHMENT_PER_DOMAIN)
+            domain_delay: Пауза между запросами к домену, сек (LINK_ENRICHMENT_DOMAIN_DELAY)
+            queue_size: Размер очереди, при переполнении посты откладываются (LINK_ENRICHMENT_QUEUE_SIZE)
+        """
+        self.enabled = os.getenv("CRAWL4AI_ENABLED", "false").lower() == "true"
+        self.crawl4ai_url = os.getenv("CRAWL4AI_URL", "http://crawl4ai:11235")
+        self.word_threshold = int(os.getenv("CRAWL4AI_WORD_THRESHOLD", "100"))
+        self.timeout = float(os.getenv("CRAWL4AI_TIMEOUT", "30"))
+
+        self.concurrency = concurrency or int(os.getenv("LINK_ENRICHMENT_CONCURRENCY", "4"))
+        self.per_domain = per_domain or int(os.getenv("LINK_ENRICHMENT_PER_DOMAIN", "1"))
+        self.domain_delay = domain_delay if domain_delay is not None else float(
+            os.getenv("LINK_ENRICHMENT_DOMAIN_DELAY", "1.0")
+        )
+        self.queue_size = queue_size or int(os.getenv("LINK_ENRICHMENT_QUEUE_SIZE", "1000"))
+
+        self.cache = cache
+        self.on_enriched = on_enriched
+
+        self.queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        # Посты в asyncio очереди и признак отложенных (не поместились)
+        self._queued: Set[int] = set()
+        self._deferred = False
+        # Загрузки в работе: normalized_url -> Future с контентом
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Politeness: domain -> семафор и время, раньше которого нельзя начать запрос
+        self._domain_slots: Dict[str, asyncio.Semaphore] = {}
+        self._domain_next: Dict[str, float] = {}
+
+    # ------------------------------------------------------------------
+    # Очередь
+    # ------------------------------------------------------------------
+
+    def enqueue(self, post_id: int, text: str) -> bool:
+        """
+        Поставить пост в очередь обогащения (не блокирует парсер)
+
+        Вызывать после commit поста - воркер читает его своей сессией.
+        Пост сначала записывается в pending (Redis): при переполнении
+        очереди он обрабатывается позже, после рестарта - при start().
+
+        Returns:
+            True - пост в очереди (или отложен)
+        """
+        if not self.enabled:
+            return False
+
+        urls = extract_urls(text)
+        if not urls:
+            return False
+
+        self.start()
+        # Берем первую ссылку для обогащения
+        self._get_cache().add_pending(post_id, urls[0])
+        if not self._put(post_id, urls[0]):
+            _record("deferred")
+            logger.warning(f"⚠️ LinkEnrichment: очередь переполнена, пост {post_id} отложен")
+        return True
+
+    def start(self):
+        """
+        Запустить воркеры в текущем event loop (повторный вызов - no-op)
+
+        Посты, оставшиеся в pending после рестарта, ставятся в очередь.
+        """
+        if self._workers:
+            return
+        if self.queue is None:
+            self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._workers = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+        logger.info(f"🚀 LinkEnrichment: запущено {self.concurrency} воркеров")
+
+        restored = self._requeue_pending()
+        if restored:
+            logger.info(f"♻️ LinkEnrichment: {restored} постов из pending поставлено в очередь")
+
+    def _get_cache(self) -> LinkContentCache:
+        if self.cache is None:
+            self.cache = link_content_cache
+        return self.cache
+
+    def _put(self, post_id: int, url: str) -> bool:
+        """Положить пост в asyncio очередь (False - очередь заполнена)"""
+        if post_id in self._queued:
+            return True
+        try:
+            self.queue.put_nowait((post_id, url))
+        except asyncio.QueueFull:
+            self._deferred = True
+            return False
+
+        self._queued.add(post_id)
+        if link_enrichment_queue_size:
+            link_enrichment_queue_size.set(self.queue.qsize())
+        return True
+
+    def _requeue_pending(self) -> int:
+        """Поставить в очередь отложенные посты из pending (сколько поставлено)"""
+        self._deferred = False
+        queued = 0
+        for post_id, url in self._get_cache().pending().items():
+            if post_id in self._queued:
+                continue
+            if not self._put(post_id, url):
+                break
+            queued += 1
+        return queued
+
+    async def stop(self):
+        """Остановить воркеры (необработанные посты в очереди остаются)"""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def join(self):
+        """Дождаться обработки всей очереди"""
+        if self.queue is not None:
+            await self.queue.join()
+
+    async def _run(self):
+        while True:
+            post_id, url = await self.queue.get()
+            try:
+                await self.enrich_post(post_id, url)
+            except asyncio.CancelledError:
+                # Остановка - пост остается в pending до следующего start()
+                self._queued.discard(post_id)
+                self.queue.task_done()
+                raise
+            except Exception as e:
+                logger.error(f"❌ LinkEnrichment: Ошибка обогащения поста {post_id}: {e}")
+
+            # Неудачная загрузка уже в negative cache - повторять не нужно
+            self._get_cache().remove_pending(post_id)
+            self._queued.discard(post_id)
+            # Очередь опустела - дозагрузить отложенные (до task_done: join() не завершится раньше)
+            if self._deferred and self.queue.empty():
+                self._requeue_pending()
+            self.queue.task_done()
+            if link_enrichment_queue_size:
+                link_enrichment_queue_size.set(self.queue.qsize())
+
+    # ------------------------------------------------------------------
+    # Обогащение
+    # ------------------------------------------------------------------
+
+    async def enrich_post(self, post_id: int, url: str) -> bool:
+        """
+        Обогатить пост контентом ссылки
+
+        Returns:
+            True - enriched_content сохранен
+        """
+        content = await self.get_content(url)
+        if not content:
+            return False
+
+        db = SessionLocal()
+        try:
+            post = db.query(Post).filter(Post.id == post_id).first()
+            if not post:
+                logger.debug(f"LinkEnrichment: пост {post_id} не найден (удален до обогащения)")
+                return False
+
+            post.enriched_content = f"{post.text}\n\n[Содержимое ссылки: {url}]\n{content}"
+            db.commit()
+            logger.info(f"✅ LinkEnrichment: Пост {post_id} обогащен контентом ссылки {url} ({len(content)} символов)")
+
+            # Обогащение завершилось после индексации - переиндексировать
+            # пост вместе с контентом ссылки
+            already_indexed = db.query(IndexingStatus.id).filter(
+                IndexingStatus.post_id == post_id,
+                IndexingStatus.status == "success"
+            ).first() is not None
+        finally:
+            db.close()
+
+        if already_indexed and self.on_enriched:
+            await self.on_enriched([post_id])
+        return True
+
+    async def get_content(self, url: str) -> Optional[str]:
+        """
+        Контент страницы: кеш → загрузка в работе → Crawl4AI
+
+        Returns:
+            Текст страницы или None (нет контента / ошибка)
+        """
+        normalized = normalize_url(url)
+
+        cached = self._get_cache().get(normalized)
+        if cached is not None:
+            _record("hit" if cached.get("status") == STATUS_OK else "negative")
+            return cached.get("content") or None
+
+        inflight = self._inflight.get(normalized)
+        if inflight is not None:
+            _record("coalesced")
+            return await asyncio.shield(inflight)
+
+        _record("miss")
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[normalized] = future
+        try:
+            status, content = await self._fetch_polite(url, normalized)
+            self.cache.set(normalized, status, content)
+            future.set_result(content or None)
+            return content or None
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # Исключение получают ожидающие; если их нет - не логировать "never retrieved"
+                future.exception()
+            raise
+        finally:
+            self._inflight.pop(normalized, None)
+
+    async def _fetch_polite(self, url: str, normalized: str) -> Tuple[str, str]:
+        """Загрузка с ограничением конкурентности и паузой на домен"""
+        domain = urlsplit(normalized).hostname or ""
+        self._prune_domains()
+        slot = self._domain_slots.setdefault(domain, asyncio.Semaphore(self.per_domain))
+
+        async with slot:
+            delay = self._domain_next.get(domain, 0.0) - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                return await self._crawl(url)
+            finally:
+                self._domain_next[domain] = time.monotonic() + self.domain_delay
+
+    def _prune_domains(self):
+        """Забыть домены без активных запросов и с истекшей паузой"""
+        if len(self._domain_slots) < MAX_TRACKED_DOMAINS:
+            return
+        now = time.monotonic()
+        for domain in list(self._domain_slots):
+            idle = not self._domain_slots[domain].locked() and self._domain_next.get(domain, 0.0) <= now
+            if idle:
+                self._domain_slots.pop(domain, None)
+                self._domain_next.pop(domain, None)
+
+    async def _crawl(self, url: str) -> Tuple[str, str]:
+        """
+        Запрос к Crawl4AI
+
+        Returns:
+            (STATUS_*, контент)
+        """
+        try:
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                # Правильный формат API: urls как массив
+                response = await client.post(
+                    f"{self.crawl4ai_url}/crawl",
+                    json={
+                        "urls": [url]  # Массив URL, не одна строка!
+                    }
+                )
+
+            if response.status_code != 200:
+                logger.warning(f"⚠️ LinkEnrichment: Crawl4AI вернул статус {response.status_code} для {url}")
+                return STATUS_FAILED, ""
+
+            result = response.json()
+            if not (result.get("success") and result.get("results")):
+                logger.warning(f"⚠️ LinkEnrichment: Crawl4AI не вернул результаты для {url}")
+                return STATUS_EMPTY, ""
+
+            # markdown - это словарь с разными форматами, raw_markdown - текст
+            markdown_data = result["results"][0].get("markdown", {})
+            content = ""
+            if isinstance(markdown_data, dict):
+                content = markdown_data.get("raw_markdown", "")
+            elif isinstance(markdown_data, str):
+                content = markdown_data
+
+            # Проверяем минимальную длину контента
+            if not content or len(content) < self.word_threshold:
+                logger.debug(
+                    f"LinkEnrichment: Ссылка {url} не содержит достаточно контента "
+                    f"({len(content or '')} символов < {self.word_threshold})"
+                )
+                return STATUS_EMPTY, ""
+
+            return STATUS_OK, content[:MAX_CONTENT_LENGTH]
+
+        except httpx.TimeoutException:
+            logger.warning(f"⏳ LinkEnrichment: Timeout при извлечении контента из {url}")
+        except httpx.ConnectError:
+            logger.warning("🔌 LinkEnrichment: Crawl4AI недоступен")
+        except Exception as e:
+            logger.error(f"❌ LinkEnrichment: Ошибка загрузки {url}: {e}")
+        return STATUS_FAILED, ""
+
+
+# Глобальный кеш (общий для воркеров процесса)
+link_content_cache = LinkContentCache()
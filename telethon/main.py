@@ -1119,6 +1119,11 @@ async def qr_auth_status(session_id: str):
 # ============================================================
 
 from admin_panel_manager import admin_panel_manager
+try:
+    from rag_service.ttl_cache import TTLCache
+except ImportError:
+    # Fallback для тестов (rag_service/ добавлен в sys.path напрямую)
+    from ttl_cache import TTLCache
 from functools import wraps
 from typing import List
 
@@ -1634,70 +1639,98 @@ async def get_invite_usage_api(
 # Admin Panel - Statistics API
 # ============================================================
 
-@app.get("/api/admin/stats/summary")
-@require_admin
-async def get_stats_summary_api(
-    admin_id: int,
-    token: str,
-    db: Session = Depends(get_db)
-):
-    """Общая статистика"""
-    total_users = db.query(User).count()
-    authenticated_users = db.query(User).filter(User.is_authenticated == True).count()
-    
-    # По подпискам
-    subscription_counts = {}
-    for sub_type in ["free", "trial", "basic", "premium", "enterprise"]:
-        count = db.query(User).filter(User.subscription_type == sub_type).count()
-        subscription_counts[sub_type] = count
-    
-    # По ролям
-    admins_count = db.query(User).filter(User.role == "admin").count()
-    
-    # Инвайт коды
-    total_invites = db.query(InviteCode).count()
-    active_invites = db.query(InviteCode).filter(
-        InviteCode.uses_count < InviteCode.max_uses,
-        InviteCode.expires_at > datetime.now(timezone.utc)
-    ).count()
-    
-    # Группы (новое)
-    from models import Group, GroupMention
-    total_groups = db.query(Group).count()
-    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    mentions_today = db.query(GroupMention).filter(
-        GroupMention.mentioned_at >= today
-    ).count()
+# Агрегаты дашборда кэшируются на ADMIN_STATS_CACHE_TTL секунд (?fresh=1 - обойти)
+admin_stats_cache = TTLCache(ttl=float(os.getenv("ADMIN_STATS_CACHE_TTL", "30")))
+
+SUBSCRIPTION_TYPES = ["free", "trial", "basic", "premium", "enterprise"]
+
+
+def _user_stats(db: Session) -> dict:
+    """Пользователи, роли и подписки - один проход по users (COUNT ... FILTER)"""
+    columns = [
+        func.count(User.id),
+        func.count(User.id).filter(User.is_authenticated == True),
+        func.count(User.id).filter(User.role == "admin"),
+    ] + [
+        func.count(User.id).filter(User.subscription_type == sub_type)
+        for sub_type in SUBSCRIPTION_TYPES
+    ]
+    row = db.query(*columns).one()
     
     return {
         "users": {
-            "total": total_users,
-            "authenticated": authenticated_users,
-            "admins": admins_count
+            "total": row[0],
+            "authenticated": row[1],
+            "admins": row[2]
         },
-        "subscriptions": subscription_counts,
+        "subscriptions": dict(zip(SUBSCRIPTION_TYPES, row[3:]))
+    }
+
+
+def _group_stats(db: Session) -> dict:
+    """Группы и упоминания за сегодня/неделю - по одному запросу на таблицу"""
+    from models import Group, GroupMention
+    
+    now = datetime.now(timezone.utc)
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    week_ago = now - timedelta(days=7)
+    
+    mentions_today, mentions_week = db.query(
+        func.count(GroupMention.id).filter(GroupMention.mentioned_at >= today),
+        func.count(GroupMention.id).filter(GroupMention.mentioned_at >= week_ago)
+    ).filter(
+        GroupMention.mentioned_at >= min(today, week_ago)
+    ).one()
+    
+    return {
+        "total_groups": db.query(func.count(Group.id)).scalar(),
+        "mentions_today": mentions_today,
+        "mentions_week": mentions_week
+    }
+
+
+def _compute_stats_summary(db: Session) -> dict:
+    stats = _user_stats(db)
+    
+    total_invites, active_invites = db.query(
+        func.count(InviteCode.code),
+        func.count(InviteCode.code).filter(
+            InviteCode.uses_count < InviteCode.max_uses,
+            InviteCode.expires_at > datetime.now(timezone.utc)
+        )
+    ).one()
+    
+    groups = _group_stats(db)
+    
+    return {
+        "users": stats["users"],
+        "subscriptions": stats["subscriptions"],
         "invites": {
             "total": total_invites,
             "active": active_invites
         },
         "groups": {
-            "total": total_groups,
-            "mentions_today": mentions_today
+            "total": groups["total_groups"],
+            "mentions_today": groups["mentions_today"]
         }
     }
 
 
-@app.get("/api/admin/stats/registrations")
+@app.get("/api/admin/stats/summary")
 @require_admin
-async def get_registrations_stats_api(
+async def get_stats_summary_api(
     admin_id: int,
     token: str,
-    days: int = 7,
+    fresh: bool = False,
     db: Session = Depends(get_db)
 ):
-    """Статистика регистраций по дням"""
-    from sqlalchemy import func, Date, cast
-    
+    """Общая статистика"""
+    return admin_stats_cache.get_or_set(
+        "summary", lambda: _compute_stats_summary(db), fresh=fresh
+    )
+
+
+def _compute_registrations(db: Session, days: int) -> dict:
     # Получаем регистрации за последние N дней
     start_date = datetime.now(timezone.utc) - timedelta(days=days)
     
@@ -1718,7 +1751,9 @@ async def get_registrations_stats_api(
     data = []
     
     for reg in registrations:
-        labels.append(reg.date.strftime('%d.%m'))
+        # SQLite возвращает func.date() строкой
+        date = reg.date if not isinstance(reg.date, str) else datetime.strptime(reg.date, '%Y-%m-%d')
+        labels.append(date.strftime('%d.%m'))
         data.append(reg.count)
     
     return {
@@ -1728,21 +1763,33 @@ async def get_registrations_stats_api(
     }
 
 
+@app.get("/api/admin/stats/registrations")
+@require_admin
+async def get_registrations_stats_api(
+    admin_id: int,
+    token: str,
+    days: int = 7,
+    fresh: bool = False,
+    db: Session = Depends(get_db)
+):
+    """Статистика регистраций по дням"""
+    return admin_stats_cache.get_or_set(
+        ("registrations", days), lambda: _compute_registrations(db, days), fresh=fresh
+    )
+
+
 @app.get("/api/admin/stats/subscriptions")
 @require_admin
 async def get_subscriptions_stats_api(
     admin_id: int,
     token: str,
+    fresh: bool = False,
     db: Session = Depends(get_db)
 ):
     """Breakdown подписок для Pie chart"""
-    subscriptions = {}
-    
-    for sub_type in ["free", "trial", "basic", "premium", "enterprise"]:
-        count = db.query(User).filter(User.subscription_type == sub_type).count()
-        subscriptions[sub_type] = count
-    
-    return subscriptions
+    return admin_stats_cache.get_or_set(
+        "subscriptions", lambda: _user_stats(db)["subscriptions"], fresh=fresh
+    )
 
 
 # ============================================================
@@ -1866,34 +1913,18 @@ async def toggle_group_mentions_api(
 async def get_groups_stats_api(
     admin_id: int,
     token: str,
+    fresh: bool = False,
     db: Session = Depends(get_db)
 ):
     """Статистика по группам"""
-    from models import Group, GroupMention
-    from datetime import timedelta
+    stats = admin_stats_cache.get_or_set("groups", lambda: _group_stats(db), fresh=fresh)
     
-    total_groups = db.query(Group).count()
-    
-    # Упоминания за сегодня
-    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    mentions_today = db.query(GroupMention).filter(
-        GroupMention.mentioned_at >= today
-    ).count()
-    
-    # Упоминания за неделю
-    week_ago = datetime.now(timezone.utc) - timedelta(days=7)
-    mentions_week = db.query(GroupMention).filter(
-        GroupMention.mentioned_at >= week_ago
-    ).count()
-    
-    # Статус мониторинга
+    # Статус мониторинга - in-memory, всегда актуальный
     from group_monitor_service import group_monitor_service
     monitor_status = group_monitor_service.get_status()
     
     return {
-        "total_groups": total_groups,
-        "mentions_today": mentions_today,
-        "mentions_week": mentions_week,
+        **stats,
         "active_monitors": monitor_status["active_monitors"],
         "monitored_groups_total": monitor_status["monitored_groups_total"]
     }
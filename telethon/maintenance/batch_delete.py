@@ -0,0 +1,146 @@
+"""
+Batch Delete
+Пакетное удаление постов для retention
+
+Вместо одного DELETE на весь диапазон пользователя (сотни тысяч строк
+в одной транзакции, долгие блокировки и всплеск WAL) посты удаляются
+пачками по id:
+
+    SELECT id FROM posts WHERE ... AND id > :last_id ORDER BY id LIMIT :n
+    DELETE FROM indexing_status WHERE post_id IN (:ids)
+    DELETE FROM posts WHERE id IN (:ids)
+
+Каждая пачка - отдельная короткая транзакция. ID пачки нужны для
+очистки Qdrant/Neo4j (maintenance/store_cleanup.py) и для курсора
+RetentionCursor, который позволяет продолжить прерванный проход.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Tuple
+
+from sqlalchemy import select, delete, text
+
+from models import Post, IndexingStatus
+
+logger = logging.getLogger(__name__)
+
+
+class DeleteThrottle:
+    """
+    Ограничение скорости удаления
+
+    - batch_sleep: пауза после каждой пачки (дает место остальной нагрузке)
+    - max_rows_per_second: общий лимит для всех параллельных проходов (0 - без лимита)
+    """
+
+    def __init__(self, batch_sleep: float = 0.0, max_rows_per_second: float = 0.0):
+        self.batch_sleep = batch_sleep
+        self.max_rows_per_second = max_rows_per_second
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def pace(self, rows: int):
+        """Подождать после пачки из rows строк"""
+        delay = self.batch_sleep
+
+        if self.max_rows_per_second > 0:
+            async with self._lock:
+                now = time.monotonic()
+                self._next_slot = max(self._next_slot, now) + rows / self.max_rows_per_second
+                delay = max(delay, self._next_slot - now)
+
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def select_batch(
+    db,
+    conditions: list,
+    cutoff: datetime,
+    after_id: int,
+    limit: int
+) -> List[Tuple[int, int]]:
+    """
+    Следующая пачка истекших постов (keyset по id)
+
+    Returns:
+        [(post_id, user_id), ...] по возрастанию id
+    """
+    rows = db.execute(
+        select(Post.id, Post.user_id)
+        .where(*conditions, Post.posted_at < cutoff, Post.id > after_id)
+        .order_by(Post.id)
+        .limit(limit)
+    ).all()
+    return [(row[0], row[1]) for row in rows]
+
+
+def delete_batch(
+    db,
+    post_ids: List[int],
+    lock_timeout_ms: int = 0,
+    cursor=None
+) -> Dict[str, Any]:
+    """
+    Удалить пачку постов в одной транзакции
+
+    Сначала берутся row locks (SELECT ... FOR UPDATE) - время их ожидания
+    и есть lock wait пачки. В PostgreSQL lock_timeout ограничивает ожидание:
+    пачка откатывается и будет повторена следующим запуском с того же курсора.
+
+    Args:
+        db: Сессия БД
+        post_ids: ID постов пачки
+        lock_timeout_ms: SET LOCAL lock_timeout (0 - без ограничения)
+        cursor: RetentionCursor, сдвигается в той же транзакции
+
+    Returns:
+        {"deleted", "indexing_status", "lock_wait", "duration"}
+    """
+    start = time.perf_counter()
+
+    try:
+        if lock_timeout_ms and db.get_bind().dialect.name == "postgresql":
+            db.execute(text(f"SET LOCAL lock_timeout = {int(lock_timeout_ms)}"))
+
+        lock_start = time.perf_counter()
+        db.execute(
+            select(Post.id).where(Post.id.in_(post_ids)).with_for_update()
+        ).all()
+        lock_wait = time.perf_counter() - lock_start
+
+        # indexing_status первым (FK на posts)
+        indexing_deleted = db.execute(
+            delete(IndexingStatus).where(IndexingStatus.post_id.in_(post_ids))
+        ).rowcount
+        deleted = db.execute(
+            delete(Post).where(Post.id.in_(post_ids))
+        ).rowcount
+
+        if cursor is not None:
+            cursor.last_post_id = max(post_ids)
+            cursor.deleted = (cursor.deleted or 0) + deleted
+
+        db.commit()
+
+    except Exception:
+        db.rollback()
+        raise
+
+    return {
+        "deleted": deleted,
+        "indexing_status": indexing_deleted,
+        "lock_wait": lock_wait,
+        "duration": time.perf_counter() - start
+    }
+
+
+def group_by_user(rows: List[Tuple[int, int]]) -> Dict[int, List[int]]:
+    """[(post_id, user_id), ...] → {user_id: [post_id, ...]}"""
+    user_posts: Dict[int, List[int]] = {}
+    for post_id, user_id in rows:
+        user_posts.setdefault(user_id, []).append(post_id)
+    return user_posts
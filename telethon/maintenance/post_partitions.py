@@ -0,0 +1,230 @@
+"""
+Post Partitions
+Месячные RANGE-партиции posts / indexing_status по posted_at
+
+Партиционирование включается миграцией
+scripts/migrations/partition_posts_table.py. После нее retention
+удаляет старые данные целыми партициями (DETACH + DROP) вместо
+DELETE ... WHERE posted_at < cutoff: без bloat, долгих блокировок и WAL.
+
+Именование партиций:
+- posts_p2025_10, indexing_status_p2025_10 - [2025-10-01, 2025-11-01)
+- posts_default, indexing_status_default - строки вне диапазонов (и posted_at IS NULL)
+"""
+
+import logging
+import re
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Tuple
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Порядок важен при удалении: сначала зависимая таблица
+PARTITIONED_TABLES = ("indexing_status", "posts")
+
+# Сколько будущих месяцев держать созданными заранее
+DEFAULT_MONTHS_AHEAD = 2
+
+
+def month_start(dt: datetime) -> datetime:
+    """Начало месяца (UTC) для даты"""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    dt = dt.astimezone(timezone.utc)
+    return datetime(dt.year, dt.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(dt: datetime, months: int) -> datetime:
+    """Сдвинуть начало месяца на N месяцев"""
+    index = dt.year * 12 + (dt.month - 1) + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    """Имя месячной партиции: posts_p2025_10"""
+    return f"{table}_p{month.year:04d}_{month.month:02d}"
+
+
+def parse_partition_name(table: str, name: str):
+    """
+    Разобрать имя партиции в границы
+
+    Returns:
+        (from, to) для месячной партиции или None (default/чужая таблица)
+    """
+    match = re.fullmatch(rf"{re.escape(table)}_p(\d{{4}})_(\d{{2}})", name)
+    if not match:
+        return None
+    start = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=timezone.utc)
+    return start, add_months(start, 1)
+
+
+def create_partition_sql(table: str, month: datetime, parent: str = None) -> str:
+    """
+    DDL месячной партиции
+
+    Args:
+        table: Логическая таблица (определяет имя партиции)
+        month: Любая дата внутри месяца
+        parent: Родительская таблица, если отличается от table (миграция)
+    """
+    start = month_start(month)
+    end = add_months(start, 1)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, start)} "
+        f"PARTITION OF {parent or table} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+def create_default_partition_sql(table: str, parent: str = None) -> str:
+    """DDL default партиции"""
+    return f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {parent or table} DEFAULT"
+
+
+def is_partitioned(db, table: str = "posts") -> bool:
+    """Проверить что таблица партиционирована (только PostgreSQL)"""
+    try:
+        if db.get_bind().dialect.name != "postgresql":
+            return False
+        result = db.execute(
+            text("""
+                SELECT 1 FROM pg_partitioned_table pt
+                JOIN pg_class c ON c.oid = pt.partrelid
+                WHERE c.relname = :table
+            """),
+            {"table": table}
+        ).first()
+        return result is not None
+    except Exception as e:
+        logger.warning(f"⚠️ Partition check failed for {table}: {e}")
+        return False
+
+
+def list_partitions(db, table: str) -> List[Tuple[str, datetime, datetime]]:
+    """
+    Месячные партиции таблицы, отсортированные по времени
+
+    Returns:
+        [(имя, from, to), ...] (default партиция не включается)
+    """
+    rows = db.execute(
+        text("""
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.relname = :table
+        """),
+        {"table": table}
+    ).scalars().all()
+
+    partitions = []
+    for name in rows:
+        bounds = parse_partition_name(table, name)
+        if bounds:
+            partitions.append((name, bounds[0], bounds[1]))
+
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def ensure_partitions(db, months_ahead: int = DEFAULT_MONTHS_AHEAD) -> List[str]:
+    """
+    Создать партиции текущего и будущих месяцев
+
+    Без них новые посты попадали бы в default партицию,
+    которую нельзя удалить целиком.
+
+    Returns:
+        Имена созданных партиций
+    """
+    current = month_start(datetime.now(timezone.utc))
+    created = []
+
+    for table in PARTITIONED_TABLES:
+        existing = {name for name, _, _ in list_partitions(db, table)}
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            name = partition_name(table, month)
+            if name not in existing:
+                db.execute(text(create_partition_sql(table, month)))
+                created.append(name)
+
+    db.commit()
+
+    if created:
+        logger.info(f"📅 Created partitions: {', '.join(created)}")
+
+    return created
+
+
+def expired_partitions(db, cutoff: datetime) -> List[Tuple[datetime, datetime]]:
+    """Границы месячных партиций posts, целиком лежащих до cutoff"""
+    return [
+        (start, end) for _, start, end in list_partitions(db, "posts")
+        if end <= cutoff
+    ]
+
+
+def partition_post_ids(db, month: datetime) -> Dict[int, List[int]]:
+    """
+    ID постов партиции, сгруппированные по пользователям
+
+    Нужны до DROP для очистки Qdrant/Neo4j (см. maintenance/store_cleanup.py)
+    """
+    rows = db.execute(
+        text(f"SELECT user_id, id FROM {partition_name('posts', month)}")
+    ).fetchall()
+
+    user_posts: Dict[int, List[int]] = {}
+    for user_id, post_id in rows:
+        user_posts.setdefault(user_id, []).append(post_id)
+    return user_posts
+
+
+def drop_partitions_before(db, cutoff: datetime, dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Удалить партиции, целиком лежащие до cutoff (upper bound <= cutoff)
+
+    Args:
+        db: Сессия БД
+        cutoff: Граница retention, общая для всех пользователей
+        dry_run: Если True, только подсчет без удаления
+
+    Returns:
+        Список партиций и количество удаленных постов
+    """
+    dropped = []
+    posts_deleted = 0
+
+    for start, end in expired_partitions(db, cutoff):
+        posts_partition = partition_name("posts", start)
+        count = db.execute(text(f"SELECT COUNT(*) FROM {posts_partition}")).scalar() or 0
+
+        if not dry_run:
+            for table in PARTITIONED_TABLES:
+                name = partition_name(table, start)
+                exists = db.execute(
+                    text("SELECT to_regclass(:name)"), {"name": name}
+                ).scalar()
+                if not exists:
+                    continue
+                db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+                db.execute(text(f"DROP TABLE {name}"))
+            db.commit()
+            logger.info(f"🗑️ Dropped partition {posts_partition} ({count} posts)")
+
+        dropped.append({
+            "partition": posts_partition,
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "posts": count
+        })
+        posts_deleted += count
+
+    return {
+        "partitions": dropped,
+        "posts_deleted": posts_deleted
+    }
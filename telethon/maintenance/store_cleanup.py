@@ -0,0 +1,288 @@
+"""
+Store Cleanup
+Удаление данных истекших постов из Qdrant и Neo4j
+
+UnifiedRetentionService удаляет посты в PostgreSQL, но векторы и
+Post nodes живут в отдельных хранилищах. Без их очистки растет память
+Qdrant и стоимость обхода графа, а поиск возвращает точки, которые
+обогащение из БД потом молча отбрасывает.
+
+Стратегия:
+- Qdrant: delete by filter в коллекции пользователя telegram_posts_{user_id}
+  * posted_at_ts < cutoff (payload пишет IndexerService)
+  * точки, проиндексированные до появления posted_at_ts - по post_id пачками
+- Neo4j: UNWIND $post_ids + DETACH DELETE пачками
+
+Порядок: сначала производные хранилища, затем PostgreSQL. Если процесс
+прервется, следующий запуск найдет те же посты в БД и повторит очистку.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+
+try:
+    from qdrant_client import QdrantClient as QdrantClientBase
+    from qdrant_client.models import (
+        Filter,
+        FieldCondition,
+        FilterSelector,
+        IsEmptyCondition,
+        MatchAny,
+        MatchValue,
+        PayloadField,
+        Range
+    )
+    QDRANT_AVAILABLE = True
+except ImportError:
+    QDRANT_AVAILABLE = False
+
+try:
+    from rag_service.metrics import record_cleanup
+except ImportError:
+    # Fallback для тестов
+    def record_cleanup(*args, **kwargs):
+        pass
+
+logger = logging.getLogger(__name__)
+
+# Размер пачки post_id для Qdrant MatchAny и Neo4j UNWIND
+DEFAULT_BATCH_SIZE = int(os.getenv("RETENTION_STORE_BATCH_SIZE", "1000"))
+
+
+def collection_name(user_id: int) -> str:
+    """Коллекция пользователя (совпадает с rag_service/vector_db.py)"""
+    return f"telegram_posts_{user_id}"
+
+
+def to_timestamp(dt: datetime) -> int:
+    """Unix timestamp (naive datetime считается UTC)"""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def chunked(items: List[int], size: int):
+    """Разбить список на пачки"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class StoreCleanup:
+    """
+    Очистка Qdrant и Neo4j для истекших постов
+
+    Qdrant включается переменной QDRANT_URL, Neo4j - NEO4J_ENABLED
+    (см. graph/neo4j_client.py). Отключенное хранилище пропускается.
+    """
+
+    def __init__(self, qdrant=None, neo4j=None, batch_size: int = DEFAULT_BATCH_SIZE):
+        """
+        Args:
+            qdrant: qdrant_client.QdrantClient (по умолчанию создается из QDRANT_URL)
+            neo4j: Neo4jClient (по умолчанию graph.neo4j_client.neo4j_client)
+            batch_size: Размер пачки post_id
+        """
+        self._qdrant = qdrant
+        self._neo4j = neo4j
+        self.batch_size = batch_size
+
+    @property
+    def qdrant(self):
+        """Lazy Qdrant client"""
+        if self._qdrant is None and QDRANT_AVAILABLE and os.getenv("QDRANT_URL"):
+            self._qdrant = QdrantClientBase(
+                url=os.getenv("QDRANT_URL"),
+                api_key=os.getenv("QDRANT_API_KEY"),
+                timeout=int(os.getenv("QDRANT_TIMEOUT", "60"))
+            )
+        return self._qdrant
+
+    @property
+    def neo4j(self):
+        """Neo4j client (если граф включен)"""
+        if self._neo4j is None:
+            try:
+                from graph.neo4j_client import neo4j_client
+                self._neo4j = neo4j_client
+            except ImportError:
+                return None
+        if not self._neo4j.enabled or not self._neo4j.driver:
+            return None
+        return self._neo4j
+
+    @property
+    def enabled(self) -> bool:
+        """Есть ли хотя бы одно хранилище для очистки"""
+        return self.qdrant is not None or self.neo4j is not None
+
+    def _existing_collections(self) -> set:
+        return {c.name for c in self.qdrant.get_collections().collections}
+
+    def _qdrant_filters(
+        self,
+        cutoff: datetime,
+        post_ids: List[int],
+        channel_id: Optional[int] = None,
+        by_range: bool = True
+    ) -> List["Filter"]:
+        """
+        Непересекающиеся фильтры удаления
+
+        1. posted_at_ts < cutoff (by_range=False - пропустить, уже удалено
+           предыдущей пачкой того же прохода)
+        2. Старые точки без posted_at_ts - по post_id
+        """
+        scope = []
+        if channel_id is not None:
+            scope.append(FieldCondition(key="channel_id", match=MatchValue(value=channel_id)))
+
+        filters = []
+        if by_range:
+            filters.append(Filter(must=scope + [
+                FieldCondition(key="posted_at_ts", range=Range(lt=to_timestamp(cutoff)))
+            ]))
+        for batch in chunked(post_ids, self.batch_size):
+            filters.append(Filter(must=scope + [
+                FieldCondition(key="post_id", match=MatchAny(any=batch)),
+                IsEmptyCondition(is_empty=PayloadField(key="posted_at_ts"))
+            ]))
+        return filters
+
+    async def purge_qdrant(
+        self,
+        user_posts: Dict[int, List[int]],
+        cutoff: datetime,
+        dry_run: bool = False,
+        channel_id: Optional[int] = None,
+        by_range: bool = True
+    ) -> int:
+        """
+        Удалить векторы истекших постов
+
+        Args:
+            user_posts: {user_id: [post_id, ...]} - истекшие посты по коллекциям
+            cutoff: Граница retention
+            dry_run: Если True, только подсчет
+            channel_id: Ограничить удаление каналом (orphaned channels)
+            by_range: Удалять по posted_at_ts < cutoff (иначе только по post_id)
+
+        Returns:
+            Количество удаленных (для dry run - найденных) точек
+        """
+        if self.qdrant is None or not user_posts:
+            return 0
+
+        start_time = time.time()
+        total = 0
+
+        try:
+            # Синхронный QdrantClient - в thread pool, event loop не блокируется
+            existing = await asyncio.to_thread(self._existing_collections)
+
+            for user_id, post_ids in user_posts.items():
+                name = collection_name(user_id)
+                if name not in existing:
+                    continue
+
+                for points_filter in self._qdrant_filters(cutoff, post_ids, channel_id, by_range):
+                    count = (await asyncio.to_thread(
+                        self.qdrant.count,
+                        collection_name=name,
+                        count_filter=points_filter,
+                        exact=True
+                    )).count
+                    if count == 0:
+                        continue
+
+                    if not dry_run:
+                        await asyncio.to_thread(
+                            self.qdrant.delete,
+                            collection_name=name,
+                            points_selector=FilterSelector(filter=points_filter),
+                            wait=True
+                        )
+                    total += count
+
+                logger.debug(f"🗑️ Qdrant {name}: {total} points {'would be' if dry_run else ''} deleted")
+
+            if not dry_run:
+                record_cleanup("qdrant", time.time() - start_time, total)
+
+            return total
+
+        except Exception as e:
+            logger.error(f"❌ Qdrant cleanup error: {e}")
+            if not dry_run:
+                record_cleanup("qdrant", time.time() - start_time, total, success=False)
+            raise
+
+    async def purge_neo4j(self, post_ids: List[int], dry_run: bool = False) -> int:
+        """
+        Удалить Post nodes истекших постов
+
+        Args:
+            post_ids: ID постов (Post.id в графе = posts.id)
+            dry_run: Если True, только подсчет
+
+        Returns:
+            Количество удаленных (для dry run - найденных) nodes
+        """
+        neo4j = self.neo4j
+        if neo4j is None or not post_ids:
+            return 0
+
+        start_time = time.time()
+
+        try:
+            if dry_run:
+                return await neo4j.count_post_nodes(post_ids, batch_size=self.batch_size)
+
+            deleted = await neo4j.delete_post_nodes(post_ids, batch_size=self.batch_size)
+            record_cleanup("neo4j", time.time() - start_time, deleted)
+            return deleted
+
+        except Exception as e:
+            logger.error(f"❌ Neo4j cleanup error: {e}")
+            if not dry_run:
+                record_cleanup("neo4j", time.time() - start_time, 0, success=False)
+            raise
+
+    async def purge(
+        self,
+        user_posts: Dict[int, List[int]],
+        cutoff: datetime,
+        dry_run: bool = False,
+        channel_id: Optional[int] = None,
+        by_range: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Очистить Neo4j и Qdrant для истекших постов
+
+        Ошибка одного хранилища не останавливает другое.
+
+        Returns:
+            {"neo4j": N, "qdrant": M, "errors": [...]}
+        """
+        result = {"neo4j": 0, "qdrant": 0, "errors": []}
+
+        post_ids = [pid for ids in user_posts.values() for pid in ids]
+
+        try:
+            result["neo4j"] = await self.purge_neo4j(post_ids, dry_run)
+        except Exception as e:
+            result["errors"].append(f"Neo4j: {e}")
+
+        try:
+            result["qdrant"] = await self.purge_qdrant(user_posts, cutoff, dry_run, channel_id, by_range)
+        except Exception as e:
+            result["errors"].append(f"Qdrant: {e}")
+
+        return result
+
+
+# Global instance
+store_cleanup = StoreCleanup()
@@ -6,16 +6,22 @@ Features:
 - Smart retention (учет digest frequency)
 - Channel orphan cleanup (нет подписчиков)
 - Dry run mode
-- Sync cleanup: PostgreSQL → Neo4j → Qdrant
+- Batched deletes: пачки по id, паузы/лимит rows/sec, курсор для resume,
+  параллельная обработка пользователей (см. maintenance/batch_delete.py)
+- Cross-store cleanup: Neo4j → Qdrant → PostgreSQL (см. maintenance/store_cleanup.py)
 - Context7 best practices (PostgreSQL partitioning)
+- Partition drop: месячные партиции posts/indexing_status удаляются целиком,
+  когда retention всех пользователей их прошел (см. maintenance/post_partitions.py)
 
 Best practices (from Context7):
 - PostgreSQL: batch DELETE + VACUUM OR партиционирование
-- Neo4j: DETACH DELETE с batch iterations (apoc.periodic.iterate)
-- Qdrant: delete by filter (posted_at < cutoff_date)
-- Sequential cleanup: PostgreSQL → Neo4j → Qdrant
+- Neo4j: UNWIND $post_ids + DETACH DELETE пачками
+- Qdrant: delete by filter (posted_at_ts < cutoff_date)
+- Sequential cleanup: Neo4j → Qdrant → PostgreSQL (источник истины последним,
+  прерванный запуск повторяется целиком)
 """
 
+import asyncio
 import logging
 import os
 import time
@@ -27,13 +33,27 @@ import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from database import SessionLocal
-from models import Post, User, Channel, DigestSettings, user_channel
+from sqlalchemy import case, func, select
+
+from models import Post, User, Channel, DigestSettings, IndexingStatus, RetentionCursor, user_channel
+from maintenance.post_partitions import (
+    is_partitioned, ensure_partitions, drop_partitions_before,
+    expired_partitions, partition_post_ids
+)
+from maintenance.store_cleanup import store_cleanup as default_store_cleanup
+from maintenance.batch_delete import DeleteThrottle, select_batch, delete_batch, group_by_user
 try:
-    from rag_service.metrics import record_cleanup
+    from rag_service.metrics import record_cleanup, record_cleanup_batch, set_cleanup_throughput
 except ImportError:
     # Fallback для тестов
     def record_cleanup(*args, **kwargs):
         pass
+    
+    def record_cleanup_batch(*args, **kwargs):
+        pass
+    
+    def set_cleanup_throughput(*args, **kwargs):
+        pass
 
 logger = logging.getLogger(__name__)
 
@@ -55,12 +75,13 @@ class UnifiedRetentionService:
     - Недавние посты vs старые → минимум 90 дней для RAG
     """
     
-    def __init__(self, base_retention_days: int = None):
+    def __init__(self, base_retention_days: int = None, store_cleanup=None):
         """
         Инициализация unified retention service
         
         Args:
             base_retention_days: Базовый минимум retention (default: 90 дней)
+            store_cleanup: Очистка Qdrant/Neo4j (default: maintenance.store_cleanup)
         """
         if base_retention_days is None:
             base_retention_days = int(os.getenv("DATA_RETENTION_DAYS", "90"))
@@ -68,9 +89,121 @@ class UnifiedRetentionService:
         self.base_retention_days = base_retention_days
         self.min_retention_days = 90  # Абсолютный минимум для RAG/search
         self.max_retention_days = 3650  # Максимум (10 лет)
+        self.store_cleanup = store_cleanup or default_store_cleanup
+        
+        # Пакетное удаление
+        self.batch_size = int(os.getenv("RETENTION_BATCH_SIZE", "5000"))
+        self.user_concurrency = int(os.getenv("RETENTION_USER_CONCURRENCY", "4"))
+        self.lock_timeout_ms = int(os.getenv("RETENTION_LOCK_TIMEOUT_MS", "5000"))
+        self.throttle = DeleteThrottle(
+            batch_sleep=float(os.getenv("RETENTION_BATCH_SLEEP", "0.1")),
+            max_rows_per_second=float(os.getenv("RETENTION_MAX_ROWS_PER_SEC", "0"))
+        )
         
         logger.info(f"🗑️ UnifiedRetentionService initialized (base: {base_retention_days} days)")
         logger.info(f"   Min retention: {self.min_retention_days} days (for RAG/search)")
+        logger.info(f"   Batch: {self.batch_size} rows, concurrency: {self.user_concurrency} users")
+    
+    @staticmethod
+    def _empty_store_stats() -> Dict[str, int]:
+        return {"postgres": 0, "indexing_status": 0, "neo4j": 0, "qdrant": 0}
+    
+    @staticmethod
+    def _add_store_stats(total: Dict[str, int], part: Dict[str, int]):
+        for store, count in part.items():
+            total[store] = total.get(store, 0) + count
+    
+    async def _delete_in_batches(
+        self,
+        db,
+        conditions: list,
+        cutoff: datetime,
+        stores: Dict[str, int],
+        errors: List[str],
+        cursor: Optional[RetentionCursor] = None,
+        channel_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Удалить истекшие посты пачками по id
+        
+        Для каждой пачки: Neo4j/Qdrant → indexing_status + posts в одной
+        транзакции (курсор сдвигается там же) → пауза throttle.
+        
+        Args:
+            db: Сессия БД
+            conditions: Условия на Post (пользователь или канал)
+            cutoff: Граница retention
+            stores: Счетчики по хранилищам (дополняются)
+            errors: Ошибки Qdrant/Neo4j (дополняются)
+            cursor: RetentionCursor для resume (None - без курсора)
+            channel_id: Ограничить очистку Qdrant каналом
+            
+        Returns:
+            {"deleted", "batches", "lock_wait", "duration"}
+        """
+        start = time.perf_counter()
+        after_id = cursor.last_post_id if cursor is not None else 0
+        deleted = 0
+        batches = 0
+        lock_wait = 0.0
+        
+        while True:
+            rows = await asyncio.to_thread(
+                select_batch, db, conditions, cutoff, after_id, self.batch_size
+            )
+            if not rows:
+                break
+            
+            post_ids = [post_id for post_id, _ in rows]
+            
+            if self.store_cleanup.enabled:
+                # Range-фильтр Qdrant удаляет все точки до cutoff - достаточно первой пачки
+                await self._purge_stores(
+                    group_by_user(rows), cutoff, False, stores, errors,
+                    channel_id=channel_id, by_range=(batches == 0)
+                )
+            
+            batch = await asyncio.to_thread(
+                delete_batch, db, post_ids, self.lock_timeout_ms, cursor
+            )
+            
+            deleted += batch["deleted"]
+            stores["postgres"] += batch["deleted"]
+            stores["indexing_status"] += batch["indexing_status"]
+            lock_wait += batch["lock_wait"]
+            batches += 1
+            after_id = post_ids[-1]
+            record_cleanup_batch("postgres", batch["lock_wait"])
+            
+            if len(rows) < self.batch_size:
+                break
+            
+            await self.throttle.pace(len(rows))
+        
+        return {
+            "deleted": deleted,
+            "batches": batches,
+            "lock_wait": lock_wait,
+            "duration": time.perf_counter() - start
+        }
+    
+    async def _purge_stores(
+        self,
+        user_posts: Dict[int, List[int]],
+        cutoff: datetime,
+        dry_run: bool,
+        stores: Dict[str, int],
+        errors: List[str],
+        channel_id: Optional[int] = None,
+        by_range: bool = True
+    ):
+        """Очистить Neo4j и Qdrant до удаления постов из PostgreSQL"""
+        result = await self.store_cleanup.purge(
+            user_posts, cutoff, dry_run, channel_id=channel_id, by_range=by_range
+        )
+        stores["neo4j"] += result["neo4j"]
+        stores["qdrant"] += result["qdrant"]
+        errors.extend(result["errors"])
     
     async def calculate_retention_period(self, user_id: int) -> int:
         """
@@ -147,21 +280,148 @@ class UnifiedRetentionService:
         finally:
             db.close()
     
-    async def cleanup_orphaned_channels(self, dry_run: bool = False) -> int:
+    async def calculate_max_retention_period(self, db) -> int:
+        """
+        Максимальный retention среди всех пользователей
+        
+        Партиция может быть удалена целиком только когда ее прошел
+        retention каждого пользователя (включая неактивных). Считается
+        одним SQL агрегатом по правилам calculate_retention_period: тот
+        при ошибке возвращает base_retention_days, и максимум по нему мог
+        оказаться заниженным. Ошибка агрегата пробрасывается - удаление
+        партиций не выполняется.
+        
+        Args:
+            db: Сессия БД
+            
+        Returns:
+            Количество дней retention
+        """
+        digest_retention = case(
+            (DigestSettings.enabled.is_(True), case(
+                (DigestSettings.frequency == "daily", 2),
+                (DigestSettings.frequency == "monthly", 60),
+                else_=14  # weekly и неизвестные значения
+            )),
+            else_=14  # Нет настроек или дайджест выключен
+        )
+        users_count, max_user_retention, max_digest_retention = db.query(
+            func.count(User.id),
+            func.max(func.coalesce(User.retention_days, 30)),
+            func.max(digest_retention)
+        ).outerjoin(DigestSettings, DigestSettings.user_id == User.id).one()
+        
+        if not users_count:
+            return self.max_retention_days
+        
+        retention = max(self.min_retention_days, max_user_retention or 0, max_digest_retention or 0)
+        return min(retention, self.max_retention_days)
+    
+    async def cleanup_expired_partitions(self, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Удаление партиций posts/indexing_status целиком
+        
+        Логика:
+        - Только если posts партиционирована (PostgreSQL, миграция partition_posts_table.py)
+        - cutoff = now - MAX(retention всех пользователей)
+        - Партиции с upper bound <= cutoff: DETACH + DROP (без DELETE/VACUUM)
+        - Заранее создаются партиции текущего и будущих месяцев
+        
+        Args:
+            dry_run: Если True, только подсчет без удаления
+            
+        Returns:
+            Статистика удаленных партиций
+        """
+        db = SessionLocal()
+        try:
+            if not is_partitioned(db):
+                return {
+                    "partitioned": False,
+                    "partitions": [],
+                    "posts_deleted": 0,
+                    "dry_run": dry_run
+                }
+            
+            start_time = time.time()
+            
+            retention_days = await self.calculate_max_retention_period(db)
+            cutoff_date = datetime.now(timezone.utc) - timedelta(days=retention_days)
+            
+            logger.info(f"🧹 Partition cleanup: max retention={retention_days} days, cutoff={cutoff_date.isoformat()}")
+            
+            if not dry_run:
+                ensure_partitions(db)
+            
+            # Qdrant/Neo4j чистятся до DROP, пока ID постов еще доступны
+            stores = self._empty_store_stats()
+            store_errors = []
+            if self.store_cleanup.enabled:
+                for start, end in expired_partitions(db, cutoff_date):
+                    await self._purge_stores(
+                        partition_post_ids(db, start), end, dry_run, stores, store_errors
+                    )
+            
+            result = drop_partitions_before(db, cutoff_date, dry_run=dry_run)
+            stores["postgres"] = result["posts_deleted"]
+            
+            if not dry_run:
+                record_cleanup("postgres", time.time() - start_time, result["posts_deleted"])
+            
+            logger.info(
+                f"✅ Partition cleanup: {len(result['partitions'])} partitions, "
+                f"{result['posts_deleted']} posts {'would be' if dry_run else ''} deleted"
+            )
+            
+            return {
+                "partitioned": True,
+                "retention_days": retention_days,
+                "cutoff_date": cutoff_date.isoformat(),
+                "partitions": result["partitions"],
+                "posts_deleted": result["posts_deleted"],
+                "stores": stores,
+                "store_errors": store_errors,
+                "dry_run": dry_run
+            }
+            
+        except Exception as e:
+            logger.error(f"❌ Error in partition cleanup: {e}")
+            db.rollback()
+            if not dry_run:
+                record_cleanup("postgres", 0, 0, success=False)
+            return {
+                "partitioned": True,
+                "error": str(e),
+                "partitions": [],
+                "posts_deleted": 0,
+                "dry_run": dry_run
+            }
+        finally:
+            db.close()
+    
+    async def cleanup_orphaned_channels(
+        self,
+        dry_run: bool = False,
+        stores: Optional[Dict[str, int]] = None
+    ) -> int:
         """
         Очистка каналов без подписчиков
         
         Логика:
         - Канал считается orphaned если нет активных подписок
-        - Удаляются посты канала старше 30 дней
+        - Удаляются посты канала старше 30 дней (+ Qdrant/Neo4j/indexing_status)
         - Сам канал остается (для истории)
         
         Args:
             dry_run: Если True, только подсчет без удаления
+            stores: Счетчики по хранилищам (дополняются)
             
         Returns:
             Количество удаленных постов
         """
+        if stores is None:
+            stores = self._empty_store_stats()
+        
         logger.info(f"🧹 Cleanup orphaned channels (dry_run={dry_run})")
         
         db = SessionLocal()
@@ -196,14 +456,38 @@ class UnifiedRetentionService:
                     if count > 0:
                         logger.info(f"📊 Channel @{channel.channel_username}: {count} posts to delete")
                         
+                        errors = []
+                        
                         if not dry_run:
-                            # Удалить посты
-                            deleted = posts_query.delete(synchronize_session=False)
-                            db.commit()
+                            # Курсор не нужен: удаленные пачки не вернутся, повторный запуск
+                            # просто продолжит с оставшихся постов
+                            result = await self._delete_in_batches(
+                                db, [Post.channel_id == channel.id], cutoff, stores, errors,
+                                channel_id=channel.id
+                            )
+                            deleted = result["deleted"]
                             total_deleted += deleted
-                            logger.info(f"✅ Channel @{channel.channel_username}: deleted {deleted} posts")
+                            logger.info(
+                                f"✅ Channel @{channel.channel_username}: deleted {deleted} posts "
+                                f"({result['batches']} batches)"
+                            )
                         else:
+                            if self.store_cleanup.enabled:
+                                rows = posts_query.with_entities(Post.id, Post.user_id).all()
+                                await self._purge_stores(
+                                    group_by_user(rows), cutoff, True, stores, errors,
+                                    channel_id=channel.id
+                                )
+                            stores["indexing_status"] += db.query(IndexingStatus).filter(
+                                IndexingStatus.post_id.in_(
+                                    select(Post.id).where(Post.channel_id == channel.id, Post.posted_at < cutoff)
+                                )
+                            ).count()
+                            stores["postgres"] += count
                             total_deleted += count
+                        
+                        for error in errors:
+                            logger.warning(f"⚠️ Channel @{channel.channel_username}: {error}")
                     
                 except Exception as e:
                     logger.error(f"❌ Error cleaning channel @{channel.channel_username}: {e}")
@@ -220,26 +504,50 @@ class UnifiedRetentionService:
         finally:
             db.close()
     
-    async def cleanup_user_posts(self, user_id: int, dry_run: bool = False) -> Dict[str, Any]:
+    async def cleanup_user_posts(
+        self,
+        user_id: int,
+        dry_run: bool = False,
+        retention_days: Optional[int] = None
+    ) -> Dict[str, Any]:
         """
         Очистка постов для конкретного пользователя
         
+        Вместе с постами удаляются их векторы (Qdrant), Post nodes (Neo4j)
+        и записи indexing_status. Dry run возвращает те же счетчики по хранилищам.
+        
         Args:
             user_id: ID пользователя
             dry_run: Если True, только подсчет без удаления
+            retention_days: Уже рассчитанный retention (иначе считается заново)
             
         Returns:
             Статистика очистки
         """
         try:
             # Рассчитать retention period
-            retention_days = await self.calculate_retention_period(user_id)
+            if retention_days is None:
+                retention_days = await self.calculate_retention_period(user_id)
             cutoff_date = datetime.now(timezone.utc) - timedelta(days=retention_days)
             
             logger.info(f"📊 User {user_id}: retention={retention_days} days, cutoff={cutoff_date.isoformat()}")
             
             db = SessionLocal()
             try:
+                # Прерванный проход продолжается со своим cutoff, если retention не вырос
+                cursor = None
+                if not dry_run:
+                    cursor = db.get(RetentionCursor, user_id)
+                    if cursor is not None and cursor.cutoff <= cutoff_date:
+                        cutoff_date = cursor.cutoff
+                        logger.info(
+                            f"🔄 User {user_id}: resuming retention after post {cursor.last_post_id} "
+                            f"({cursor.deleted} already deleted)"
+                        )
+                    elif cursor is not None:
+                        db.delete(cursor)
+                        cursor = None
+                
                 # Подсчитать посты для удаления
                 posts_query = db.query(Post).filter(
                     Post.user_id == user_id,
@@ -247,30 +555,80 @@ class UnifiedRetentionService:
                 )
                 count = posts_query.count()
                 
+                stores = self._empty_store_stats()
+                store_errors = []
+                
                 if count == 0:
+                    if cursor is not None:
+                        db.delete(cursor)
+                        db.commit()
                     return {
                         "user_id": user_id,
                         "retention_days": retention_days,
                         "cutoff_date": cutoff_date.isoformat(),
                         "posts_deleted": 0,
+                        "stores": stores,
                         "dry_run": dry_run
                     }
                 
                 logger.info(f"📊 User {user_id}: {count} posts to delete")
                 
-                if not dry_run:
-                    # Удалить посты
-                    deleted = posts_query.delete(synchronize_session=False)
+                if dry_run:
+                    if self.store_cleanup.enabled:
+                        post_ids = [row[0] for row in posts_query.with_entities(Post.id).all()]
+                        await self._purge_stores(
+                            {user_id: post_ids}, cutoff_date, True, stores, store_errors
+                        )
+                    stores["indexing_status"] = db.query(IndexingStatus).filter(
+                        IndexingStatus.post_id.in_(
+                            select(Post.id).where(Post.user_id == user_id, Post.posted_at < cutoff_date)
+                        )
+                    ).count()
+                    stores["postgres"] = count
+                    
+                    return {
+                        "user_id": user_id,
+                        "retention_days": retention_days,
+                        "cutoff_date": cutoff_date.isoformat(),
+                        "posts_deleted": count,
+                        "stores": stores,
+                        "store_errors": store_errors,
+                        "dry_run": dry_run
+                    }
+                
+                if cursor is None:
+                    cursor = RetentionCursor(user_id=user_id, cutoff=cutoff_date, last_post_id=0, deleted=0)
+                    db.add(cursor)
                     db.commit()
-                    logger.info(f"✅ User {user_id}: deleted {deleted} posts")
-                else:
-                    deleted = count
+                
+                result = await self._delete_in_batches(
+                    db, [Post.user_id == user_id], cutoff_date, stores, store_errors, cursor=cursor
+                )
+                
+                # Проход завершен - курсор больше не нужен
+                db.delete(cursor)
+                db.commit()
+                
+                deleted = result["deleted"]
+                rows_per_second = deleted / result["duration"] if result["duration"] > 0 else 0.0
+                record_cleanup("postgres", result["duration"], deleted)
+                set_cleanup_throughput("postgres", rows_per_second)
+                
+                logger.info(
+                    f"✅ User {user_id}: deleted {deleted} posts in {result['batches']} batches "
+                    f"({rows_per_second:.0f} rows/s, lock wait {result['lock_wait']:.2f}s)"
+                )
                 
                 return {
                     "user_id": user_id,
                     "retention_days": retention_days,
                     "cutoff_date": cutoff_date.isoformat(),
                     "posts_deleted": deleted,
+                    "batches": result["batches"],
+                    "rows_per_second": round(rows_per_second, 1),
+                    "lock_wait_seconds": round(result["lock_wait"], 3),
+                    "stores": stores,
+                    "store_errors": store_errors,
                     "dry_run": dry_run
                 }
                 
@@ -326,47 +684,108 @@ class UnifiedRetentionService:
             users_processed = 0
             user_stats = []
             errors = []
-            
-            for user in users:
-                try:
-                    result = await self.cleanup_user_posts(user.id, dry_run)
-                    users_processed += 1
-                    
-                    if "error" in result:
-                        errors.append(f"User {user.id}: {result['error']}")
-                    else:
-                        posts_deleted = result.get("posts_deleted", 0)
-                        total_posts_deleted += posts_deleted
-                        
-                        if posts_deleted > 0:
-                            user_stats.append({
-                                "user_id": user.id,
-                                "telegram_id": user.telegram_id,
-                                "retention_days": result.get("retention_days"),
-                                "posts_deleted": posts_deleted
-                            })
-                            logger.info(f"✅ User {user.telegram_id}: {posts_deleted} posts {'would be' if dry_run else ''} deleted")
+            stores = self._empty_store_stats()
+            
+            # 1. Партиции, которые прошел retention всех пользователей, удаляются целиком
+            partition_result = await self.cleanup_expired_partitions(dry_run)
+            total_posts_deleted += partition_result.get("posts_deleted", 0)
+            self._add_store_stats(stores, partition_result.get("stores", {}))
+            errors.extend(f"Partitions: {e}" for e in partition_result.get("store_errors", []))
+            if "error" in partition_result:
+                errors.append(f"Partitions: {partition_result['error']}")
+            
+            # Пользователи с максимальным retention полностью покрыты удалением партиций
+            # (хвост до границы месяца уйдет со следующей партицией)
+            covered_retention = None
+            if partition_result.get("partitioned") and "error" not in partition_result:
+                covered_retention = partition_result.get("retention_days")
+            
+            # 2. Пакетные DELETE только для пользователей с более коротким retention,
+            #    до user_concurrency пользователей параллельно
+            semaphore = asyncio.Semaphore(max(1, self.user_concurrency))
+            
+            async def process_user(user):
+                async with semaphore:
+                    retention_days = None
+                    if covered_retention is not None:
+                        retention_days = await self.calculate_retention_period(user.id)
+                        if retention_days >= covered_retention:
+                            return None
+                    return await self.cleanup_user_posts(user.id, dry_run, retention_days=retention_days)
+            
+            pass_start = time.perf_counter()
+            results = await asyncio.gather(
+                *(process_user(user) for user in users),
+                return_exceptions=True
+            )
+            pass_duration = time.perf_counter() - pass_start
+            
+            batches = 0
+            lock_wait = 0.0
+            targeted_deleted = 0
+            
+            for user, result in zip(users, results):
+                if isinstance(result, Exception):
+                    logger.error(f"❌ Error processing user {user.id}: {result}")
+                    errors.append(f"User {user.id}: {str(result)}")
+                    continue
                 
-                except Exception as e:
-                    logger.error(f"❌ Error processing user {user.id}: {e}")
-                    errors.append(f"User {user.id}: {str(e)}")
+                users_processed += 1
+                if result is None:
+                    continue
+                
+                if "error" in result:
+                    errors.append(f"User {user.id}: {result['error']}")
                     continue
+                
+                posts_deleted = result.get("posts_deleted", 0)
+                total_posts_deleted += posts_deleted
+                targeted_deleted += posts_deleted
+                batches += result.get("batches", 0)
+                lock_wait += result.get("lock_wait_seconds", 0.0)
+                self._add_store_stats(stores, result.get("stores", {}))
+                errors.extend(f"User {user.id}: {e}" for e in result.get("store_errors", []))
+                
+                if posts_deleted > 0:
+                    user_stats.append({
+                        "user_id": user.id,
+                        "telegram_id": user.telegram_id,
+                        "retention_days": result.get("retention_days"),
+                        "posts_deleted": posts_deleted
+                    })
+                    logger.info(f"✅ User {user.telegram_id}: {posts_deleted} posts {'would be' if dry_run else ''} deleted")
+            
+            throughput = {
+                "batches": batches,
+                "rows_per_second": round(targeted_deleted / pass_duration, 1) if pass_duration > 0 else 0.0,
+                "lock_wait_seconds": round(lock_wait, 3),
+                "duration_seconds": round(pass_duration, 3)
+            }
+            if not dry_run:
+                set_cleanup_throughput("postgres", throughput["rows_per_second"])
             
             # Cleanup orphaned channels
             try:
-                orphaned_deleted = await self.cleanup_orphaned_channels(dry_run)
+                orphaned_deleted = await self.cleanup_orphaned_channels(dry_run, stores=stores)
                 total_posts_deleted += orphaned_deleted
             except Exception as e:
                 logger.error(f"❌ Error in orphaned channels cleanup: {e}")
                 errors.append(f"Orphaned channels: {str(e)}")
             
             logger.info(f"✅ Unified cleanup complete: {total_posts_deleted} posts {'would be' if dry_run else ''} deleted")
+            logger.info(
+                f"   Stores: indexing_status={stores['indexing_status']}, "
+                f"neo4j={stores['neo4j']}, qdrant={stores['qdrant']}"
+            )
             
             return {
                 "status": "success",
                 "users_processed": users_processed,
                 "total_posts_deleted": total_posts_deleted,
                 "user_stats": user_stats,
+                "partitions": partition_result.get("partitions", []),
+                "stores": stores,
+                "throughput": throughput,
                 "errors": errors,
                 "dry_run": dry_run,
                 "timestamp": datetime.now(timezone.utc).isoformat()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey, BigInteger, LargeBinary, JSON, Table, UniqueConstraint
+from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey, BigInteger, LargeBinary, JSON, Table, UniqueConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy import event
@@ -420,6 +420,10 @@ class Channel(Base):
                 ).values(**values)
             )
 
+# Статусы тегирования, которые обрабатывает retry (частичный индекс ix_posts_tagging_pending)
+TAGGING_RETRY_STATUSES = ("pending", "failed", "retrying")
+
+
 class Post(Base):
     __tablename__ = "posts"
     
@@ -437,6 +441,11 @@ class Post(Base):
     # Обогащенный контент (текст + контент из ссылок)
     enriched_content = Column(Text, nullable=True)  # Для RAG индексации с контентом ссылок
     
+    # Почти-дубликаты (near_duplicates.py): MinHash текста и первый пост цепочки репостов.
+    # Без FK - в PostgreSQL posts партиционирована и PK включает posted_at
+    minhash = Column(LargeBinary, nullable=True)
+    canonical_post_id = Column(Integer, nullable=True)
+    
     # Поля для отслеживания тегирования
     tagging_status = Column(String, default="pending")  # pending, success, failed, retrying
     tagging_attempts = Column(Integer, default=0)  # Количество попыток тегирования
@@ -446,6 +455,28 @@ class Post(Base):
     # Связи
     user = relationship("User", back_populates="posts")
     channel = relationship("Channel", back_populates="posts")
+    
+    # Уникальность поста пользователя + индексы под горячие запросы
+    # (дайджесты, retention, поиск по датам, retry тегирования).
+    # В PostgreSQL после partition_posts_table.py таблица партиционирована по posted_at,
+    # поэтому там PK и уникальный ключ дополнительно включают posted_at.
+    __table_args__ = (
+        UniqueConstraint('user_id', 'channel_id', 'telegram_message_id', name='uix_user_channel_message'),
+        Index('ix_posts_user_posted_at', user_id, posted_at.desc()),
+        Index('ix_posts_channel_posted_at', channel_id, posted_at),
+        Index(
+            'ix_posts_canonical',
+            canonical_post_id,
+            postgresql_where=canonical_post_id.isnot(None),
+            sqlite_where=canonical_post_id.isnot(None),
+        ),
+        Index(
+            'ix_posts_tagging_pending',
+            tagging_status,
+            postgresql_where=tagging_status.in_(TAGGING_RETRY_STATUSES),
+            sqlite_where=tagging_status.in_(TAGGING_RETRY_STATUSES),
+        ),
+    )
 
 
 class DigestSettings(Base):
@@ -486,26 +517,71 @@ class DigestSettings(Base):
     user = relationship("User", back_populates="digest_settings")
 
 
+class PrecomputedDigest(Base):
+    """Дайджест, сгенерированный заранее (до слота доставки)"""
+    __tablename__ = "precomputed_digests"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    period_key = Column(String, nullable=False)  # "daily:2025-01-15" - частота + дата слота
+    
+    slot_at = Column(TZDateTime, nullable=False)     # Время доставки
+    date_from = Column(TZDateTime, nullable=False)   # Начало периода дайджеста
+    covered_until = Column(TZDateTime, nullable=False)  # Посты учтены до этого момента
+    last_post_id = Column(Integer, nullable=False, default=0)  # Max posts.id на момент генерации
+    
+    digest = Column(Text, nullable=False)
+    posts_count = Column(Integer, default=0)
+    ai_generated = Column(Boolean, default=False)
+    topped_up = Column(Boolean, default=False)  # Дополнен постами после генерации
+    
+    generated_at = Column(TZDateTime, default=lambda: datetime.now(timezone.utc))
+    delivered_at = Column(TZDateTime, nullable=True)
+    
+    __table_args__ = (
+        UniqueConstraint('user_id', 'period_key', name='uix_user_digest_period'),
+    )
+
+
 class IndexingStatus(Base):
     """Статус индексации постов в Qdrant"""
     __tablename__ = "indexing_status"
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
-    post_id = Column(Integer, ForeignKey("posts.id"), nullable=False, index=True)
+    # Без FK на posts.id: после партиционирования (scripts/migrations/partition_posts_table.py)
+    # PK posts - (id, posted_at), строки удаляются вместе с партициями и явно в retention
+    post_id = Column(Integer, nullable=False, index=True)
     
     indexed_at = Column(TZDateTime, default=lambda: datetime.now(timezone.utc))
     vector_id = Column(String, nullable=True)  # ID в Qdrant
     status = Column(String, default="success", index=True)  # success, failed, pending
     error = Column(Text, nullable=True)
+    posted_at = Column(TZDateTime, nullable=True)  # Копия posts.posted_at - ключ партиционирования
     
     # Связи
     user = relationship("User")
-    post = relationship("Post")
+    post = relationship("Post", primaryjoin="foreign(IndexingStatus.post_id) == Post.id")
     
     # Уникальность комбинации user_id + post_id
     __table_args__ = (
         UniqueConstraint('user_id', 'post_id', name='uix_user_post'),
+        Index('ix_indexing_status_user_status', 'user_id', 'status'),
+    )
+
+
+class RetentionCursor(Base):
+    """Позиция пакетного retention пользователя (resume после прерывания)"""
+    __tablename__ = "retention_cursors"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    cutoff = Column(TZDateTime, nullable=False)  # Граница retention прерванного прохода
+    last_post_id = Column(Integer, nullable=False, default=0)  # Keyset: id > last_post_id
+    deleted = Column(Integer, nullable=False, default=0)
+    updated_at = Column(
+        TZDateTime,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc)
     )
 
 
@@ -0,0 +1,282 @@
+"""
+Near-Duplicate Detection
+Почти-дубликаты постов (репосты, кросспостинг) при парсинге - MinHash + LSH
+
+Одна новость приходит из многих каналов, и каждая копия тегируется,
+индексируется и попадает в дайджест. При парсинге для поста считается
+MinHash сигнатура множества биграмм слов нормализованного текста:
+- нормализация: нижний регистр, ё → е, без ссылок, @упоминаний,
+  эмодзи и пунктуации
+- дубликат: оценка сходства Жаккара >= NEAR_DUP_THRESHOLD с постом того
+  же пользователя за последние NEAR_DUP_WINDOW_DAYS дней
+- LSH: 64 значения сигнатуры делятся на 16 полос по 4; кандидаты - посты
+  с совпадающей полосой (для сходства 0.7 вероятность попасть в кандидаты
+  ~0.99), затем проверка по всей сигнатуре
+- индекс пользователя в памяти, при первом обращении восстанавливается
+  из posts.minhash (посты без сигнатуры - по тексту)
+
+SimHash (64 бита, расстояние Хэмминга) для постов Telegram (~30 слов) не
+подходит: приписка канала в 3-4 слова сдвигает 5+ бит, и порог, ловящий
+репосты, требует слишком широкого поиска по индексу.
+
+Дубликат получает canonical_post_id (первый пост цепочки): теги и
+embedding берутся у canonical, в поиске и дайджестах копии схлопываются.
+"""
+import hashlib
+import heapq
+import logging
+import os
+import re
+import struct
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple, Union
+
+from models import Post
+
+try:
+    from observability.metrics import posts_near_duplicate_total
+except ImportError:
+    posts_near_duplicate_total = None
+
+logger = logging.getLogger(__name__)
+
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+
+# 64 независимых 32-битных хэша биграммы - один вызов shake_128 (256 байт);
+# не зависит от PYTHONHASHSEED - сигнатуры в posts.minhash сравнимы между
+# процессами и перезапусками
+_SIGNATURE_FORMAT = f">{NUM_PERMUTATIONS}I"
+_SIGNATURE_BYTES = NUM_PERMUTATIONS * 4
+
+URL_RE = re.compile(r"https?://\S+|www\.\S+")
+MENTION_RE = re.compile(r"@\w+")
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize_text(text: str) -> List[str]:
+    """Слова текста без ссылок, упоминаний, эмодзи и пунктуации"""
+    text = (text or "").lower().replace("ё", "е")
+    text = MENTION_RE.sub(" ", URL_RE.sub(" ", text))
+    return WORD_RE.findall(text)
+
+
+def _shingle_hashes(words: List[str]) -> List[Tuple[int, ...]]:
+    """NUM_PERMUTATIONS хэшей каждой биграммы слов (для одного слова - само слово)"""
+    shingles = {" ".join(words[i:i + 2]) for i in range(max(1, len(words) - 1))}
+    return [
+        struct.unpack(_SIGNATURE_FORMAT, hashlib.shake_128(s.encode("utf-8")).digest(_SIGNATURE_BYTES))
+        for s in shingles
+    ]
+
+
+def minhash(text: str, min_tokens: int = 0) -> Optional[Tuple[int, ...]]:
+    """
+    MinHash сигнатура текста (NUM_PERMUTATIONS значений по 32 бита)
+
+    Returns:
+        Сигнатура или None - слов меньше min_tokens (короткие посты вроде
+        "Доброе утро!" дают ложные совпадения)
+    """
+    words = normalize_text(text)
+    if not words or len(words) < min_tokens:
+        return None
+
+    # Минимум по каждой из хэш-функций (столбцы матрицы биграммы × хэши)
+    return tuple(map(min, zip(*_shingle_hashes(words))))
+
+
+def similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    """Оценка сходства Жаккара по сигнатурам"""
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_PERMUTATIONS
+
+
+def _similarity_bytes(a: bytes, b: bytes) -> float:
+    """similarity() для сигнатур в виде to_bytes()"""
+    return sum(1 for i in range(0, len(a), 4) if a[i:i + 4] == b[i:i + 4]) / NUM_PERMUTATIONS
+
+
+def to_bytes(signature: Tuple[int, ...]) -> bytes:
+    """Сигнатура → posts.minhash (BYTEA)"""
+    return struct.pack(_SIGNATURE_FORMAT, *signature)
+
+
+def from_bytes(value: bytes) -> Tuple[int, ...]:
+    """posts.minhash → сигнатура"""
+    return struct.unpack(_SIGNATURE_FORMAT, bytes(value))
+
+
+class MinHashIndex:
+    """
+    LSH индекс сигнатур одного пользователя
+
+    Память: сигнатура хранится как bytes (256 байт вместо ~2.3 КБ у кортежа
+    из 64 int), ключ полосы - hash() ее байт, корзина с одним постом - сам
+    post_id без списка (почти все корзины). Совпадения hash() проверяются
+    сравнением сигнатур.
+    """
+
+    def __init__(self, threshold: float = 0.7):
+        self.threshold = threshold
+        self._bands: List[Dict[int, Union[int, List[int]]]] = [{} for _ in range(LSH_BANDS)]
+        # post_id -> (сигнатура to_bytes, canonical_post_id)
+        self._entries: Dict[int, Tuple[bytes, Optional[int]]] = {}
+        # Min-heap (posted_at timestamp, post_id) для вытеснения по окну: посты
+        # добавляются не по порядку posted_at (загрузка канала, отложенные сообщения)
+        self._order: List[Tuple[float, int]] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _keys(self, packed: bytes):
+        width = LSH_ROWS * 4
+        for i, table in enumerate(self._bands):
+            yield table, hash(packed[i * width:(i + 1) * width])
+
+    @staticmethod
+    def _bucket(table: Dict[int, Union[int, List[int]]], key: int) -> Tuple[int, ...]:
+        bucket = table.get(key)
+        if bucket is None:
+            return ()
+        return (bucket,) if isinstance(bucket, int) else tuple(bucket)
+
+    def add(self, post_id: int, signature: Tuple[int, ...], canonical_id: Optional[int], posted_at_ts: float):
+        if post_id in self._entries:
+            return
+        packed = to_bytes(signature)
+        self._entries[post_id] = (packed, canonical_id)
+        heapq.heappush(self._order, (posted_at_ts, post_id))
+        for table, key in self._keys(packed):
+            bucket = table.get(key)
+            if bucket is None:
+                table[key] = post_id
+            elif isinstance(bucket, int):
+                table[key] = [bucket, post_id]
+            else:
+                bucket.append(post_id)
+
+    def find(self, signature: Tuple[int, ...], exclude_post_id: Optional[int] = None) -> Optional[int]:
+        """
+        Canonical пост для сигнатуры
+
+        Returns:
+            canonical_post_id самого похожего (при равенстве - более раннего)
+            поста или None
+        """
+        packed = to_bytes(signature)
+        checked = set()
+        best = None
+        for table, key in self._keys(packed):
+            for post_id in self._bucket(table, key):
+                if post_id in checked or post_id == exclude_post_id:
+                    continue
+                checked.add(post_id)
+                stored, canonical_id = self._entries[post_id]
+                score = _similarity_bytes(packed, stored)
+                if score >= self.threshold:
+                    candidate = (-score, post_id, canonical_id or post_id)
+                    if best is None or candidate < best:
+                        best = candidate
+        return best[2] if best else None
+
+    def evict(self, before_ts: float):
+        """Удалить посты старше before_ts (окно дедупликации)"""
+        while self._order and self._order[0][0] < before_ts:
+            _, post_id = heapq.heappop(self._order)
+            entry = self._entries.pop(post_id, None)
+            if entry is None:
+                continue
+            for table, key in self._keys(entry[0]):
+                bucket = table.get(key)
+                if bucket == post_id:
+                    del table[key]
+                elif isinstance(bucket, list):
+                    bucket.remove(post_id)
+                    if len(bucket) == 1:
+                        table[key] = bucket[0]
+
+
+class NearDuplicateDetector:
+    """Поиск почти-дубликатов при парсинге (индексы пользователей в памяти)"""
+
+    def __init__(
+        self,
+        threshold: Optional[float] = None,
+        window_days: Optional[int] = None,
+        min_tokens: Optional[int] = None
+    ):
+        self.enabled = os.getenv("NEAR_DUP_ENABLED", "true").lower() == "true"
+        self.threshold = threshold if threshold is not None else float(os.getenv("NEAR_DUP_THRESHOLD", "0.7"))
+        self.window = timedelta(days=window_days or int(os.getenv("NEAR_DUP_WINDOW_DAYS", "7")))
+        self.min_tokens = min_tokens if min_tokens is not None else int(os.getenv("NEAR_DUP_MIN_TOKENS", "10"))
+        self._indexes: Dict[int, MinHashIndex] = {}
+
+    def _load_index(self, db, user_id: int, exclude_post_id: Optional[int] = None) -> MinHashIndex:
+        """Индекс пользователя из posts.minhash за окно дедупликации"""
+        index = MinHashIndex(self.threshold)
+        since = datetime.now(timezone.utc) - self.window
+
+        rows = db.query(
+            Post.id, Post.minhash, Post.canonical_post_id, Post.posted_at, Post.text
+        ).filter(
+            Post.user_id == user_id,
+            Post.posted_at >= since,
+            Post.id != exclude_post_id
+        ).order_by(Post.posted_at, Post.id).all()
+
+        for post_id, stored, canonical_id, posted_at, text in rows:
+            # Посты до включения дедупликации - сигнатура по тексту
+            signature = from_bytes(stored) if stored is not None else minhash(text, self.min_tokens)
+            if signature is not None:
+                index.add(post_id, signature, canonical_id, _timestamp(posted_at))
+
+        logger.info(f"🧬 NearDuplicates: индекс user {user_id} загружен ({len(index)} постов)")
+        return index
+
+    def check(self, db, post: Post) -> Optional[int]:
+        """
+        Проверить новый пост (после flush - нужен post.id)
+
+        Заполняет post.minhash и post.canonical_post_id.
+
+        Returns:
+            canonical_post_id, если пост - почти-дубликат
+        """
+        if not self.enabled:
+            return None
+
+        signature = minhash(post.text, self.min_tokens)
+        if signature is None:
+            return None
+
+        index = self._indexes.get(post.user_id)
+        if index is None:
+            # Пост уже в сессии после flush - в загружаемый индекс не попадает
+            index = self._indexes[post.user_id] = self._load_index(db, post.user_id, exclude_post_id=post.id)
+        index.evict(_timestamp(datetime.now(timezone.utc) - self.window))
+
+        canonical_id = index.find(signature, exclude_post_id=post.id)
+        post.minhash = to_bytes(signature)
+        post.canonical_post_id = canonical_id
+        index.add(post.id, signature, canonical_id, _timestamp(post.posted_at))
+
+        if canonical_id is not None:
+            if posts_near_duplicate_total:
+                posts_near_duplicate_total.inc()
+            logger.info(f"🧬 NearDuplicates: пост {post.id} - почти-дубликат поста {canonical_id}")
+        return canonical_id
+
+    def forget_user(self, user_id: int):
+        """Сбросить индекс пользователя (перезагрузится из БД)"""
+        self._indexes.pop(user_id, None)
+
+
+def _timestamp(value: datetime) -> float:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+# Глобальный экземпляр
+near_duplicate_detector = NearDuplicateDetector()
@@ -85,6 +85,135 @@ Example:
         rag_query_errors_total.labels(error_type='qdrant_timeout').inc()
 """
 
+rag_digest_stage_duration_seconds = Histogram(
+    'rag_digest_stage_duration_seconds',
+    'AI digest generation latency by pipeline stage',
+    ['stage'],
+    buckets=[0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+)
+"""
+Latency этапов AI-дайджеста
+
+Labels:
+- stage: Этап (interests, embed, search, summarize, format, total)
+
+Example:
+    rag_digest_stage_duration_seconds.labels(stage='summarize').observe(12.3)
+"""
+
+rag_digest_tokens_saved = Histogram(
+    'rag_digest_tokens_saved',
+    'Prompt tokens saved per AI digest by cross-topic post deduplication',
+    buckets=[0, 100, 500, 1000, 2500, 5000, 10000]
+)
+"""
+Сэкономленные токены промптов на один AI-дайджест
+
+Пост, найденный в нескольких темах, отправляется в LLM только в теме
+с лучшим score (DIGEST_MAX_TOPICS_PER_POST).
+
+Example:
+    rag_digest_tokens_saved.observe(1200)
+"""
+
+rag_digest_generation_lead_seconds = Histogram(
+    'rag_digest_generation_lead_seconds',
+    'How long before the delivery slot a digest was pre-generated',
+    buckets=[0, 60, 300, 600, 1200, 1800, 3600, 7200]
+)
+"""
+Запас времени pre-generation: slot_at - время готовности дайджеста
+
+Example:
+    rag_digest_generation_lead_seconds.observe((slot_at - now).total_seconds())
+"""
+
+rag_digest_deliveries_total = Counter(
+    'rag_digest_deliveries_total',
+    'Scheduled digest deliveries',
+    ['source', 'on_time']
+)
+"""
+Доставки дайджестов
+
+Labels:
+- source: precomputed, topped_up, generated (в момент доставки), failed
+- on_time: true/false (доставлен в пределах DIGEST_ON_TIME_SECONDS от слота)
+
+On-time rate:
+    sum(rag_digest_deliveries_total{on_time="true"}) / sum(rag_digest_deliveries_total)
+"""
+
+telegram_outbound_messages_total = Counter(
+    'telegram_outbound_messages_total',
+    'Outbound Telegram Bot API messages by priority and result',
+    ['priority', 'status']
+)
+"""
+Исходящие сообщения через rag_service/telegram_sender.py
+
+Labels:
+- priority: notification, bulk
+- status: sent, retry (429/5xx/сеть, повтор поставлен в очередь), failed, duplicate (ключ уже доставлен)
+
+Example:
+    rate(telegram_outbound_messages_total{status="sent"}[1m])
+"""
+
+group_digest_cache_total = Counter(
+    'group_digest_cache_total',
+    'Group digest / mention analysis cache lookups by result',
+    ['kind', 'result']
+)
+"""
+Кеш результатов group_digest_cache.py
+
+Labels:
+- kind: digest, mention, window (резюме окна map-фазы)
+- result: hit, miss, coalesced (дождались такого же запроса в работе)
+
+Example:
+    sum(rate(group_digest_cache_total{result="hit"}[1h])) by (kind)
+"""
+
+gigachat_governor_rate = Gauge(
+    'gigachat_governor_rate',
+    'Current adaptive GigaChat request rate (requests per second)'
+)
+"""
+Текущая частота запросов к GigaChat (rag_service/gigachat_governor.py)
+
+AIMD: 429 → x0.5, медленный ответ → x0.8, успешный → +GIGACHAT_RATE_STEP.
+"""
+
+gigachat_governor_queue_wait_seconds = Histogram(
+    'gigachat_governor_queue_wait_seconds',
+    'Time spent waiting for a GigaChat slot by priority',
+    ['priority'],
+    buckets=[0.01, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300]
+)
+"""
+Ожидание слота GigaChat
+
+Labels:
+- priority: interactive, digest, background
+
+Example:
+    histogram_quantile(0.95, sum(rate(gigachat_governor_queue_wait_seconds_bucket{priority="interactive"}[5m])) by (le))
+"""
+
+gigachat_governor_throttle_events_total = Counter(
+    'gigachat_governor_throttle_events_total',
+    'GigaChat rate decreases by reason',
+    ['reason']
+)
+"""
+Снижения частоты GigaChat
+
+Labels:
+- reason: 429 (Rate Limit), latency (ответ дольше GIGACHAT_LATENCY_TARGET)
+"""
+
 # ============================================================================
 # Parsing Metrics
 # ============================================================================
@@ -119,6 +248,44 @@ Example:
     posts_parsed_total.labels(user_id=str(user_id)).inc(5)  # Добавлено 5 постов
 """
 
+link_enrichment_queue_size = Gauge(
+    'link_enrichment_queue_size',
+    'Posts waiting for link enrichment (Crawl4AI)'
+)
+"""
+Очередь обогащения постов контентом ссылок (link_enrichment.py)
+"""
+
+link_enrichment_cache_total = Counter(
+    'link_enrichment_cache_total',
+    'Link content lookups by result',
+    ['result']
+)
+"""
+Кеш контента ссылок по нормализованному URL
+
+Labels:
+- result: hit, negative (кешированная неудача/пустая страница), miss (запрос
+  к Crawl4AI), coalesced (ожидание такого же URL в работе), deferred (очередь
+  переполнена, пост обработается позже из pending)
+
+Example PromQL:
+    sum(rate(link_enrichment_cache_total{result=~"hit|negative|coalesced"}[1h]))
+      / sum(rate(link_enrichment_cache_total{result!="deferred"}[1h]))
+"""
+
+posts_near_duplicate_total = Counter(
+    'posts_near_duplicate_total',
+    'Parsed posts detected as near-duplicates (MinHash)'
+)
+"""
+Почти-дубликаты при парсинге (near_duplicates.py): теги и embedding
+берутся у canonical поста без запросов к GigaChat
+
+Доля дубликатов:
+    rate(posts_near_duplicate_total[1d]) / sum(rate(bot_posts_parsed_total[1d]))
+"""
+
 # ============================================================================
 # Helper Functions
 # ============================================================================
@@ -2,12 +2,13 @@ import asyncio
 import schedule
 import time
 import os
-import re
 from datetime import datetime, timezone, timedelta
 from database import SessionLocal
 from models import Channel, Post, User
 from auth import get_authenticated_users, cleanup_inactive_clients
 from shared_auth_manager import shared_auth_manager
+from link_enrichment import LinkEnrichmentWorker, extract_urls
+from near_duplicates import near_duplicate_detector
 from telethon.errors import FloodWaitError
 import logging
 from typing import List
@@ -37,6 +38,8 @@ class ParserService:
     def __init__(self):
         self.is_running = False
         self.new_post_ids = []  # Список ID новых постов для тегирования
+        # Обогащение контентом ссылок - фоновые воркеры, парсер только ставит в очередь
+        self.link_enrichment = LinkEnrichmentWorker(on_enriched=self._notify_rag_service)
     
     async def initialize(self):
         """Инициализация сервиса парсинга"""
@@ -137,6 +140,9 @@ class ParserService:
         if parsing_queue_size:
             parsing_queue_size.inc()
         
+        # После rollback атрибуты user истекают - id нужен в обработчике ошибки
+        user_id = user.id
+        
         try:
             # Получаем информацию о подписке пользователя
             subscription = channel.get_user_subscription(db, user)
@@ -153,6 +159,7 @@ class ParserService:
             
             # Получаем новые сообщения
             posts_added = 0
+            posts_to_enrich = []
             async for message in client.iter_messages(
                 f"@{channel.channel_username}",
                 limit=50,  # Ограничиваем количество для производительности
@@ -198,17 +205,25 @@ class ParserService:
                         self.new_post_ids.append(new_post.id)  # Добавляем ID для тегирования
                         posts_added += 1
                         
-                        # Обогащаем пост контентом ссылок (если включено)
-                        await self._enrich_post_with_links(new_post, db)
+                        # Почти-дубликат (репост/кросспост) берет теги, embedding и контент
+                        # ссылок у canonical поста - обогащать его и добавлять в граф не нужно
+                        canonical_post_id = near_duplicate_detector.check(db, new_post)
+                        if canonical_post_id is None:
+                            posts_to_enrich.append((new_post.id, new_post.text))
                         
                         # Neo4j: индексировать пост в Knowledge Graph (фоновая задача)
-                        if neo4j_client and neo4j_client.enabled:
+                        if canonical_post_id is None and neo4j_client and neo4j_client.enabled:
                             asyncio.create_task(self._index_post_in_graph(new_post, user, channel))
             
             # Обновляем время последнего парсинга для этого пользователя
             channel.update_user_subscription(db, user, last_parsed_at=datetime.now(timezone.utc))
             db.commit()
             
+            # Обогащение контентом ссылок (если включено) - после commit,
+            # воркер читает пост своей сессией
+            for post_id, text in posts_to_enrich:
+                self.link_enrichment.enqueue(post_id, text)
+            
             # Prometheus metrics: track posts parsed
             if posts_parsed_total and posts_added > 0:
                 posts_parsed_total.labels(user_id=str(user.id)).inc(posts_added)
@@ -217,6 +232,9 @@ class ParserService:
             
         except Exception as e:
             db.rollback()
+            # Индекс почти-дубликатов уже содержит откаченные посты - перезагрузить из БД,
+            # иначе при повторном парсинге посты совпадут со своими несуществующими копиями
+            near_duplicate_detector.forget_user(user_id)
             raise e
         finally:
             # Prometheus metrics: decrement queue size
@@ -348,13 +366,7 @@ class ParserService:
         Returns:
             Список найденных URL
         """
-        if not text:
-            return []
-        
-        # Regex для поиска URL
-        url_pattern = r'https?://[^\s<>"{}|\\^`\[\]]+'
-        urls = re.findall(url_pattern, text)
-        return urls
+        return extract_urls(text)
     
     async def _index_post_in_graph(self, post: Post, user: User, channel: Channel):
         """
@@ -396,78 +408,6 @@ class ParserService:
         except Exception as e:
             logger.error(f"❌ Failed to index post {post.id} in Neo4j: {e}")
     
-    async def _enrich_post_with_links(self, post: Post, db: SessionLocal):
-        """
-        Обогащение поста контентом из ссылок через Crawl4AI
-        
-        Args:
-            post: Объект Post
-            db: Сессия базы данных
-        """
-        crawl4ai_enabled = os.getenv("CRAWL4AI_ENABLED", "false").lower() == "true"
-        
-        if not crawl4ai_enabled:
-            return
-        
-        urls = self._extract_urls(post.text)
-        if not urls:
-            return
-        
-        # Берем первую ссылку для обогащения
-        url = urls[0]
-        crawl4ai_url = os.getenv("CRAWL4AI_URL", "http://crawl4ai:11235")
-        word_threshold = int(os.getenv("CRAWL4AI_WORD_THRESHOLD", "100"))
-        timeout = float(os.getenv("CRAWL4AI_TIMEOUT", "30"))
-        
-        try:
-            import httpx
-            
-            async with httpx.AsyncClient(timeout=timeout) as client:
-                # Правильный формат API: urls как массив
-                response = await client.post(
-                    f"{crawl4ai_url}/crawl",
-                    json={
-                        "urls": [url]  # Массив URL, не одна строка!
-                    }
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    
-                    # Проверяем успешность и наличие результатов
-                    if result.get("success") and result.get("results"):
-                        first_result = result["results"][0]
-                        
-                        # markdown - это словарь с разными форматами
-                        markdown_data = first_result.get("markdown", {})
-                        
-                        # Используем raw_markdown для извлечения текста
-                        content = ""
-                        if isinstance(markdown_data, dict):
-                            content = markdown_data.get("raw_markdown", "")
-                        elif isinstance(markdown_data, str):
-                            content = markdown_data
-                        
-                        # Проверяем минимальную длину контента
-                        if content and len(content) >= word_threshold:
-                            # Добавляем обогащенный контент к посту (ограничиваем 3000 символов)
-                            post.enriched_content = f"{post.text}\n\n[Содержимое ссылки: {url}]\n{content[:3000]}"
-                            db.commit()
-                            logger.info(f"✅ ParserService: Пост {post.id} обогащен контентом ссылки {url} ({len(content)} символов)")
-                        else:
-                            logger.debug(f"ParserService: Ссылка {url} не содержит достаточно контента ({len(content)} символов < {word_threshold})")
-                    else:
-                        logger.warning(f"⚠️ ParserService: Crawl4AI не вернул результаты для {url}")
-                else:
-                    logger.warning(f"⚠️ ParserService: Crawl4AI вернул статус {response.status_code} для {url}")
-                    
-        except httpx.TimeoutException:
-            logger.warning(f"⏳ ParserService: Timeout при извлечении контента из {url}")
-        except httpx.ConnectError:
-            logger.warning(f"🔌 ParserService: Crawl4AI недоступен")
-        except Exception as e:
-            logger.error(f"❌ ParserService: Ошибка обогащения поста {post.id}: {e}")
-    
     async def _notify_rag_service(self, post_ids: List[int]):
         """
         Уведомление RAG-сервиса о новых постах для индексации
@@ -544,7 +484,8 @@ class ParserService:
                                 user_id=post.user_id,
                                 post_id=post_id,
                                 status="pending",
-                                error="RAG service unavailable during parsing"
+                                error="RAG service unavailable during parsing",
+                                posted_at=post.posted_at
                             )
                             db.add(status)
                 
@@ -2,10 +2,12 @@
 AI-генератор дайджестов с использованием GigaChat
 Анализирует интересы пользователя и создает краткие саммари по темам
 """
+import asyncio
 import logging
 import sys
 import os
-from typing import List, Dict, Any, Optional
+import time
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
 from collections import Counter
 import httpx
@@ -17,8 +19,18 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from database import SessionLocal
 from models import Post, Channel, RAGQueryHistory, DigestSettings
 from search import search_service
+from embeddings import embeddings_service
+from context_packer import context_budget, context_packer
+from rate_limiter import PRIORITY_DIGEST, gigachat_slot
 import config
 
+# Observability
+try:
+    from observability.metrics import rag_digest_stage_duration_seconds, rag_digest_tokens_saved
+except ImportError:
+    rag_digest_stage_duration_seconds = None
+    rag_digest_tokens_saved = None
+
 logger = logging.getLogger(__name__)
 
 
@@ -55,6 +67,9 @@ class AIDigestGenerator:
         Returns:
             Markdown-дайджест с AI-саммари по темам
         """
+        timings: Dict[str, float] = {}
+        total_start = stage_start = time.perf_counter()
+        
         try:
             logger.info(f"🤖 AI-дайджест для user {user_id}: {date_from.date()} - {date_to.date()}")
             
@@ -66,45 +81,69 @@ class AIDigestGenerator:
                 # Fallback: анализ по популярным тегам
                 topics = await self._get_popular_topics(user_id, date_from, date_to)
             
-            logger.info(f"📋 Выбранные темы ({len(topics)}): {', '.join(topics[:topics_limit])}")
+            selected_topics = topics[:topics_limit]
+            logger.info(f"📋 Выбранные темы ({len(topics)}): {', '.join(selected_topics)}")
+            timings["interests"] = time.perf_counter() - stage_start
             
-            # 2. Для каждой темы: Sequential обработка с rate limiting
-            # Rate limiter и retry уже встроены в embeddings.generate_embedding()
-            topic_summaries = []
-            import asyncio
+            # 2. Embeddings всех тем - одним batch запросом
+            stage_start = time.perf_counter()
+            topic_vectors = await self._embed_topics(selected_topics)
+            timings["embed"] = time.perf_counter() - stage_start
             
-            for i, topic in enumerate(topics[:topics_limit]):
-                logger.info(f"🔍 Обработка темы {i+1}/{topics_limit}: {topic}")
-                
-                try:
-                    # Rate limiter уже внутри _search_posts_for_topic
-                    # через embeddings.generate_embedding()
-                    posts = await self._search_posts_for_topic(
-                        user_id, topic, date_from, date_to
-                    )
-                    
-                    if posts:
-                        # Суммаризация через GigaChat
-                        summary = await self._summarize_topic(
-                            topic, posts, summary_style
-                        )
-                        topic_summaries.append(summary)
+            # 3. Поиск по всем темам одним multi-query шагом
+            stage_start = time.perf_counter()
+            topic_posts = await self._search_posts_for_topics(
+                user_id, selected_topics, topic_vectors, date_from, date_to
+            )
+            
+            # Пост уходит в LLM только в темах с лучшим score
+            topic_posts, tokens_saved = self._assign_posts_to_topics(
+                topic_posts, config.DIGEST_MAX_TOPICS_PER_POST
+            )
+            logger.info(f"✂️ Дедупликация постов между темами: -{tokens_saved} токенов промптов")
+            if rag_digest_tokens_saved:
+                rag_digest_tokens_saved.observe(tokens_saved)
+            timings["search"] = time.perf_counter() - stage_start
+            
+            # 4. Саммари с ограничением конкурентности
+            # (каждый вызов GigaChat дополнительно проходит общий gigachat_slot)
+            stage_start = time.perf_counter()
+            semaphore = asyncio.Semaphore(max(1, config.DIGEST_SUMMARY_CONCURRENCY))
+            
+            async def summarize(topic: str, posts: List[Dict]) -> Optional[Dict[str, Any]]:
+                if not posts:
+                    return None
+                async with semaphore:
+                    try:
+                        summary = await self._summarize_topic(topic, posts, summary_style)
                         logger.info(f"✅ Тема '{topic}': {len(posts)} постов")
-                    
-                except Exception as e:
-                    logger.warning(f"⚠️ Тема '{topic}' пропущена: {e}")
-                    continue
-                
-                # Небольшая пауза между темами (на всякий случай)
-                if i < len(topics) - 1:
-                    await asyncio.sleep(0.3)
+                        return summary
+                    except Exception as e:
+                        logger.warning(f"⚠️ Тема '{topic}' пропущена: {e}")
+                        return None
+            
+            summaries = await asyncio.gather(*[
+                summarize(topic, posts)
+                for topic, posts in zip(selected_topics, topic_posts)
+            ])
+            timings["summarize"] = time.perf_counter() - stage_start
+            
+            # gather сохраняет порядок - темы идут в исходном приоритете
+            topic_summaries = [summary for summary in summaries if summary]
             
             if not topic_summaries:
+                timings["total"] = time.perf_counter() - total_start
+                self._record_stage_timings(user_id, timings)
                 logger.warning(f"⚠️ AI-дайджест пустой для user {user_id}, генерируем fallback")
                 return await self._generate_fallback_digest(user_id, date_from, date_to)
             
-            # 3. Форматирование финального дайджеста
+            # 5. Форматирование финального дайджеста
+            stage_start = time.perf_counter()
             digest = self._format_ai_digest(topic_summaries, date_from, date_to)
+            timings["format"] = time.perf_counter() - stage_start
+            
+            timings["total"] = time.perf_counter() - total_start
+            self._record_stage_timings(user_id, timings)
             
             logger.info(f"✅ AI-дайджест сгенерирован: {len(topic_summaries)} тем")
             
@@ -313,16 +352,151 @@ class AIDigestGenerator:
         finally:
             db.close()
     
+    async def _embed_topics(self, topics: List[str]) -> List[Optional[List[float]]]:
+        """
+        Embeddings всех тем одним batch запросом
+        
+        Returns:
+            Векторы в порядке topics (None - search сгенерирует сам)
+        """
+        if not topics:
+            return []
+        
+        try:
+            results = await self.search_service.embeddings.generate_embeddings_batch(topics)
+            return [result[0] if result else None for result in results]
+        except Exception as e:
+            logger.warning(f"⚠️ Batch embeddings тем недоступен: {e}")
+            return [None] * len(topics)
+    
+    async def _search_posts_for_topics(
+        self,
+        user_id: int,
+        topics: List[str],
+        topic_vectors: List[Optional[List[float]]],
+        date_from: datetime,
+        date_to: datetime
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Найти посты для всех тем: batch поиск в Qdrant + одно обогащение из БД
+        
+        Если batch поиск недоступен - параллельный поиск по каждой теме.
+        
+        Returns:
+            Списки постов в порядке topics
+        """
+        try:
+            return await self.search_service.search_multi(
+                queries=topics,
+                user_id=user_id,
+                limit=config.DIGEST_POSTS_PER_TOPIC,
+                date_from=date_from,
+                date_to=date_to,
+                query_vectors=topic_vectors
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Multi-поиск недоступен, ищем по темам отдельно: {e}")
+        
+        return await asyncio.gather(*[
+            self._search_posts_for_topic(user_id, topic, date_from, date_to, query_vector=vector)
+            for topic, vector in zip(topics, topic_vectors)
+        ])
+    
+    def _assign_posts_to_topics(
+        self,
+        topic_posts: List[List[Dict[str, Any]]],
+        max_topics_per_post: int = 1
+    ) -> Tuple[List[List[Dict[str, Any]]], int]:
+        """
+        Распределить посты между темами
+        
+        Один и тот же пост часто находится по нескольким темам - без
+        распределения он попадает в несколько промптов. Пост остается только
+        в max_topics_per_post темах с наибольшим score; внутри темы чанки
+        одного поста схлопываются в лучший.
+        
+        Args:
+            topic_posts: Результаты поиска по темам
+            max_topics_per_post: В скольких темах может остаться пост (0 - без ограничения)
+            
+        Returns:
+            (посты по темам, оценка сэкономленных токенов промптов)
+        """
+        # Лучший чанк каждого поста внутри темы
+        deduped = []
+        for posts in topic_posts:
+            position: Dict[Any, int] = {}
+            ordered = []
+            for post in posts:
+                post_id = post.get('post_id')
+                if post_id is None:
+                    ordered.append(post)
+                elif post_id not in position:
+                    position[post_id] = len(ordered)
+                    ordered.append(post)
+                elif post.get('score', 0) > ordered[position[post_id]].get('score', 0):
+                    ordered[position[post_id]] = post
+            deduped.append(ordered)
+        
+        if max_topics_per_post <= 0:
+            return deduped, 0
+        
+        # Темы, где пост набрал лучший score
+        candidates: Dict[Any, List[Tuple[float, int]]] = {}
+        for topic_index, posts in enumerate(deduped):
+            for post in posts:
+                if post.get('post_id') is not None:
+                    candidates.setdefault(post['post_id'], []).append((post.get('score', 0), topic_index))
+        
+        allowed = {
+            post_id: {topic_index for _, topic_index in sorted(scores, key=lambda x: (-x[0], x[1]))[:max_topics_per_post]}
+            for post_id, scores in candidates.items()
+        }
+        
+        assigned = []
+        tokens_saved = 0
+        for topic_index, posts in enumerate(deduped):
+            kept = []
+            for post in posts:
+                post_id = post.get('post_id')
+                if post_id is None or topic_index in allowed[post_id]:
+                    kept.append(post)
+                else:
+                    # Оценка по фрагменту, который попал бы в промпт (_summarize_topic)
+                    tokens_saved += min(
+                        embeddings_service.count_tokens(post.get('text', '')),
+                        config.DIGEST_MAX_PASSAGE_TOKENS
+                    )
+            assigned.append(kept)
+        
+        return assigned, tokens_saved
+    
+    def _record_stage_timings(self, user_id: int, timings: Dict[str, float]):
+        """Залогировать и отправить в Prometheus длительности этапов дайджеста"""
+        if not timings:
+            return
+        
+        breakdown = ", ".join(f"{stage}={duration:.2f}s" for stage, duration in timings.items())
+        logger.info(f"⏱️ AI-дайджест user {user_id}: {breakdown}")
+        
+        if rag_digest_stage_duration_seconds:
+            for stage, duration in timings.items():
+                rag_digest_stage_duration_seconds.labels(stage=stage).observe(duration)
+    
     async def _search_posts_for_topic(
         self,
         user_id: int,
         topic: str,
         date_from: datetime,
-        date_to: datetime
+        date_to: datetime,
+        query_vector: Optional[List[float]] = None
     ) -> List[Dict[str, Any]]:
         """
         Найти релевантные посты для темы через RAG векторный поиск
         
+        Args:
+            query_vector: Готовый embedding темы (None - сгенерировать в search)
+        
         Returns:
             Список постов (топ-10-15 релевантных)
         """
@@ -333,7 +507,8 @@ class AIDigestGenerator:
                 user_id=user_id,
                 limit=config.DIGEST_POSTS_PER_TOPIC,
                 date_from=date_from,
-                date_to=date_to
+                date_to=date_to,
+                query_vector=query_vector
             )
             
             # search() возвращает список напрямую, не dict
@@ -343,6 +518,18 @@ class AIDigestGenerator:
             logger.error(f"❌ Ошибка поиска постов для темы '{topic}': {e}")
             return []
     
+    @staticmethod
+    def _format_post(index: int, post: Dict[str, Any]) -> str:
+        """Пост в промпте саммари темы"""
+        channel = post.get('channel_username', '')
+        date_str = post.get('posted_at', '')
+        if isinstance(date_str, str):
+            date_str = date_str[:10]  # Только дата
+        elif hasattr(date_str, 'strftime'):
+            date_str = date_str.strftime('%Y-%m-%d')
+        
+        return f"{index}. [@{channel}, {date_str}]: {post.get('text', '')}"
+    
     async def _summarize_topic(
         self,
         topic: str,
@@ -366,24 +553,26 @@ class AIDigestGenerator:
             }
         """
         try:
-            # Подготовка контекста из постов
-            contexts = []
-            for i, post in enumerate(posts[:15], 1):  # Максимум 15 постов
-                text = post.get('text', '')
-                # Для малого количества постов берем весь текст, иначе 700 символов
-                if len(posts) <= 3:
-                    text = text[:1000]  # Весь пост или до 1000 символов
-                else:
-                    text = text[:700]  # Первые 700 символов
-                
-                channel = post.get('channel_username', '')
-                date_str = post.get('posted_at', '')
-                if isinstance(date_str, str):
-                    date_str = date_str[:10]  # Только дата
-                elif hasattr(date_str, 'strftime'):
-                    date_str = date_str.strftime('%Y-%m-%d')
-                
-                contexts.append(f"{i}. [@{channel}, {date_str}]: {text}")
+            # Подготовка контекста из постов (максимум 15 постов)
+            if config.CONTEXT_PACKING_ENABLED:
+                # Без почти-повторов, посты обрезаются по токенам в бюджет темы
+                packed = context_packer.pack(
+                    posts[:15],
+                    budget_tokens=context_budget(config.DIGEST_TOPIC_CONTEXT_TOKENS, self.gigachat_model),
+                    max_passage_tokens=config.DIGEST_MAX_PASSAGE_TOKENS,
+                    formatter=self._format_post
+                )
+                contexts = [self._format_post(i, post) for i, post in enumerate(packed, 1)]
+            else:
+                contexts = []
+                for i, post in enumerate(posts[:15], 1):
+                    text = post.get('text', '')
+                    # Для малого количества постов берем весь текст, иначе 700 символов
+                    if len(posts) <= 3:
+                        text = text[:1000]  # Весь пост или до 1000 символов
+                    else:
+                        text = text[:700]  # Первые 700 символов
+                    contexts.append(self._format_post(i, dict(post, text=text)))
             
             context_block = "\n\n".join(contexts)
             
@@ -463,7 +652,8 @@ class AIDigestGenerator:
             temperature = config.DIGEST_AI_TEMPERATURE
         
         try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
+            # Общий слот GigaChat: конкурентность + rate limit (как у embeddings)
+            async with gigachat_slot(PRIORITY_DIGEST) as lease, httpx.AsyncClient(timeout=60.0) as client:
                 payload = {
                     "model": self.gigachat_model,
                     "messages": [
@@ -477,6 +667,7 @@ class AIDigestGenerator:
                     self.gigachat_url,
                     json=payload
                 )
+                lease.observe(response)
                 
                 if response.status_code == 200:
                     data = response.json()
@@ -570,17 +761,18 @@ class AIDigestGenerator:
         from database import SessionLocal
         from models import Post
         from collections import defaultdict
+        from digest_generator import collapse_near_duplicates
         
         logger.info(f"📰 Fallback: обычный дайджест для user {user_id}")
         
         db = SessionLocal()
         try:
-            # Получаем посты за период (топ-20 по views)
-            posts = db.query(Post).filter(
+            # Получаем посты за период (топ-20 по views, почти-дубликаты - один раз)
+            posts = collapse_near_duplicates(db.query(Post).filter(
                 Post.user_id == user_id,
                 Post.posted_at >= date_from,
                 Post.posted_at <= date_to
-            ).order_by(Post.views.desc().nullslast(), Post.posted_at.desc()).limit(20).all()
+            )).order_by(Post.views.desc().nullslast(), Post.posted_at.desc()).limit(20).all()
             
             if not posts:
                 return self._generate_empty_digest(date_from, date_to)
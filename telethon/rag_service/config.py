@@ -35,6 +35,8 @@ QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", "60"))
 # Основной провайдер: gpt2giga (GigaChat)
 GIGACHAT_PROXY_URL = os.getenv("GIGACHAT_PROXY_URL", "http://gpt2giga-proxy:8090")
 GIGACHAT_ENABLED = os.getenv("GIGACHAT_ENABLED", "true").lower() == "true"
+# Одновременных запросов к GigaChat (embeddings + completions, по тарифу)
+GIGACHAT_MAX_CONCURRENCY = int(os.getenv("GIGACHAT_MAX_CONCURRENCY", "1"))
 
 # Fallback провайдер: sentence-transformers
 EMBEDDING_MODEL = os.getenv(
@@ -67,6 +69,56 @@ RAG_MIN_SCORE = float(os.getenv("RAG_MIN_SCORE", "0.5"))  # Понижено с
 RAG_CONTEXT_WINDOW = int(os.getenv("RAG_CONTEXT_WINDOW", "4000"))
 RAG_TEMPERATURE = float(os.getenv("RAG_TEMPERATURE", "0.3"))
 
+# Гибридный поиск: sparse (BM25) + dense векторы, слияние RRF в Qdrant
+# false - только dense (как раньше); коллекции без sparse векторов ищутся dense
+SPARSE_SEARCH_ENABLED = os.getenv("SPARSE_SEARCH_ENABLED", "true").lower() == "true"
+SPARSE_VECTOR_NAME = os.getenv("SPARSE_VECTOR_NAME", "text")
+HYBRID_PREFETCH_LIMIT = int(os.getenv("HYBRID_PREFETCH_LIMIT", "50"))  # Кандидатов от каждого retriever
+SPARSE_AVG_DOC_TOKENS = int(os.getenv("SPARSE_AVG_DOC_TOKENS", "150"))  # avgdl для BM25 нормализации длины
+
+# Индексация страниц по ссылкам (Post.enriched_content, Crawl4AI) отдельными chunks
+# с payload source=link; их score в поиске умножается на LINK_CHUNK_SCORE_WEIGHT
+INDEX_ENRICHED_CONTENT = os.getenv("INDEX_ENRICHED_CONTENT", "true").lower() == "true"
+LINK_CHUNK_SCORE_WEIGHT = float(os.getenv("LINK_CHUNK_SCORE_WEIGHT", "0.85"))
+
+# Cross-encoder rerank кандидатов перед генерацией ответа (reranker.py):
+# поиск возвращает RERANK_CANDIDATES, в промпт идут лучшие RERANK_TOP_K.
+# Модель - ONNX int8 на CPU (onnxruntime + tokenizers, опционально)
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+RERANK_ONNX_FILE = os.getenv("RERANK_ONNX_FILE", "onnx/model_quint8_avx2.onnx")
+RERANK_MODEL_PATH = os.getenv("RERANK_MODEL_PATH")  # Локальная папка с tokenizer.json и ONNX файлом
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "30"))
+RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "5"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", "256"))  # Токенов на пару (вопрос, текст)
+RERANK_TIMEOUT_MS = int(os.getenv("RERANK_TIMEOUT_MS", "300"))  # Бюджет, иначе порядок поиска
+RERANK_THREADS = int(os.getenv("RERANK_THREADS", "2"))
+
+# Упаковка контекста промптов (context_packer.py): склейка соседних chunks,
+# MMR без почти-повторов, бюджет токенов (RAG - RAG_CONTEXT_WINDOW)
+CONTEXT_PACKING_ENABLED = os.getenv("CONTEXT_PACKING_ENABLED", "true").lower() == "true"
+RAG_MAX_PASSAGE_TOKENS = int(os.getenv("RAG_MAX_PASSAGE_TOKENS", "800"))  # Токенов на один фрагмент
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))  # 1.0 - только релевантность
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))  # Сходство почти-повтора
+# Бюджеты для отдельных моделей: "GigaChat=3000,google/gemini-2.0-flash-exp:free=8000"
+CONTEXT_TOKEN_BUDGETS = {
+    model.strip(): int(tokens)
+    for model, _, tokens in (
+        item.rpartition("=") for item in os.getenv("CONTEXT_TOKEN_BUDGETS", "").split(",") if "=" in item
+    )
+}
+
+# Вектор интересов для /rag/recommend (interest_vectors.py): центроид embeddings
+# запросов и векторов постов, с которыми работал пользователь, с затуханием
+INTEREST_VECTORS_REDIS = os.getenv("INTEREST_VECTORS_REDIS", "true").lower() == "true"
+INTEREST_HALF_LIFE_DAYS = float(os.getenv("INTEREST_HALF_LIFE_DAYS", "14"))  # Вес сигнала падает вдвое
+INTEREST_TTL_DAYS = int(os.getenv("INTEREST_TTL_DAYS", "90"))  # Без сигналов - вектор удаляется
+INTEREST_QUERY_WEIGHT = float(os.getenv("INTEREST_QUERY_WEIGHT", "1.0"))  # Вес запроса
+INTEREST_POST_WEIGHT = float(os.getenv("INTEREST_POST_WEIGHT", "2.0"))  # Вес поста (похожие посты)
+INTEREST_MIN_WEIGHT = float(os.getenv("INTEREST_MIN_WEIGHT", "0.25"))  # Меньше - интересы устарели
+RECOMMEND_MIN_SCORE = float(os.getenv("RECOMMEND_MIN_SCORE", "0.4"))  # Cosine поста с вектором интересов
+
 # ============================================================================
 # Digest Settings
 # ============================================================================
@@ -74,6 +126,15 @@ DIGEST_DEFAULT_TIME = os.getenv("DIGEST_DEFAULT_TIME", "09:00")
 DIGEST_MAX_POSTS = int(os.getenv("DIGEST_MAX_POSTS", "200"))  # Увеличено для активных пользователей
 DIGEST_SUMMARY_LENGTH = os.getenv("DIGEST_SUMMARY_LENGTH", "short")  # short, medium, detailed
 
+# Pre-generation: дайджест генерируется в окне до слота доставки (0 - отключено)
+DIGEST_PREGEN_WINDOW_MINUTES = int(os.getenv("DIGEST_PREGEN_WINDOW_MINUTES", "60"))
+DIGEST_PREGEN_MARGIN_MINUTES = int(os.getenv("DIGEST_PREGEN_MARGIN_MINUTES", "5"))  # Запас до слота
+DIGEST_GENERATION_TIMEOUT = int(os.getenv("DIGEST_GENERATION_TIMEOUT", "300"))  # Генерация в момент доставки
+DIGEST_TOPUP_TIMEOUT = int(os.getenv("DIGEST_TOPUP_TIMEOUT", "30"))  # Дополнение новыми постами
+# AI top-up через LLM только от N новых постов; меньше - список постов без LLM
+DIGEST_TOPUP_MIN_POSTS = int(os.getenv("DIGEST_TOPUP_MIN_POSTS", "10"))
+DIGEST_ON_TIME_SECONDS = int(os.getenv("DIGEST_ON_TIME_SECONDS", "60"))  # Доставка "вовремя"
+
 # ============================================================================
 # AI Digest Settings
 # ============================================================================
@@ -82,12 +143,19 @@ GIGACHAT_MODEL = os.getenv("GIGACHAT_MODEL", "GigaChat")  # GigaChat или Giga
 DIGEST_AI_TEMPERATURE = float(os.getenv("DIGEST_AI_TEMPERATURE", "0.3"))
 DIGEST_POSTS_PER_TOPIC = int(os.getenv("DIGEST_POSTS_PER_TOPIC", "10"))  # Постов для анализа на тему
 QUERY_HISTORY_DAYS = int(os.getenv("QUERY_HISTORY_DAYS", "30"))  # Анализ запросов за N дней
+DIGEST_SUMMARY_CONCURRENCY = int(os.getenv("DIGEST_SUMMARY_CONCURRENCY", "3"))  # Параллельных саммари тем
+DIGEST_MAX_TOPICS_PER_POST = int(os.getenv("DIGEST_MAX_TOPICS_PER_POST", "1"))  # В скольких темах может быть пост
+DIGEST_TOPIC_CONTEXT_TOKENS = int(os.getenv("DIGEST_TOPIC_CONTEXT_TOKENS", "2500"))  # Бюджет постов в промпте темы
+DIGEST_MAX_PASSAGE_TOKENS = int(os.getenv("DIGEST_MAX_PASSAGE_TOKENS", "300"))  # Токенов на один пост
 
 # ============================================================================
 # Service Settings
 # ============================================================================
 RAG_SERVICE_ENABLED = os.getenv("RAG_SERVICE_ENABLED", "true").lower() == "true"
 
+# TTL кэша статистики (/rag/stats), секунды. ?fresh=1 обходит кэш
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "30"))
+
 # Timezone
 TZ = os.getenv("TZ", "Europe/Moscow")
 
@@ -0,0 +1,222 @@
+"""
+Context Packer
+Упаковка найденных фрагментов в промпт LLM с бюджетом токенов
+
+Генераторы вставляли в промпт целые тексты всех найденных chunks:
+соседние chunks одного поста повторяли друг друга (overlap), одна
+новость из нескольких каналов занимала место несколько раз, размер
+промпта не контролировался, а в дайджесте посты резались по символам.
+Packer:
+- склеивает соседние chunks одного поста (одной страницы по ссылке) в
+  один фрагмент по start_pos/end_pos, overlap не повторяется
+- выбирает фрагменты по MMR (Maximal Marginal Relevance): релевантность
+  (позиция в выдаче) минус сходство с уже выбранными; сходство -
+  косинус векторов слов (sparse_encoder.tokenize, 1 + log tf), фрагменты со
+  сходством >= CONTEXT_DEDUP_THRESHOLD отбрасываются
+- заполняет бюджет токенов (tiktoken cl100k_base, как при chunking) с
+  учетом заголовков источников; фрагмент длиннее max_passage_tokens или
+  остатка бюджета обрезается по границе предложения
+"""
+import logging
+import math
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import config
+from embeddings import EmbeddingsService, embeddings_service
+from sparse_encoder import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Меньше - фрагмент не добавляется (обрывок без смысла)
+MIN_PASSAGE_TOKENS = 32
+TRUNCATION_MARK = " …"
+
+Formatter = Callable[[int, Dict[str, Any]], str]
+
+
+def context_budget(default: int, *models: str) -> int:
+    """Бюджет контекста для промпта, который может уйти любой из models (CONTEXT_TOKEN_BUDGETS)"""
+    return min([config.CONTEXT_TOKEN_BUDGETS.get(model, default) for model in models if model] or [default])
+
+
+def _chunk_position(result: Dict[str, Any]) -> Tuple[int, int]:
+    info = result.get("chunk_info") or {}
+    return info.get("chunk_index", 0), info.get("start_pos") or 0
+
+
+def merge_adjacent_chunks(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Склеить соседние chunks одного источника
+
+    Chunks - точные срезы текста (start_pos/end_pos), соседние chunks
+    перекрываются на overlap: перекрытие берется один раз. Несмежные
+    chunks поста остаются отдельными фрагментами.
+
+    Returns:
+        Фрагменты в порядке лучшего chunk'а (поля лучшего chunk'а,
+        склеенный text, merged_chunks - сколько chunks вошло)
+    """
+    groups: Dict[Any, List[Tuple[int, Dict[str, Any]]]] = {}
+    for rank, result in enumerate(results):
+        if result.get("post_id") is None:
+            key = ("rank", rank)
+        else:
+            key = (result["post_id"], result.get("source", "post"), result.get("source_url"))
+        groups.setdefault(key, []).append((rank, result))
+
+    passages = []
+    for chunks in groups.values():
+        chunks.sort(key=lambda item: _chunk_position(item[1]))
+        run = None
+        for rank, result in chunks:
+            index, start = _chunk_position(result)
+            end = (result.get("chunk_info") or {}).get("end_pos")
+            text = result.get("text") or ""
+
+            adjacent = run is not None and (
+                index == run["last_index"] + 1
+                or (run["end"] is not None and start <= run["end"])
+            )
+            if not adjacent:
+                run = {"rank": rank, "best": result, "text": text, "start": start,
+                       "end": end, "last_index": index, "count": 1}
+                passages.append(run)
+                continue
+
+            if run["end"] is not None and start <= run["end"]:
+                run["text"] += text[run["end"] - start:]
+            else:
+                run["text"] += "\n" + text
+            if rank < run["rank"]:
+                run["rank"], run["best"] = rank, result
+            run["end"] = end if end is not None else run["end"]
+            run["last_index"] = index
+            run["count"] += 1
+
+    passages.sort(key=lambda run: run["rank"])
+    merged = []
+    for run in passages:
+        passage = dict(run["best"], text=run["text"], merged_chunks=run["count"])
+        if run["count"] > 1:
+            passage["chunk_info"] = dict(passage.get("chunk_info") or {}, start_pos=run["start"], end_pos=run["end"])
+        merged.append(passage)
+    return merged
+
+
+class _TermVector:
+    """Вектор слов фрагмента для косинусного сходства (вес 1 + log tf)"""
+
+    __slots__ = ("counts", "norm")
+
+    def __init__(self, text: str):
+        # Сублинейный tf: слово, повторенное в длинном фрагменте, не определяет сходство
+        self.counts = {token: 1.0 + math.log(tf) for token, tf in Counter(tokenize(text)).items()}
+        self.norm = math.sqrt(sum(v * v for v in self.counts.values()))
+
+    def cosine(self, other: "_TermVector") -> float:
+        if not self.norm or not other.norm:
+            return 0.0
+        small, large = sorted((self.counts, other.counts), key=len)
+        dot = sum(v * large.get(token, 0) for token, v in small.items())
+        return dot / (self.norm * other.norm)
+
+
+class ContextPacker:
+    """Отбор и обрезка фрагментов контекста под бюджет токенов"""
+
+    def __init__(
+        self,
+        mmr_lambda: Optional[float] = None,
+        dedup_threshold: Optional[float] = None
+    ):
+        self.mmr_lambda = config.CONTEXT_MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+        self.dedup_threshold = config.CONTEXT_DEDUP_THRESHOLD if dedup_threshold is None else dedup_threshold
+
+    @staticmethod
+    def _truncate(text: str, max_tokens: int) -> str:
+        """Первые max_tokens токенов text, конец - по границе предложения или слова"""
+        offsets = embeddings_service.token_offsets(text)
+        if len(offsets) <= max_tokens:
+            return text
+        # Место под TRUNCATION_MARK
+        cut = offsets[max(1, max_tokens - 2)]
+        end = EmbeddingsService._find_boundary(text, cut // 2, cut) or cut
+        return text[:end].rstrip() + TRUNCATION_MARK
+
+    def pack(
+        self,
+        results: List[Dict[str, Any]],
+        budget_tokens: int,
+        max_passage_tokens: Optional[int] = None,
+        formatter: Optional[Formatter] = None,
+        separator: str = "\n\n"
+    ) -> List[Dict[str, Any]]:
+        """
+        Упаковать результаты поиска в бюджет токенов
+
+        Args:
+            results: Результаты поиска по убыванию релевантности (поле text)
+            budget_tokens: Бюджет токенов на весь блок контекста
+            max_passage_tokens: Максимум токенов текста одного фрагмента
+            formatter: Форматирование фрагмента в промпте (номер с 1, фрагмент) -
+                заголовок учитывается в бюджете; None - только text
+            separator: Разделитель фрагментов в промпте
+
+        Returns:
+            Фрагменты в порядке выбора (text склеен и обрезан, packed_tokens -
+            токенов фрагмента в промпте)
+        """
+        formatter = formatter or (lambda index, passage: passage.get("text") or "")
+        passages = merge_adjacent_chunks(results)
+        if not passages:
+            return []
+
+        vectors = [_TermVector(p.get("text") or "") for p in passages]
+        # Релевантность по позиции: score поиска, гибрида и rerank несравнимы между собой
+        relevance = [1.0 - rank / len(passages) for rank in range(len(passages))]
+        max_similarity = [0.0] * len(passages)
+        remaining = set(range(len(passages)))
+        separator_tokens = embeddings_service.count_tokens(separator)
+
+        packed = []
+        dropped_duplicates = 0
+        budget = budget_tokens
+        while remaining and budget > MIN_PASSAGE_TOKENS:
+            best = max(
+                remaining,
+                key=lambda i: (self.mmr_lambda * relevance[i] - (1 - self.mmr_lambda) * max_similarity[i], -i)
+            )
+            remaining.discard(best)
+
+            if max_similarity[best] >= self.dedup_threshold:
+                dropped_duplicates += 1
+                continue
+
+            passage = passages[best]
+            index = len(packed) + 1
+            header_tokens = embeddings_service.count_tokens(formatter(index, dict(passage, text="")))
+            text_budget = budget - header_tokens - (separator_tokens if packed else 0)
+            if max_passage_tokens:
+                text_budget = min(text_budget, max_passage_tokens)
+            if text_budget < MIN_PASSAGE_TOKENS:
+                continue
+
+            text = self._truncate(passage.get("text") or "", text_budget)
+            passage = dict(passage, text=text)
+            passage["packed_tokens"] = embeddings_service.count_tokens(formatter(index, passage))
+            budget -= passage["packed_tokens"] + (separator_tokens if packed else 0)
+            packed.append(passage)
+
+            for i in remaining:
+                max_similarity[i] = max(max_similarity[i], vectors[i].cosine(vectors[best]))
+
+        logger.debug(
+            f"📦 ContextPacker: {len(results)} chunks → {len(passages)} фрагментов → {len(packed)} в промпт "
+            f"({budget_tokens - budget}/{budget_tokens} токенов, почти-повторов: {dropped_duplicates})"
+        )
+        return packed
+
+
+# Глобальный экземпляр
+context_packer = ContextPacker()
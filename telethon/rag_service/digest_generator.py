@@ -11,6 +11,8 @@ from collections import defaultdict
 # Добавляем родительскую директорию в path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+from sqlalchemy import func
+
 from database import SessionLocal
 from models import Post, Channel, DigestSettings
 from generator import rag_generator
@@ -19,6 +21,32 @@ import config
 logger = logging.getLogger(__name__)
 
 
+def collapse_near_duplicates(query):
+    """
+    Один пост на группу почти-дубликатов coalesce(canonical_post_id, id)
+    
+    Остается самый ранний пост группы среди выбранных (как в
+    SearchService._build_enriched). Canonical пост может быть вне периода,
+    в канале вне фильтра или удален retention - тогда история остается
+    в дайджесте одной из своих копий.
+    
+    Args:
+        query: Query(Post) с фильтрами выборки (без order_by/limit)
+        
+    Returns:
+        Query(Post) по той же выборке без повторов
+    """
+    ranked = query.with_entities(
+        Post.id.label("post_id"),
+        func.row_number().over(
+            partition_by=func.coalesce(Post.canonical_post_id, Post.id),
+            order_by=[Post.posted_at, Post.id]
+        ).label("group_rank")
+    ).subquery()
+    
+    return query.session.query(Post).join(ranked, ranked.c.post_id == Post.id).filter(ranked.c.group_rank == 1)
+
+
 class DigestGenerator:
     """Генератор дайджестов"""
     
@@ -122,7 +150,8 @@ class DigestGenerator:
                             func.json_contains(Post.tags, f'"{tag}"')
                         )
                 
-                posts = query.order_by(Post.posted_at.desc()).limit(max_posts).all()
+                # Почти-дубликаты (репосты) - один раз на историю
+                posts = collapse_near_duplicates(query).order_by(Post.posted_at.desc()).limit(max_posts).all()
                 
                 if not posts:
                     return {
@@ -5,6 +5,7 @@
 1. EmbeddingsGigaR через gpt2giga-proxy (основной)
 2. sentence-transformers (fallback)
 """
+import bisect
 import logging
 import httpx
 import tiktoken
@@ -30,6 +31,11 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Границы разреза chunks, по убыванию предпочтения
+CHUNK_PARAGRAPH_SEPARATORS = ("\n\n",)
+CHUNK_SENTENCE_SEPARATORS = (". ", "! ", "? ", "… ", "\n")
+CHUNK_WORD_SEPARATORS = (" ", "\t")
+
 
 class EmbeddingsService:
     """Сервис для генерации embeddings"""
@@ -74,14 +80,61 @@ class EmbeddingsService:
             # Приблизительная оценка: 1 токен ≈ 4 символа
             return len(text) // 4
     
-    def chunk_text(
+    def token_offsets(self, text: str) -> List[int]:
+        """
+        Символьная позиция начала каждого токена в text (один encode, O(n))
+        
+        Позиции считаются по байтам токенов: байт продолжения UTF-8 не
+        начинает новый символ, поэтому токен, начинающийся внутри
+        многобайтового символа, получает позицию этого символа.
+        Без tokenizer - "токены" по 4 символа (как в count_tokens).
+        """
+        if not self.tokenizer:
+            return list(range(0, len(text), 4))
+        
+        tokens = self.tokenizer.encode(text, disallowed_special=())
+        offsets = []
+        char_pos = 0
+        for token_bytes in self.tokenizer.decode_tokens_bytes(tokens):
+            starts_mid_char = bool(token_bytes) and 0x80 <= token_bytes[0] < 0xC0
+            offsets.append(max(0, char_pos - starts_mid_char))
+            char_pos += sum(1 for byte in token_bytes if not 0x80 <= byte < 0xC0)
+        return offsets
+    
+    @staticmethod
+    def _find_boundary(text: str, lo: int, hi: int, last: bool = True) -> Optional[int]:
+        """
+        Граница разреза в text[lo:hi]: абзац, конец предложения, пробел
+        
+        Args:
+            last: True - последняя граница (конец chunk'а), False - первая (начало overlap)
+            
+        Returns:
+            Позиция начала следующего фрагмента или None
+        """
+        for separators in (CHUNK_PARAGRAPH_SEPARATORS, CHUNK_SENTENCE_SEPARATORS, CHUNK_WORD_SEPARATORS):
+            found = []
+            for sep in separators:
+                pos = text.rfind(sep, lo, hi) if last else text.find(sep, lo, hi)
+                if pos >= 0 and lo < pos + len(sep) < hi + last:
+                    found.append(pos + len(sep))
+            if found:
+                return max(found) if last else min(found)
+        return None
+    
+    def chunk_text_with_count(
         self,
         text: str,
         max_tokens: int,
         overlap_tokens: int
-    ) -> List[Tuple[str, int, int]]:
+    ) -> Tuple[List[Tuple[str, int, int]], int]:
         """
-        Разбить текст на chunks с overlap
+        Разбить текст на chunks с overlap за один encode
+        
+        Конец chunk'а сдвигается назад к границе абзаца, предложения или
+        слова (не дальше чем на половину max_tokens), overlap начинается с
+        первой такой границы в зоне overlap. Текст chunk'а - срез исходного
+        текста, позиции точные, в chunk попадает не больше max_tokens токенов.
         
         Args:
             text: Текст для разбиения
@@ -89,53 +142,65 @@ class EmbeddingsService:
             overlap_tokens: Количество токенов для overlap
             
         Returns:
-            Список кортежей (chunk_text, start_pos, end_pos)
+            (список кортежей (chunk_text, start_pos, end_pos), число токенов текста)
         """
         if not text or not text.strip():
-            return []
+            return [], 0
         
-        total_tokens = self.count_tokens(text)
+        offsets = self.token_offsets(text)
+        total_tokens = len(offsets)
         
         # Если текст короче max_tokens, возвращаем его целиком
         if total_tokens <= max_tokens:
-            return [(text, 0, len(text))]
+            return [(text, 0, len(text))], total_tokens
         
-        # Разбиваем на chunks
-        chunks = []
+        def char_at(token_index: int) -> int:
+            return offsets[token_index] if token_index < total_tokens else len(text)
         
-        if self.tokenizer:
-            # Используем tokenizer для точного разбиения
-            tokens = self.tokenizer.encode(text)
+        chunks = []
+        start_token, start_char = 0, 0
+        while True:
+            limit_token = start_token + max_tokens
+            if limit_token >= total_tokens:
+                chunks.append((text[start_char:], start_char, len(text)))
+                break
             
-            start = 0
-            while start < len(tokens):
-                end = min(start + max_tokens, len(tokens))
-                chunk_tokens = tokens[start:end]
-                chunk_text = self.tokenizer.decode(chunk_tokens)
-                
-                # Определяем позицию в оригинальном тексте (приблизительно)
-                char_start = len(self.tokenizer.decode(tokens[:start]))
-                char_end = len(self.tokenizer.decode(tokens[:end]))
-                
-                chunks.append((chunk_text, char_start, char_end))
-                
-                # Двигаемся вперед с учетом overlap
-                start = end - overlap_tokens if end < len(tokens) else end
-        else:
-            # Простое разбиение по символам (fallback)
-            chars_per_chunk = max_tokens * 4  # Приблизительно
-            overlap_chars = overlap_tokens * 4
+            limit_char = char_at(limit_token)
+            lo = max(start_char, char_at(start_token + max_tokens // 2))
+            end_char = self._find_boundary(text, lo, limit_char) or limit_char
+            chunks.append((text[start_char:end_char], start_char, end_char))
             
-            start = 0
-            while start < len(text):
-                end = min(start + chars_per_chunk, len(text))
-                chunk_text = text[start:end]
-                chunks.append((chunk_text, start, end))
-                
-                start = end - overlap_chars if end < len(text) else end
+            # Overlap: overlap_tokens токенов перед концом chunk'а, с первой границы в этой зоне
+            end_token = bisect.bisect_left(offsets, end_char)
+            overlap_char = char_at(max(end_token - overlap_tokens, start_token + 1))
+            if overlap_char < end_char:
+                start_char = self._find_boundary(text, overlap_char, end_char, last=False) or overlap_char
+            else:
+                start_char = end_char
+            # Токен, внутри которого начинается следующий chunk
+            start_token = bisect.bisect_right(offsets, start_char) - 1
         
         logger.debug(f"Текст разбит на {len(chunks)} chunks (max_tokens={max_tokens}, overlap={overlap_tokens})")
-        return chunks
+        return chunks, total_tokens
+    
+    def chunk_text(
+        self,
+        text: str,
+        max_tokens: int,
+        overlap_tokens: int
+    ) -> List[Tuple[str, int, int]]:
+        """
+        Разбить текст на chunks с overlap
+        
+        Args:
+            text: Текст для разбиения
+            max_tokens: Максимальное количество токенов в chunk
+            overlap_tokens: Количество токенов для overlap
+            
+        Returns:
+            Список кортежей (chunk_text, start_pos, end_pos)
+        """
+        return self.chunk_text_with_count(text, max_tokens, overlap_tokens)[0]
     
     async def generate_embedding_gigachat(self, text: str) -> Optional[List[float]]:
         """
@@ -152,7 +217,7 @@ class EmbeddingsService:
             return None
         
         # Импорты для rate limiting и retry
-        from rate_limiter import gigachat_rate_limiter
+        from rate_limiter import gigachat_slot
         from tenacity import (
             retry,
             stop_after_attempt,
@@ -187,8 +252,8 @@ class EmbeddingsService:
                 reraise=True
             )
             async def _generate_with_retry():
-                # КРИТИЧНО: Rate limiter для 1 concurrent request
-                async with gigachat_rate_limiter:
+                # КРИТИЧНО: общий слот GigaChat (конкурентность + rate limit)
+                async with gigachat_slot():
                     logger.debug("🔒 Acquired rate limit slot for GigaChat")
                     
                     async with httpx.AsyncClient(timeout=30.0) as client:
@@ -337,16 +402,101 @@ class EmbeddingsService:
         Returns:
             Список embeddings (или None для ошибок)
         """
-        results = []
+        results: List[Optional[Tuple[List[float], str]]] = [None] * len(texts)
         
-        # TODO: Оптимизировать batch processing для GigaChat API
-        # Пока делаем последовательно
-        for text in texts:
-            result = await self.generate_embedding(text)
-            results.append(result)
+        # GigaChat: один запрос на весь batch (input - список)
+        if self.gigachat_enabled:
+            embeddings = await self.generate_embeddings_gigachat_batch(texts)
+            for i, embedding in enumerate(embeddings):
+                if embedding:
+                    results[i] = (embedding, "gigachat")
+        
+        # Недостающие - по одному с fallback
+        for i, text in enumerate(texts):
+            if results[i] is None:
+                results[i] = await self.generate_embedding(text)
         
         return results
     
+    async def generate_embeddings_gigachat_batch(
+        self,
+        texts: List[str]
+    ) -> List[Optional[List[float]]]:
+        """
+        Embeddings для нескольких текстов одним запросом к GigaChat
+        
+        Args:
+            texts: Список текстов
+            
+        Returns:
+            Список векторов в порядке texts (None - пустой текст или ошибка)
+        """
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        indexed = [(i, text) for i, text in enumerate(texts) if text and text.strip()]
+        
+        if not self.gigachat_enabled or not indexed:
+            return embeddings
+        
+        from rate_limiter import gigachat_slot
+        from tenacity import (
+            retry,
+            stop_after_attempt,
+            wait_exponential,
+            retry_if_exception_type
+        )
+        
+        @retry(
+            retry=retry_if_exception_type(httpx.HTTPStatusError),
+            stop=stop_after_attempt(3),
+            wait=wait_exponential(multiplier=1, min=2, max=10),
+            reraise=True
+        )
+        async def _generate_with_retry():
+            async with gigachat_slot():
+                async with httpx.AsyncClient(timeout=30.0) as client:
+                    response = await client.post(
+                        self.gigachat_url,
+                        json={
+                            "input": [text for _, text in indexed],
+                            "model": "EmbeddingsGigaR"
+                        }
+                    )
+                    
+                    if response.status_code != 200:
+                        logger.warning(f"⚠️ GigaChat batch embeddings error {response.status_code}")
+                        response.raise_for_status()
+                    
+                    return response.json()
+        
+        timer = None
+        if rag_embeddings_duration_seconds:
+            timer = rag_embeddings_duration_seconds.labels(provider='gigachat').time()
+            timer.__enter__()
+        
+        try:
+            result = await _generate_with_retry()
+            
+            # Ответ OpenAI-совместимый: data[k].index - позиция во входном списке
+            for k, item in enumerate(result.get("data", [])):
+                position = item.get("index", k)
+                if 0 <= position < len(indexed):
+                    embeddings[indexed[position][0]] = item["embedding"]
+            
+            if self.gigachat_vector_size is None:
+                first = next((e for e in embeddings if e), None)
+                if first:
+                    self.gigachat_vector_size = len(first)
+            
+        except Exception as e:
+            logger.error(f"❌ Ошибка GigaChat batch embeddings ({len(indexed)} текстов): {e}")
+            if rag_query_errors_total:
+                rag_query_errors_total.labels(error_type='embedding_failed').inc()
+        finally:
+            if timer:
+                timer.__exit__(None, None, None)
+        
+        return embeddings
+    
     def get_chunking_params(self, provider: str = "gigachat") -> Tuple[int, int]:
         """
         Получить параметры chunking для провайдера
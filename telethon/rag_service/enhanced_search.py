@@ -7,9 +7,15 @@ Best practices from neo4j-graphrag HybridRetriever:
 - Graph-aware ranking
 - Context expansion
 - Graceful degradation
+
+Этапы перекрываются: vector search по исходному запросу стартует сразу,
+параллельно с query expansion и graph signals; expand_with_graph
+стартует на первых результатах. Этапы Neo4j ограничены deadline
+(HYBRID_*_TIMEOUT_MS) - медленный граф не задерживает ответ.
 """
 import logging
 import asyncio
+import time
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timezone
 
@@ -27,7 +33,8 @@ from rag_service.metrics import (
     combined_score_distribution,
     record_hybrid_search
 )
-import time
+
+logger = logging.getLogger(__name__)
 
 # Query expansion (опционально)
 try:
@@ -40,16 +47,14 @@ except ImportError:
     query_expander = None
     ff = None
 
-logger = logging.getLogger(__name__)
-
 
 class EnhancedSearchService:
     """
     Hybrid search combining Qdrant vector search and Neo4j graph context
     
     Architecture:
-        1. Parallel: Qdrant search + Neo4j personalization signals
-        2. Expand: Add graph-related posts
+        1. Parallel: Qdrant search + query expansion + Neo4j personalization signals
+        2. Expand: Add graph-related posts (pipelined on first results)
         3. Rank: Combined score (vector + graph)
     
     Usage:
@@ -68,6 +73,13 @@ class EnhancedSearchService:
         """Инициализация enhanced search service"""
         self.search_service = search_service
         self.neo4j_enabled = neo4j_client.enabled
+        
+        # Deadlines этапов (секунды): по истечении этап пропускается
+        self.expansion_timeout = float(os.getenv("HYBRID_EXPANSION_TIMEOUT_MS", "300")) / 1000
+        self.expanded_search_timeout = float(os.getenv("HYBRID_EXPANDED_SEARCH_TIMEOUT_MS", "2000")) / 1000
+        self.graph_signals_timeout = float(os.getenv("HYBRID_GRAPH_SIGNALS_TIMEOUT_MS", "500")) / 1000
+        self.graph_expand_timeout = float(os.getenv("HYBRID_GRAPH_EXPAND_TIMEOUT_MS", "500")) / 1000
+        
         logger.info(f"✅ EnhancedSearchService initialized (Neo4j: {self.neo4j_enabled})")
     
     async def search_with_graph_context(
@@ -94,10 +106,16 @@ class EnhancedSearchService:
             Ranked список постов с combined scores
         
         Flow:
-            1. Parallel: Qdrant search (limit*2) + Neo4j signals
-            2. Expand: добавить related posts через граф
+            1. Parallel: Qdrant search (limit*2) по исходному запросу +
+               query expansion + Neo4j signals
+            2. Expand: related posts через граф - сразу на результатах
+               исходного запроса; результаты расширенного запроса
+               сливаются с ними, для новых постов - отдельный expand
             3. Rank: (1-w)*vector_score + w*graph_score
             4. Return: top K results
+        
+        Deadlines: query expansion, поиск по расширенному запросу, graph
+        signals и graph expansion - по истечении этап пропускается.
         """
         # Start timer
         start_time = time.time()
@@ -125,48 +143,64 @@ class EnhancedSearchService:
             
             logger.info(f"🔍 Hybrid search for user {user_id}: '{query}' (graph_weight={graph_weight})")
             
-            # Query expansion (если включен feature flag)
+            # Critical path: сколько запрос ждал каждый этап (с учетом перекрытия)
+            stages: Dict[str, float] = {}
+            timed_out: List[str] = []
+            stage_start = time.time()
+            
+            def mark(stage: str):
+                nonlocal stage_start
+                now = time.time()
+                stages[stage] = stages.get(stage, 0.0) + now - stage_start
+                stage_start = now
+            
+            # 1. Parallel: vector search по исходному запросу + graph signals + query expansion
+            base_task = asyncio.create_task(self._vector_search(query, user_id, limit * 2, **kwargs))
+            signals_task = asyncio.create_task(self._with_deadline(
+                self._get_graph_signals(user_id), self.graph_signals_timeout,
+                "graph_signals", {"user_interests": [], "trending_tags": []}, timed_out
+            ))
+            
             expanded_query = query
             if QUERY_EXPANSION_AVAILABLE and query_expander and ff:
                 if ff.is_enabled('query_expansion', user_id=user_id):
-                    try:
-                        expanded_query = await query_expander.expand_query(
-                            query=query,
-                            user_id=user_id
-                        )
-                        if expanded_query != query:
-                            logger.info(f"✨ Query expanded: '{query}' → '{expanded_query}'")
-                    except Exception as e:
-                        logger.warning(f"⚠️ Query expansion failed: {e}")
-            
-            # 1. Parallel execution: Vector search + Graph signals
-            vector_results, graph_signals = await asyncio.gather(
-                self._vector_search(expanded_query, user_id, limit * 2, **kwargs),  # Use expanded query
-                self._get_graph_signals(user_id),
-                return_exceptions=True
-            )
+                    expanded_query = await self._with_deadline(
+                        query_expander.expand_query(query=query, user_id=user_id),
+                        self.expansion_timeout, "expansion", query, timed_out
+                    )
+                    mark("expansion")
+                    if expanded_query != query:
+                        logger.info(f"✨ Query expanded: '{query}' → '{expanded_query}'")
             
-            # Handle exceptions
-            if isinstance(vector_results, Exception):
-                logger.error(f"❌ Vector search failed: {vector_results}")
-                return []
+            # Поиск по расширенному запросу - пока исходный еще выполняется
+            expanded_task = None
+            if expanded_query != query:
+                expanded_task = asyncio.create_task(self._with_deadline(
+                    self._vector_search(expanded_query, user_id, limit * 2, **kwargs),
+                    self.expanded_search_timeout, "expanded_search", [], timed_out
+                ))
             
-            if isinstance(graph_signals, Exception):
-                logger.warning(f"⚠️ Graph signals failed: {graph_signals}, continuing without")
-                graph_signals = {"user_interests": [], "trending_tags": []}
+            # 2. Graph expansion - сразу на первых результатах
+            vector_results = await base_task
+            mark("vector_search")
+            graph_tasks = [self._start_graph_expansion(vector_results, timed_out)]
+            
+            if expanded_task:
+                expanded_results = await expanded_task
+                mark("expanded_search")
+                known_post_ids = {r.get('post_id') for r in vector_results}
+                new_results = [r for r in expanded_results if r.get('post_id') not in known_post_ids]
+                graph_tasks.append(self._start_graph_expansion(new_results, timed_out))
+                vector_results = self._merge_results(vector_results, expanded_results)[:limit * 2]
             
             if not vector_results:
+                for task in graph_tasks + [signals_task]:
+                    task.cancel()
                 return []
             
-            # 2. Expand with graph context
-            graph_context = []
-            if expand_graph and len(vector_results) > 0:
-                post_ids = [r.get('post_id') for r in vector_results if r.get('post_id')]
-                if post_ids:
-                    graph_context = await neo4j_client.expand_with_graph(
-                        post_ids=post_ids,
-                        limit_per_post=2  # 2 related posts per result
-                    )
+            graph_context = [item for context in await asyncio.gather(*graph_tasks) for item in context]
+            graph_signals = await signals_task
+            mark("graph")
             
             # 3. Merge and rank
             combined_results = self._rank_with_graph(
@@ -178,6 +212,7 @@ class EnhancedSearchService:
             
             # 4. Return top K
             top_results = combined_results[:limit]
+            mark("rank")
             
             # Record metrics
             duration = time.time() - start_time
@@ -187,7 +222,9 @@ class EnhancedSearchService:
                 duration=duration,
                 results_count=len(top_results),
                 mode="hybrid",
-                avg_combined_score=avg_score
+                avg_combined_score=avg_score,
+                stages=stages,
+                timed_out=timed_out
             )
             
             # Record graph expansion
@@ -195,9 +232,11 @@ class EnhancedSearchService:
                 total_graph_docs = sum(len(g.get('related_posts', [])) for g in graph_context)
                 graph_expansion_added_docs.observe(total_graph_docs)
             
+            breakdown = ", ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in stages.items())
             logger.info(f"✅ Hybrid search returned {len(top_results)} results "
                        f"(from {len(vector_results)} vector + {len(graph_context)} graph) "
-                       f"in {duration:.3f}s")
+                       f"in {duration:.3f}s ({breakdown})"
+                       + (f", deadline: {', '.join(timed_out)}" if timed_out else ""))
             
             return top_results
             
@@ -214,6 +253,62 @@ class EnhancedSearchService:
             except:
                 return []
     
+    async def _with_deadline(
+        self,
+        awaitable,
+        timeout: float,
+        stage: str,
+        default: Any,
+        timed_out: List[str]
+    ) -> Any:
+        """
+        Выполнить этап с deadline
+        
+        Returns:
+            Результат этапа или default (deadline истек / ошибка);
+            этапы, не уложившиеся в deadline, добавляются в timed_out
+        """
+        try:
+            return await asyncio.wait_for(awaitable, timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⏱️ Hybrid search stage '{stage}' exceeded {timeout * 1000:.0f}ms, continuing without")
+            timed_out.append(stage)
+        except Exception as e:
+            logger.warning(f"⚠️ Hybrid search stage '{stage}' failed: {e}, continuing without")
+        return default
+    
+    def _start_graph_expansion(self, results: List[Dict[str, Any]], timed_out: List[str]) -> asyncio.Task:
+        """Запустить expand_with_graph для результатов (с deadline) в фоне"""
+        post_ids = list(dict.fromkeys(r.get('post_id') for r in results if r.get('post_id')))
+        
+        async def expand() -> List[Dict[str, Any]]:
+            if not post_ids:
+                return []
+            return await neo4j_client.expand_with_graph(
+                post_ids=post_ids,
+                limit_per_post=2  # 2 related posts per result
+            )
+        
+        return asyncio.create_task(self._with_deadline(
+            expand(), self.graph_expand_timeout, "graph_expand", [], timed_out
+        ))
+    
+    @staticmethod
+    def _merge_results(*result_sets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Слить результаты нескольких поисков
+        
+        Один chunk (post_id, source, chunk_index) - один раз, с лучшим score;
+        порядок - по убыванию score
+        """
+        merged: Dict[Any, Dict[str, Any]] = {}
+        for results in result_sets:
+            for r in results:
+                key = (r.get('post_id'), r.get('source', 'post'), (r.get('chunk_info') or {}).get('chunk_index', 0))
+                if key not in merged or r.get('score', 0.0) > merged[key].get('score', 0.0):
+                    merged[key] = r
+        return sorted(merged.values(), key=lambda r: r.get('score', 0.0), reverse=True)
+    
     async def _vector_search(
         self,
         query: str,
@@ -8,6 +8,9 @@ from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 
 from search import search_service
+from reranker import reranker
+from context_packer import context_budget, context_packer
+from rate_limiter import PRIORITY_INTERACTIVE, gigachat_slot
 import config
 
 # Инициализируем logger до использования
@@ -42,6 +45,26 @@ class RAGGenerator:
         else:
             logger.warning("⚠️ RAG Generator отключен (отсутствует OPENROUTER_API_KEY)")
     
+    @staticmethod
+    def _format_context(index: int, ctx: Dict[str, Any]) -> str:
+        """Источник в промпте (используется и для подсчета токенов в ContextPacker)"""
+        channel = ctx.get("channel_username", "Unknown")
+        posted_at = ctx.get("posted_at", "")
+        if isinstance(posted_at, datetime):
+            posted_at = posted_at.strftime("%Y-%m-%d %H:%M")
+        text = ctx.get("text", "")
+        url = ctx.get("url", "")
+        
+        context_str = f"""
+Источник {index}:
+Канал: @{channel}
+Дата: {posted_at}
+Ссылка: {url}
+Текст:
+{text}
+"""
+        return context_str.strip()
+    
     def _create_rag_prompt(
         self,
         query: str,
@@ -58,24 +81,7 @@ class RAGGenerator:
             Промпт для LLM
         """
         # Форматируем контексты
-        formatted_contexts = []
-        for i, ctx in enumerate(contexts, 1):
-            channel = ctx.get("channel_username", "Unknown")
-            posted_at = ctx.get("posted_at", "")
-            if isinstance(posted_at, datetime):
-                posted_at = posted_at.strftime("%Y-%m-%d %H:%M")
-            text = ctx.get("text", "")
-            url = ctx.get("url", "")
-            
-            context_str = f"""
-Источник {i}:
-Канал: @{channel}
-Дата: {posted_at}
-Ссылка: {url}
-Текст:
-{text}
-"""
-            formatted_contexts.append(context_str.strip())
+        formatted_contexts = [self._format_context(i, ctx) for i, ctx in enumerate(contexts, 1)]
         
         contexts_block = "\n\n---\n\n".join(formatted_contexts)
         
@@ -175,7 +181,7 @@ class RAGGenerator:
             Сгенерированный ответ или None
         """
         try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
+            async with gigachat_slot(PRIORITY_INTERACTIVE) as lease, httpx.AsyncClient(timeout=60.0) as client:
                 response = await client.post(
                     self.gigachat_url,
                     json={
@@ -190,6 +196,7 @@ class RAGGenerator:
                         "max_tokens": max_tokens
                     }
                 )
+                lease.observe(response)
                 
                 if response.status_code != 200:
                     logger.error(f"❌ GigaChat error {response.status_code}: {response.text[:200]}")
@@ -250,7 +257,9 @@ class RAGGenerator:
         channels: Optional[List[int]] = None,
         tags: Optional[List[str]] = None,
         date_from: Optional[datetime] = None,
-        date_to: Optional[datetime] = None
+        date_to: Optional[datetime] = None,
+        rerank: Optional[bool] = None,
+        context_packing: Optional[bool] = None
     ) -> Dict[str, Any]:
         """
         Сгенерировать ответ на вопрос с использованием RAG
@@ -263,6 +272,8 @@ class RAGGenerator:
             tags: Фильтр по тегам
             date_from: Фильтр по дате (от)
             date_to: Фильтр по дате (до)
+            rerank: Cross-encoder rerank кандидатов (None - config.RERANK_ENABLED)
+            context_packing: Упаковка контекста в бюджет токенов (None - config.CONTEXT_PACKING_ENABLED)
             
         Returns:
             Словарь с ответом и источниками
@@ -288,6 +299,11 @@ class RAGGenerator:
                 feature_flags.is_enabled('hybrid_search', user_id=user_id)
             )
             
+            # Rerank: поиск с запасом кандидатов, в контекст - лучшие RERANK_TOP_K
+            if rerank is None:
+                rerank = config.RERANK_ENABLED
+            fetch_limit = max(context_limit, config.RERANK_CANDIDATES) if rerank else context_limit
+            
             # Получаем релевантные документы через поиск
             search_results = []
             
@@ -299,7 +315,7 @@ class RAGGenerator:
                     search_results = await enhanced_search_service.search_with_graph_context(
                         query=query,
                         user_id=user_id,
-                        limit=context_limit,
+                        limit=fetch_limit,
                         channel_id=channels[0] if channels else None,
                         tags=tags,
                         date_from=date_from,
@@ -315,15 +331,16 @@ class RAGGenerator:
                 
                 if channels:
                     # Ищем по каждому каналу и объединяем результаты
-                    for channel_id in channels:
+                    for i, channel_id in enumerate(channels):
                         results = await search_service.search(
                             query=query,
                             user_id=user_id,
-                            limit=context_limit // len(channels) + 1,
+                            limit=fetch_limit // len(channels) + 1,
                             channel_id=channel_id,
                             tags=tags,
                             date_from=date_from,
-                            date_to=date_to
+                            date_to=date_to,
+                            track_interest=i == 0
                         )
                         search_results.extend(results)
                 else:
@@ -331,10 +348,11 @@ class RAGGenerator:
                     search_results = await search_service.search(
                         query=query,
                         user_id=user_id,
-                        limit=context_limit,
+                        limit=fetch_limit,
                         tags=tags,
                         date_from=date_from,
-                        date_to=date_to
+                        date_to=date_to,
+                        track_interest=True
                     )
             
             if not search_results:
@@ -346,7 +364,32 @@ class RAGGenerator:
                 }
             
             # Ограничиваем количество документов для контекста
-            search_results = search_results[:context_limit]
+            reranked = None
+            if rerank:
+                reranked = await reranker.rerank(
+                    query, search_results[:fetch_limit],
+                    top_k=min(context_limit, config.RERANK_TOP_K)
+                )
+            # Без rerank (или fallback по бюджету/ошибке) - исходный порядок поиска
+            search_results = reranked if reranked is not None else search_results[:context_limit]
+            
+            # Склейка chunks, MMR и бюджет токенов (промпт может уйти и в GigaChat)
+            context_tokens = None
+            if context_packing is None:
+                context_packing = config.CONTEXT_PACKING_ENABLED
+            if context_packing:
+                search_results = context_packer.pack(
+                    search_results,
+                    budget_tokens=context_budget(
+                        config.RAG_CONTEXT_WINDOW,
+                        self.openrouter_model,
+                        "GigaChat" if config.GIGACHAT_ENABLED else None
+                    ),
+                    max_passage_tokens=config.RAG_MAX_PASSAGE_TOKENS,
+                    formatter=self._format_context,
+                    separator="\n\n---\n\n"
+                )
+                context_tokens = sum(result["packed_tokens"] for result in search_results)
             
             # Создаем промпт
             prompt = self._create_rag_prompt(query, search_results)
@@ -374,7 +417,8 @@ class RAGGenerator:
                     "error": "Не удалось сгенерировать ответ",
                     "answer": None,
                     "sources": [],
-                    "context_used": len(search_results)
+                    "context_used": len(search_results),
+                    "context_tokens": context_tokens
                 }
             
             # Форматируем источники
@@ -396,7 +440,8 @@ class RAGGenerator:
                 "query": query,
                 "answer": answer,
                 "sources": sources,
-                "context_used": len(sources)
+                "context_used": len(sources),
+                "context_tokens": context_tokens
             }
             
         except Exception as e:
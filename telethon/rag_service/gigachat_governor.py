@@ -0,0 +1,527 @@
+"""
+Общий регулятор запросов к GigaChat (gpt2giga-proxy)
+
+Лимит GigaChat - один на аккаунт, а запросы идут из нескольких
+процессов: rag-service (embeddings, /rag/ask, AI-дайджесты) и бот
+(тегирование, LangChain агенты дайджестов групп). Поэтому состояние
+регулятора хранится в Redis и меняется атомарно Lua скриптами:
+- лимит частоты: gigachat:governor:next_slot - время следующего старта
+- конкурентность: ZSET аренд (lease) с TTL - упавший процесс не держит слот
+- приоритеты: интерактивные запросы → дайджесты → фоновые (индексация,
+  тегирование). Запрос ждет, пока есть ожидающие с более высоким
+  приоритетом, но не дольше MAX_YIELD_SECONDS (защита от голодания)
+- адаптивная частота (AIMD): 429 → частота x0.5 и пауза на Retry-After,
+  медленный ответ → x0.8, успешный → +GIGACHAT_RATE_STEP
+
+Без Redis регулятор работает локально для процесса с той же логикой.
+
+Модуль не импортирует config - используется и из telethon, и из rag_service.
+Приоритет по умолчанию задается для всего сценария через gigachat_priority():
+
+    with gigachat_priority(PRIORITY_INTERACTIVE):
+        answer = await rag_generator.generate_answer(...)
+
+    async with gigachat_governor.slot() as lease:
+        response = await client.post(...)
+        lease.observe(response)
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple
+
+# Observability
+try:
+    from observability.metrics import (
+        gigachat_governor_rate,
+        gigachat_governor_queue_wait_seconds,
+        gigachat_governor_throttle_events_total
+    )
+except ImportError:
+    gigachat_governor_rate = None
+    gigachat_governor_queue_wait_seconds = None
+    gigachat_governor_throttle_events_total = None
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты (меньше - раньше)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_DIGEST = 1
+PRIORITY_BACKGROUND = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_DIGEST: "digest",
+    PRIORITY_BACKGROUND: "background"
+}
+
+# Сколько запрос уступает более приоритетным, прежде чем встать с ними наравне
+MAX_YIELD_SECONDS = {
+    PRIORITY_INTERACTIVE: 0.0,
+    PRIORITY_DIGEST: 30.0,
+    PRIORITY_BACKGROUND: 120.0
+}
+
+# AIMD
+DECREASE_FACTOR = 0.5   # 429
+SLOW_FACTOR = 0.8       # ответ дольше GIGACHAT_LATENCY_TARGET
+
+# Ожидающий запрос обновляет регистрацию каждые POLL_INTERVAL секунд
+POLL_INTERVAL = 0.5
+WAITER_TTL = 3.0
+
+# После ошибки Redis - локальный режим на это время
+REDIS_RETRY_SECONDS = 30.0
+
+# Приоритет сценария (задается gigachat_priority)
+_current_priority: ContextVar[int] = ContextVar("gigachat_priority", default=PRIORITY_DIGEST)
+
+
+@contextmanager
+def gigachat_priority(priority: int):
+    """Приоритет всех запросов к GigaChat внутри блока (наследуется задачами)"""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+class GigaChatBusyError(TimeoutError):
+    """Слот GigaChat не получен за max_queue_wait"""
+
+
+# KEYS: leases, next_slot, rate, waiting:0, waiting:1, waiting:2
+# ARGV: lease_id, rank, aged, default_rate, max_concurrency, lease_ttl_ms, waiter_ttl_ms
+# Возвращает {1, 0} - слот выдан, {0, wait_ms} - ждать
+ACQUIRE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local lease_id = ARGV[1]
+local rank = tonumber(ARGV[2])
+local rate = tonumber(redis.call('GET', KEYS[3]) or ARGV[4])
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+for i = 4, 6 do
+  redis.call('ZREMRANGEBYSCORE', KEYS[i], '-inf', now)
+end
+redis.call('ZADD', KEYS[4 + rank], now + tonumber(ARGV[7]), lease_id)
+
+if ARGV[3] ~= '1' then
+  for r = 0, rank - 1 do
+    if redis.call('ZCARD', KEYS[4 + r]) > 0 then
+      return {0, 100}
+    end
+  end
+end
+
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[5]) then
+  return {0, 100}
+end
+
+local next_slot = tonumber(redis.call('GET', KEYS[2]) or '0')
+if next_slot > now then
+  return {0, next_slot - now}
+end
+
+local interval = math.floor(1000 / rate)
+redis.call('SET', KEYS[2], now + interval, 'PX', interval + 60000)
+redis.call('ZADD', KEYS[1], now + tonumber(ARGV[6]), lease_id)
+redis.call('ZREM', KEYS[4 + rank], lease_id)
+return {1, 0}
+"""
+
+# KEYS: rate, next_slot
+# ARGV: kind (throttled/slow/ok), default_rate, min_rate, max_rate, step, pause_ms
+# Возвращает новую частоту строкой (Lua number -> integer при возврате)
+FEEDBACK_SCRIPT = """
+local rate = tonumber(redis.call('GET', KEYS[1]) or ARGV[2])
+local kind = ARGV[1]
+
+if kind == 'throttled' then
+  rate = math.max(tonumber(ARGV[3]), rate * 0.5)
+  local t = redis.call('TIME')
+  local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+  local pause = tonumber(ARGV[6])
+  local resume_at = now + pause
+  if resume_at > tonumber(redis.call('GET', KEYS[2]) or '0') then
+    redis.call('SET', KEYS[2], resume_at, 'PX', pause + 60000)
+  end
+elseif kind == 'slow' then
+  rate = math.max(tonumber(ARGV[3]), rate * 0.8)
+else
+  rate = math.min(tonumber(ARGV[4]), rate + tonumber(ARGV[5]))
+end
+
+redis.call('SET', KEYS[1], tostring(rate), 'EX', 86400)
+return tostring(rate)
+"""
+
+
+def _retry_after_seconds(headers: Any) -> Optional[float]:
+    """Retry-After из заголовков ответа (секунды или HTTP-дата)"""
+    value = headers.get("Retry-After") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _rate_limited_response(error: BaseException) -> Tuple[bool, Any]:
+    """
+    Является ли исключение ответом 429
+
+    httpx.HTTPStatusError (raise_for_status) и openai.RateLimitError
+    (ChatOpenAI в LangChain агентах) несут response со status_code.
+    """
+    response = getattr(error, "response", None)
+    status_code = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    return status_code == 429, getattr(response, "headers", None)
+
+
+@dataclass
+class GigaChatLease:
+    """Выданный слот: через observe() регулятор узнает результат запроса"""
+    lease_id: str
+    priority: int
+    wait_time: float
+    started_at: float
+    throttled: bool = False
+    retry_after: Optional[float] = None
+
+    def observe(self, response: Any):
+        """Учесть HTTP ответ GigaChat (429 и Retry-After)"""
+        if getattr(response, "status_code", None) == 429:
+            self.throttled = True
+            self.retry_after = _retry_after_seconds(getattr(response, "headers", None))
+
+
+class _LocalBackend:
+    """Состояние регулятора в памяти процесса (без Redis)"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.next_slot = 0.0
+        self.leases: Dict[str, float] = {}
+        self.waiting: Tuple[Dict[str, float], ...] = ({}, {}, {})
+
+    async def try_acquire(
+        self,
+        lease_id: str,
+        rank: int,
+        aged: bool,
+        max_concurrency: int,
+        lease_ttl: float
+    ) -> float:
+        now = time.monotonic()
+        for registry in (self.leases, *self.waiting):
+            for stale in [key for key, expires_at in registry.items() if expires_at <= now]:
+                del registry[stale]
+        self.waiting[rank][lease_id] = now + WAITER_TTL
+
+        if not aged and any(self.waiting[r] for r in range(rank)):
+            return 0.1
+        if len(self.leases) >= max_concurrency:
+            return 0.1
+        if self.next_slot > now:
+            return self.next_slot - now
+
+        self.next_slot = now + 1.0 / self.rate
+        self.leases[lease_id] = now + lease_ttl
+        del self.waiting[rank][lease_id]
+        return 0.0
+
+    async def release(self, lease_id: str):
+        self.leases.pop(lease_id, None)
+
+    async def forget(self, lease_id: str, rank: int):
+        self.waiting[rank].pop(lease_id, None)
+
+    async def feedback(
+        self,
+        kind: str,
+        min_rate: float,
+        max_rate: float,
+        step: float,
+        pause: float
+    ) -> float:
+        if kind == "throttled":
+            self.rate = max(min_rate, self.rate * DECREASE_FACTOR)
+            self.next_slot = max(self.next_slot, time.monotonic() + pause)
+        elif kind == "slow":
+            self.rate = max(min_rate, self.rate * SLOW_FACTOR)
+        else:
+            self.rate = min(max_rate, self.rate + step)
+        return self.rate
+
+
+class _RedisBackend:
+    """Состояние регулятора в Redis (общее для всех процессов)"""
+
+    PREFIX = "gigachat:governor"
+
+    def __init__(self, client, default_rate: float):
+        self.client = client
+        self.default_rate = default_rate
+        self.leases_key = f"{self.PREFIX}:leases"
+        self.next_slot_key = f"{self.PREFIX}:next_slot"
+        self.rate_key = f"{self.PREFIX}:rate"
+        self.waiting_keys = [f"{self.PREFIX}:waiting:{rank}" for rank in PRIORITY_NAMES]
+        self._acquire = client.register_script(ACQUIRE_SCRIPT)
+        self._feedback = client.register_script(FEEDBACK_SCRIPT)
+
+    async def try_acquire(
+        self,
+        lease_id: str,
+        rank: int,
+        aged: bool,
+        max_concurrency: int,
+        lease_ttl: float
+    ) -> float:
+        granted, wait_ms = await self._acquire(
+            keys=[self.leases_key, self.next_slot_key, self.rate_key, *self.waiting_keys],
+            args=[
+                lease_id, rank, "1" if aged else "0", self.default_rate,
+                max_concurrency, int(lease_ttl * 1000), int(WAITER_TTL * 1000)
+            ]
+        )
+        return 0.0 if int(granted) else int(wait_ms) / 1000
+
+    async def release(self, lease_id: str):
+        await self.client.zrem(self.leases_key, lease_id)
+
+    async def forget(self, lease_id: str, rank: int):
+        await self.client.zrem(self.waiting_keys[rank], lease_id)
+
+    async def feedback(
+        self,
+        kind: str,
+        min_rate: float,
+        max_rate: float,
+        step: float,
+        pause: float
+    ) -> float:
+        rate = await self._feedback(
+            keys=[self.rate_key, self.next_slot_key],
+            args=[kind, self.default_rate, min_rate, max_rate, step, int(pause * 1000)]
+        )
+        return float(rate)
+
+
+class GigaChatGovernor:
+    """Адаптивный rate limit + конкурентность + приоритеты для GigaChat"""
+
+    def __init__(
+        self,
+        redis_client=None,
+        use_redis: Optional[bool] = None,
+        rate: Optional[float] = None,
+        min_rate: Optional[float] = None,
+        max_rate: Optional[float] = None,
+        rate_step: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        latency_target: Optional[float] = None,
+        lease_ttl: Optional[float] = None,
+        max_queue_wait: Optional[float] = None,
+        throttle_pause: Optional[float] = None
+    ):
+        """
+        Args:
+            redis_client: redis.asyncio клиент (по умолчанию REDIS_HOST/REDIS_PORT)
+            use_redis: Общее состояние в Redis (GIGACHAT_GOVERNOR_REDIS)
+            rate: Начальная частота, запросов/сек (GIGACHAT_RATE)
+            min_rate / max_rate: Границы адаптивной частоты
+            rate_step: Прирост частоты после успешного ответа
+            max_concurrency: Запросов "в полете" на все процессы
+            latency_target: Ответ дольше - признак перегрузки, частота снижается
+            lease_ttl: TTL аренды слота (процесс упал, не освободив слот)
+            max_queue_wait: Максимум ожидания слота (GigaChatBusyError)
+            throttle_pause: Пауза после 429 без Retry-After
+        """
+        def _env(value, name, default, cast=float):
+            return value if value is not None else cast(os.getenv(name, default))
+
+        self.initial_rate = _env(rate, "GIGACHAT_RATE", "1.0")
+        self.min_rate = _env(min_rate, "GIGACHAT_RATE_MIN", "0.2")
+        self.max_rate = _env(max_rate, "GIGACHAT_RATE_MAX", "3.0")
+        self.rate_step = _env(rate_step, "GIGACHAT_RATE_STEP", "0.05")
+        self.max_concurrency = _env(max_concurrency, "GIGACHAT_MAX_CONCURRENCY", "1", int)
+        self.latency_target = _env(latency_target, "GIGACHAT_LATENCY_TARGET", "15")
+        self.lease_ttl = _env(lease_ttl, "GIGACHAT_LEASE_TTL", "180")
+        self.max_queue_wait = _env(max_queue_wait, "GIGACHAT_MAX_QUEUE_WAIT", "300")
+        self.throttle_pause = _env(throttle_pause, "GIGACHAT_THROTTLE_PAUSE", "2.0")
+        self.rate = self.initial_rate
+
+        self._local = _LocalBackend(self.initial_rate)
+        self._redis: Optional[_RedisBackend] = None
+        self._redis_failed_at: Optional[float] = None
+
+        if use_redis is None:
+            use_redis = os.getenv("GIGACHAT_GOVERNOR_REDIS", "true").lower() == "true"
+        if use_redis:
+            try:
+                if redis_client is None:
+                    import redis.asyncio as redis
+
+                    redis_client = redis.Redis(
+                        host=os.getenv("REDIS_HOST", "redis"),
+                        port=int(os.getenv("REDIS_PORT", "6379")),
+                        password=os.getenv("REDIS_PASSWORD") or None,
+                        decode_responses=True,
+                        socket_timeout=5,
+                        socket_connect_timeout=5
+                    )
+                self._redis = _RedisBackend(redis_client, self.initial_rate)
+            except Exception as e:
+                logger.warning(f"⚠️ GigaChat governor: Redis недоступен, локальный режим ({e})")
+
+        logger.info(
+            f"✅ GigaChat governor: {self.initial_rate} req/s "
+            f"[{self.min_rate}..{self.max_rate}], max concurrency {self.max_concurrency}, "
+            f"{'Redis' if self._redis else 'local'}"
+        )
+
+    def _backend(self):
+        """Redis, а после ошибки Redis - локальное состояние на REDIS_RETRY_SECONDS"""
+        if self._redis is None:
+            return self._local
+        if self._redis_failed_at and time.monotonic() - self._redis_failed_at < REDIS_RETRY_SECONDS:
+            return self._local
+        return self._redis
+
+    async def _call(self, method: str, *args):
+        backend = self._backend()
+        try:
+            return await getattr(backend, method)(*args)
+        except Exception as e:
+            if backend is self._local:
+                raise
+            if self._redis_failed_at is None:
+                logger.warning(f"⚠️ GigaChat governor: ошибка Redis, локальный режим ({e})")
+            self._redis_failed_at = time.monotonic()
+            return await getattr(self._local, method)(*args)
+
+    async def acquire(self, priority: Optional[int] = None) -> GigaChatLease:
+        """
+        Дождаться слота
+
+        Raises:
+            GigaChatBusyError: слот не получен за max_queue_wait
+        """
+        priority = _current_priority.get() if priority is None else priority
+        lease_id = uuid.uuid4().hex
+        started = time.monotonic()
+
+        try:
+            while True:
+                waited = time.monotonic() - started
+                wait = await self._call(
+                    "try_acquire", lease_id, priority,
+                    waited >= MAX_YIELD_SECONDS[priority],
+                    self.max_concurrency, self.lease_ttl
+                )
+                if wait <= 0:
+                    break
+                if waited + wait > self.max_queue_wait:
+                    raise GigaChatBusyError(
+                        f"GigaChat: слот не получен за {self.max_queue_wait:.0f}s "
+                        f"({PRIORITY_NAMES[priority]})"
+                    )
+                # Jitter: процессы не опрашивают Redis синхронно
+                await asyncio.sleep(min(wait, POLL_INTERVAL) * random.uniform(1.0, 1.2))
+        except BaseException:
+            try:
+                await self._call("forget", lease_id, priority)
+            except Exception:
+                pass
+            raise
+
+        wait_time = time.monotonic() - started
+        if gigachat_governor_queue_wait_seconds:
+            gigachat_governor_queue_wait_seconds.labels(priority=PRIORITY_NAMES[priority]).observe(wait_time)
+        if wait_time > 5:
+            logger.debug(f"⏳ GigaChat slot ({PRIORITY_NAMES[priority]}) после {wait_time:.1f}s ожидания")
+
+        return GigaChatLease(
+            lease_id=lease_id,
+            priority=priority,
+            wait_time=wait_time,
+            started_at=time.monotonic()
+        )
+
+    async def release(self, lease: GigaChatLease, error: Optional[BaseException] = None):
+        """Освободить слот и скорректировать частоту по результату запроса"""
+        latency = time.monotonic() - lease.started_at
+
+        if lease.throttled:
+            kind = "throttled"
+        elif latency > self.latency_target or isinstance(error, asyncio.TimeoutError):
+            kind = "slow"
+        elif error is None:
+            kind = "ok"
+        else:
+            kind = None
+
+        try:
+            await self._call("release", lease.lease_id)
+            if kind is None:
+                return
+            pause = lease.retry_after if lease.retry_after is not None else self.throttle_pause
+            rate = await self._call(
+                "feedback", kind, self.min_rate, self.max_rate, self.rate_step, pause
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ GigaChat governor: не удалось освободить слот: {e}")
+            return
+
+        if kind != "ok":
+            logger.warning(
+                f"🐢 GigaChat {'429' if kind == 'throttled' else f'latency {latency:.1f}s'}: "
+                f"частота {self.rate:.2f} → {rate:.2f} req/s"
+            )
+            if gigachat_governor_throttle_events_total:
+                gigachat_governor_throttle_events_total.labels(
+                    reason="429" if kind == "throttled" else "latency"
+                ).inc()
+        self.rate = rate
+        if gigachat_governor_rate:
+            gigachat_governor_rate.set(rate)
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[int] = None):
+        """
+        Слот для одного запроса к GigaChat
+
+        429 распознается через lease.observe(response) или по исключению
+        (raise_for_status, openai.RateLimitError).
+        """
+        lease = await self.acquire(priority)
+        error = None
+        try:
+            yield lease
+        except BaseException as e:
+            error = e
+            rate_limited, headers = _rate_limited_response(e)
+            if rate_limited:
+                lease.throttled = True
+                lease.retry_after = _retry_after_seconds(headers)
+            raise
+        finally:
+            await self.release(lease, error)
+
+
+# Глобальный экземпляр
+gigachat_governor = GigaChatGovernor()
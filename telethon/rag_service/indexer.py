@@ -2,8 +2,10 @@
 Сервис индексирования постов в Qdrant
 """
 import logging
+import re
 import sys
 import os
+import uuid
 from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime, timezone
 
@@ -14,10 +16,48 @@ from database import SessionLocal
 from models import Post, User, IndexingStatus
 from vector_db import qdrant_client
 from embeddings import embeddings_service
+from sparse_encoder import sparse_encoder
+from rate_limiter import PRIORITY_BACKGROUND, gigachat_priority
 import config
 
 logger = logging.getLogger(__name__)
 
+# Источник chunk'а (payload "source"): текст поста или страница по ссылке
+SOURCE_POST = "post"
+SOURCE_LINK = "link"
+
+# Разделитель страниц в Post.enriched_content (см. LinkEnrichmentWorker.enrich_post)
+LINK_SECTION_RE = re.compile(r"\n*\[Содержимое ссылки: ([^\]\n]+)\]\n")
+
+
+def split_post_sections(post: Post) -> List[Tuple[str, str, Optional[str]]]:
+    """
+    Документ поста для индексации: текст поста и страницы по ссылкам
+    
+    Returns:
+        Список (source, text, url)
+    """
+    sections = [(SOURCE_POST, post.text, None)]
+    
+    if config.INDEX_ENRICHED_CONTENT and post.enriched_content:
+        # [текст поста, url1, страница1, url2, страница2, ...]
+        parts = LINK_SECTION_RE.split(post.enriched_content)
+        for url, content in zip(parts[1::2], parts[2::2]):
+            content = content.strip()
+            if content:
+                sections.append((SOURCE_LINK, content, url.strip()))
+    
+    return sections
+
+
+def chunk_point_id(post_id: int, chunk_index: int, total_chunks: int) -> str:
+    """UUID точки Qdrant для chunk'а поста"""
+    if total_chunks > 1:
+        # Для chunks используем комбинацию post_id + chunk_index
+        return str(uuid.uuid5(uuid.NAMESPACE_DNS, f"post_{post_id}_chunk_{chunk_index}"))
+    # Для одного chunk используем UUID на основе post_id
+    return str(uuid.uuid5(uuid.NAMESPACE_DNS, f"post_{post_id}"))
+
 
 class IndexerService:
     """Сервис для индексации постов в Qdrant"""
@@ -65,48 +105,74 @@ class IndexerService:
                 self._save_indexing_status(
                     db, post.user_id, post_id,
                     status="skipped",
-                    error=error_msg
+                    error=error_msg,
+                    posted_at=post.posted_at
                 )
                 return False, error_msg
             
-            # Проверяем, нужно ли разбивать на chunks
-            token_count = self.embeddings.count_tokens(post.text)
-            max_tokens, overlap_tokens = self.embeddings.get_chunking_params("gigachat")
+            # Повторная индексация (например, после обогащения ссылками) -
+            # chunks прошлой разбивки, которых нет в новой, нужно удалить
+            reindex = db.query(IndexingStatus.id).filter(
+                IndexingStatus.user_id == post.user_id,
+                IndexingStatus.post_id == post_id,
+                IndexingStatus.status == "success"
+            ).first() is not None
+            
+            # Почти-дубликат (near_duplicates.py): chunks и embeddings canonical
+            # поста копируются без запросов к GigaChat; если canonical еще не
+            # проиндексирован - обычная индексация
+            if post.canonical_post_id:
+                copied = await self._index_from_canonical(db, post, reindex)
+                if copied:
+                    return True, None
             
-            if token_count <= max_tokens:
-                # Индексируем пост целиком
-                success = await self._index_single_chunk(
-                    db, post, post.text, chunk_index=0, total_chunks=1
-                )
-                return success, None if success else "Ошибка индексации"
-            else:
-                # Разбиваем на chunks
-                chunks = self.embeddings.chunk_text(
-                    post.text,
+            # Текст поста и страницы по ссылкам разбиваются отдельно:
+            # chunk не смешивает источники, source попадает в payload
+            max_tokens, overlap_tokens = self.embeddings.get_chunking_params("gigachat")
+            chunks = []
+            token_count = 0
+            for source, section_text, source_url in split_post_sections(post):
+                section_chunks, section_tokens = self.embeddings.chunk_text_with_count(
+                    section_text,
                     max_tokens=max_tokens,
                     overlap_tokens=overlap_tokens
                 )
-                
-                logger.info(f"📄 Пост {post_id}: разбит на {len(chunks)} chunks")
-                
-                # Индексируем каждый chunk
-                success_count = 0
-                for i, (chunk_text, start_pos, end_pos) in enumerate(chunks):
-                    success = await self._index_single_chunk(
-                        db, post, chunk_text,
-                        chunk_index=i,
-                        total_chunks=len(chunks),
-                        start_pos=start_pos,
-                        end_pos=end_pos
+                token_count += section_tokens
+                chunks.extend(
+                    (chunk_text, start_pos, end_pos, source, source_url)
+                    for chunk_text, start_pos, end_pos in section_chunks
+                )
+            
+            if len(chunks) > 1:
+                logger.info(f"📄 Пост {post_id}: {token_count} токенов, разбит на {len(chunks)} chunks")
+            
+            # Индексируем каждый chunk (start_pos/end_pos - позиции в тексте источника)
+            success_count = 0
+            for i, (chunk_text, start_pos, end_pos, source, source_url) in enumerate(chunks):
+                success = await self._index_single_chunk(
+                    db, post, chunk_text,
+                    chunk_index=i,
+                    total_chunks=len(chunks),
+                    start_pos=start_pos,
+                    end_pos=end_pos,
+                    source=source,
+                    source_url=source_url
+                )
+                if success:
+                    success_count += 1
+            
+            if success_count == len(chunks):
+                if reindex:
+                    await self.qdrant.delete_post_points(
+                        post.user_id, post_id,
+                        keep_point_ids=[chunk_point_id(post_id, i, len(chunks)) for i in range(len(chunks))]
                     )
-                    if success:
-                        success_count += 1
-                
-                if success_count == len(chunks):
-                    return True, None
-                else:
-                    error_msg = f"Проиндексировано {success_count}/{len(chunks)} chunks"
-                    return False, error_msg
+                return True, None
+            elif len(chunks) == 1:
+                return False, "Ошибка индексации"
+            else:
+                error_msg = f"Проиндексировано {success_count}/{len(chunks)} chunks"
+                return False, error_msg
                     
         except Exception as e:
             error_msg = f"Ошибка индексации поста {post_id}: {e}"
@@ -119,7 +185,8 @@ class IndexerService:
                     self._save_indexing_status(
                         db, post.user_id, post_id,
                         status="failed",
-                        error=str(e)[:500]
+                        error=str(e)[:500],
+                        posted_at=post.posted_at
                     )
             except:
                 pass
@@ -138,7 +205,9 @@ class IndexerService:
         chunk_index: int = 0,
         total_chunks: int = 1,
         start_pos: int = 0,
-        end_pos: Optional[int] = None
+        end_pos: Optional[int] = None,
+        source: str = SOURCE_POST,
+        source_url: Optional[str] = None
     ) -> bool:
         """
         Индексировать один chunk текста
@@ -151,13 +220,17 @@ class IndexerService:
             total_chunks: Общее количество chunks
             start_pos: Начальная позиция в оригинальном тексте
             end_pos: Конечная позиция в оригинальном тексте
+            source: Источник chunk'а (SOURCE_POST / SOURCE_LINK)
+            source_url: URL страницы для SOURCE_LINK
             
         Returns:
             Успех операции
         """
         try:
-            # Генерируем embedding
-            result = await self.embeddings.generate_embedding(chunk_text)
+            # Генерируем embedding (индексация - фоновый приоритет GigaChat,
+            # уступает /rag/ask и дайджестам)
+            with gigachat_priority(PRIORITY_BACKGROUND):
+                result = await self.embeddings.generate_embedding(chunk_text)
             if not result:
                 logger.error(f"❌ Не удалось сгенерировать embedding для поста {post.id}")
                 return False
@@ -166,36 +239,29 @@ class IndexerService:
             
             # Формируем payload для Qdrant
             payload = {
-                "post_id": post.id,
+                **self._post_payload(post),
                 "text": chunk_text,
-                "channel_id": post.channel_id,
-                "channel_username": post.channel.channel_username,
-                "posted_at": post.posted_at.isoformat(),
-                "tags": post.tags or [],
-                "url": post.url,
-                "views": post.views,
                 "chunk_index": chunk_index,
                 "total_chunks": total_chunks,
                 "start_pos": start_pos,
                 "end_pos": end_pos or len(chunk_text),
+                "source": source,
                 "embedding_provider": provider
             }
+            if source_url:
+                payload["source_url"] = source_url
             
             # Формируем уникальный ID для chunk'а (используем UUID формат)
-            import uuid
-            if total_chunks > 1:
-                # Для chunks используем комбинацию post_id + chunk_index
-                point_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, f"post_{post.id}_chunk_{chunk_index}"))
-            else:
-                # Для одного chunk используем UUID на основе post_id
-                point_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, f"post_{post.id}"))
+            point_id = chunk_point_id(post.id, chunk_index, total_chunks)
             
             # Сохраняем в Qdrant
+            # Sparse BM25 вектор - для гибридного поиска по точным совпадениям
             vector_id = await self.qdrant.upsert_point(
                 user_id=post.user_id,
                 point_id=point_id,
                 vector=embedding,
-                payload=payload
+                payload=payload,
+                sparse_vector=sparse_encoder.encode_document(chunk_text)
             )
             
             # Сохраняем статус индексации (только для первого chunk'а или если один chunk)
@@ -203,7 +269,8 @@ class IndexerService:
                 self._save_indexing_status(
                     db, post.user_id, post.id,
                     vector_id=vector_id,
-                    status="success"
+                    status="success",
+                    posted_at=post.posted_at
                 )
             
             logger.debug(f"✅ Пост {post.id} chunk {chunk_index+1}/{total_chunks} проиндексирован ({provider})")
@@ -213,6 +280,82 @@ class IndexerService:
             logger.error(f"❌ Ошибка индексации chunk'а {chunk_index} поста {post.id}: {e}")
             return False
     
+    @staticmethod
+    def _post_payload(post: Post) -> Dict[str, Any]:
+        """Поля payload, относящиеся к посту (общие для всех его chunks)"""
+        # Числовая дата для Range фильтров (retention delete by filter)
+        posted_at = post.posted_at
+        if posted_at.tzinfo is None:
+            posted_at = posted_at.replace(tzinfo=timezone.utc)
+        
+        payload = {
+            "post_id": post.id,
+            "channel_id": post.channel_id,
+            "channel_username": post.channel.channel_username,
+            "posted_at": post.posted_at.isoformat(),
+            "posted_at_ts": int(posted_at.timestamp()),
+            "tags": post.tags or [],
+            "url": post.url,
+            "views": post.views
+        }
+        # Группа почти-дубликатов - по ней схлопываются результаты поиска
+        if post.canonical_post_id:
+            payload["canonical_post_id"] = post.canonical_post_id
+        return payload
+    
+    async def _index_from_canonical(self, db: Any, post: Post, reindex: bool = False) -> bool:
+        """
+        Проиндексировать почти-дубликат копией chunks canonical поста
+        
+        Векторы и текст chunks - canonical поста, поля поста (post_id, канал,
+        дата, теги, url) - собственные.
+        
+        Returns:
+            False - у canonical поста нет точек в Qdrant
+        """
+        try:
+            source_points = await self.qdrant.get_post_points(post.user_id, post.canonical_post_id)
+            if not source_points:
+                return False
+            
+            post_payload = self._post_payload(post)
+            total_chunks = len(source_points)
+            points = []
+            for i, point in enumerate(source_points):
+                payload = dict(point["payload"])
+                payload.update(post_payload)
+                payload["chunk_index"] = i
+                payload["total_chunks"] = total_chunks
+                points.append({
+                    "id": chunk_point_id(post.id, i, total_chunks),
+                    "vector": point["vector"],
+                    "sparse_vector": point["sparse_vector"],
+                    "payload": payload
+                })
+            
+            await self.qdrant.upsert_points_batch(post.user_id, points)
+            self._save_indexing_status(
+                db, post.user_id, post.id,
+                vector_id=points[0]["id"],
+                status="success",
+                posted_at=post.posted_at
+            )
+            if reindex:
+                await self.qdrant.delete_post_points(
+                    post.user_id, post.id,
+                    keep_point_ids=[p["id"] for p in points]
+                )
+            
+            logger.info(
+                f"🧬 Пост {post.id}: {total_chunks} chunks скопировано "
+                f"с canonical поста {post.canonical_post_id}"
+            )
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ Ошибка копирования chunks canonical поста {post.canonical_post_id}: {e}")
+            return False
+    
     def _save_indexing_status(
         self,
         db: Any,
@@ -220,7 +363,8 @@ class IndexerService:
         post_id: int,
         vector_id: Optional[str] = None,
         status: str = "success",
-        error: Optional[str] = None
+        error: Optional[str] = None,
+        posted_at: Optional[datetime] = None
     ):
         """
         Сохранить статус индексации в БД
@@ -232,6 +376,7 @@ class IndexerService:
             vector_id: ID вектора в Qdrant
             status: Статус (success/failed/skipped)
             error: Сообщение об ошибке
+            posted_at: Дата поста (ключ партиционирования indexing_status)
         """
         try:
             # Проверяем существующий статус
@@ -253,7 +398,8 @@ class IndexerService:
                     post_id=post_id,
                     vector_id=vector_id,
                     status=status,
-                    error=error
+                    error=error,
+                    posted_at=posted_at
                 )
                 db.add(indexing_status)
             
@@ -385,6 +531,22 @@ class IndexerService:
         finally:
             db.close()
     
+    async def _drop_dense_only_collection(self, user_id: int):
+        """Удалить коллекцию пользователя, если в ней нет sparse векторов"""
+        if not config.SPARSE_SEARCH_ENABLED:
+            return
+        
+        collection_name = self.qdrant.get_collection_name(user_id)
+        try:
+            if self.qdrant.has_sparse_vectors(collection_name):
+                return
+        except Exception:
+            # Коллекции нет - будет создана при индексации
+            return
+        
+        logger.info(f"🔄 Коллекция {collection_name} без sparse векторов - пересоздается для гибридного поиска")
+        await self.qdrant.delete_collection(user_id)
+    
     async def reindex_user_posts(
         self,
         user_id: int
@@ -422,6 +584,10 @@ class IndexerService:
             ).delete()
             db.commit()
             
+            # Коллекция без sparse векторов (создана до гибридного поиска) -
+            # пересоздаем, схему существующей коллекции не изменить
+            await self._drop_dense_only_collection(user_id)
+            
             # Индексируем заново
             result = await self.index_posts_batch(post_ids)
             result["user_id"] = user_id
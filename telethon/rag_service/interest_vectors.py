@@ -0,0 +1,176 @@
+"""
+Interest Vectors
+Вектор интересов пользователя для рекомендаций без генерации embeddings
+
+/rag/recommend искал посты по 3 темам интересов: 3 последовательных
+вызова embeddings (лимит GigaChat) и 3 поиска на каждый запрос. Вместо
+этого поддерживается вектор интересов - центроид недавних сигналов:
+- запросы пользователя: embedding уже посчитан при поиске (/rag/ask,
+  /rag/search), вес INTEREST_QUERY_WEIGHT
+- посты, к которым пользователь обращался (похожие посты): векторы
+  chunks из Qdrant, вес INTEREST_POST_WEIGHT
+- холодный старт: темы интересов (история запросов, теги) - один batch
+  embeddings при первой рекомендации
+
+Центроид - взвешенная сумма нормированных векторов с экспоненциальным
+затуханием (полураспад INTEREST_HALF_LIFE_DAYS): старые интересы
+вытесняются новыми. Рекомендации - один поиск в Qdrant по центроиду.
+
+Хранение в Redis (interest:vector:{user_id}, TTL INTEREST_TTL_DAYS), без
+Redis - в памяти процесса. Обновление - чтение и запись без блокировки:
+одновременные сигналы одного пользователя редки, потеря одного сигнала
+некритична.
+"""
+import json
+import logging
+import math
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "interest:vector:"
+# После ошибки Redis - локальное хранение, повторная попытка через
+REDIS_RETRY_SECONDS = 60
+
+
+def _normalize(vector: List[float]) -> Optional[List[float]]:
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector] if norm else None
+
+
+class InterestVectorStore:
+    """Центроиды интересов пользователей (Redis или память процесса)"""
+
+    def __init__(self, redis_client=None, use_redis: Optional[bool] = None):
+        """
+        Args:
+            redis_client: redis.asyncio клиент (по умолчанию REDIS_HOST/REDIS_PORT)
+            use_redis: Хранить в Redis (по умолчанию INTEREST_VECTORS_REDIS)
+        """
+        self.half_life = config.INTEREST_HALF_LIFE_DAYS * 86400
+        self.ttl = config.INTEREST_TTL_DAYS * 86400
+        self._local: Dict[int, Dict[str, Any]] = {}
+        self._redis = None
+        self._redis_failed_at: Optional[float] = None
+
+        if use_redis is None:
+            use_redis = config.INTEREST_VECTORS_REDIS
+        if use_redis:
+            try:
+                if redis_client is None:
+                    import redis.asyncio as redis
+
+                    redis_client = redis.Redis(
+                        host=os.getenv("REDIS_HOST", "redis"),
+                        port=int(os.getenv("REDIS_PORT", "6379")),
+                        password=os.getenv("REDIS_PASSWORD") or None,
+                        decode_responses=True,
+                        socket_timeout=5,
+                        socket_connect_timeout=5
+                    )
+                self._redis = redis_client
+            except Exception as e:
+                logger.warning(f"⚠️ InterestVectors: Redis недоступен, хранение в памяти ({e})")
+
+    def _redis_available(self) -> bool:
+        if self._redis is None:
+            return False
+        return not (self._redis_failed_at and time.monotonic() - self._redis_failed_at < REDIS_RETRY_SECONDS)
+
+    def _redis_error(self, e: Exception):
+        if self._redis_failed_at is None:
+            logger.warning(f"⚠️ InterestVectors: ошибка Redis, хранение в памяти ({e})")
+        self._redis_failed_at = time.monotonic()
+
+    async def _load(self, user_id: int) -> Optional[Dict[str, Any]]:
+        if self._redis_available():
+            try:
+                raw = await self._redis.get(f"{KEY_PREFIX}{user_id}")
+                return json.loads(raw) if raw else None
+            except Exception as e:
+                self._redis_error(e)
+        return self._local.get(user_id)
+
+    async def _save(self, user_id: int, state: Dict[str, Any]):
+        if self._redis_available():
+            try:
+                await self._redis.setex(f"{KEY_PREFIX}{user_id}", self.ttl, json.dumps(state))
+                return
+            except Exception as e:
+                self._redis_error(e)
+        self._local[user_id] = state
+
+    def _decay(self, state: Dict[str, Any], now: float) -> float:
+        """Множитель затухания накопленной суммы с момента последнего обновления"""
+        return 0.5 ** (max(0.0, now - state["updated_at"]) / self.half_life)
+
+    async def get(self, user_id: int) -> Optional[List[float]]:
+        """
+        Вектор интересов пользователя
+
+        Returns:
+            Центроид (направление для cosine поиска) или None - сигналов нет
+            или они устарели (вес после затухания < INTEREST_MIN_WEIGHT)
+        """
+        state = await self._load(user_id)
+        if not state:
+            return None
+        if state["weight"] * self._decay(state, time.time()) < config.INTEREST_MIN_WEIGHT:
+            return None
+        return state["vector"]
+
+    async def add(self, user_id: int, vectors: List[List[float]], weight: float = 1.0):
+        """
+        Добавить сигналы интереса
+
+        Args:
+            user_id: ID пользователя
+            vectors: Векторы сигналов (embedding запроса, chunks поста)
+            weight: Вес сигнала (векторы одного сигнала делят его поровну)
+        """
+        vectors = [v for v in (_normalize(vector) for vector in vectors if vector) if v]
+        if not vectors:
+            return
+
+        try:
+            now = time.time()
+            state = await self._load(user_id)
+            share = weight / len(vectors)
+
+            if state and len(state["vector"]) == len(vectors[0]):
+                decay = self._decay(state, now)
+                total = [x * decay for x in state["vector"]]
+                total_weight = state["weight"] * decay
+            else:
+                # Первый сигнал или смена размерности embeddings (другой провайдер)
+                total = [0.0] * len(vectors[0])
+                total_weight = 0.0
+
+            for vector in vectors:
+                if len(vector) != len(total):
+                    continue
+                for i, x in enumerate(vector):
+                    total[i] += share * x
+                total_weight += share
+
+            await self._save(user_id, {"vector": total, "weight": total_weight, "updated_at": now})
+        except Exception as e:
+            # Рекомендации - не критичный путь, поиск не должен падать
+            logger.warning(f"⚠️ InterestVectors: не удалось обновить user {user_id}: {e}")
+
+    async def reset(self, user_id: int):
+        """Сбросить вектор интересов (например, при удалении данных пользователя)"""
+        self._local.pop(user_id, None)
+        if self._redis_available():
+            try:
+                await self._redis.delete(f"{KEY_PREFIX}{user_id}")
+            except Exception as e:
+                self._redis_error(e)
+
+
+# Глобальный экземпляр
+interest_vectors = InterestVectorStore()
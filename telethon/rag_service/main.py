@@ -1,6 +1,7 @@
 """
 RAG Service FastAPI Application
 """
+import asyncio
 import logging
 import sys
 import os
@@ -13,6 +14,7 @@ from fastapi.responses import JSONResponse
 from typing import Optional
 from pydantic import BaseModel
 from datetime import datetime, timezone
+from sqlalchemy import func
 
 # Prometheus metrics
 from prometheus_client import make_asgi_app
@@ -44,7 +46,11 @@ except ImportError as e:
 from indexer import indexer_service
 from vector_db import qdrant_client
 from embeddings import embeddings_service
+from interest_vectors import interest_vectors
 from scheduler import digest_scheduler
+from telegram_sender import telegram_sender
+from ttl_cache import TTLCache
+from rate_limiter import PRIORITY_INTERACTIVE, gigachat_priority
 
 
 # Database dependency
@@ -56,6 +62,9 @@ def get_db():
     finally:
         db.close()
 
+# Кэш статистики индексации (дашборды обновляют ее часто)
+stats_cache = TTLCache(ttl=config.STATS_CACHE_TTL)
+
 # Настройка логирования
 log_level = getattr(logging, config.LOG_LEVEL.upper(), logging.INFO)
 logging.basicConfig(
@@ -98,7 +107,7 @@ async def startup_event():
             
             logger.info(f"📅 Найдено {len(active_settings)} активных расписаний дайджестов")
             
-            for idx, settings in enumerate(active_settings):
+            for settings in active_settings:
                 try:
                     # Конвертируем frequency в days_of_week
                     if settings.frequency == "daily":
@@ -109,30 +118,19 @@ async def startup_event():
                     else:
                         days_of_week = "mon-sun"
                     
-                    # Staggering: сдвиг времени на 5 минут для каждого пользователя
-                    # Избегаем одновременных дайджестов → Rate Limit
-                    base_time = settings.time  # "09:00"
-                    hour, minute = map(int, base_time.split(":"))
-                    
-                    # Добавляем idx * 5 минут
-                    minute += idx * 5
-                    if minute >= 60:
-                        hour += minute // 60
-                        minute = minute % 60
-                    
-                    staggered_time = f"{hour:02d}:{minute:02d}"
-                    
-                    if idx > 0:  # Логируем только для сдвинутых пользователей
-                        logger.info(f"📅 User {settings.user_id}: {base_time} → {staggered_time} (stagger +{idx*5}m)")
-                    
+                    # Без сдвига слотов: pre-generation равномерно распределяет
+                    # генерацию по окну до слота (см. scheduler.py) - один раз ниже
                     await digest_scheduler.schedule_digest(
                         user_id=settings.user_id,
-                        time=staggered_time,  # ← Сдвинутое время
+                        time=settings.time,
                         days_of_week=days_of_week,
-                        timezone=settings.timezone
+                        timezone=settings.timezone,
+                        spread=False
                     )
                 except Exception as e:
                     logger.error(f"❌ Не удалось запланировать дайджест для user {settings.user_id}: {e}")
+            
+            digest_scheduler.spread_pregeneration()
         finally:
             db.close()
             
@@ -170,6 +168,14 @@ async def startup_event():
     except Exception as e:
         logger.error(f"❌ Ошибка запуска cleanup scheduler: {e}")
     
+    # Загрузка reranker модели (первый запрос иначе не уложится в бюджет)
+    if config.RERANK_ENABLED:
+        try:
+            from reranker import reranker
+            await asyncio.get_running_loop().run_in_executor(None, reranker.warmup)
+        except Exception as e:
+            logger.error(f"❌ Ошибка загрузки reranker: {e}")
+    
     logger.info("✅ RAG Service готов к работе")
 
 
@@ -181,6 +187,7 @@ async def shutdown_event():
         digest_scheduler.stop()
     except Exception as e:
         logger.error(f"❌ Ошибка остановки планировщика: {e}")
+    await telegram_sender.stop()
     logger.info("✅ RAG Service остановлен")
 
 
@@ -432,63 +439,54 @@ async def retry_pending_posts(
 # ============================================================================
 
 @app.get("/rag/stats/{user_id}", response_model=CollectionStatsResponse)
-async def get_collection_stats(user_id: int):
+async def get_collection_stats(user_id: int, fresh: bool = False):
     """
     Получить статистику индексации пользователя
     
+    Счетчики статусов считаются одним GROUP BY по indexing_status
+    (индекс ix_indexing_status_user_status). Ответ кэшируется на
+    STATS_CACHE_TTL секунд.
+    
     Args:
         user_id: ID пользователя
+        fresh: Обойти кэш (?fresh=1)
     """
+    if not fresh:
+        cached = stats_cache.get(user_id)
+        if cached is not None:
+            return cached
+    
     db = SessionLocal()
     try:
         # Проверяем существование пользователя
-        user = db.query(User).filter(User.id == user_id).first()
+        user = db.query(User.id).filter(User.id == user_id).first()
         if not user:
             raise HTTPException(404, f"Пользователь {user_id} не найден")
         
         # Получаем информацию о коллекции Qdrant
         collection_info = await qdrant_client.get_collection_info(user_id)
         
-        # Получаем статистику из БД
-        total_posts = db.query(Post).filter(Post.user_id == user_id).count()
-        
-        indexed_posts = db.query(IndexingStatus).filter(
-            IndexingStatus.user_id == user_id,
-            IndexingStatus.status == "success"
-        ).count()
-        
-        pending_posts = db.query(IndexingStatus).filter(
-            IndexingStatus.user_id == user_id,
-            IndexingStatus.status == "pending"
-        ).count()
-        
-        failed_posts = db.query(IndexingStatus).filter(
-            IndexingStatus.user_id == user_id,
-            IndexingStatus.status == "failed"
-        ).count()
-        
-        # Если коллекция не существует
-        if not collection_info:
-            return CollectionStatsResponse(
-                user_id=user_id,
-                collection_name=qdrant_client.get_collection_name(user_id),
-                vectors_count=0,
-                points_count=0,
-                indexed_posts=indexed_posts,
-                pending_posts=pending_posts,
-                failed_posts=failed_posts
-            )
+        # Получаем статистику из БД одним запросом
+        status_counts = dict(
+            db.query(IndexingStatus.status, func.count(IndexingStatus.id))
+            .filter(IndexingStatus.user_id == user_id)
+            .group_by(IndexingStatus.status)
+            .all()
+        )
         
-        return CollectionStatsResponse(
+        response = CollectionStatsResponse(
             user_id=user_id,
-            collection_name=collection_info["name"],
-            vectors_count=collection_info["vectors_count"],
-            points_count=collection_info["points_count"],
-            indexed_posts=indexed_posts,
-            pending_posts=pending_posts,
-            failed_posts=failed_posts
+            collection_name=collection_info["name"] if collection_info else qdrant_client.get_collection_name(user_id),
+            vectors_count=collection_info["vectors_count"] if collection_info else 0,
+            points_count=collection_info["points_count"] if collection_info else 0,
+            indexed_posts=status_counts.get("success", 0),
+            pending_posts=status_counts.get("pending", 0),
+            failed_posts=status_counts.get("failed", 0)
         )
         
+        stats_cache.set(user_id, response)
+        return response
+        
     except HTTPException:
         raise
     except Exception as e:
@@ -524,6 +522,8 @@ async def delete_user_index(user_id: int):
             IndexingStatus.user_id == user_id
         ).delete()
         db.commit()
+        stats_cache.invalidate(user_id)
+        await interest_vectors.reset(user_id)
         
         return {
             "user_id": user_id,
@@ -597,17 +597,19 @@ async def search_posts(
         if date_to:
             date_to_obj = dt.fromisoformat(date_to.replace('Z', '+00:00'))
         
-        # Выполняем поиск
-        results = await search_service.search(
-            query=query,
-            user_id=user_id,
-            limit=limit,
-            channel_id=channel_id,
-            tags=tags_list,
-            date_from=date_from_obj,
-            date_to=date_to_obj,
-            min_score=min_score
-        )
+        # Выполняем поиск (пользователь ждет ответа - вне очереди фоновых запросов GigaChat)
+        with gigachat_priority(PRIORITY_INTERACTIVE):
+            results = await search_service.search(
+                query=query,
+                user_id=user_id,
+                limit=limit,
+                channel_id=channel_id,
+                tags=tags_list,
+                date_from=date_from_obj,
+                date_to=date_to_obj,
+                min_score=min_score,
+                track_interest=True
+            )
         
         # Форматируем результаты
         search_results = [
@@ -740,16 +742,19 @@ async def ask_question(request: AskRequest):
         request: Запрос с вопросом и параметрами фильтрации
     """
     try:
-        # Генерируем ответ
-        result = await rag_generator.generate_answer(
-            query=request.query,
-            user_id=request.user_id,
-            context_limit=request.context_limit,
-            channels=request.channels,
-            tags=request.tags,
-            date_from=request.date_from,
-            date_to=request.date_to
-        )
+        # Генерируем ответ (embedding запроса и генерация - интерактивный приоритет GigaChat)
+        with gigachat_priority(PRIORITY_INTERACTIVE):
+            result = await rag_generator.generate_answer(
+                query=request.query,
+                user_id=request.user_id,
+                context_limit=request.context_limit,
+                channels=request.channels,
+                tags=request.tags,
+                date_from=request.date_from,
+                date_to=request.date_to,
+                rerank=request.rerank,
+                context_packing=request.context_packing
+            )
         
         # Проверяем на ошибки
         if "error" in result and not result.get("answer"):
@@ -771,7 +776,8 @@ async def ask_question(request: AskRequest):
             query=request.query,
             answer=result["answer"],
             sources=sources,
-            context_used=result["context_used"]
+            context_used=result["context_used"],
+            context_tokens=result.get("context_tokens")
         )
         
     except HTTPException:
@@ -1067,6 +1073,10 @@ async def get_recommendations(user_id: int, limit: int = 5):
     """
     Получить персональные рекомендации на основе интересов пользователя
     
+    Один поиск в Qdrant по вектору интересов (interest_vectors.py) без
+    генерации embeddings. Холодный старт (вектора еще нет) - темы интересов
+    из истории запросов и тегов, один batch embeddings для затравки вектора.
+    
     Args:
         user_id: ID пользователя
         limit: Количество рекомендаций (по умолчанию 5)
@@ -1075,7 +1085,6 @@ async def get_recommendations(user_id: int, limit: int = 5):
         Список рекомендованных постов с релевантностью
     """
     try:
-        from ai_digest_generator import ai_digest_generator
         from sqlalchemy.orm import joinedload
         
         logger.info(f"🎯 Генерация рекомендаций для user {user_id}")
@@ -1086,78 +1095,76 @@ async def get_recommendations(user_id: int, limit: int = 5):
             if not user:
                 raise HTTPException(404, f"Пользователь {user_id} не найден")
             
-            # Получаем интересы пользователя
-            interests = await ai_digest_generator.get_user_interests_summary(user_id)
-            combined_topics = interests.get('combined_topics', [])
-            
-            if not combined_topics:
-                logger.info(f"   💡 Нет данных об интересах для user {user_id}")
-                return {
-                    "recommendations": [],
-                    "message": "Недостаточно данных для рекомендаций. Используйте /ask для анализа интересов."
-                }
-            
-            logger.info(f"   🔍 Темы интересов: {', '.join(combined_topics[:3])}...")
+            based_on_topics = []
+            interest_vector = await interest_vectors.get(user_id)
             
-            # Собираем релевантные посты для каждой темы
-            all_recommendations = []
-            seen_post_ids = set()
+            if interest_vector is None:
+                from ai_digest_generator import ai_digest_generator
+                
+                interests = await ai_digest_generator.get_user_interests_summary(user_id)
+                based_on_topics = interests.get('combined_topics', [])[:3]  # Топ-3 темы
+                
+                if not based_on_topics:
+                    logger.info(f"   💡 Нет данных об интересах для user {user_id}")
+                    return {
+                        "recommendations": [],
+                        "message": "Недостаточно данных для рекомендаций. Используйте /ask для анализа интересов."
+                    }
+                
+                logger.info(f"   🌱 Затравка вектора интересов по темам: {', '.join(based_on_topics)}")
+                embeddings = await embeddings_service.generate_embeddings_batch(based_on_topics)
+                await interest_vectors.add(
+                    user_id, [result[0] for result in embeddings if result], config.INTEREST_QUERY_WEIGHT
+                )
+                interest_vector = await interest_vectors.get(user_id)
+                
+                if interest_vector is None:
+                    return {
+                        "recommendations": [],
+                        "message": "Не удалось определить интересы. Попробуйте позже."
+                    }
             
-            for topic in combined_topics[:3]:  # Топ-3 темы
-                try:
-                    # Векторный поиск по теме
-                    embedding, provider = await embeddings_service.generate_embedding(topic)
-                    if not embedding:
-                        continue
-                    
-                    results = await qdrant_client.search(
-                        user_id=user_id,
-                        query_vector=embedding,
-                        limit=5,
-                        score_threshold=0.6
-                    )
-                    
-                    # Добавляем уникальные результаты
-                    for result in results:
-                        post_id = result['payload']['post_id']
-                        if post_id not in seen_post_ids:
-                            seen_post_ids.add(post_id)
-                            all_recommendations.append({
-                                'post_id': post_id,
-                                'score': result['score'],
-                                'topic': topic
-                            })
-                    
-                except Exception as e:
-                    logger.error(f"   ❌ Ошибка поиска по теме '{topic}': {e}")
-                    continue
+            # С запасом: у длинных постов находится несколько chunks
+            results = await qdrant_client.search(
+                user_id=user_id,
+                query_vector=interest_vector,
+                limit=limit * 3,
+                score_threshold=config.RECOMMEND_MIN_SCORE,
+                hybrid=False
+            )
             
-            # Сортируем по score
-            all_recommendations.sort(key=lambda x: x['score'], reverse=True)
-            top_recommendations = all_recommendations[:limit]
+            # Лучший chunk каждого поста, почти-дубликаты - один раз
+            top_recommendations = {}
+            for result in results:
+                payload = result['payload']
+                group = payload.get('canonical_post_id') or payload['post_id']
+                if group not in top_recommendations and len(top_recommendations) < limit:
+                    top_recommendations[group] = (payload['post_id'], result['score'])
             
             if not top_recommendations:
-                logger.info(f"   💡 Посты не найдены для тем: {combined_topics}")
+                logger.info(f"   💡 Посты не найдены по вектору интересов user {user_id}")
                 return {
                     "recommendations": [],
                     "message": "Релевантные посты не найдены. Попробуйте добавить больше каналов."
                 }
             
-            # Обогащаем данными из БД
+            # Обогащаем данными из БД одним запросом
+            posts = {
+                post.id: post
+                for post in db.query(Post).options(joinedload(Post.channel)).filter(
+                    Post.id.in_([post_id for post_id, _ in top_recommendations.values()])
+                )
+            }
             enriched_recommendations = []
-            for rec in top_recommendations:
-                post = db.query(Post).options(
-                    joinedload(Post.channel)
-                ).filter(Post.id == rec['post_id']).first()
-                
+            for post_id, score in top_recommendations.values():
+                post = posts.get(post_id)
                 if post:
                     enriched_recommendations.append({
                         'post_id': post.id,
                         'channel': post.channel.channel_username if post.channel else 'unknown',
                         'title': post.text[:100] if post.text else 'Без текста',
                         'url': post.url,
-                        'score': rec['score'],
-                        'topic': rec['topic'],
+                        'score': score,
                         'posted_at': post.posted_at.isoformat() if post.posted_at else None
                     })
             
@@ -1165,7 +1172,7 @@ async def get_recommendations(user_id: int, limit: int = 5):
             
             return {
                 "recommendations": enriched_recommendations,
-                "based_on_topics": combined_topics[:3]
+                "based_on_topics": based_on_topics
             }
             
         finally:
@@ -1289,7 +1296,8 @@ async def hybrid_search(request: HybridSearchRequest):
                 from sqlalchemy.orm import joinedload
                 
                 # Используем векторный поиск для семантического понимания
-                embedding, provider = await embeddings_service.generate_embedding(request.query)
+                with gigachat_priority(PRIORITY_INTERACTIVE):
+                    embedding, provider = await embeddings_service.generate_embedding(request.query)
                 
                 if embedding:
                     # Векторный поиск в Qdrant
@@ -1297,7 +1305,8 @@ async def hybrid_search(request: HybridSearchRequest):
                         user_id=request.user_id,
                         query_vector=embedding,
                         limit=request.limit,
-                        score_threshold=0.5  # Более низкий порог для широкого поиска
+                        score_threshold=0.5,  # Более низкий порог для широкого поиска
+                        query_text=request.query
                     )
                     
                     # Обогащаем данными из БД
@@ -7,7 +7,7 @@ Best practices:
 - Graceful degradation (работает без Prometheus)
 """
 import logging
-from typing import Optional
+from typing import Dict, List, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -99,12 +99,64 @@ if PROMETHEUS_AVAILABLE:
         'Distribution of combined scores',
         buckets=[0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0]
     )
+    
+    # Critical path hybrid search: сколько запрос ждал каждый этап
+    # (expansion, vector_search, expanded_search, graph, rank)
+    hybrid_search_stage_seconds = Histogram(
+        'hybrid_search_stage_seconds',
+        'Hybrid search critical path time per stage',
+        ['stage'],
+        buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0]
+    )
+    
+    # Этапы, пропущенные по deadline (expansion, expanded_search, graph_signals, graph_expand)
+    hybrid_search_stage_timeouts_total = Counter(
+        'hybrid_search_stage_timeouts_total',
+        'Hybrid search stages skipped by deadline',
+        ['stage']
+    )
+    
+    # Query expansion latency (query_expander.py): source - откуда связи тегов
+    # (memory - in-memory копия, cache - TTL кэш, neo4j - batch запрос, none - нет ключевых слов)
+    query_expansion_duration_seconds = Histogram(
+        'query_expansion_duration_seconds',
+        'Query expansion duration',
+        ['source'],
+        buckets=[0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0]
+    )
 else:
     # Mock metrics
     hybrid_search_duration_seconds = None
     hybrid_search_results_total = None
     graph_expansion_added_docs = None
     combined_score_distribution = None
+    hybrid_search_stage_seconds = None
+    hybrid_search_stage_timeouts_total = None
+    query_expansion_duration_seconds = None
+
+
+# ========================================
+# Rerank Metrics
+# ========================================
+
+if PROMETHEUS_AVAILABLE:
+    # Latency cross-encoder reranker (reranker.py)
+    rag_rerank_duration_seconds = Histogram(
+        'rag_rerank_duration_seconds',
+        'Cross-encoder rerank duration',
+        buckets=[0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0]
+    )
+    
+    # Исходы rerank: ok, timeout (fallback на порядок поиска), error, unavailable
+    rag_rerank_total = Counter(
+        'rag_rerank_total',
+        'Rerank attempts by result',
+        ['result']
+    )
+else:
+    # Mock metrics
+    rag_rerank_duration_seconds = None
+    rag_rerank_total = None
 
 
 # ========================================
@@ -134,6 +186,21 @@ if PROMETHEUS_AVAILABLE:
         ['database']
     )
     
+    # Throughput пакетного удаления (rows/sec последнего прохода)
+    data_cleanup_rows_per_second = Gauge(
+        'data_cleanup_rows_per_second',
+        'Rows deleted per second by batched cleanup',
+        ['database']
+    )
+    
+    # Ожидание row locks перед DELETE пачки
+    data_cleanup_lock_wait_seconds = Histogram(
+        'data_cleanup_lock_wait_seconds',
+        'Time spent waiting for row locks per cleanup batch',
+        ['database'],
+        buckets=[0.001, 0.01, 0.05, 0.1, 0.5, 1, 5, 10]
+    )
+    
     # Database size (gauge для мониторинга роста)
     database_size_bytes = Gauge(
         'database_size_bytes',
@@ -145,6 +212,8 @@ else:
     data_cleanup_total = None
     data_cleanup_duration_seconds = None
     data_cleanup_records_deleted = None
+    data_cleanup_rows_per_second = None
+    data_cleanup_lock_wait_seconds = None
     database_size_bytes = None
 
 
@@ -217,7 +286,9 @@ def record_hybrid_search(
     duration: float,
     results_count: int,
     mode: str = "hybrid",
-    avg_combined_score: Optional[float] = None
+    avg_combined_score: Optional[float] = None,
+    stages: Optional[Dict[str, float]] = None,
+    timed_out: Optional[List[str]] = None
 ):
     """
     Записать метрики для hybrid search
@@ -227,6 +298,8 @@ def record_hybrid_search(
         results_count: Количество результатов
         mode: Режим поиска (hybrid, fallback_vector_only)
         avg_combined_score: Средний combined score
+        stages: Critical path - секунды ожидания каждого этапа
+        timed_out: Этапы, пропущенные по deadline
     """
     if not PROMETHEUS_AVAILABLE:
         return
@@ -240,6 +313,14 @@ def record_hybrid_search(
         
         if avg_combined_score is not None and combined_score_distribution:
             combined_score_distribution.observe(avg_combined_score)
+        
+        if hybrid_search_stage_seconds:
+            for stage, seconds in (stages or {}).items():
+                hybrid_search_stage_seconds.labels(stage=stage).observe(seconds)
+        
+        if hybrid_search_stage_timeouts_total:
+            for stage in timed_out or []:
+                hybrid_search_stage_timeouts_total.labels(stage=stage).inc()
     except Exception as e:
         logger.warning(f"Failed to record hybrid search metric: {e}")
 
@@ -271,5 +352,41 @@ def record_cleanup(database: str, duration: float, deleted_count: int, success:
         logger.warning(f"Failed to record cleanup metric: {e}")
 
 
+def record_cleanup_batch(database: str, lock_wait: float):
+    """
+    Записать ожидание row locks для одной пачки удаления
+    
+    Args:
+        database: База данных (postgres)
+        lock_wait: Время ожидания блокировок (секунды)
+    """
+    if not PROMETHEUS_AVAILABLE:
+        return
+    
+    try:
+        if data_cleanup_lock_wait_seconds:
+            data_cleanup_lock_wait_seconds.labels(database=database).observe(lock_wait)
+    except Exception as e:
+        logger.warning(f"Failed to record cleanup batch metric: {e}")
+
+
+def set_cleanup_throughput(database: str, rows_per_second: float):
+    """
+    Обновить throughput пакетного удаления
+    
+    Args:
+        database: База данных (postgres)
+        rows_per_second: Удалено строк в секунду за проход
+    """
+    if not PROMETHEUS_AVAILABLE:
+        return
+    
+    try:
+        if data_cleanup_rows_per_second:
+            data_cleanup_rows_per_second.labels(database=database).set(rows_per_second)
+    except Exception as e:
+        logger.warning(f"Failed to set cleanup throughput metric: {e}")
+
+
 logger.info(f"✅ Metrics module loaded (Prometheus available: {PROMETHEUS_AVAILABLE})")
 
@@ -6,10 +6,18 @@ Best practices:
 - Использовать tag co-occurrence из графа
 - Избегать over-expansion (max 3-5 терминов)
 - Graceful degradation (работает без Neo4j)
+
+Связи тегов (без round-trip в Neo4j в обычном случае):
+1. In-memory копия top-N RELATED_TO связей (QUERY_EXPANSION_TOP_EDGES),
+   обновляется в фоне раз в QUERY_EXPANSION_REFRESH_SECONDS
+2. TTL кэш окрестностей тегов (QUERY_EXPANSION_CACHE_TTL)
+3. Остальные ключевые слова - один UNWIND запрос в Neo4j
 """
+import asyncio
 import logging
 import re
-from typing import List, Set, Optional
+import time
+from typing import Dict, List, Optional
 import os
 
 # Импорты
@@ -18,6 +26,17 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 from graph.neo4j_client import neo4j_client
 
+try:
+    from rag_service.ttl_cache import TTLCache
+except ImportError:
+    # Fallback для тестов (rag_service/ добавлен в sys.path напрямую)
+    from ttl_cache import TTLCache
+
+try:
+    from rag_service.metrics import query_expansion_duration_seconds
+except ImportError:
+    query_expansion_duration_seconds = None
+
 logger = logging.getLogger(__name__)
 
 
@@ -42,6 +61,20 @@ class QueryExpander:
         self.enabled = neo4j_client.enabled
         self.max_expansions = int(os.getenv("QUERY_EXPANSION_MAX_TERMS", "3"))
         
+        # Окрестности тегов: (tag, limit) → названия связанных тегов
+        self.cache = TTLCache(
+            ttl=float(os.getenv("QUERY_EXPANSION_CACHE_TTL", "3600")),
+            max_size=int(os.getenv("QUERY_EXPANSION_CACHE_SIZE", "10000"))
+        )
+        
+        # In-memory копия самых сильных связей (0 - отключено)
+        self.snapshot_edges = int(os.getenv("QUERY_EXPANSION_TOP_EDGES", "5000"))
+        self.snapshot_refresh_seconds = float(os.getenv("QUERY_EXPANSION_REFRESH_SECONDS", "900"))
+        self._snapshot: Dict[str, List[str]] = {}
+        self._snapshot_complete = False
+        self._snapshot_at: Optional[float] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        
         # Стоп-слова (не расширяем их)
         self.stop_words = {
             'что', 'где', 'когда', 'как', 'почему', 'какие', 'какой', 'какая',
@@ -72,7 +105,7 @@ class QueryExpander:
         
         Algorithm:
             1. Извлечь ключевые слова из запроса
-            2. Для каждого ключевого слова найти related tags в Neo4j
+            2. Найти related tags: in-memory копия → TTL кэш → один batch запрос в Neo4j
             3. Добавить top N related tags к запросу
             4. Return expanded query
         """
@@ -82,6 +115,8 @@ class QueryExpander:
         if max_terms is None:
             max_terms = self.max_expansions
         
+        start = time.perf_counter()
+        source = "none"
         try:
             # 1. Извлечь ключевые слова
             keywords = self._extract_keywords(query)
@@ -91,26 +126,44 @@ class QueryExpander:
                 return query
             
             logger.debug(f"🔍 Keywords extracted: {keywords}")
+            self._schedule_snapshot_refresh()
+            source = "memory"
             
-            # 2. Найти related tags для каждого keyword
-            expanded_terms: Set[str] = set()
+            # 2. Найти related tags (первые 2 keyword - avoid over-expansion)
+            keywords = keywords[:2]
+            related: Dict[str, List[str]] = {}
+            missing = []
+            for keyword in keywords:
+                names = self._snapshot_related(keyword, max_terms)
+                if names is None:
+                    names = self.cache.get((keyword, max_terms))
+                    if names is not None:
+                        source = "cache"
+                if names is None:
+                    missing.append(keyword)
+                else:
+                    related[keyword] = names
             
-            for keyword in keywords[:2]:  # Limit to first 2 keywords (avoid over-expansion)
-                try:
-                    # Запросить related tags из Neo4j
-                    related = await neo4j_client.get_tag_relationships(
-                        tag_name=keyword,
-                        limit=max_terms
-                    )
-                    
-                    if related:
-                        # Добавить названия related tags
-                        related_names = [r.get('tag') for r in related if r.get('tag')]
-                        expanded_terms.update(related_names[:max_terms])
-                        logger.debug(f"   '{keyword}' → {related_names[:max_terms]}")
-                        
-                except Exception as e:
-                    logger.warning(f"⚠️ Failed to get related tags for '{keyword}': {e}")
+            if missing:
+                source = "neo4j"
+                fetched = await neo4j_client.get_tag_relationships_batch(
+                    tag_names=missing,
+                    limit=max_terms
+                )
+                # Ошибка Neo4j ({} без ключей) не кэшируется
+                for keyword, relationships in fetched.items():
+                    names = [r.get('tag') for r in relationships if r.get('tag')]
+                    self.cache.set((keyword, max_terms), names)
+                    related[keyword] = names
+            
+            expanded_terms: List[str] = []
+            for keyword in keywords:
+                names = related.get(keyword) or []
+                if names:
+                    logger.debug(f"   '{keyword}' → {names}")
+                for name in names:
+                    if name not in expanded_terms:
+                        expanded_terms.append(name)
             
             # 3. Собрать expanded query
             if expanded_terms:
@@ -136,6 +189,59 @@ class QueryExpander:
         except Exception as e:
             logger.error(f"❌ Query expansion failed: {e}")
             return query  # Fallback to original
+        finally:
+            if query_expansion_duration_seconds:
+                query_expansion_duration_seconds.labels(source=source).observe(time.perf_counter() - start)
+    
+    def _snapshot_related(self, keyword: str, limit: int) -> Optional[List[str]]:
+        """
+        Связанные теги из in-memory копии
+        
+        Копия содержит все связи с weight не ниже N-й по силе, поэтому top
+        связей тега в копии - его настоящий top, если их хотя бы limit
+        (или копия вмещает весь граф).
+        
+        Returns:
+            Названия связанных тегов или None (копия не отвечает за тег)
+        """
+        names = self._snapshot.get(keyword, [])
+        if len(names) >= limit or self._snapshot_complete:
+            return names[:limit]
+        return None
+    
+    def _schedule_snapshot_refresh(self):
+        """Запустить фоновое обновление in-memory копии, если она устарела"""
+        if self.snapshot_edges <= 0:
+            return
+        if self._refresh_task and not self._refresh_task.done():
+            return
+        if self._snapshot_at is not None and time.monotonic() - self._snapshot_at < self.snapshot_refresh_seconds:
+            return
+        self._refresh_task = asyncio.create_task(self.refresh_snapshot())
+    
+    async def refresh_snapshot(self):
+        """
+        Перечитать top-N RELATED_TO связей из Neo4j в память
+        
+        Ошибка Neo4j (пустой ответ) оставляет прежнюю копию до следующей попытки.
+        """
+        self._snapshot_at = time.monotonic()
+        try:
+            edges = await neo4j_client.get_top_tag_relationships(limit=self.snapshot_edges)
+            if not edges:
+                return
+            
+            snapshot: Dict[str, List[str]] = {}
+            # Связи уже по убыванию weight - списки соседей тоже
+            for edge in edges:
+                snapshot.setdefault(edge["tag1"], []).append(edge["tag2"])
+                snapshot.setdefault(edge["tag2"], []).append(edge["tag1"])
+            
+            self._snapshot = snapshot
+            self._snapshot_complete = len(edges) < self.snapshot_edges
+            logger.debug(f"✅ QueryExpander: in-memory копия обновлена ({len(edges)} связей, {len(snapshot)} тегов)")
+        except Exception as e:
+            logger.warning(f"⚠️ QueryExpander: не удалось обновить in-memory копию: {e}")
     
     def _extract_keywords(self, query: str) -> List[str]:
         """
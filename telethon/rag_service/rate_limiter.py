@@ -1,21 +1,38 @@
 """
 Глобальный Rate Limiter для GigaChat API
 
-Тариф: 1 concurrent request
-Best practice: Context7 aiolimiter - leaky bucket algorithm для защиты от Rate Limit
+Тонкая обертка над gigachat_governor: общий для всех процессов (Redis)
+адаптивный лимит частоты, конкурентность (GIGACHAT_MAX_CONCURRENCY)
+и приоритеты запросов.
 """
-from aiolimiter import AsyncLimiter
-import logging
+from gigachat_governor import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_DIGEST,
+    PRIORITY_INTERACTIVE,
+    gigachat_governor,
+    gigachat_priority
+)
 
-logger = logging.getLogger(__name__)
+__all__ = [
+    "PRIORITY_BACKGROUND",
+    "PRIORITY_DIGEST",
+    "PRIORITY_INTERACTIVE",
+    "gigachat_governor",
+    "gigachat_priority",
+    "gigachat_slot"
+]
 
-# КРИТИЧНО: max_rate=1 для одного потока GigaChat
-# time_period=1.0 = минимум 1 секунда между запросами
-# Это гарантирует что одновременно выполняется только 1 запрос к GigaChat API
-gigachat_rate_limiter = AsyncLimiter(
-    max_rate=1,      # 1 запрос
-    time_period=1.0  # за 1 секунду
-)
 
-logger.info("✅ GigaChat Rate Limiter инициализирован: 1 request per 1 second")
+def gigachat_slot(priority=None):
+    """
+    Слот для одного запроса к GigaChat (embeddings или completions)
+
+    Args:
+        priority: PRIORITY_* (по умолчанию - приоритет сценария, см. gigachat_priority)
 
+    Usage:
+        async with gigachat_slot() as lease:
+            response = await client.post(...)
+            lease.observe(response)
+    """
+    return gigachat_governor.slot(priority)
@@ -0,0 +1,205 @@
+"""
+Cross-Encoder Reranker
+Переранжирование кандидатов поиска перед генерацией RAG-ответа
+
+Поиск упорядочивает документы по cosine (или смеси с графом), и в промпт
+попадает весь top context_limit, включая слабые совпадения. Reranker
+получает больше кандидатов (RERANK_CANDIDATES), оценивает пары
+(вопрос, текст) cross-encoder'ом и оставляет лучшие RERANK_TOP_K:
+- модель: небольшой многоязычный cross-encoder в ONNX (int8) на CPU,
+  onnxruntime + tokenizers, без torch; загрузка лениво при первом вызове
+- пары оцениваются батчами по RERANK_BATCH_SIZE в отдельном потоке
+- бюджет RERANK_TIMEOUT_MS: не уложились - исходный порядок поиска
+  (поток досчитывает текущий батч и останавливается)
+
+Зависимости опциональны: без onnxruntime/tokenizers reranker отключается.
+"""
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import config
+
+try:
+    from rag_service.metrics import rag_rerank_duration_seconds, rag_rerank_total
+except ImportError:
+    rag_rerank_duration_seconds = None
+    rag_rerank_total = None
+
+logger = logging.getLogger(__name__)
+
+
+class CrossEncoderReranker:
+    """Cross-encoder (ONNX, CPU) для переранжирования результатов поиска"""
+
+    def __init__(self):
+        self.enabled = config.RERANK_ENABLED
+        self.model_name = config.RERANK_MODEL
+        self.onnx_file = config.RERANK_ONNX_FILE
+        self.model_path = config.RERANK_MODEL_PATH
+        self.batch_size = config.RERANK_BATCH_SIZE
+        self.max_length = config.RERANK_MAX_LENGTH
+        self.timeout = config.RERANK_TIMEOUT_MS / 1000
+        self.threads = config.RERANK_THREADS
+
+        self._session = None
+        self._tokenizer = None
+        self._input_names = set()
+        self._load_failed = False
+        # Один поток: модель уже распараллелена внутри (intra_op threads),
+        # запросы не конкурируют за ядра
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+
+    @property
+    def available(self) -> bool:
+        """Модель загружена или еще не пробовали (enabled - только значение по умолчанию для запросов)"""
+        return not self._load_failed
+
+    def _resolve(self, filename: str) -> str:
+        """Локальный файл модели (RERANK_MODEL_PATH) или загрузка с HuggingFace Hub"""
+        if self.model_path:
+            return os.path.join(self.model_path, filename)
+        from huggingface_hub import hf_hub_download
+        return hf_hub_download(self.model_name, filename)
+
+    def _load(self) -> bool:
+        """Ленивая загрузка ONNX модели и токенизатора"""
+        if self._session is not None:
+            return True
+        if self._load_failed:
+            return False
+
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+
+            logger.info(f"📥 Загрузка reranker модели: {self.model_name} ({self.onnx_file})")
+            tokenizer = Tokenizer.from_file(self._resolve("tokenizer.json"))
+            tokenizer.enable_truncation(max_length=self.max_length, strategy="only_second")
+            tokenizer.enable_padding()
+
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = self.threads
+            session = ort.InferenceSession(
+                self._resolve(self.onnx_file),
+                sess_options=options,
+                providers=["CPUExecutionProvider"]
+            )
+
+            self._tokenizer = tokenizer
+            self._input_names = {i.name for i in session.get_inputs()}
+            self._session = session
+            logger.info("✅ Reranker модель загружена")
+            return True
+
+        except ImportError:
+            logger.warning("⚠️ onnxruntime/tokenizers не установлены. Reranker недоступен.")
+            logger.warning("   Установите: pip install onnxruntime tokenizers huggingface-hub")
+        except Exception as e:
+            logger.error(f"❌ Ошибка загрузки reranker модели: {e}")
+
+        self._load_failed = True
+        return False
+
+    def _score_batch(self, query: str, texts: List[str]) -> List[float]:
+        """Оценки релевантности пар (query, text) - logits cross-encoder'а"""
+        import numpy as np
+
+        encodings = self._tokenizer.encode_batch([(query, text) for text in texts])
+        inputs = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64)
+        }
+        logits = self._session.run(None, {k: v for k, v in inputs.items() if k in self._input_names})[0]
+        return [float(row[0]) if np.ndim(row) else float(row) for row in logits]
+
+    def _score(self, query: str, texts: List[str], deadline: float) -> Optional[List[float]]:
+        """Оценки батчами; None - модель недоступна или бюджет исчерпан"""
+        if not self._load():
+            return None
+
+        scores = []
+        for i in range(0, len(texts), self.batch_size):
+            if time.monotonic() > deadline:
+                return None
+            scores.extend(self._score_batch(query, texts[i:i + self.batch_size]))
+        return scores
+
+    def warmup(self):
+        """Загрузить модель заранее (первый запрос иначе не уложится в бюджет)"""
+        if self.enabled and self._load():
+            self._score_batch("прогрев", ["прогрев reranker"])
+
+    async def rerank(
+        self,
+        query: str,
+        results: List[Dict[str, Any]],
+        top_k: int
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Переранжировать результаты поиска
+
+        Args:
+            query: Вопрос пользователя
+            results: Кандидаты поиска (поле text)
+            top_k: Сколько лучших оставить
+
+        Returns:
+            top_k результатов по rerank_score или None - reranker недоступен,
+            ошибка или превышен бюджет (вызывающий берет исходный порядок)
+        """
+        if not results or not self.available:
+            self._record("unavailable")
+            return None
+
+        start = time.monotonic()
+        deadline = start + self.timeout
+        texts = [result.get("text") or "" for result in results]
+
+        try:
+            loop = asyncio.get_running_loop()
+            scores = await asyncio.wait_for(
+                loop.run_in_executor(self._executor, self._score, query, texts, deadline),
+                timeout=self.timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"⏰ Reranker: превышен бюджет {self.timeout * 1000:.0f}ms, исходный порядок")
+            self._record("timeout", time.monotonic() - start)
+            return None
+        except Exception as e:
+            logger.error(f"❌ Reranker: ошибка переранжирования: {e}")
+            self._record("error", time.monotonic() - start)
+            return None
+
+        if scores is None:
+            self._record("timeout" if self.available else "unavailable", time.monotonic() - start)
+            return None
+
+        duration = time.monotonic() - start
+        self._record("ok", duration)
+
+        reranked = [dict(result, rerank_score=score) for result, score in zip(results, scores)]
+        reranked.sort(key=lambda r: r["rerank_score"], reverse=True)
+        logger.info(
+            f"🎯 Reranker: {len(results)} кандидатов → {min(top_k, len(reranked))} "
+            f"за {duration * 1000:.0f}ms"
+        )
+        return reranked[:top_k]
+
+    @staticmethod
+    def _record(result: str, duration: Optional[float] = None):
+        try:
+            if rag_rerank_total:
+                rag_rerank_total.labels(result=result).inc()
+            if duration is not None and rag_rerank_duration_seconds:
+                rag_rerank_duration_seconds.observe(duration)
+        except Exception:
+            pass
+
+
+# Глобальный экземпляр
+reranker = CrossEncoderReranker()
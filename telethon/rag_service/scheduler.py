@@ -1,25 +1,53 @@
 """
 Планировщик для автоматических дайджестов
-Базовая реализация
+
+Две фазы:
+1. Pre-generation - в окне DIGEST_PREGEN_WINDOW_MINUTES до слота доставки.
+   Пользователи одного слота (например, 09:00 Europe/Moscow) равномерно
+   распределяются по окну, чтобы не упираться одновременно в GigaChat limiter.
+   Результат сохраняется в precomputed_digests по (user, period).
+2. Доставка - в слот пользователя отправляется сохраненный дайджест.
+   Если после генерации появились новые посты - дайджест дополняется
+   (incremental top-up). AI-дайджест дополняется саммари через LLM только
+   от DIGEST_TOPUP_MIN_POSTS новых постов, иначе - списком постов без LLM
+   (все пользователи слота не идут в GigaChat в одну минуту). Нет
+   сохраненного - генерация как раньше.
 """
+import asyncio
+import hashlib
 import logging
+from html import escape
 import os
 import sys
 from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.date import DateTrigger
-import httpx
 import pytz
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 
 # Добавляем родительскую директорию в path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from database import SessionLocal
-from models import DigestSettings
+from models import DigestSettings, Post, PrecomputedDigest
+import config
+from telegram_sender import telegram_sender, PRIORITY_BULK
+
+# Observability
+try:
+    from observability.metrics import rag_digest_generation_lead_seconds, rag_digest_deliveries_total
+except ImportError:
+    rag_digest_generation_lead_seconds = None
+    rag_digest_deliveries_total = None
 
 logger = logging.getLogger(__name__)
 
+# Сколько дней хранить доставленные/устаревшие pre-generated дайджесты
+PRECOMPUTED_RETENTION_DAYS = 14
+
 
 class DigestScheduler:
     """Планировщик дайджестов"""
@@ -27,6 +55,13 @@ class DigestScheduler:
     def __init__(self):
         """Инициализация планировщика"""
         self.scheduler = AsyncIOScheduler()
+        self.pregen_window = timedelta(minutes=config.DIGEST_PREGEN_WINDOW_MINUTES)
+        self.pregen_margin = timedelta(minutes=config.DIGEST_PREGEN_MARGIN_MINUTES)
+        
+        # Триггеры доставки и ожидающие pre-generation пользователи по слотам (UTC)
+        self._triggers: Dict[int, CronTrigger] = {}
+        self._slot_users: Dict[datetime, List[int]] = {}
+        
         logger.info("✅ Digest Scheduler инициализирован")
     
     def start(self):
@@ -52,7 +87,8 @@ class DigestScheduler:
         user_id: int,
         time: str = "09:00",
         days_of_week: str = "mon-sun",
-        timezone: str = "Europe/Moscow"
+        timezone: str = "Europe/Moscow",
+        spread: bool = True
     ):
         """
         Запланировать дайджест для пользователя
@@ -62,6 +98,9 @@ class DigestScheduler:
             time: Время отправки (HH:MM)
             days_of_week: Дни недели
             timezone: Часовой пояс (например, 'Europe/Moscow')
+            spread: Сразу перераспределить pre-generation слота. False - при
+                массовом планировании (старт сервиса), затем один вызов
+                spread_pregeneration() на все слоты
         """
         try:
             hour, minute = time.split(":")
@@ -91,12 +130,309 @@ class DigestScheduler:
                 replace_existing=True
             )
             
+            self._triggers[user_id] = trigger
+            self._schedule_pregeneration(user_id, spread=spread)
+            
             logger.info(f"📅 Дайджест запланирован для user {user_id} ({time} {timezone}, {days_of_week})")
             
         except Exception as e:
             logger.error(f"❌ Ошибка планирования дайджеста: {e}")
             raise
     
+    # ------------------------------------------------------------------
+    # Фаза 1: pre-generation
+    # ------------------------------------------------------------------
+    
+    def _schedule_pregeneration(self, user_id: int, spread: bool = True):
+        """Запланировать pre-generation к следующему слоту пользователя"""
+        trigger = self._triggers.get(user_id)
+        if trigger is None or self.pregen_window <= timedelta(0):
+            return
+        
+        now = datetime.now(pytz.UTC)
+        slot_at = trigger.get_next_fire_time(None, now)
+        if slot_at is None:
+            return
+        slot_at = slot_at.astimezone(pytz.UTC)
+        
+        self._forget_slot(user_id)
+        self._slot_users.setdefault(slot_at, []).append(user_id)
+        if spread:
+            self._spread_pregeneration(slot_at)
+    
+    def spread_pregeneration(self):
+        """Распределить pre-generation всех ожидающих слотов (после массового schedule_digest)"""
+        for slot_at in list(self._slot_users):
+            self._spread_pregeneration(slot_at)
+    
+    def _spread_pregeneration(self, slot_at: datetime):
+        """
+        Равномерно распределить pre-generation пользователей слота по окну
+        
+        Окно: [slot_at - window, slot_at - margin). Пользователи, чья
+        генерация уже началась, в списке слота не участвуют.
+        """
+        users = self._slot_users.get(slot_at, [])
+        if not users:
+            return
+        
+        now = datetime.now(pytz.UTC)
+        window_start = max(slot_at - self.pregen_window, now)
+        window_end = slot_at - self.pregen_margin
+        
+        if window_end <= window_start:
+            # Слот слишком близко - дайджест сгенерируется при доставке
+            for user_id in users:
+                self._remove_pregeneration_job(user_id)
+            self._slot_users.pop(slot_at, None)
+            return
+        
+        step = (window_end - window_start) / len(users)
+        
+        for k, user_id in enumerate(users):
+            run_at = window_start + step * k + step / 2
+            self._remove_pregeneration_job(user_id)
+            self.scheduler.add_job(
+                self._pregenerate_digest,
+                trigger=DateTrigger(run_date=run_at),
+                id=f"digest_pregen_user_{user_id}",
+                args=[user_id, slot_at],
+                replace_existing=True,
+                misfire_grace_time=int(self.pregen_window.total_seconds())
+            )
+        
+        logger.debug(f"🗓️ Pre-generation слота {slot_at.isoformat()}: {len(users)} пользователей, шаг {step}")
+    
+    def _forget_slot(self, user_id: int):
+        """Убрать пользователя из ожидающих pre-generation"""
+        for slot_at in list(self._slot_users):
+            users = self._slot_users[slot_at]
+            if user_id in users:
+                users.remove(user_id)
+                if not users:
+                    del self._slot_users[slot_at]
+    
+    def _remove_pregeneration_job(self, user_id: int):
+        job_id = f"digest_pregen_user_{user_id}"
+        if self.scheduler.get_job(job_id):
+            self.scheduler.remove_job(job_id)
+    
+    def _period_length(self, settings: DigestSettings) -> timedelta:
+        """Период дайджеста по частоте"""
+        if settings.frequency == "weekly":
+            return timedelta(days=7)
+        return timedelta(days=1)
+    
+    def _period_key(self, settings: DigestSettings, slot_at: datetime) -> str:
+        """Ключ периода: частота + дата слота в часовом поясе пользователя"""
+        tz = pytz.timezone(settings.timezone or "Europe/Moscow")
+        return f"{settings.frequency or 'daily'}:{slot_at.astimezone(tz).date().isoformat()}"
+    
+    def _max_post_id(self, db, user_id: int) -> int:
+        return db.query(func.max(Post.id)).filter(Post.user_id == user_id).scalar() or 0
+    
+    async def _generate(
+        self,
+        user_id: int,
+        settings: DigestSettings,
+        date_from: datetime,
+        date_to: datetime
+    ) -> Dict:
+        """Сгенерировать дайджест (AI или обычный - решает digest_generator)"""
+        from digest_generator import digest_generator
+        
+        return await digest_generator.generate_digest(
+            user_id=user_id,
+            date_from=date_from,
+            date_to=date_to,
+            channels=settings.channels,
+            tags=settings.tags,
+            format=settings.format or "markdown",
+            max_posts=settings.max_posts or 200
+        )
+    
+    async def _pregenerate_digest(self, user_id: int, slot_at: datetime):
+        """
+        Сгенерировать и сохранить дайджест к слоту slot_at
+        
+        Args:
+            user_id: ID пользователя
+            slot_at: Время доставки (UTC)
+        """
+        self._forget_slot(user_id)
+        db = SessionLocal()
+        
+        try:
+            settings = db.query(DigestSettings).filter(
+                DigestSettings.user_id == user_id
+            ).first()
+            
+            if not settings or not settings.enabled:
+                return
+            
+            logger.info(f"🧮 Pre-generation дайджеста user {user_id} к {slot_at.isoformat()}")
+            
+            now = datetime.now(pytz.UTC)
+            date_from = slot_at - self._period_length(settings)
+            # Фиксируем до генерации: посты, пришедшие во время генерации, попадут в top-up
+            last_post_id = self._max_post_id(db, user_id)
+            
+            result = await self._generate(user_id, settings, date_from, now)
+            digest_text = (result or {}).get("digest", "")
+            
+            if not digest_text:
+                logger.warning(f"⚠️ Pre-generation: пустой дайджест для user {user_id}")
+                return
+            
+            period_key = self._period_key(settings, slot_at)
+            stored = db.query(PrecomputedDigest).filter(
+                PrecomputedDigest.user_id == user_id,
+                PrecomputedDigest.period_key == period_key
+            ).first()
+            
+            if not stored:
+                stored = PrecomputedDigest(user_id=user_id, period_key=period_key)
+                db.add(stored)
+            
+            stored.slot_at = slot_at
+            stored.date_from = date_from
+            stored.covered_until = now
+            stored.last_post_id = last_post_id
+            stored.digest = digest_text
+            stored.posts_count = result.get("posts_count", 0)
+            stored.ai_generated = bool(result.get("ai_generated"))
+            stored.topped_up = False
+            stored.generated_at = datetime.now(pytz.UTC)
+            stored.delivered_at = None
+            
+            # Старые записи больше не нужны
+            db.query(PrecomputedDigest).filter(
+                PrecomputedDigest.user_id == user_id,
+                PrecomputedDigest.slot_at < now - timedelta(days=PRECOMPUTED_RETENTION_DAYS)
+            ).delete(synchronize_session=False)
+            
+            db.commit()
+            
+            lead = (slot_at - stored.generated_at).total_seconds()
+            if rag_digest_generation_lead_seconds:
+                rag_digest_generation_lead_seconds.observe(max(lead, 0))
+            
+            logger.info(f"✅ Дайджест user {user_id} готов за {lead:.0f}s до слота ({period_key})")
+            
+        except Exception as e:
+            logger.error(f"❌ Ошибка pre-generation дайджеста для user {user_id}: {e}", exc_info=True)
+            db.rollback()
+        finally:
+            db.close()
+    
+    # ------------------------------------------------------------------
+    # Фаза 2: доставка
+    # ------------------------------------------------------------------
+    
+    async def _get_digest_for_delivery(
+        self,
+        db,
+        settings: DigestSettings,
+        now: datetime
+    ) -> Tuple[str, Optional[PrecomputedDigest], str]:
+        """
+        Дайджест для доставки: сохраненный, дополненный или сгенерированный сейчас
+        
+        Returns:
+            (текст, запись precomputed_digests или None, source для метрик)
+        """
+        user_id = settings.user_id
+        
+        stored = db.query(PrecomputedDigest).filter(
+            PrecomputedDigest.user_id == user_id,
+            PrecomputedDigest.period_key == self._period_key(settings, now),
+            PrecomputedDigest.delivered_at.is_(None)
+        ).first()
+        
+        if not stored:
+            # Нет pre-generated - генерируем в момент доставки
+            result = await asyncio.wait_for(
+                self._generate(user_id, settings, now - self._period_length(settings), now),
+                timeout=config.DIGEST_GENERATION_TIMEOUT
+            )
+            return (result or {}).get("digest", ""), None, "generated"
+        
+        new_posts = db.query(func.count(Post.id)).filter(
+            Post.user_id == user_id,
+            Post.id > stored.last_post_id,
+            Post.posted_at >= stored.date_from
+        ).scalar()
+        
+        if not new_posts:
+            return stored.digest, stored, "precomputed"
+        
+        # Incremental top-up: посты, пришедшие после генерации
+        logger.info(f"➕ Top-up дайджеста user {user_id}: {new_posts} новых постов")
+        last_post_id = self._max_post_id(db, user_id)
+        
+        try:
+            if stored.ai_generated and new_posts < config.DIGEST_TOPUP_MIN_POSTS:
+                # Мало новых постов - список без LLM (нет всплеска GigaChat в слот)
+                stored.digest = f"{stored.digest}\n\n{self._new_posts_list(db, settings, stored, last_post_id)}"
+                stored.posts_count = (stored.posts_count or 0) + new_posts
+            elif stored.ai_generated:
+                # AI: саммари только по новому окну, дописываем к готовому
+                result = await asyncio.wait_for(
+                    self._generate(user_id, settings, stored.covered_until, now),
+                    timeout=config.DIGEST_TOPUP_TIMEOUT
+                )
+                addition = (result or {}).get("digest", "")
+                if addition:
+                    stored.digest = f"{stored.digest}\n\n{self._topup_header(settings, stored)}\n\n{addition}"
+                    stored.posts_count = (stored.posts_count or 0) + result.get("posts_count", 0)
+            else:
+                # Обычный дайджест без LLM - дешевле пересобрать целиком
+                result = await asyncio.wait_for(
+                    self._generate(user_id, settings, stored.date_from, now),
+                    timeout=config.DIGEST_TOPUP_TIMEOUT
+                )
+                if (result or {}).get("digest"):
+                    stored.digest = result["digest"]
+                    stored.posts_count = result.get("posts_count", 0)
+            
+            stored.covered_until = now
+            stored.last_post_id = last_post_id
+            stored.topped_up = True
+            return stored.digest, stored, "topped_up"
+            
+        except Exception as e:
+            # Top-up не успел - отправляем то, что есть
+            logger.warning(f"⚠️ Top-up дайджеста user {user_id} не удался: {e}")
+            return stored.digest, stored, "precomputed"
+    
+    def _topup_header(self, settings: DigestSettings, stored: PrecomputedDigest) -> str:
+        tz = pytz.timezone(settings.timezone or "Europe/Moscow")
+        since = stored.covered_until.astimezone(tz).strftime('%H:%M')
+        return f"<b>🆕 Новое с {since}</b>"
+    
+    def _new_posts_list(
+        self,
+        db,
+        settings: DigestSettings,
+        stored: PrecomputedDigest,
+        last_post_id: int
+    ) -> str:
+        """Посты после генерации списком (канал, начало текста, ссылка) - без LLM"""
+        posts = db.query(Post).options(joinedload(Post.channel)).filter(
+            Post.user_id == settings.user_id,
+            Post.id > stored.last_post_id,
+            Post.id <= last_post_id,
+            Post.posted_at >= stored.date_from
+        ).order_by(Post.posted_at).all()
+        
+        lines = [self._topup_header(settings, stored), ""]
+        for post in posts:
+            channel = escape(post.channel.channel_username if post.channel else "")
+            preview = escape(" ".join((post.text or "").split())[:150])
+            source = f'<a href="{post.url}">@{channel}</a>' if post.url else f"@{channel}"
+            lines.append(f"• {source}: {preview}" if preview else f"• {source}")
+        return "\n".join(lines)
+    
     async def _send_digest(self, user_id: int):
         """
         Отправить дайджест пользователю
@@ -104,10 +440,11 @@ class DigestScheduler:
         Args:
             user_id: ID пользователя
         """
+        started_at = datetime.now(pytz.UTC)
         db = SessionLocal()
         
         try:
-            logger.info(f"📧 Генерация и отправка дайджеста для user {user_id}")
+            logger.info(f"📧 Отправка дайджеста для user {user_id}")
             
             # Получаем настройки дайджеста из БД
             settings = db.query(DigestSettings).filter(
@@ -118,62 +455,23 @@ class DigestScheduler:
                 logger.warning(f"⚠️ Дайджест отключен или не найден для user {user_id}")
                 return
             
-            # Определяем период для дайджеста
-            now = datetime.now(pytz.timezone(settings.timezone))
+            try:
+                digest_text, stored, source = await self._get_digest_for_delivery(db, settings, started_at)
+            except asyncio.TimeoutError:
+                logger.error(f"❌ Timeout при генерации дайджеста для user {user_id}")
+                self._record_delivery("failed", False)
+                return
+            except Exception as e:
+                logger.error(f"❌ Ошибка генерации дайджеста: {e}")
+                self._record_delivery("failed", False)
+                return
             
-            if settings.frequency == "daily":
-                date_from = now - timedelta(days=1)
-            elif settings.frequency == "weekly":
-                date_from = now - timedelta(days=7)
-            else:
-                date_from = now - timedelta(days=1)
-            
-            date_to = now
-            
-            # Вызываем RAG Service для генерации дайджеста
-            rag_url = os.getenv("RAG_SERVICE_URL", "http://localhost:8020")
-            
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                try:
-                    # Генерация AI-дайджеста
-                    response = await client.post(
-                        f"{rag_url}/rag/digest/generate",
-                        json={
-                            "user_id": user_id,
-                            "date_from": date_from.isoformat(),
-                            "date_to": date_to.isoformat(),
-                            "preferred_topics": settings.preferred_topics,
-                            "topics_limit": settings.topics_limit or 5,
-                            "summary_style": settings.summary_style or "concise",
-                            "format": settings.format or "markdown",
-                            "max_posts": settings.max_posts or 200,
-                            "channels": settings.channels,
-                            "tags": settings.tags
-                        }
-                    )
-                    
-                    if response.status_code != 200:
-                        logger.error(f"❌ Ошибка генерации дайджеста: {response.status_code} - {response.text[:200]}")
-                        return
-                    
-                    result = response.json()
-                    digest_text = result.get("digest", "")
-                    
-                    if not digest_text:
-                        logger.warning(f"⚠️ Пустой дайджест для user {user_id}")
-                        return
-                    
-                except httpx.TimeoutException:
-                    logger.error(f"❌ Timeout при генерации дайджеста для user {user_id}")
-                    return
-                except Exception as e:
-                    logger.error(f"❌ Ошибка вызова RAG service: {e}")
-                    return
+            if not digest_text:
+                logger.warning(f"⚠️ Пустой дайджест для user {user_id}")
+                return
             
             # Отправка через Telegram Bot
-            bot_token = os.getenv("BOT_TOKEN")
-            
-            if not bot_token:
+            if not telegram_sender.enabled:
                 logger.error("❌ BOT_TOKEN не найден в переменных окружения")
                 return
             
@@ -187,67 +485,16 @@ class DigestScheduler:
             
             telegram_id = user.telegram_id
             
-            # Отправка через Telegram Bot API с retry механизмом
-            max_retries = 3
-            retry_delay = 2  # секунды
-            
-            for attempt in range(max_retries):
-                try:
-                    async with httpx.AsyncClient(timeout=30.0) as client:
-                        # Разбиваем длинный дайджест на части (макс 4096 символов в Telegram)
-                        max_length = 4000  # Оставляем запас
-                        
-                        if len(digest_text) <= max_length:
-                            messages = [digest_text]
-                        else:
-                            # Разбиваем по параграфам
-                            messages = []
-                            current_message = ""
-                            
-                            for line in digest_text.split("\n"):
-                                if len(current_message) + len(line) + 1 <= max_length:
-                                    current_message += line + "\n"
-                                else:
-                                    if current_message:
-                                        messages.append(current_message)
-                                    current_message = line + "\n"
-                            
-                            if current_message:
-                                messages.append(current_message)
-                        
-                        # Отправляем все части
-                        for i, message in enumerate(messages):
-                            response = await client.post(
-                                f"https://api.telegram.org/bot{bot_token}/sendMessage",
-                                json={
-                                    "chat_id": telegram_id,
-                                    "text": message,
-                                    "parse_mode": "HTML",  # Всегда HTML, форматирование в digest_generator
-                                    "disable_web_page_preview": True
-                                }
-                            )
-                            
-                            if response.status_code != 200:
-                                logger.error(f"❌ Ошибка отправки дайджеста в Telegram: {response.status_code} - {response.text[:200]}")
-                                raise Exception(f"Telegram API returned {response.status_code}")
-                            
-                            logger.info(f"✅ Часть {i+1}/{len(messages)} дайджеста отправлена user {user_id}")
-                        
-                        # Успешная отправка - выходим из retry loop
-                        break
-                        
-                except Exception as e:
-                    if attempt < max_retries - 1:
-                        logger.warning(f"⚠️ Попытка {attempt + 1}/{max_retries} не удалась: {e}. Повтор через {retry_delay} сек...")
-                        import asyncio
-                        await asyncio.sleep(retry_delay)
-                        retry_delay *= 2  # Exponential backoff
-                    else:
-                        logger.error(f"❌ Все {max_retries} попытки отправки дайджеста провалились: {e}")
-                        return
+            if not await self._deliver_to_telegram(user_id, telegram_id, digest_text):
+                self._record_delivery("failed", False)
+                return
+            
+            delivered_at = datetime.now(pytz.UTC)
+            if stored:
+                stored.delivered_at = delivered_at
             
             # Обновляем last_sent_at в БД
-            settings.last_sent_at = datetime.now(pytz.UTC)
+            settings.last_sent_at = delivered_at
             
             # Вычисляем next_scheduled_at
             job_id = f"digest_user_{user_id}"
@@ -258,13 +505,77 @@ class DigestScheduler:
             
             db.commit()
             
-            logger.info(f"✅ Дайджест успешно отправлен user {user_id} (telegram_id: {telegram_id})")
+            slot_at = stored.slot_at if stored and stored.slot_at <= started_at else started_at
+            on_time = (delivered_at - slot_at).total_seconds() <= config.DIGEST_ON_TIME_SECONDS
+            self._record_delivery(source, on_time)
+            
+            logger.info(f"✅ Дайджест успешно отправлен user {user_id} (telegram_id: {telegram_id}, {source})")
             
         except Exception as e:
             logger.error(f"❌ Ошибка отправки дайджеста для user {user_id}: {e}", exc_info=True)
             db.rollback()
         finally:
             db.close()
+            # Следующий слот готовим заранее
+            self._schedule_pregeneration(user_id)
+    
+    def _record_delivery(self, source: str, on_time: bool):
+        if rag_digest_deliveries_total:
+            rag_digest_deliveries_total.labels(source=source, on_time=str(on_time).lower()).inc()
+    
+    def _split_message(self, text: str, max_length: int = 4000) -> List[str]:
+        """Разбить длинный дайджест на части по строкам (лимит Telegram 4096)"""
+        if len(text) <= max_length:
+            return [text]
+        
+        messages = []
+        current_message = ""
+        
+        for line in text.split("\n"):
+            if len(current_message) + len(line) + 1 <= max_length:
+                current_message += line + "\n"
+            else:
+                if current_message:
+                    messages.append(current_message)
+                current_message = line + "\n"
+        
+        if current_message:
+            messages.append(current_message)
+        
+        return messages
+    
+    async def _deliver_to_telegram(
+        self,
+        user_id: int,
+        telegram_id: int,
+        digest_text: str
+    ) -> bool:
+        """
+        Отправить дайджест через общую outbound очередь (telegram_sender)
+        
+        Rate limit, retry_after и backoff обрабатывает очередь. Ключи частей
+        строятся по содержимому: повторный запуск доставки того же дайджеста
+        не дублирует уже отправленные части.
+        
+        Returns:
+            True если все части отправлены
+        """
+        messages = self._split_message(digest_text)
+        digest_hash = hashlib.sha1(digest_text.encode("utf-8")).hexdigest()[:16]
+        
+        delivered = await telegram_sender.send_parts(
+            telegram_id,
+            messages,
+            priority=PRIORITY_BULK,
+            key_prefix=f"digest:{user_id}:{digest_hash}"
+        )
+        
+        if delivered:
+            logger.info(f"✅ {len(messages)} част(и) дайджеста отправлены user {user_id}")
+        else:
+            logger.error(f"❌ Дайджест user {user_id} не доставлен")
+        
+        return delivered
 
 
 # Глобальный экземпляр планировщика
@@ -41,6 +41,8 @@ class AskRequest(BaseModel):
     tags: Optional[List[str]] = Field(None, description="Фильтр по тегам")
     date_from: Optional[datetime] = Field(None, description="Фильтр по дате (от)")
     date_to: Optional[datetime] = Field(None, description="Фильтр по дате (до)")
+    rerank: Optional[bool] = Field(None, description="Cross-encoder rerank (None - RERANK_ENABLED)")
+    context_packing: Optional[bool] = Field(None, description="Упаковка контекста (None - CONTEXT_PACKING_ENABLED)")
 
 
 class DigestRequest(BaseModel):
@@ -116,6 +118,7 @@ class AskResponse(BaseModel):
     answer: str
     sources: List[Source]
     context_used: int
+    context_tokens: Optional[int] = Field(None, description="Токенов контекста в промпте (ContextPacker)")
 
 
 class DigestResponse(BaseModel):
@@ -2,7 +2,8 @@
 Сервис гибридного поиска по постам
 
 Поддерживает:
-- Векторный поиск по embeddings
+- Векторный поиск по embeddings + sparse BM25 (слияние RRF в Qdrant,
+  SPARSE_SEARCH_ENABLED)
 - Фильтры: channel_id, tags, date range
 - Re-ranking результатов
 """
@@ -16,9 +17,12 @@ from datetime import datetime
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from database import SessionLocal
+from sqlalchemy.orm import joinedload
+
 from models import Post, Channel
 from vector_db import qdrant_client
 from embeddings import embeddings_service
+from interest_vectors import interest_vectors
 import config
 
 # Observability
@@ -53,7 +57,9 @@ class SearchService:
         tags: Optional[List[str]] = None,
         date_from: Optional[datetime] = None,
         date_to: Optional[datetime] = None,
-        min_score: Optional[float] = None
+        min_score: Optional[float] = None,
+        query_vector: Optional[List[float]] = None,
+        track_interest: bool = False
     ) -> List[Dict[str, Any]]:
         """
         Гибридный поиск по постам
@@ -67,22 +73,30 @@ class SearchService:
             date_from: Фильтр по дате (от)
             date_to: Фильтр по дате (до)
             min_score: Минимальный score релевантности
+            query_vector: Готовый embedding запроса (например, из batch) - без генерации
+            track_interest: Запрос пользователя - учесть embedding в векторе интересов
             
         Returns:
             Список найденных постов с метаданными
         """
         try:
-            # Генерируем embedding для запроса
-            result = await self.embeddings.generate_embedding(query)
-            if not result:
-                logger.error("❌ Не удалось сгенерировать embedding для запроса")
-                if rag_query_errors_total:
-                    rag_query_errors_total.labels(error_type='embedding_failed').inc()
-                return []
-            
-            query_vector, provider = result
+            if query_vector is not None:
+                provider = "precomputed"
+            else:
+                # Генерируем embedding для запроса
+                result = await self.embeddings.generate_embedding(query)
+                if not result:
+                    logger.error("❌ Не удалось сгенерировать embedding для запроса")
+                    if rag_query_errors_total:
+                        rag_query_errors_total.labels(error_type='embedding_failed').inc()
+                    return []
+                
+                query_vector, provider = result
             logger.info(f"🔍 Поиск для user {user_id}: '{query}' (embedding: {provider})")
             
+            if track_interest:
+                await interest_vectors.add(user_id, [query_vector], config.INTEREST_QUERY_WEIGHT)
+            
             # Применяем min_score по умолчанию из конфига, если не указан
             if min_score is None:
                 min_score = config.RAG_MIN_SCORE
@@ -119,7 +133,8 @@ class SearchService:
                     channel_id=channel_id,
                     tags=tags,
                     date_from=date_from,
-                    date_to=date_to
+                    date_to=date_to,
+                    query_text=query
                 )
                 
                 # Update trace with results
@@ -140,25 +155,7 @@ class SearchService:
             enriched_results = await self._enrich_search_results(search_results)
             
             # Применяем date фильтр после обогащения (т.к. Qdrant хранит posted_at как keyword)
-            if date_from or date_to:
-                from datetime import timezone as dt_timezone
-                
-                filtered_results = []
-                for r in enriched_results:
-                    posted_at = r['posted_at']
-                    
-                    # Делаем обе даты timezone-aware
-                    if posted_at and posted_at.tzinfo is None:
-                        posted_at = posted_at.replace(tzinfo=dt_timezone.utc)
-                    
-                    df = date_from.replace(tzinfo=dt_timezone.utc) if date_from and date_from.tzinfo is None else date_from
-                    dt = date_to.replace(tzinfo=dt_timezone.utc) if date_to and date_to.tzinfo is None else date_to
-                    
-                    # Проверяем диапазон
-                    if (not df or posted_at >= df) and (not dt or posted_at <= dt):
-                        filtered_results.append(r)
-                
-                enriched_results = filtered_results
+            enriched_results = self._filter_by_date(enriched_results, date_from, date_to)
             
             logger.info(f"✅ Найдено {len(enriched_results)} результатов для user {user_id}")
             return enriched_results
@@ -167,63 +164,249 @@ class SearchService:
             logger.error(f"❌ Ошибка поиска: {e}")
             raise
     
-    async def _enrich_search_results(
+    async def search_multi(
         self,
-        search_results: List[Dict[str, Any]]
-    ) -> List[Dict[str, Any]]:
+        queries: List[str],
+        user_id: int,
+        limit: int = 10,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        min_score: Optional[float] = None,
+        query_vectors: Optional[List[Optional[List[float]]]] = None
+    ) -> List[List[Dict[str, Any]]]:
         """
-        Обогатить результаты поиска данными из БД
+        Поиск сразу по нескольким запросам (например, темам дайджеста)
+        
+        Один batch embeddings для запросов без готового вектора, один
+        batch-запрос в Qdrant и одно обогащение из БД для объединения
+        найденных постов.
         
         Args:
-            search_results: Результаты из Qdrant
+            queries: Поисковые запросы
+            user_id: ID пользователя
+            limit: Количество результатов на запрос
+            date_from: Фильтр по дате (от)
+            date_to: Фильтр по дате (до)
+            min_score: Минимальный score релевантности
+            query_vectors: Готовые embeddings в порядке queries (None - сгенерировать)
             
         Returns:
-            Обогащенные результаты
+            Результаты в порядке queries (формат как у search)
+        """
+        if not queries:
+            return []
+        
+        vectors = list(query_vectors) if query_vectors else [None] * len(queries)
+        
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            generated = await self.embeddings.generate_embeddings_batch([queries[i] for i in missing])
+            for i, result in zip(missing, generated):
+                if result:
+                    vectors[i] = result[0]
+        
+        if min_score is None:
+            min_score = config.RAG_MIN_SCORE
+        
+        searchable = [i for i, vector in enumerate(vectors) if vector is not None]
+        if not searchable:
+            logger.error("❌ Не удалось сгенерировать embeddings для запросов")
+            return [[] for _ in queries]
+        
+        timer = None
+        if rag_search_duration_seconds:
+            timer = rag_search_duration_seconds.time()
+            timer.__enter__()
+        
+        try:
+            batch_results = await self.qdrant.search_batch(
+                user_id=user_id,
+                query_vectors=[vectors[i] for i in searchable],
+                limit=limit,
+                score_threshold=min_score,
+                query_texts=[queries[i] for i in searchable]
+            )
+        finally:
+            if timer:
+                timer.__exit__(None, None, None)
+        
+        raw_results: List[List[Dict[str, Any]]] = [[] for _ in queries]
+        for i, results in zip(searchable, batch_results):
+            raw_results[i] = results
+        
+        # Одно обогащение на объединение постов всех запросов
+        post_ids = {
+            r["payload"].get("post_id")
+            for results in raw_results for r in results
+            if r["payload"].get("post_id")
+        }
+        posts = self._load_posts(post_ids)
+        
+        output = [
+            self._filter_by_date(self._build_enriched(results, posts), date_from, date_to)
+            for results in raw_results
+        ]
+        
+        logger.info(
+            f"✅ Multi-поиск user {user_id}: {len(queries)} запросов, "
+            f"{len(post_ids)} уникальных постов"
+        )
+        return output
+    
+    def _load_posts(self, post_ids) -> Dict[int, Dict[str, Any]]:
+        """
+        Загрузить посты одним запросом
+        
+        Returns:
+            {post_id: актуальные поля поста}
         """
+        if not post_ids:
+            return {}
+        
         db = SessionLocal()
         try:
-            enriched = []
+            posts = db.query(Post).options(
+                joinedload(Post.channel)
+            ).filter(Post.id.in_(list(post_ids))).all()
             
-            for result in search_results:
-                payload = result["payload"]
-                
-                # Извлекаем post_id из payload
-                post_id = payload.get("post_id")
-                if not post_id:
-                    continue
-                
-                # Получаем пост из БД для актуальных данных
-                post = db.query(Post).filter(Post.id == post_id).first()
-                if not post:
-                    continue
-                
-                # Формируем обогащенный результат
-                enriched_result = {
-                    "post_id": post.id,
-                    "score": result["score"],
-                    "text": payload.get("text", post.text),
+            return {
+                post.id: {
+                    "text": post.text,
                     "channel_id": post.channel_id,
-                    "channel_username": post.channel.channel_username,
+                    "channel_username": post.channel.channel_username if post.channel else None,
                     "posted_at": post.posted_at,
                     "url": post.url,
                     "tags": post.tags,
-                    "views": post.views,
-                    "chunk_info": {
-                        "chunk_index": payload.get("chunk_index", 0),
-                        "total_chunks": payload.get("total_chunks", 1),
-                        "is_chunked": payload.get("total_chunks", 1) > 1
-                    }
+                    "views": post.views
                 }
-                
-                enriched.append(enriched_result)
+                for post in posts
+            }
+        finally:
+            db.close()
+    
+    def _build_enriched(
+        self,
+        search_results: List[Dict[str, Any]],
+        posts: Dict[int, Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Собрать результаты поиска с данными постов
+        
+        Chunks страниц по ссылкам (source=link) получают score с весом
+        LINK_CHUNK_SCORE_WEIGHT, порядок пересчитывается с учетом веса
+        (для гибридного поиска - по fusion_score).
+        
+        Почти-дубликаты (payload canonical_post_id) схлопываются: остается
+        лучший по рангу пост группы, остальные - в duplicate_post_ids.
+        """
+        ranked = []
+        
+        for result in search_results:
+            payload = result["payload"]
+            
+            post = posts.get(payload.get("post_id"))
+            if not post:
+                continue
+            
+            source = payload.get("source", "post")
+            weight = config.LINK_CHUNK_SCORE_WEIGHT if source == "link" else 1.0
+            rank_score = result.get("fusion_score", result["score"]) * weight
+            
+            group = payload.get("canonical_post_id") or payload["post_id"]
+            ranked.append((rank_score, group, {
+                "post_id": payload["post_id"],
+                "score": result["score"] * weight,
+                "text": payload.get("text", post["text"]),
+                "channel_id": post["channel_id"],
+                "channel_username": post["channel_username"],
+                "posted_at": post["posted_at"],
+                "url": post["url"],
+                "tags": post["tags"],
+                "views": post["views"],
+                "source": source,
+                "source_url": payload.get("source_url"),
+                "chunk_info": {
+                    "chunk_index": payload.get("chunk_index", 0),
+                    "total_chunks": payload.get("total_chunks", 1),
+                    "is_chunked": payload.get("total_chunks", 1) > 1,
+                    "start_pos": payload.get("start_pos"),
+                    "end_pos": payload.get("end_pos")
+                },
+                "duplicate_post_ids": []
+            }))
+        
+        # Стабильная сортировка: без link chunks порядок Qdrant не меняется
+        ranked.sort(key=lambda item: item[0], reverse=True)
+        
+        # Группа почти-дубликатов -> пост с лучшим рангом и остальные посты группы
+        group_posts = {}
+        group_duplicates = {}
+        for _, group, item in ranked:
+            kept = group_posts.setdefault(group, item["post_id"])
+            duplicates = group_duplicates.setdefault(group, [])
+            if item["post_id"] != kept and item["post_id"] not in duplicates:
+                duplicates.append(item["post_id"])
+        
+        enriched = []
+        for _, group, item in ranked:
+            if item["post_id"] != group_posts[group]:
+                continue
+            item["duplicate_post_ids"] = list(group_duplicates[group])
+            enriched.append(item)
+        return enriched
+    
+    def _filter_by_date(
+        self,
+        results: List[Dict[str, Any]],
+        date_from: Optional[datetime],
+        date_to: Optional[datetime]
+    ) -> List[Dict[str, Any]]:
+        """Фильтр по дате после обогащения (posted_at в Qdrant - keyword)"""
+        if not date_from and not date_to:
+            return results
+        
+        from datetime import timezone as dt_timezone
+        
+        # Делаем обе даты timezone-aware
+        df = date_from.replace(tzinfo=dt_timezone.utc) if date_from and date_from.tzinfo is None else date_from
+        dt = date_to.replace(tzinfo=dt_timezone.utc) if date_to and date_to.tzinfo is None else date_to
+        
+        filtered_results = []
+        for r in results:
+            posted_at = r['posted_at']
+            if posted_at and posted_at.tzinfo is None:
+                posted_at = posted_at.replace(tzinfo=dt_timezone.utc)
+            
+            # Проверяем диапазон
+            if (not df or posted_at >= df) and (not dt or posted_at <= dt):
+                filtered_results.append(r)
+        
+        return filtered_results
+    
+    async def _enrich_search_results(
+        self,
+        search_results: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Обогатить результаты поиска данными из БД
+        
+        Args:
+            search_results: Результаты из Qdrant
             
-            return enriched
+        Returns:
+            Обогащенные результаты
+        """
+        try:
+            post_ids = {
+                r["payload"].get("post_id")
+                for r in search_results
+                if r["payload"].get("post_id")
+            }
+            return self._build_enriched(search_results, self._load_posts(post_ids))
             
         except Exception as e:
             logger.error(f"❌ Ошибка обогащения результатов: {e}")
             return []
-        finally:
-            db.close()
     
     async def search_similar_posts(
         self,
@@ -233,33 +416,59 @@ class SearchService:
         """
         Найти похожие посты
         
+        Запрос - собственные точки поста в Qdrant (recommend по ID chunks),
+        embedding текста поста не генерируется. Векторы поста добавляются
+        в вектор интересов пользователя. Пост без точек в Qdrant (еще не
+        проиндексирован) - поиск по тексту.
+        
         Args:
             post_id: ID поста для поиска похожих
             limit: Количество результатов
             
         Returns:
-            Список похожих постов
+            Список похожих постов (без самого поста и его почти-дубликатов)
         """
         db = SessionLocal()
         try:
-            # Получаем пост
             post = db.query(Post).filter(Post.id == post_id).first()
             if not post or not post.text:
                 logger.warning(f"⚠️ Пост {post_id} не найден или не содержит текста")
                 return []
+            user_id, text = post.user_id, post.text
+            exclude_post_ids = [post_id] + ([post.canonical_post_id] if post.canonical_post_id else [])
+        finally:
+            db.close()
+        
+        try:
+            points = await self.qdrant.get_post_points(user_id, post_id)
+            if not points:
+                logger.info(f"📭 Пост {post_id} не проиндексирован, похожие посты по тексту")
+                results = await self.search(query=text, user_id=user_id, limit=limit + 1)
+                return [r for r in results if r["post_id"] not in exclude_post_ids][:limit]
+            
+            await interest_vectors.add(user_id, [p["vector"] for p in points], config.INTEREST_POST_WEIGHT)
             
-            # Используем текст поста как запрос
-            return await self.search(
-                query=post.text,
-                user_id=post.user_id,
-                limit=limit + 1  # +1 чтобы исключить сам пост
+            # С запасом: у длинных постов находится несколько chunks
+            search_results = await self.qdrant.recommend(
+                user_id=user_id,
+                positive_ids=[str(p["id"]) for p in points],
+                limit=limit * 3,
+                score_threshold=config.RAG_MIN_SCORE,
+                exclude_post_ids=exclude_post_ids
             )
             
+            enriched = await self._enrich_search_results(search_results)
+            seen = set()
+            similar = []
+            for result in enriched:
+                if result["post_id"] not in seen:
+                    seen.add(result["post_id"])
+                    similar.append(result)
+            return similar[:limit]
+            
         except Exception as e:
             logger.error(f"❌ Ошибка поиска похожих постов: {e}")
             return []
-        finally:
-            db.close()
     
     async def get_popular_tags(
         self,
@@ -0,0 +1,107 @@
+"""
+Sparse (BM25) векторы для гибридного поиска
+
+Dense embeddings плохо находят точные совпадения: имена, тикеры,
+хэштеги, жаргон каналов. Sparse вектор хранится рядом с dense в той же
+точке Qdrant и ищется по тем же фильтрам, результаты сливаются RRF.
+
+- токены: слова в нижнем регистре, #хэштеги/$тикеры/@упоминания
+  индексируются и с префиксом, и без; ё → е
+- русские слова: отсечение частых окончаний (релиз/релиза/релизом → релиз)
+- документ: BM25 TF (k1, b, avgdl = SPARSE_AVG_DOC_TOKENS)
+- запрос: вес 1.0 на уникальный токен
+- IDF считает Qdrant (SparseVectorParams(modifier=Modifier.IDF)) по
+  коллекции пользователя - словарь хранить не нужно
+- индекс токена - crc32, стабилен между процессами и релизами
+"""
+import re
+import zlib
+from collections import Counter
+from typing import List, Optional
+
+from qdrant_client.models import SparseVector
+
+import config
+
+TOKEN_RE = re.compile(r"[#@$]?\w+(?:[-.]\w+)*", re.UNICODE)
+CYRILLIC_RE = re.compile(r"^[а-я]+$")
+
+# Окончания, от длинных к коротким
+RU_ENDINGS = (
+    "иями", "ями", "ами", "ого", "его", "ому", "ему", "ыми", "ими", "иях", "ией", "иям",
+    "ах", "ях", "ия", "ие", "ии", "ию", "ий", "ый", "ой", "ая", "яя", "ое", "ее", "ые",
+    "ов", "ев", "ей", "ом", "ем", "ам", "ям", "ую", "юю",
+    "а", "я", "о", "е", "ы", "и", "у", "ю", "ь"
+)
+MIN_STEM_LENGTH = 3
+
+STOPWORDS = frozenset({
+    "и", "в", "во", "на", "с", "со", "к", "ко", "по", "о", "об", "от", "до", "из",
+    "за", "для", "не", "ни", "но", "а", "или", "что", "как", "это", "так", "же",
+    "бы", "ли", "у", "то", "все", "он", "она", "они", "мы", "вы", "я", "его", "ее",
+    "их", "там", "тут", "есть", "был", "была", "были", "быть", "при", "про",
+    "the", "a", "an", "and", "or", "of", "to", "in", "on", "for", "is", "are", "with"
+})
+
+
+def _stem(word: str) -> str:
+    if not CYRILLIC_RE.match(word):
+        return word
+    for ending in RU_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH:
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Токены для sparse вектора (с повторами - для TF)"""
+    tokens = []
+    for raw in TOKEN_RE.findall((text or "").lower().replace("ё", "е")):
+        word = raw.lstrip("#@$")
+        if not word or word in STOPWORDS:
+            continue
+        tokens.append(_stem(word))
+        if raw != word:
+            # #релиз, $sber, @channel - отдельный точный токен
+            tokens.append(raw[0] + word)
+    return tokens
+
+
+def token_index(token: str) -> int:
+    return zlib.crc32(token.encode("utf-8"))
+
+
+class SparseEncoder:
+    """BM25 sparse векторы документов и запросов"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, avg_doc_tokens: Optional[int] = None):
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_tokens = avg_doc_tokens or config.SPARSE_AVG_DOC_TOKENS
+
+    def _vector(self, weights: dict) -> Optional[SparseVector]:
+        if not weights:
+            return None
+        # Коллизии crc32 внутри одного текста - веса складываются
+        merged = Counter()
+        for token, weight in weights.items():
+            merged[token_index(token)] += weight
+        indices = sorted(merged)
+        return SparseVector(indices=indices, values=[float(merged[i]) for i in indices])
+
+    def encode_document(self, text: str) -> Optional[SparseVector]:
+        """Sparse вектор документа (None - нет токенов)"""
+        counts = Counter(tokenize(text))
+        length_norm = self.k1 * (1 - self.b + self.b * sum(counts.values()) / self.avg_doc_tokens)
+        return self._vector({
+            token: tf * (self.k1 + 1) / (tf + length_norm)
+            for token, tf in counts.items()
+        })
+
+    def encode_query(self, text: str) -> Optional[SparseVector]:
+        """Sparse вектор запроса (None - нет токенов)"""
+        return self._vector({token: 1.0 for token in tokenize(text)})
+
+
+# Глобальный экземпляр
+sparse_encoder = SparseEncoder()
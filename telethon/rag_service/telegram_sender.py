@@ -0,0 +1,561 @@
+"""
+Outbound очередь для Telegram Bot API
+
+Дайджесты и уведомления об упоминаниях отправляются через одну очередь:
+- глобальный token bucket (лимит Telegram ~30 msg/s на бота)
+- pacing по чату (не чаще 1 сообщения в TELEGRAM_PER_CHAT_INTERVAL секунд)
+- 429 → повтор после parameters.retry_after, 5xx/сеть → exponential backoff
+- идемпотентность по ключу части: повторная отправка дайджеста не
+  дублирует уже доставленные части
+- приоритеты: уведомления → массовые дайджесты
+
+Бот отправляет из нескольких процессов (rag-service - дайджесты, telethon -
+уведомления об упоминаниях), поэтому token bucket, pacing по чату и ключи
+идемпотентности хранятся в Redis и меняются атомарно (Lua скрипт), как в
+gigachat_governor. Без Redis - то же состояние локально для процесса.
+Очередь с приоритетами - своя в каждом процессе.
+
+Модуль не импортирует config - используется и из telethon, и из rag_service.
+"""
+import asyncio
+import itertools
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+# Observability
+try:
+    from observability.metrics import telegram_outbound_messages_total
+except ImportError:
+    telegram_outbound_messages_total = None
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты (меньше - раньше)
+PRIORITY_NOTIFICATION = 0
+PRIORITY_BULK = 1
+
+PRIORITY_NAMES = {
+    PRIORITY_NOTIFICATION: "notification",
+    PRIORITY_BULK: "bulk"
+}
+
+# Ключ, который отправляет другой процесс: опрос и TTL захвата
+CLAIM_POLL_INTERVAL = 0.5
+CLAIM_TTL = 600
+
+# После ошибки Redis - локальный режим на это время
+REDIS_RETRY_SECONDS = 30.0
+
+
+# KEYS: bucket, chat_next
+# ARGV: rate, capacity, per_chat_interval_ms
+# Возвращает {1, 0} - можно отправлять, {0, wait_ms} - ждать токен,
+# {-1, wait_ms} - чат еще не готов
+TRY_SEND_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local chat_next = tonumber(redis.call('GET', KEYS[2]) or '0')
+if chat_next > now then
+  return {-1, chat_next - now}
+end
+
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate / 1000)
+
+if tokens < 1 then
+  return {0, math.ceil((1 - tokens) * 1000 / rate)}
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens - 1), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], 60000)
+
+local interval = tonumber(ARGV[3])
+if interval > 0 then
+  redis.call('SET', KEYS[2], now + interval, 'PX', interval + 60000)
+end
+return {1, 0}
+"""
+
+# KEYS: chat_next
+# ARGV: delay_ms
+DELAY_CHAT_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local resume_at = now + tonumber(ARGV[1])
+if resume_at > tonumber(redis.call('GET', KEYS[1]) or '0') then
+  redis.call('SET', KEYS[1], resume_at, 'PX', tonumber(ARGV[1]) + 60000)
+end
+return resume_at
+"""
+
+
+class _LocalBackend:
+    """Состояние отправки в памяти процесса (без Redis)"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.chat_next_at: Dict[int, float] = {}
+        self.sent: Dict[str, float] = {}
+        self.claims: Dict[str, float] = {}
+
+    async def try_send(self, chat_id: int, per_chat_interval: float) -> Tuple[float, bool]:
+        now = time.monotonic()
+        chat_ready_at = self.chat_next_at.get(chat_id, 0.0)
+        if chat_ready_at > now:
+            return chat_ready_at - now, True
+
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return (1 - self.tokens) / self.rate, False
+
+        self.tokens -= 1
+        if per_chat_interval > 0:
+            self.chat_next_at[chat_id] = now + per_chat_interval
+        return 0.0, False
+
+    async def delay_chat(self, chat_id: int, delay: float):
+        resume_at = time.monotonic() + delay
+        self.chat_next_at[chat_id] = max(self.chat_next_at.get(chat_id, 0.0), resume_at)
+
+    async def is_sent(self, key: str) -> bool:
+        expires_at = self.sent.get(key)
+        if expires_at is None:
+            return False
+        if expires_at <= time.monotonic():
+            del self.sent[key]
+            return False
+        return True
+
+    async def mark_sent(self, key: str, ttl: float):
+        now = time.monotonic()
+        self.sent[key] = now + ttl
+
+        # Периодическая очистка устаревших ключей
+        if len(self.sent) > 10000:
+            self.sent = {k: t for k, t in self.sent.items() if t > now}
+
+    async def claim(self, key: str, ttl: float) -> bool:
+        now = time.monotonic()
+        if self.claims.get(key, 0.0) > now:
+            return False
+        self.claims[key] = now + ttl
+        return True
+
+    async def unclaim(self, key: str):
+        self.claims.pop(key, None)
+
+
+class _RedisBackend:
+    """Состояние отправки в Redis (общее для всех процессов бота)"""
+
+    PREFIX = "telegram:sender"
+
+    def __init__(self, client, rate: float, capacity: float):
+        self.client = client
+        self.rate = rate
+        self.capacity = capacity
+        self.bucket_key = f"{self.PREFIX}:bucket"
+        self._try_send = client.register_script(TRY_SEND_SCRIPT)
+        self._delay_chat = client.register_script(DELAY_CHAT_SCRIPT)
+
+    def _chat_key(self, chat_id: int) -> str:
+        return f"{self.PREFIX}:chat:{chat_id}"
+
+    async def try_send(self, chat_id: int, per_chat_interval: float) -> Tuple[float, bool]:
+        code, wait_ms = await self._try_send(
+            keys=[self.bucket_key, self._chat_key(chat_id)],
+            args=[self.rate, self.capacity, int(per_chat_interval * 1000)]
+        )
+        code = int(code)
+        if code == 1:
+            return 0.0, False
+        return int(wait_ms) / 1000, code < 0
+
+    async def delay_chat(self, chat_id: int, delay: float):
+        await self._delay_chat(keys=[self._chat_key(chat_id)], args=[int(delay * 1000)])
+
+    async def is_sent(self, key: str) -> bool:
+        return bool(await self.client.exists(f"{self.PREFIX}:sent:{key}"))
+
+    async def mark_sent(self, key: str, ttl: float):
+        await self.client.set(f"{self.PREFIX}:sent:{key}", "1", ex=int(ttl))
+
+    async def claim(self, key: str, ttl: float) -> bool:
+        return bool(await self.client.set(f"{self.PREFIX}:pending:{key}", "1", nx=True, ex=int(ttl)))
+
+    async def unclaim(self, key: str):
+        await self.client.delete(f"{self.PREFIX}:pending:{key}")
+
+
+@dataclass
+class OutboundMessage:
+    """Сообщение в очереди отправки"""
+    chat_id: int
+    payload: Dict[str, Any]
+    priority: int
+    key: Optional[str]
+    future: asyncio.Future
+    attempt: int = 0
+
+
+@dataclass(order=True)
+class _QueueItem:
+    priority: int
+    seq: int
+    message: OutboundMessage = field(compare=False)
+
+
+class TelegramSender:
+    """Общая очередь исходящих сообщений Telegram Bot API"""
+
+    def __init__(
+        self,
+        bot_token: Optional[str] = None,
+        api_url: str = "https://api.telegram.org",
+        global_rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        per_chat_interval: Optional[float] = None,
+        max_retries: int = 5,
+        workers: int = 8,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        redis_client=None,
+        use_redis: Optional[bool] = None
+    ):
+        """
+        Args:
+            bot_token: Токен бота (по умолчанию BOT_TOKEN)
+            api_url: Base URL Bot API
+            global_rate: Сообщений в секунду на бота (TELEGRAM_GLOBAL_RATE)
+            burst: Емкость token bucket (по умолчанию = global_rate)
+            per_chat_interval: Минимальный интервал между сообщениями в чат
+            max_retries: Повторов на одну часть
+            workers: Параллельных отправителей
+            transport: httpx transport (тесты / fake Bot API)
+            redis_client: redis.asyncio клиент (по умолчанию REDIS_HOST/REDIS_PORT)
+            use_redis: Общее состояние в Redis (TELEGRAM_SENDER_REDIS)
+        """
+        self._bot_token = bot_token
+        self.api_url = api_url.rstrip("/")
+        self.global_rate = global_rate or float(os.getenv("TELEGRAM_GLOBAL_RATE", "25"))
+        self.burst = burst or self.global_rate
+        self.per_chat_interval = (
+            per_chat_interval if per_chat_interval is not None
+            else float(os.getenv("TELEGRAM_PER_CHAT_INTERVAL", "1.0"))
+        )
+        self.max_retries = max_retries
+        self.workers = workers
+        self.transport = transport
+
+        # Доставленные ключи хранятся idempotency_ttl
+        self.idempotency_ttl = 24 * 3600
+        self._pending_keys: Dict[str, asyncio.Future] = {}
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._tasks: List[asyncio.Task] = []
+        self._seq = itertools.count()
+
+        self._local = _LocalBackend(self.global_rate, self.burst)
+        self._redis: Optional[_RedisBackend] = None
+        self._redis_failed_at: Optional[float] = None
+
+        if use_redis is None:
+            use_redis = os.getenv("TELEGRAM_SENDER_REDIS", "true").lower() == "true"
+        if use_redis:
+            try:
+                if redis_client is None:
+                    import redis.asyncio as redis
+
+                    redis_client = redis.Redis(
+                        host=os.getenv("REDIS_HOST", "redis"),
+                        port=int(os.getenv("REDIS_PORT", "6379")),
+                        password=os.getenv("REDIS_PASSWORD") or None,
+                        decode_responses=True,
+                        socket_timeout=5,
+                        socket_connect_timeout=5
+                    )
+                self._redis = _RedisBackend(redis_client, self.global_rate, self.burst)
+            except Exception as e:
+                logger.warning(f"⚠️ Telegram sender: Redis недоступен, локальный режим ({e})")
+
+    @property
+    def bot_token(self) -> Optional[str]:
+        """Токен читается при отправке - глобальный экземпляр создается до загрузки env"""
+        return self._bot_token or os.getenv("BOT_TOKEN")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.bot_token)
+
+    def _ensure_started(self):
+        """Запустить workers в текущем event loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._tasks:
+            return
+
+        self._loop = loop
+        self._queue = asyncio.PriorityQueue()
+        self._client = httpx.AsyncClient(timeout=30.0, transport=self.transport)
+        self._pending_keys = {}
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+        logger.info(
+            f"✅ Telegram sender запущен: {self.global_rate} msg/s, "
+            f"{self.per_chat_interval}s на чат, {self.workers} workers, "
+            f"{'Redis' if self._redis else 'local'}"
+        )
+
+    async def stop(self):
+        """Остановить workers и закрыть HTTP клиент"""
+        for task in self._tasks:
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+        self._loop = None
+
+    def _backend(self):
+        """Redis, а после ошибки Redis - локальное состояние на REDIS_RETRY_SECONDS"""
+        if self._redis is None:
+            return self._local
+        if self._redis_failed_at and time.monotonic() - self._redis_failed_at < REDIS_RETRY_SECONDS:
+            return self._local
+        return self._redis
+
+    async def _call(self, method: str, *args):
+        backend = self._backend()
+        try:
+            return await getattr(backend, method)(*args)
+        except Exception as e:
+            if backend is self._local:
+                raise
+            if self._redis_failed_at is None:
+                logger.warning(f"⚠️ Telegram sender: ошибка Redis, локальный режим ({e})")
+            self._redis_failed_at = time.monotonic()
+            return await getattr(self._local, method)(*args)
+
+    async def _claim(self, key: str) -> bool:
+        """
+        Захватить ключ для отправки
+
+        Ту же часть уже отправляет другой процесс - ждем, пока он ее
+        доставит (False) или отпустит ключ после ошибки (захватываем, True).
+        """
+        while not await self._call("claim", key, CLAIM_TTL):
+            await asyncio.sleep(CLAIM_POLL_INTERVAL * random.uniform(1.0, 1.2))
+            if await self._call("is_sent", key):
+                return False
+        return True
+
+    async def send_message(
+        self,
+        chat_id: int,
+        text: str,
+        priority: int = PRIORITY_BULK,
+        idempotency_key: Optional[str] = None,
+        parse_mode: Optional[str] = "HTML",
+        disable_web_page_preview: bool = True
+    ) -> bool:
+        """
+        Поставить сообщение в очередь и дождаться результата
+
+        Args:
+            chat_id: Получатель
+            text: Текст
+            priority: PRIORITY_NOTIFICATION / PRIORITY_BULK
+            idempotency_key: Ключ части - уже доставленная часть не отправляется повторно
+            parse_mode: Режим разметки
+            disable_web_page_preview: Отключить превью ссылок
+
+        Returns:
+            True если сообщение доставлено (или было доставлено раньше)
+        """
+        if not self.enabled:
+            logger.error("❌ BOT_TOKEN не задан - отправка невозможна")
+            return False
+
+        self._ensure_started()
+
+        if idempotency_key and await self._call("is_sent", idempotency_key):
+            self._record(priority, "duplicate")
+            return True
+
+        # Та же часть уже в очереди этого процесса - ждем ее результат
+        if idempotency_key and idempotency_key in self._pending_keys:
+            return await asyncio.shield(self._pending_keys[idempotency_key])
+
+        payload = {"chat_id": chat_id, "text": text, "disable_web_page_preview": disable_web_page_preview}
+        if parse_mode:
+            payload["parse_mode"] = parse_mode
+
+        future = self._loop.create_future()
+        message = OutboundMessage(
+            chat_id=chat_id,
+            payload=payload,
+            priority=priority,
+            key=idempotency_key,
+            future=future
+        )
+
+        if not idempotency_key:
+            self._enqueue(message)
+            return await asyncio.shield(future)
+
+        self._pending_keys[idempotency_key] = future
+        claimed = False
+        try:
+            claimed = await self._claim(idempotency_key)
+            if not claimed:
+                self._record(priority, "duplicate")
+                future.set_result(True)
+            else:
+                self._enqueue(message)
+            return await asyncio.shield(future)
+        finally:
+            if self._pending_keys.get(idempotency_key) is future:
+                del self._pending_keys[idempotency_key]
+            if claimed:
+                try:
+                    await self._call("unclaim", idempotency_key)
+                except Exception as e:
+                    logger.warning(f"⚠️ Telegram sender: не удалось освободить ключ {idempotency_key}: {e}")
+
+    async def send_parts(
+        self,
+        chat_id: int,
+        parts: List[str],
+        priority: int = PRIORITY_BULK,
+        key_prefix: Optional[str] = None,
+        **kwargs
+    ) -> bool:
+        """
+        Отправить многочастное сообщение по порядку
+
+        Каждая часть получает ключ "{key_prefix}:{i}": при повторе после
+        сбоя уже доставленные части пропускаются.
+
+        Returns:
+            True если доставлены все части
+        """
+        for i, part in enumerate(parts):
+            key = f"{key_prefix}:{i}" if key_prefix else None
+            if not await self.send_message(chat_id, part, priority=priority, idempotency_key=key, **kwargs):
+                logger.error(f"❌ Часть {i+1}/{len(parts)} не доставлена в чат {chat_id}")
+                return False
+        return True
+
+    def _enqueue(self, message: OutboundMessage):
+        self._queue.put_nowait(_QueueItem(message.priority, next(self._seq), message))
+
+    def _requeue_later(self, message: OutboundMessage, delay: float):
+        """Вернуть сообщение в очередь через delay секунд (worker не блокируется)"""
+        self._loop.call_later(delay, self._enqueue, message)
+
+    async def _worker(self):
+        while True:
+            item = await self._queue.get()
+            message = item.message
+
+            try:
+                while True:
+                    wait, chat_limited = await self._call(
+                        "try_send", message.chat_id, self.per_chat_interval
+                    )
+                    if wait <= 0 or chat_limited:
+                        break
+                    # Нет токена - ждем, worker не берет следующие сообщения
+                    await asyncio.sleep(wait)
+
+                # Pacing по чату: слишком рано - отложить, не занимая worker
+                if chat_limited:
+                    self._requeue_later(message, wait)
+                    continue
+
+                await self._deliver(message)
+
+            except asyncio.CancelledError:
+                if not message.future.done():
+                    message.future.set_result(False)
+                raise
+            except Exception as e:
+                logger.error(f"❌ Ошибка outbound worker: {e}")
+                if not message.future.done():
+                    message.future.set_result(False)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, message: OutboundMessage):
+        """Один вызов sendMessage с обработкой retry_after и ошибок"""
+        message.attempt += 1
+        retry_delay = None
+
+        try:
+            response = await self._client.post(
+                f"{self.api_url}/bot{self.bot_token}/sendMessage",
+                json=message.payload
+            )
+
+            if response.status_code == 200:
+                if message.key:
+                    await self._call("mark_sent", message.key, self.idempotency_ttl)
+                self._record(message.priority, "sent")
+                message.future.set_result(True)
+                return
+
+            if response.status_code == 429:
+                # Flood control: ждем ровно столько, сколько просит Telegram
+                try:
+                    retry_delay = float(response.json().get("parameters", {}).get("retry_after", 1))
+                except Exception:
+                    retry_delay = 1.0
+                await self._call("delay_chat", message.chat_id, retry_delay)
+                logger.warning(f"⚠️ Telegram 429 для чата {message.chat_id}, retry_after={retry_delay}s")
+            elif response.status_code >= 500:
+                retry_delay = min(2 ** message.attempt, 30)
+                logger.warning(f"⚠️ Telegram {response.status_code}, повтор через {retry_delay}s")
+            else:
+                # 400/403 и т.п. - повтор не поможет
+                logger.error(f"❌ Telegram {response.status_code}: {response.text[:200]}")
+
+        except httpx.HTTPError as e:
+            retry_delay = min(2 ** message.attempt, 30)
+            logger.warning(f"⚠️ Ошибка сети Telegram: {e}, повтор через {retry_delay}s")
+
+        if retry_delay is not None and message.attempt < self.max_retries:
+            self._record(message.priority, "retry")
+            self._requeue_later(message, retry_delay)
+            return
+
+        self._record(message.priority, "failed")
+        message.future.set_result(False)
+
+    def _record(self, priority: int, status: str):
+        if telegram_outbound_messages_total:
+            telegram_outbound_messages_total.labels(
+                priority=PRIORITY_NAMES.get(priority, str(priority)),
+                status=status
+            ).inc()
+
+
+# Глобальный экземпляр
+telegram_sender = TelegramSender()
@@ -0,0 +1,76 @@
+"""
+TTL Cache для агрегатов статистики
+
+Статистические endpoints (/rag/stats, /api/admin/stats/*) дергаются
+дашбордами на каждом обновлении, а данные меняются медленно. Небольшой
+in-memory кэш с коротким TTL убирает повторные агрегаты из БД;
+параметр ?fresh=1 у endpoints обходит кэш.
+
+Кэш локален для процесса (каждый worker держит свою копию) - для
+статистики это приемлемо: расхождение ограничено TTL.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """In-memory кэш с TTL и ограничением размера"""
+
+    def __init__(self, ttl: float, max_size: int = 1024):
+        """
+        Args:
+            ttl: Время жизни записи (секунды)
+            max_size: Максимум записей (при переполнении удаляются самые старые)
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data: Dict[Hashable, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Значение или None если нет / истекло"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        """Сохранить значение на ttl секунд"""
+        with self._lock:
+            if key not in self._data and len(self._data) >= self.max_size:
+                oldest = min(self._data, key=lambda k: self._data[k][0])
+                del self._data[oldest]
+            self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def get_or_set(self, key: Hashable, compute: Callable[[], Any], fresh: bool = False) -> Any:
+        """
+        Вернуть кэшированное значение или посчитать и сохранить
+
+        Args:
+            key: Ключ
+            compute: Функция расчета значения
+            fresh: Игнорировать кэш (значение все равно обновляется)
+        """
+        if not fresh:
+            value = self.get(key)
+            if value is not None:
+                return value
+        value = compute()
+        self.set(key, value)
+        return value
+
+    def invalidate(self, key: Hashable):
+        """Удалить запись"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Очистить кэш"""
+        with self._lock:
+            self._data.clear()
@@ -1,20 +1,40 @@
 """
 Qdrant Client для работы с векторной БД
+
+Коллекции хранят dense вектор (безымянный) и, при SPARSE_SEARCH_ENABLED,
+sparse BM25 вектор SPARSE_VECTOR_NAME (sparse_encoder.py). Гибридный поиск -
+один запрос query_points: prefetch dense + prefetch sparse, слияние RRF.
+Коллекции, созданные до гибридного поиска, ищутся только dense до
+переиндексации (/rag/reindex/user пересоздает их со sparse векторами).
 """
+import asyncio
 import logging
 from typing import List, Dict, Optional, Any
 from qdrant_client import QdrantClient as QdrantClientBase
 from qdrant_client.models import (
     Distance,
     VectorParams,
+    SparseVectorParams,
+    SparseVector,
+    Modifier,
     PointStruct,
     Filter,
     FieldCondition,
     MatchValue,
-    Range
+    Range,
+    QueryRequest,
+    Prefetch,
+    FusionQuery,
+    Fusion,
+    FilterSelector,
+    HasIdCondition,
+    RecommendQuery,
+    RecommendInput,
+    RecommendStrategy
 )
 from datetime import datetime
 import config
+from sparse_encoder import sparse_encoder
 
 logger = logging.getLogger(__name__)
 
@@ -29,12 +49,27 @@ class QdrantClient:
             api_key=config.QDRANT_API_KEY,
             timeout=config.QDRANT_TIMEOUT
         )
+        # collection_name -> есть ли sparse вектор (схема коллекции не меняется)
+        self._sparse_collections: Dict[str, bool] = {}
         logger.info(f"✅ Qdrant клиент инициализирован: {config.QDRANT_URL}")
     
     def get_collection_name(self, user_id: int) -> str:
         """Получить имя коллекции для пользователя"""
         return f"telegram_posts_{user_id}"
     
+    def has_sparse_vectors(self, collection_name: str) -> bool:
+        """Есть ли в коллекции sparse вектор SPARSE_VECTOR_NAME (кэшируется)"""
+        if collection_name not in self._sparse_collections:
+            info = self.client.get_collection(collection_name=collection_name)
+            sparse = info.config.params.sparse_vectors or {}
+            self._sparse_collections[collection_name] = config.SPARSE_VECTOR_NAME in sparse
+        return self._sparse_collections[collection_name]
+    
+    def _use_hybrid(self, collection_name: str, hybrid: Optional[bool]) -> bool:
+        if hybrid is None:
+            hybrid = config.SPARSE_SEARCH_ENABLED
+        return hybrid and self.has_sparse_vectors(collection_name)
+    
     async def ensure_collection(self, user_id: int, vector_size: int = 768):
         """
         Создать коллекцию для пользователя если не существует
@@ -52,13 +87,20 @@ class QdrantClient:
             
             if not exists:
                 # Создаем коллекцию
+                # Sparse BM25 вектор: TF считает sparse_encoder, IDF - Qdrant
+                sparse_vectors_config = {
+                    config.SPARSE_VECTOR_NAME: SparseVectorParams(modifier=Modifier.IDF)
+                } if config.SPARSE_SEARCH_ENABLED else None
+                
                 self.client.create_collection(
                     collection_name=collection_name,
                     vectors_config=VectorParams(
                         size=vector_size,
                         distance=Distance.COSINE
-                    )
+                    ),
+                    sparse_vectors_config=sparse_vectors_config
                 )
+                self._sparse_collections[collection_name] = sparse_vectors_config is not None
                 
                 # Создаем индексы для фильтров
                 self.client.create_payload_index(
@@ -71,13 +113,26 @@ class QdrantClient:
                     field_name="posted_at",
                     field_schema="keyword"  # datetime хранится как ISO string
                 )
+                self.client.create_payload_index(
+                    collection_name=collection_name,
+                    field_name="posted_at_ts",
+                    field_schema="integer"  # unix timestamp для Range (retention)
+                )
+                self.client.create_payload_index(
+                    collection_name=collection_name,
+                    field_name="post_id",
+                    field_schema="integer"
+                )
                 self.client.create_payload_index(
                     collection_name=collection_name,
                     field_name="tags",
                     field_schema="keyword"
                 )
                 
-                logger.info(f"✅ Создана коллекция: {collection_name} (vector_size={vector_size})")
+                logger.info(
+                    f"✅ Создана коллекция: {collection_name} (vector_size={vector_size}, "
+                    f"sparse={'да' if sparse_vectors_config else 'нет'})"
+                )
             else:
                 logger.debug(f"Коллекция уже существует: {collection_name}")
                 
@@ -90,7 +145,8 @@ class QdrantClient:
         user_id: int,
         point_id: str,
         vector: List[float],
-        payload: Dict[str, Any]
+        payload: Dict[str, Any],
+        sparse_vector: Optional[SparseVector] = None
     ) -> str:
         """
         Добавить или обновить точку в коллекции
@@ -100,6 +156,7 @@ class QdrantClient:
             point_id: ID точки (обычно post_id)
             vector: Вектор embeddings
             payload: Метаданные (text, channel_id, posted_at, tags, url, etc.)
+            sparse_vector: BM25 вектор текста (сохраняется, если коллекция гибридная)
             
         Returns:
             ID добавленной точки
@@ -113,7 +170,7 @@ class QdrantClient:
             # Создаем точку (ID должен быть строкой)
             point = PointStruct(
                 id=str(point_id),
-                vector=vector,
+                vector=self._point_vector(collection_name, vector, sparse_vector),
                 payload=payload
             )
             
@@ -140,7 +197,7 @@ class QdrantClient:
         
         Args:
             user_id: ID пользователя
-            points: Список точек [{id, vector, payload}, ...]
+            points: Список точек [{id, vector, payload, sparse_vector (опционально)}, ...]
             
         Returns:
             Количество добавленных точек
@@ -159,7 +216,7 @@ class QdrantClient:
             point_structs = [
                 PointStruct(
                     id=str(p["id"]),
-                    vector=p["vector"],
+                    vector=self._point_vector(collection_name, p["vector"], p.get("sparse_vector")),
                     payload=p["payload"]
                 )
                 for p in points
@@ -178,6 +235,112 @@ class QdrantClient:
             logger.error(f"❌ Ошибка batch добавления: {e}")
             raise
     
+    def _point_vector(
+        self,
+        collection_name: str,
+        vector: List[float],
+        sparse_vector: Optional[SparseVector]
+    ):
+        """Dense вектор точки, в гибридной коллекции - вместе со sparse"""
+        if sparse_vector is None or not self.has_sparse_vectors(collection_name):
+            return vector
+        # "" - безымянный dense вектор коллекции
+        return {"": vector, config.SPARSE_VECTOR_NAME: sparse_vector}
+    
+    def _hybrid_query(
+        self,
+        query_vector: List[float],
+        query_text: str,
+        search_filter: Optional[Filter],
+        limit: int,
+        score_threshold: Optional[float]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Параметры гибридного запроса: prefetch dense + sparse, слияние RRF
+        
+        score_threshold применяется только к dense кандидатам: sparse
+        находит точные совпадения, у которых cosine может быть ниже порога.
+        None - в запросе нет токенов для sparse поиска.
+        """
+        sparse_query = sparse_encoder.encode_query(query_text)
+        if sparse_query is None:
+            return None
+        
+        prefetch_limit = max(limit, config.HYBRID_PREFETCH_LIMIT)
+        return {
+            "prefetch": [
+                Prefetch(
+                    query=query_vector,
+                    filter=search_filter,
+                    limit=prefetch_limit,
+                    score_threshold=score_threshold
+                ),
+                Prefetch(
+                    query=sparse_query,
+                    using=config.SPARSE_VECTOR_NAME,
+                    filter=search_filter,
+                    limit=prefetch_limit
+                )
+            ],
+            "query": FusionQuery(fusion=Fusion.RRF),
+            "limit": limit,
+            "with_payload": True
+        }
+    
+    async def _dense_scores(
+        self,
+        collection_name: str,
+        query_vectors: List[List[float]],
+        responses: List[Any]
+    ) -> List[Dict[Any, float]]:
+        """
+        Dense score точек гибридной выдачи (id -> cosine), считает Qdrant
+        
+        Один query_batch_points: на каждый запрос dense поиск только по id
+        его RRF выдачи (HasIdCondition) без payload и векторов.
+        """
+        if not any(response.points for response in responses):
+            return [{} for _ in responses]
+        
+        requests = []
+        for query_vector, response in zip(query_vectors, responses):
+            ids = [point.id for point in response.points]
+            requests.append(QueryRequest(
+                query=query_vector,
+                filter=Filter(must=[HasIdCondition(has_id=ids)]),
+                limit=max(len(ids), 1),
+                with_payload=False,
+                with_vector=False
+            ))
+        
+        dense_responses = await asyncio.to_thread(
+            self.client.query_batch_points,
+            collection_name=collection_name,
+            requests=requests
+        )
+        return [
+            {point.id: point.score for point in dense.points}
+            for dense in dense_responses
+        ]
+    
+    @staticmethod
+    def _format_hybrid(points: List[Any], dense_scores: Dict[Any, float]) -> List[Dict[str, Any]]:
+        """
+        Результаты гибридного поиска в порядке RRF
+        
+        score - cosine с dense вектором запроса (как у dense поиска: пороги и
+        смешивание score в EnhancedSearchService не меняются), fusion_score - RRF.
+        """
+        return [
+            {
+                "id": point.id,
+                "score": dense_scores.get(point.id, 0.0),
+                "fusion_score": point.score,
+                "payload": point.payload
+            }
+            for point in points
+        ]
+    
     async def search(
         self,
         user_id: int,
@@ -187,7 +350,9 @@ class QdrantClient:
         channel_id: Optional[int] = None,
         tags: Optional[List[str]] = None,
         date_from: Optional[datetime] = None,
-        date_to: Optional[datetime] = None
+        date_to: Optional[datetime] = None,
+        query_text: Optional[str] = None,
+        hybrid: Optional[bool] = None
     ) -> List[Dict[str, Any]]:
         """
         Векторный поиск с фильтрами
@@ -201,6 +366,8 @@ class QdrantClient:
             tags: Фильтр по тегам
             date_from: Фильтр по дате (от)
             date_to: Фильтр по дате (до)
+            query_text: Текст запроса - для sparse части гибридного поиска
+            hybrid: Гибридный поиск (по умолчанию SPARSE_SEARCH_ENABLED)
             
         Returns:
             Список найденных точек с payload и score
@@ -209,7 +376,8 @@ class QdrantClient:
         
         try:
             # Проверяем существование коллекции
-            collections = self.client.get_collections().collections
+            # (sync client - в thread pool, чтобы параллельные поиски не блокировали event loop)
+            collections = (await asyncio.to_thread(self.client.get_collections)).collections
             if not any(c.name == collection_name for c in collections):
                 logger.warning(f"Коллекция {collection_name} не существует")
                 return []
@@ -240,8 +408,26 @@ class QdrantClient:
             # Собираем Filter объект
             search_filter = Filter(must=filter_conditions) if filter_conditions else None
             
+            hybrid_query = None
+            if query_text and self._use_hybrid(collection_name, hybrid):
+                hybrid_query = self._hybrid_query(
+                    query_vector, query_text, search_filter, limit, score_threshold
+                )
+            
+            if hybrid_query:
+                response = await asyncio.to_thread(
+                    self.client.query_points,
+                    collection_name=collection_name,
+                    **hybrid_query
+                )
+                dense_scores = await self._dense_scores(collection_name, [query_vector], [response])
+                formatted_results = self._format_hybrid(response.points, dense_scores[0])
+                logger.info(f"🔍 Найдено {len(formatted_results)} результатов для user {user_id} (hybrid)")
+                return formatted_results
+            
             # Выполняем поиск
-            results = self.client.search(
+            results = await asyncio.to_thread(
+                self.client.search,
                 collection_name=collection_name,
                 query_vector=query_vector,
                 limit=limit,
@@ -266,6 +452,183 @@ class QdrantClient:
             logger.error(f"❌ Ошибка поиска: {e}")
             raise
     
+    async def search_batch(
+        self,
+        user_id: int,
+        query_vectors: List[List[float]],
+        limit: int = 10,
+        score_threshold: Optional[float] = None,
+        channel_id: Optional[int] = None,
+        tags: Optional[List[str]] = None,
+        query_texts: Optional[List[str]] = None,
+        hybrid: Optional[bool] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Векторный поиск сразу по нескольким запросам (один вызов query_batch_points)
+        
+        Args:
+            user_id: ID пользователя
+            query_vectors: Векторы запросов
+            limit: Количество результатов на запрос
+            score_threshold: Минимальный score
+            channel_id: Фильтр по каналу
+            tags: Фильтр по тегам
+            query_texts: Тексты запросов (в порядке query_vectors) - для гибридного поиска
+            hybrid: Гибридный поиск (по умолчанию SPARSE_SEARCH_ENABLED)
+            
+        Returns:
+            Результаты в порядке query_vectors (формат как у search)
+        """
+        collection_name = self.get_collection_name(user_id)
+        
+        if not query_vectors:
+            return []
+        
+        try:
+            collections = (await asyncio.to_thread(self.client.get_collections)).collections
+            if not any(c.name == collection_name for c in collections):
+                logger.warning(f"Коллекция {collection_name} не существует")
+                return [[] for _ in query_vectors]
+            
+            filter_conditions = []
+            
+            if channel_id is not None:
+                filter_conditions.append(
+                    FieldCondition(key="channel_id", match=MatchValue(value=channel_id))
+                )
+            
+            for tag in tags or []:
+                filter_conditions.append(
+                    FieldCondition(key="tags", match=MatchValue(value=tag))
+                )
+            
+            search_filter = Filter(must=filter_conditions) if filter_conditions else None
+            
+            use_hybrid = bool(query_texts) and self._use_hybrid(collection_name, hybrid)
+            
+            requests = []
+            hybrid_flags = []
+            for i, query_vector in enumerate(query_vectors):
+                hybrid_query = None
+                if use_hybrid:
+                    hybrid_query = self._hybrid_query(
+                        query_vector, query_texts[i], search_filter, limit, score_threshold
+                    )
+                hybrid_flags.append(hybrid_query is not None)
+                
+                if hybrid_query:
+                    requests.append(QueryRequest(**hybrid_query))
+                else:
+                    requests.append(QueryRequest(
+                        query=query_vector,
+                        filter=search_filter,
+                        limit=limit,
+                        score_threshold=score_threshold,
+                        with_payload=True
+                    ))
+            
+            batch_responses = await asyncio.to_thread(
+                self.client.query_batch_points,
+                collection_name=collection_name,
+                requests=requests
+            )
+            
+            # Dense score гибридных выдач - одним дополнительным батчем
+            hybrid_indexes = [i for i, is_hybrid in enumerate(hybrid_flags) if is_hybrid]
+            dense_scores = [{} for _ in query_vectors]
+            if hybrid_indexes:
+                scores = await self._dense_scores(
+                    collection_name,
+                    [query_vectors[i] for i in hybrid_indexes],
+                    [batch_responses[i] for i in hybrid_indexes]
+                )
+                for i, scores_by_id in zip(hybrid_indexes, scores):
+                    dense_scores[i] = scores_by_id
+            
+            formatted_results = [
+                self._format_hybrid(response.points, scores_by_id) if is_hybrid else [
+                    {
+                        "id": result.id,
+                        "score": result.score,
+                        "payload": result.payload
+                    }
+                    for result in response.points
+                ]
+                for response, scores_by_id, is_hybrid in zip(batch_responses, dense_scores, hybrid_flags)
+            ]
+            
+            logger.info(
+                f"🔍 Batch поиск user {user_id}: {len(query_vectors)} запросов, "
+                f"{sum(len(r) for r in formatted_results)} результатов"
+            )
+            return formatted_results
+            
+        except Exception as e:
+            logger.error(f"❌ Ошибка batch поиска: {e}")
+            raise
+    
+    async def recommend(
+        self,
+        user_id: int,
+        positive_ids: List[str],
+        limit: int = 10,
+        score_threshold: Optional[float] = None,
+        exclude_post_ids: Optional[List[int]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Точки, похожие на точки positive_ids (query по ID, без вектора запроса)
+        
+        Qdrant берет dense векторы точек сам (среднее - AVERAGE_VECTOR),
+        embedding запроса не нужен.
+        
+        Args:
+            user_id: ID пользователя
+            positive_ids: ID точек-образцов (например, chunks поста)
+            limit: Количество результатов
+            score_threshold: Минимальный score
+            exclude_post_ids: Исключить посты и их почти-дубликаты (canonical_post_id)
+            
+        Returns:
+            Список найденных точек с payload и score (формат как у search)
+        """
+        collection_name = self.get_collection_name(user_id)
+        
+        if not positive_ids:
+            return []
+        
+        must_not = []
+        for post_id in exclude_post_ids or []:
+            must_not.append(FieldCondition(key="post_id", match=MatchValue(value=post_id)))
+            must_not.append(FieldCondition(key="canonical_post_id", match=MatchValue(value=post_id)))
+        
+        try:
+            response = await asyncio.to_thread(
+                self.client.query_points,
+                collection_name=collection_name,
+                query=RecommendQuery(recommend=RecommendInput(
+                    positive=list(positive_ids),
+                    strategy=RecommendStrategy.AVERAGE_VECTOR
+                )),
+                query_filter=Filter(must_not=must_not) if must_not else None,
+                limit=limit,
+                score_threshold=score_threshold,
+                with_payload=True
+            )
+        except Exception as e:
+            logger.error(f"❌ Ошибка recommend в {collection_name}: {e}")
+            raise
+        
+        formatted_results = [
+            {
+                "id": point.id,
+                "score": point.score,
+                "payload": point.payload
+            }
+            for point in response.points
+        ]
+        logger.info(f"🔍 Recommend user {user_id}: {len(positive_ids)} образцов, {len(formatted_results)} результатов")
+        return formatted_results
+    
     async def delete_point(self, user_id: int, point_id: str) -> bool:
         """Удалить точку из коллекции"""
         collection_name = self.get_collection_name(user_id)
@@ -282,12 +645,88 @@ class QdrantClient:
             logger.error(f"❌ Ошибка удаления точки {point_id}: {e}")
             return False
     
+    async def delete_post_points(
+        self,
+        user_id: int,
+        post_id: int,
+        keep_point_ids: Optional[List[str]] = None
+    ) -> bool:
+        """
+        Удалить точки (chunks) поста, кроме keep_point_ids
+        
+        Используется при повторной индексации: новая разбивка может дать
+        меньше chunks или сменить схему ID (один chunk → несколько).
+        """
+        collection_name = self.get_collection_name(user_id)
+        
+        must_not = [HasIdCondition(has_id=list(keep_point_ids))] if keep_point_ids else None
+        try:
+            await asyncio.to_thread(
+                self.client.delete,
+                collection_name=collection_name,
+                points_selector=FilterSelector(filter=Filter(
+                    must=[FieldCondition(key="post_id", match=MatchValue(value=post_id))],
+                    must_not=must_not
+                ))
+            )
+            logger.debug(f"🗑️ Устаревшие chunks поста {post_id} удалены из {collection_name}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ Ошибка удаления chunks поста {post_id}: {e}")
+            return False
+
+    async def get_post_points(self, user_id: int, post_id: int) -> List[Dict[str, Any]]:
+        """
+        Точки (chunks) поста вместе с векторами
+
+        Используется для почти-дубликатов: их chunks копируются с canonical
+        поста без повторной генерации embeddings.
+
+        Returns:
+            [{id, vector, sparse_vector, payload}, ...] в порядке chunk_index
+        """
+        collection_name = self.get_collection_name(user_id)
+
+        try:
+            points, _ = await asyncio.to_thread(
+                self.client.scroll,
+                collection_name=collection_name,
+                scroll_filter=Filter(
+                    must=[FieldCondition(key="post_id", match=MatchValue(value=post_id))]
+                ),
+                limit=1000,
+                with_payload=True,
+                with_vectors=True
+            )
+        except Exception as e:
+            logger.error(f"❌ Ошибка чтения chunks поста {post_id}: {e}")
+            return []
+
+        result = []
+        for point in points:
+            vector, sparse_vector = point.vector, None
+            if isinstance(vector, dict):
+                sparse_vector = vector.get(config.SPARSE_VECTOR_NAME)
+                vector = vector.get("")
+            if not vector:
+                continue
+            result.append({
+                "id": point.id,
+                "vector": vector,
+                "sparse_vector": sparse_vector,
+                "payload": point.payload
+            })
+        result.sort(key=lambda p: p["payload"].get("chunk_index", 0))
+        return result
+
     async def delete_collection(self, user_id: int) -> bool:
         """Удалить коллекцию пользователя"""
         collection_name = self.get_collection_name(user_id)
         
         try:
             self.client.delete_collection(collection_name=collection_name)
+            self._sparse_collections.pop(collection_name, None)
             logger.info(f"🗑️ Коллекция {collection_name} удалена")
             return True
             
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark: разбиение постов на chunks (EmbeddingsService.chunk_text_with_count)
+
+Сравнивает прежний алгоритм (count_tokens + decode префикса tokens[:start]
+на каждый chunk - O(n²)) с текущим (один encode, карта token → символ,
+разрез по границам абзацев/предложений) на текстах 1k-50k символов.
+
+Метрики:
+- время разбиения (медиана по --repeat запускам), ms
+- число chunks
+
+Нужен tiktoken с кодировкой cl100k_base (скачивается при первом запуске).
+
+Использование:
+    python scripts/benchmarks/chunking.py --sizes 1000 5000 20000 50000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'rag_service')))
+
+from embeddings import embeddings_service
+
+SAMPLE_PARAGRAPH = (
+    "Сбер отчитался за третий квартал: чистая прибыль выросла на 12% год к году. "
+    "Аналитики ждут дивиденды выше консенсуса, $SBER прибавил 2% на открытии! "
+    "Подробности в канале @markets_daily, #дивиденды #отчетность.\n\n"
+)
+
+
+def make_text(size: int) -> str:
+    return (SAMPLE_PARAGRAPH * (size // len(SAMPLE_PARAGRAPH) + 1))[:size]
+
+
+def legacy_chunk_text(text: str, max_tokens: int, overlap_tokens: int):
+    """Прежняя реализация chunk_text (до перехода на карту смещений)"""
+    tokenizer = embeddings_service.tokenizer
+    total_tokens = embeddings_service.count_tokens(text)
+    if total_tokens <= max_tokens:
+        return [(text, 0, len(text))]
+
+    tokens = tokenizer.encode(text)
+    chunks = []
+    start = 0
+    while start < len(tokens):
+        end = min(start + max_tokens, len(tokens))
+        chunk_text = tokenizer.decode(tokens[start:end])
+        char_start = len(tokenizer.decode(tokens[:start]))
+        char_end = len(tokenizer.decode(tokens[:end]))
+        chunks.append((chunk_text, char_start, char_end))
+        start = end - overlap_tokens if end < len(tokens) else end
+    return chunks
+
+
+def measure(func, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
+
+
+def main(sizes, repeat: int):
+    if not embeddings_service.tokenizer:
+        sys.exit("tiktoken (cl100k_base) недоступен - бенчмарк без tokenizer не имеет смысла")
+
+    max_tokens, overlap_tokens = embeddings_service.get_chunking_params("gigachat")
+    print(f"max_tokens={max_tokens}, overlap={overlap_tokens}, repeat={repeat}")
+    print(f"{'chars':>7} | {'tokens':>6} | {'legacy ms':>9} | {'chunks':>6} | {'new ms':>7} | {'chunks':>6} | {'speedup':>7}")
+    print("-" * 68)
+    for size in sizes:
+        text = make_text(size)
+        legacy_ms, legacy_chunks = measure(
+            lambda: legacy_chunk_text(text, max_tokens, overlap_tokens), repeat
+        )
+        new_ms, (chunks, token_count) = measure(
+            lambda: embeddings_service.chunk_text_with_count(text, max_tokens, overlap_tokens), repeat
+        )
+        assert all(text[start:end] == chunk for chunk, start, end in chunks)
+        print(
+            f"{size:>7} | {token_count:>6} | {legacy_ms:>9.2f} | {len(legacy_chunks):>6} | "
+            f"{new_ms:>7.2f} | {len(chunks):>6} | {legacy_ms / new_ms:>6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    import logging
+    logging.disable(logging.WARNING)
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 2000, 5000, 10000, 20000, 50000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    main(args.sizes, args.repeat)
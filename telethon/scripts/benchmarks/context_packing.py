@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Benchmark: упаковка контекста промптов (context_packer.py)
+
+1. Промпты (локально, нужен tiktoken с cl100k_base): синтетическая выдача
+   поиска - длинные посты, разбитые на chunks как при индексации
+   (соседние chunks с overlap), короткие посты и репосты с припиской.
+   Каждое предложение поста - уникальный "факт N". Сравниваются:
+   - RAG: все top --context-limit chunks целиком (прежний промпт) и
+     ContextPacker с бюджетом RAG_CONTEXT_WINDOW
+   - дайджест: посты темы, обрезанные до 700 символов (прежний
+     _summarize_topic), и ContextPacker с DIGEST_TOPIC_CONTEXT_TOKENS
+   Метрики: токены контекста, доля уникальных фактов прежнего промпта,
+   попавших в упакованный, время упаковки p50/p95.
+
+2. Качество ответов (--eval-dataset, нужен запущенный RAG service и
+   TELEGRAM_DATABASE_URL): два прогона EvaluationRunner с
+   context_packing=False/True на одном golden dataset, дельта scores.
+
+Использование:
+    python scripts/benchmarks/context_packing.py --queries 200 --context-limit 10
+    python scripts/benchmarks/context_packing.py --eval-dataset telegram_bot_basic --rag-url http://localhost:8020
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'rag_service')))
+
+import config
+from context_packer import context_packer
+from embeddings import embeddings_service
+
+SYLLABLES = ["ра", "ко", "ми", "сте", "ло", "на", "ви", "де", "пру", "та", "ре", "жи", "бо", "ку", "се", "ан"]
+FACT_RE = re.compile(r"Факт (\d+)")
+SEPARATOR = "\n\n---\n\n"
+
+
+def format_source(index: int, ctx: dict) -> str:
+    """Источник в промпте RAG (формат RAGGenerator._format_context; импорт generator требует БД)"""
+    return f"Источник {index}:\nКанал: @{ctx['channel_username']}\nДата: 2025-01-01 09:00\nСсылка: {ctx['url']}\nТекст:\n{ctx['text']}"
+
+
+def format_post(index: int, post: dict) -> str:
+    """Пост в промпте темы дайджеста (формат AIDigestGenerator._format_post)"""
+    return f"{index}. [@{post['channel_username']}, 2025-01-01]: {post['text']}"
+
+
+class Corpus:
+    """Синтетические посты: каждое предложение - уникальный факт"""
+
+    def __init__(self, rng: random.Random, vocabulary_size: int = 5000):
+        self.rng = rng
+        # Псевдослова: посты разных новостей почти не пересекаются по словам, как в реальной выдаче
+        self.vocabulary = [
+            "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(vocabulary_size)
+        ]
+        self.next_fact = 0
+        self.next_post = 0
+
+    def text(self, sentences: int) -> str:
+        parts = []
+        for _ in range(sentences):
+            words = " ".join(self.rng.choice(self.vocabulary) for _ in range(self.rng.randint(6, 12)))
+            parts.append(f"Факт {self.next_fact}: {words}.")
+            self.next_fact += 1
+        return " ".join(parts)
+
+    def post(self, text: str) -> dict:
+        self.next_post += 1
+        return {
+            "post_id": self.next_post,
+            "text": text,
+            "channel_username": f"channel_{self.rng.randrange(50)}",
+            "url": f"https://t.me/channel/{self.next_post}",
+            "score": 0.0
+        }
+
+
+def make_results(corpus: Corpus, limit: int):
+    """Выдача поиска: chunks длинных постов, короткие посты и их репосты"""
+    max_tokens, overlap_tokens = embeddings_service.get_chunking_params("gigachat")
+    results = []
+    for _ in range(2):
+        post = corpus.post(corpus.text(300))
+        chunks = embeddings_service.chunk_text(post["text"], max_tokens, overlap_tokens)
+        for i, (text, start, end) in enumerate(chunks):
+            results.append(dict(post, text=text, chunk_info={
+                "chunk_index": i, "total_chunks": len(chunks), "start_pos": start, "end_pos": end
+            }))
+    shorts = [corpus.post(corpus.text(corpus.rng.randint(3, 8))) for _ in range(limit)]
+    reposts = [
+        dict(corpus.post(""), text=f"🔥 Репост из @{post['channel_username']}: {post['text']} Подписывайтесь!")
+        for post in shorts[:3]
+    ]
+    results.extend(shorts + reposts)
+    corpus.rng.shuffle(results)
+    return results[:limit]
+
+
+def make_topic_posts(corpus: Corpus, count: int):
+    """Посты темы дайджеста разной длины и репосты"""
+    posts = [corpus.post(corpus.text(corpus.rng.choice([2, 4, 8, 20]))) for _ in range(count - 2)]
+    posts += [dict(corpus.post(""), text=f"Репост: {post['text']}") for post in posts[:2]]
+    corpus.rng.shuffle(posts)
+    return posts
+
+
+def coverage(baseline: str, packed: str) -> float:
+    facts = set(FACT_RE.findall(baseline))
+    return len(facts & set(FACT_RE.findall(packed))) / len(facts) if facts else 1.0
+
+
+def run_case(name: str, baseline_prompts, packed_prompts, timings):
+    baseline_tokens = [embeddings_service.count_tokens(p) for p in baseline_prompts]
+    packed_tokens = [embeddings_service.count_tokens(p) for p in packed_prompts]
+    covered = [coverage(b, p) for b, p in zip(baseline_prompts, packed_prompts)]
+    timings = sorted(timings)
+    print(
+        f"{name:>6} | {statistics.mean(baseline_tokens):>7.0f} | {statistics.mean(packed_tokens):>7.0f} | "
+        f"{1 - sum(packed_tokens) / sum(baseline_tokens):>6.1%} | {statistics.mean(covered):>6.1%} | "
+        f"{timings[len(timings) // 2]:>5.1f} | {timings[min(len(timings) - 1, int(len(timings) * 0.95))]:>5.1f}"
+    )
+
+
+def prompt_benchmark(queries: int, context_limit: int):
+    if not embeddings_service.tokenizer:
+        sys.exit("tiktoken (cl100k_base) недоступен - бенчмарк без tokenizer не имеет смысла")
+
+    corpus = Corpus(random.Random(42))
+    print(
+        f"Запросов: {queries}, RAG: top-{context_limit} chunks, бюджет {config.RAG_CONTEXT_WINDOW} "
+        f"(фрагмент до {config.RAG_MAX_PASSAGE_TOKENS}); дайджест: {config.DIGEST_POSTS_PER_TOPIC} постов, "
+        f"бюджет {config.DIGEST_TOPIC_CONTEXT_TOKENS} (пост до {config.DIGEST_MAX_PASSAGE_TOKENS})"
+    )
+    print(f"\n{'case':>6} | {'before':>7} | {'after':>7} | {'saved':>6} | {'facts':>6} | {'p50ms':>5} | {'p95ms':>5}")
+    print("-" * 62)
+
+    baseline, packed, timings = [], [], []
+    for _ in range(queries):
+        results = make_results(corpus, context_limit)
+        baseline.append(SEPARATOR.join(format_source(i, r) for i, r in enumerate(results, 1)))
+        start = time.perf_counter()
+        passages = context_packer.pack(
+            results, config.RAG_CONTEXT_WINDOW, config.RAG_MAX_PASSAGE_TOKENS, format_source, SEPARATOR
+        )
+        timings.append((time.perf_counter() - start) * 1000)
+        packed.append(SEPARATOR.join(format_source(i, p) for i, p in enumerate(passages, 1)))
+    run_case("rag", baseline, packed, timings)
+
+    baseline, packed, timings = [], [], []
+    for _ in range(queries):
+        posts = make_topic_posts(corpus, config.DIGEST_POSTS_PER_TOPIC)
+        baseline.append("\n\n".join(
+            format_post(i, dict(p, text=p["text"][:1000 if len(posts) <= 3 else 700])) for i, p in enumerate(posts, 1)
+        ))
+        start = time.perf_counter()
+        passages = context_packer.pack(
+            posts, config.DIGEST_TOPIC_CONTEXT_TOKENS, config.DIGEST_MAX_PASSAGE_TOKENS, format_post
+        )
+        timings.append((time.perf_counter() - start) * 1000)
+        packed.append("\n\n".join(format_post(i, p) for i, p in enumerate(passages, 1)))
+    run_case("digest", baseline, packed, timings)
+
+
+async def answer_quality_benchmark(dataset_name: str, rag_url: str, workers: int):
+    from evaluation.evaluation_runner import EvaluationRunner
+
+    runs = {}
+    for packing in (False, True):
+        async with EvaluationRunner(rag_service_url=rag_url, context_packing=packing) as runner:
+            start = time.perf_counter()
+            run = await runner.run_evaluation(
+                dataset_name=dataset_name,
+                run_name=f"context_packing_benchmark_{'on' if packing else 'off'}",
+                parallel_workers=workers
+            )
+            runs[packing] = (run, time.perf_counter() - start)
+
+    (off, off_time), (on, on_time) = runs[False], runs[True]
+    print(f"\n{'metric':>32} | {'off':>6} | {'on':>6} | {'delta':>7}")
+    print("-" * 60)
+    for metric in sorted(set(off.scores or {}) | set(on.scores or {})):
+        before, after = (off.scores or {}).get(metric, 0.0), (on.scores or {}).get(metric, 0.0)
+        print(f"{metric:>32} | {before:>6.3f} | {after:>6.3f} | {after - before:>+7.3f}")
+    print(f"\nДлительность прогона: off {off_time:.0f}s, on {on_time:.0f}s "
+          f"(ошибок: {off.failed_items} / {on.failed_items})")
+
+
+if __name__ == "__main__":
+    import logging
+    logging.disable(logging.WARNING)
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--context-limit", type=int, default=10)
+    parser.add_argument("--eval-dataset", help="Golden dataset в БД для сравнения качества ответов")
+    parser.add_argument("--rag-url", default="http://localhost:8020")
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    if args.eval_dataset:
+        asyncio.run(answer_quality_benchmark(args.eval_dataset, args.rag_url, args.workers))
+    else:
+        prompt_benchmark(args.queries, args.context_limit)
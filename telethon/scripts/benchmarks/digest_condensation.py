@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Benchmark: дайджест группы с map-reduce сжатием диалога и без него
+
+Запускает DigestOrchestrator на синтетических диалогах (500, 2000, 10000
+сообщений) со stub LLM и считает:
+- суммарные prompt токены всех вызовов (агенты + окна condenser)
+- wall time дайджеста
+
+Stub LLM моделирует стоимость вызова: LLM_BASE_LATENCY + prompt_tokens / LLM_PREFILL_RATE.
+Токены оцениваются condenser.estimate_tokens (~3 символа на токен).
+
+Использование:
+    python scripts/benchmarks/digest_condensation.py --sizes 500 2000 10000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from langchain_agents.condenser import MessageCondenser, estimate_tokens
+from langchain_agents.orchestrator import DigestOrchestrator
+
+LLM_BASE_LATENCY = 0.05    # секунды на вызов
+LLM_PREFILL_RATE = 200000  # токенов в секунду (масштаб бенчмарка)
+
+PHRASES = [
+    "Коллеги, когда релиз новой версии?",
+    "Я посмотрел логи, ошибка в миграции базы данных",
+    "Давайте перенесем созвон на завтра, 11:00",
+    "Вот документация: https://docs.example.com/api/v2",
+    "@alice_dev можешь глянуть PR? https://github.com/org/repo/pull/42",
+    "Согласен, откатываем и чиним в понедельник",
+    "Кто отвечает за мониторинг после выкладки?",
+    "Обновил дашборд, ссылка в канале https://t.me/team_channel/128",
+]
+
+
+def make_messages(count: int) -> list:
+    """Синтетический диалог: 25 участников, сообщения каждые 10 секунд"""
+    rng = random.Random(count)
+    start = datetime(2025, 1, 1, 9, 0, tzinfo=timezone.utc)
+    users = [SimpleNamespace(username=f"user{i}", first_name=None, id=i) for i in range(25)]
+    return [
+        SimpleNamespace(
+            text=f"{rng.choice(PHRASES)} ({i})",
+            sender=rng.choice(users),
+            date=start + timedelta(seconds=10 * i)
+        )
+        for i in range(count)
+    ]
+
+
+class Meter:
+    """Счетчик prompt токенов и вызовов stub LLM"""
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.calls = 0
+
+    async def call(self, prompt: str):
+        tokens = estimate_tokens(prompt)
+        self.prompt_tokens += tokens
+        self.calls += 1
+        await asyncio.sleep(LLM_BASE_LATENCY + tokens / LLM_PREFILL_RATE)
+
+
+def stub_orchestrator(meter: Meter, condense: bool) -> DigestOrchestrator:
+    orchestrator = DigestOrchestrator()
+
+    async def summarize(fragment: str) -> str:
+        await meter.call(fragment)
+        # Резюме окна ~10% исходного текста
+        return fragment[:max(len(fragment) // 10, 200)]
+
+    orchestrator.condenser = MessageCondenser(
+        summarize=summarize,
+        condense_threshold_tokens=None if condense else 10 ** 9
+    )
+
+    stub_results = {
+        "dialogue_assessor": {"detail_level": "comprehensive", "dialogue_type": "discussion"},
+        "supervisor_synthesizer": {"html_digest": "<b>digest</b>", "metadata": {}}
+    }
+
+    for node in orchestrator.agent_graph:
+        agent = node.agent
+        result = stub_results.get(node.name, {"stub": True})
+
+        async def ainvoke(input_data, _agent=agent, _result=result, **kwargs):
+            user_message = await _agent._process_input(input_data)
+            await meter.call(_agent.system_prompt + user_message)
+            return {"pydantic_result": _result, "processed_result": {}}
+
+        agent.ainvoke = ainvoke
+
+    return orchestrator
+
+
+async def run(size: int, condense: bool) -> dict:
+    meter = Meter()
+    orchestrator = stub_orchestrator(meter, condense)
+    messages = make_messages(size)
+
+    start = time.perf_counter()
+    result = await orchestrator.generate_digest(messages, hours=24, user_id=1, group_id=1)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "success": result["success"],
+        "prompt_tokens": meter.prompt_tokens,
+        "calls": meter.calls,
+        "wall_time": elapsed
+    }
+
+
+async def main(sizes):
+    print(f"{'messages':>8} | {'mode':>9} | {'prompt tokens':>13} | {'LLM calls':>9} | {'wall time':>9}")
+    print("-" * 62)
+    for size in sizes:
+        for condense in (False, True):
+            stats = await run(size, condense)
+            mode = "condensed" if condense else "raw"
+            print(
+                f"{size:>8} | {mode:>9} | {stats['prompt_tokens']:>13,} | "
+                f"{stats['calls']:>9} | {stats['wall_time']:>8.2f}s"
+            )
+
+
+if __name__ == "__main__":
+    import logging
+    logging.disable(logging.WARNING)
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000, 10000])
+    args = parser.parse_args()
+
+    asyncio.run(main(args.sizes))
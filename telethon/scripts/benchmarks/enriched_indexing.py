@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Benchmark: индексация только текста поста vs текст + страницы по ссылкам
+
+Golden datasets не содержат реальных ссылок, поэтому посты моделируются:
+текст поста - первый context вопроса (короткий анонс), страница по ссылке
+(Post.enriched_content) - остальные contexts и expected_answer. Запрос -
+question, релевантный пост - пост этого вопроса.
+
+Режимы:
+- post  - индексируется только текст поста (как до INDEX_ENRICHED_CONTENT)
+- links - текст поста + chunks страницы (source=link, вес LINK_CHUNK_SCORE_WEIGHT)
+
+Метрики:
+- recall@k по постам (chunks одного поста схлопываются)
+- размер индекса: точки Qdrant и токены, отправленные на embedding
+- время индексации и latency p50/p95 запроса к Qdrant
+
+Нужны GigaChat (gpt2giga-proxy) или sentence-transformers для embeddings.
+По умолчанию Qdrant - QDRANT_URL; --qdrant-url :memory: - локальный режим.
+
+Использование:
+    python scripts/benchmarks/enriched_indexing.py --k 1 3 5
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'rag_service')))
+
+import config
+from embeddings import embeddings_service
+from sparse_encoder import sparse_encoder
+from vector_db import QdrantClient
+
+DATASETS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'evaluation', 'golden_datasets'))
+
+# Коллекции бенчмарка: telegram_posts_<id>, удаляются после запуска
+BENCH_USER_IDS = {"post": 990000011, "links": 990000012}
+
+
+def load_posts(datasets_dir: str):
+    """Смоделированные посты [(post_id, текст поста, страница по ссылке)] и запросы [(question, post_id)]"""
+    posts = []
+    queries = []
+    for path in sorted(glob.glob(os.path.join(datasets_dir, "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            dataset = json.load(f)
+        for item in dataset.get("items", []):
+            contexts = item.get("contexts", [])
+            if not contexts:
+                continue
+            post_id = len(posts) + 1
+            page = "\n\n".join(contexts[1:] + [item.get("expected_answer", "")]).strip()
+            posts.append((post_id, contexts[0], page))
+            queries.append((item["question"], post_id))
+    return posts, queries
+
+
+def build_chunks(posts, with_links: bool):
+    """Chunks для индексации: (post_id, source, text)"""
+    max_tokens, overlap_tokens = embeddings_service.get_chunking_params("gigachat")
+    chunks = []
+    token_count = 0
+    for post_id, body, page in posts:
+        sections = [("post", body)] + ([("link", page)] if with_links and page else [])
+        for source, text in sections:
+            section_chunks, section_tokens = embeddings_service.chunk_text_with_count(
+                text, max_tokens, overlap_tokens
+            )
+            token_count += section_tokens
+            chunks.extend((post_id, source, chunk_text) for chunk_text, _, _ in section_chunks)
+    return chunks, token_count
+
+
+async def embed(texts):
+    results = await embeddings_service.generate_embeddings_batch(texts)
+    missing = [text for text, result in zip(texts, results) if not result]
+    if missing:
+        raise RuntimeError(f"Нет embeddings для {len(missing)} текстов (GigaChat/sentence-transformers недоступны)")
+    return [result[0] for result in results]
+
+
+async def index(qdrant: QdrantClient, user_id: int, chunks) -> float:
+    start = time.perf_counter()
+    vectors = await embed([text for _, _, text in chunks])
+    points = [
+        {
+            "id": str(uuid.uuid5(uuid.NAMESPACE_DNS, f"bench_{post_id}_{i}")),
+            "vector": vector,
+            "payload": {"post_id": post_id, "source": source, "text": text},
+            "sparse_vector": sparse_encoder.encode_document(text)
+        }
+        for i, ((post_id, source, text), vector) in enumerate(zip(chunks, vectors))
+    ]
+    await qdrant.upsert_points_batch(user_id, points)
+    return time.perf_counter() - start
+
+
+def rank_posts(results):
+    """Порядок постов с весом link chunks (как SearchService._build_enriched)"""
+    best = {}
+    for result in results:
+        payload = result["payload"]
+        weight = config.LINK_CHUNK_SCORE_WEIGHT if payload.get("source") == "link" else 1.0
+        score = result.get("fusion_score", result["score"]) * weight
+        best[payload["post_id"]] = max(best.get(payload["post_id"], 0.0), score)
+    return sorted(best, key=best.get, reverse=True)
+
+
+async def evaluate(qdrant: QdrantClient, user_id: int, queries, query_vectors, ks) -> dict:
+    hits = {k: [] for k in ks}
+    latencies = []
+    for (question, post_id), vector in zip(queries, query_vectors):
+        start = time.perf_counter()
+        results = await qdrant.search(
+            user_id=user_id,
+            query_vector=vector,
+            limit=max(ks) * 3,  # С запасом: chunks одного поста схлопываются
+            score_threshold=0.0,
+            query_text=question
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        ranked = rank_posts(results)
+        for k in ks:
+            hits[k].append(1.0 if post_id in ranked[:k] else 0.0)
+
+    latencies.sort()
+    return {
+        "recall": {k: statistics.mean(values) for k, values in hits.items()},
+        "p50": latencies[len(latencies) // 2],
+        "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    }
+
+
+async def main(ks, qdrant_url: str, datasets_dir: str):
+    posts, queries = load_posts(datasets_dir)
+    print(f"Посты: {len(posts)}, запросов: {len(queries)} ({datasets_dir})")
+
+    if qdrant_url == ":memory:":
+        from qdrant_client import QdrantClient as QdrantClientBase
+        qdrant = QdrantClient()
+        qdrant.client = QdrantClientBase(":memory:")
+    else:
+        config.QDRANT_URL = qdrant_url
+        qdrant = QdrantClient()
+    for user_id in BENCH_USER_IDS.values():
+        await qdrant.delete_collection(user_id)
+
+    try:
+        query_vectors = await embed([question for question, _ in queries])
+
+        header = " | ".join(f"{f'recall@{k}':>9}" for k in ks)
+        print(f"{'mode':>5} | {'points':>6} | {'tokens':>6} | {'index s':>7} | {header} | {'p50 ms':>7} | {'p95 ms':>7}")
+        print("-" * (60 + 12 * len(ks)))
+        for mode, user_id in BENCH_USER_IDS.items():
+            chunks, token_count = build_chunks(posts, with_links=(mode == "links"))
+            index_time = await index(qdrant, user_id, chunks)
+            stats = await evaluate(qdrant, user_id, queries, query_vectors, ks)
+            recalls = " | ".join(f"{stats['recall'][k]:>9.3f}" for k in ks)
+            print(
+                f"{mode:>5} | {len(chunks):>6} | {token_count:>6} | {index_time:>7.2f} | "
+                f"{recalls} | {stats['p50']:>7.1f} | {stats['p95']:>7.1f}"
+            )
+    finally:
+        for user_id in BENCH_USER_IDS.values():
+            await qdrant.delete_collection(user_id)
+
+
+if __name__ == "__main__":
+    import logging
+    logging.disable(logging.WARNING)
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--qdrant-url", default=config.QDRANT_URL)
+    parser.add_argument("--datasets", default=DATASETS_DIR)
+    args = parser.parse_args()
+
+    asyncio.run(main(sorted(args.k), args.qdrant_url, args.datasets))
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Benchmark: dense vs sparse+dense (RRF) поиск на golden datasets
+
+Корпус - все contexts из evaluation/golden_datasets/*.json, запросы - question,
+релевантные документы запроса - его contexts. Документы индексируются во
+временную коллекцию через QdrantClient из rag_service (dense embeddings
+EmbeddingsService + sparse BM25 вектор), затем каждый запрос выполняется
+dense-only (hybrid=False) и гибридно (prefetch dense + sparse, RRF).
+
+Метрики:
+- recall@k - доля contexts запроса в top-k
+- latency p50/p95 запроса к Qdrant (embedding запроса считается заранее);
+  у hybrid включает второй запрос - dense score RRF выдачи (HasIdCondition)
+
+Нужны GigaChat (gpt2giga-proxy) или sentence-transformers для embeddings.
+По умолчанию Qdrant - QDRANT_URL; --qdrant-url :memory: - локальный режим.
+
+Использование:
+    python scripts/benchmarks/hybrid_retrieval.py --k 1 3 5 10
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'rag_service')))
+
+import config
+from embeddings import embeddings_service
+from sparse_encoder import sparse_encoder
+from vector_db import QdrantClient
+
+DATASETS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'evaluation', 'golden_datasets'))
+
+# Коллекция бенчмарка: telegram_posts_<BENCH_USER_ID>, удаляется после запуска
+BENCH_USER_ID = 990000001
+
+
+def load_golden(datasets_dir: str):
+    """Корпус (уникальные contexts) и запросы с id релевантных документов"""
+    documents = {}
+    queries = []
+    for path in sorted(glob.glob(os.path.join(datasets_dir, "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            dataset = json.load(f)
+        for item in dataset.get("items", []):
+            relevant = set()
+            for context in item.get("contexts", []):
+                doc_id = documents.setdefault(context, len(documents) + 1)
+                relevant.add(doc_id)
+            if relevant:
+                queries.append((item["question"], relevant))
+    return {doc_id: text for text, doc_id in documents.items()}, queries
+
+
+async def embed(texts):
+    results = await embeddings_service.generate_embeddings_batch(texts)
+    missing = [text for text, result in zip(texts, results) if not result]
+    if missing:
+        raise RuntimeError(f"Нет embeddings для {len(missing)} текстов (GigaChat/sentence-transformers недоступны)")
+    return [result[0] for result in results]
+
+
+async def index(qdrant: QdrantClient, documents: dict):
+    vectors = await embed(list(documents.values()))
+    points = [
+        {
+            "id": str(uuid.uuid5(uuid.NAMESPACE_DNS, f"bench_{doc_id}")),
+            "vector": vector,
+            "payload": {"post_id": doc_id, "text": text},
+            "sparse_vector": sparse_encoder.encode_document(text)
+        }
+        for (doc_id, text), vector in zip(documents.items(), vectors)
+    ]
+    await qdrant.upsert_points_batch(BENCH_USER_ID, points)
+
+
+async def evaluate(qdrant: QdrantClient, queries, query_vectors, ks, hybrid: bool) -> dict:
+    recalls = {k: [] for k in ks}
+    latencies = []
+    for (question, relevant), vector in zip(queries, query_vectors):
+        start = time.perf_counter()
+        results = await qdrant.search(
+            user_id=BENCH_USER_ID,
+            query_vector=vector,
+            limit=max(ks),
+            query_text=question,
+            hybrid=hybrid
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        ranked = [r["payload"]["post_id"] for r in results]
+        for k in ks:
+            recalls[k].append(len(relevant & set(ranked[:k])) / len(relevant))
+
+    latencies.sort()
+    return {
+        "recall": {k: statistics.mean(values) for k, values in recalls.items()},
+        "p50": latencies[len(latencies) // 2],
+        "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    }
+
+
+async def main(ks, qdrant_url: str, datasets_dir: str):
+    documents, queries = load_golden(datasets_dir)
+    print(f"Корпус: {len(documents)} документов, {len(queries)} запросов ({datasets_dir})")
+
+    config.SPARSE_SEARCH_ENABLED = True
+    if qdrant_url == ":memory:":
+        from qdrant_client import QdrantClient as QdrantClientBase
+        qdrant = QdrantClient()
+        qdrant.client = QdrantClientBase(":memory:")
+    else:
+        config.QDRANT_URL = qdrant_url
+        qdrant = QdrantClient()
+    await qdrant.delete_collection(BENCH_USER_ID)
+
+    try:
+        await index(qdrant, documents)
+        query_vectors = await embed([question for question, _ in queries])
+
+        header = " | ".join(f"{f'recall@{k}':>9}" for k in ks)
+        print(f"{'mode':>6} | {header} | {'p50 ms':>7} | {'p95 ms':>7}")
+        print("-" * (30 + 12 * len(ks)))
+        for hybrid in (False, True):
+            stats = await evaluate(qdrant, queries, query_vectors, ks, hybrid)
+            recalls = " | ".join(f"{stats['recall'][k]:>9.3f}" for k in ks)
+            print(f"{'hybrid' if hybrid else 'dense':>6} | {recalls} | {stats['p50']:>7.1f} | {stats['p95']:>7.1f}")
+    finally:
+        await qdrant.delete_collection(BENCH_USER_ID)
+
+
+if __name__ == "__main__":
+    import logging
+    logging.disable(logging.WARNING)
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10])
+    parser.add_argument("--qdrant-url", default=config.QDRANT_URL)
+    parser.add_argument("--datasets", default=DATASETS_DIR)
+    args = parser.parse_args()
+
+    asyncio.run(main(sorted(args.k), args.qdrant_url, args.datasets))
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark: поиск почти-дубликатов при парсинге (near_duplicates.py)
+
+Метрики:
+- вычисление MinHash сигнатуры поста: постов/с и мкс на пост (посты
+  ~40 слов из словаря golden datasets)
+- поиск в LSH индексе пользователя, заполненном --size сигнатурами:
+  мкс на запрос для репостов (приписка канала + ссылка) и для новых
+  постов, доля найденных репостов
+- время заполнения индекса и прирост RSS процесса
+
+Фон индекса - случайные сигнатуры (вычислять --size настоящих сигнатур
+долго); с реальными постами совпадений полос больше, поэтому запросы
+промахов здесь - нижняя оценка.
+
+Использование:
+    python scripts/benchmarks/near_duplicates.py --size 1000000 --queries 2000
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from near_duplicates import NUM_PERMUTATIONS, MinHashIndex, minhash, normalize_text
+
+DATASETS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'evaluation', 'golden_datasets'))
+
+
+def load_vocabulary(datasets_dir: str):
+    words = set()
+    for path in glob.glob(os.path.join(datasets_dir, "*.json")):
+        with open(path, encoding="utf-8") as f:
+            for item in json.load(f).get("items", []):
+                for text in item.get("contexts", []) + [item.get("question", ""), item.get("expected_answer", "")]:
+                    words.update(normalize_text(text))
+    return sorted(words)
+
+
+def make_posts(vocabulary, count: int, rng: random.Random, words_per_post: int = 40):
+    return [" ".join(rng.choice(vocabulary) for _ in range(words_per_post)) + "." for _ in range(count)]
+
+
+def make_repost(text: str, rng: random.Random) -> str:
+    return f"🔥 Репост из @channel_{rng.randrange(1000)}: {text} Подписывайтесь https://t.me/channel/{rng.randrange(10 ** 6)}"
+
+
+def max_rss_mb() -> float:
+    # ru_maxrss в КБ (Linux)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main(size: int, queries: int, datasets_dir: str, threshold: float):
+    rng = random.Random(42)
+    vocabulary = load_vocabulary(datasets_dir)
+    posts = make_posts(vocabulary, queries, rng)
+    print(f"Словарь: {len(vocabulary)} слов, постов для запросов: {len(posts)}")
+
+    # 1. Сигнатуры
+    start = time.perf_counter()
+    signatures = [minhash(text) for text in posts]
+    elapsed = time.perf_counter() - start
+    print(f"\nMinHash ({NUM_PERMUTATIONS} перестановок, биграммы слов):")
+    print(f"  {len(posts) / elapsed:,.0f} постов/с, {elapsed / len(posts) * 1e6:.0f} мкс на пост")
+
+    # 2. Индекс: фон из случайных сигнатур + исходные посты запросов
+    rss_before = max_rss_mb()
+    index = MinHashIndex(threshold)
+    start = time.perf_counter()
+    background = max(0, size - len(posts))
+    for post_id in range(background):
+        index.add(post_id, tuple(rng.getrandbits(32) for _ in range(NUM_PERMUTATIONS)), None, 0.0)
+    for i, signature in enumerate(signatures):
+        index.add(background + i, signature, None, 0.0)
+    fill_time = time.perf_counter() - start
+    print(f"\nИндекс: {len(index):,} сигнатур, заполнение {fill_time:.1f} с, RSS +{max_rss_mb() - rss_before:,.0f} МБ")
+
+    # 3. Поиск: репосты (должны найтись) и новые посты (не должны)
+    repost_signatures = [minhash(make_repost(text, rng)) for text in posts]
+    fresh_signatures = [minhash(text) for text in make_posts(vocabulary, queries, rng)]
+
+    for name, batch, expect_hit in (("репосты", repost_signatures, True), ("новые посты", fresh_signatures, False)):
+        latencies = []
+        hits = 0
+        for signature in batch:
+            start = time.perf_counter()
+            found = index.find(signature)
+            latencies.append((time.perf_counter() - start) * 1e6)
+            hits += found is not None
+        latencies.sort()
+        rate = hits / len(batch)
+        label = "найдено" if expect_hit else "ложных совпадений"
+        print(
+            f"  {name:>11}: p50 {latencies[len(latencies) // 2]:.0f} мкс, "
+            f"p95 {latencies[int(len(latencies) * 0.95)]:.0f} мкс, "
+            f"mean {statistics.mean(latencies):.0f} мкс, {label} {rate:.1%}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--threshold", type=float, default=0.7)
+    parser.add_argument("--datasets", default=DATASETS_DIR)
+    args = parser.parse_args()
+
+    main(args.size, args.queries, args.datasets, args.threshold)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cross-encoder rerank кандидатов перед генерацией (reranker.py)
+
+1. Retrieval (локально, нужны onnxruntime + tokenizers и модель RERANK_MODEL):
+   корпус - все contexts golden datasets, для каждого question кандидаты -
+   top --candidates по BM25 (sparse_encoder, без внешних сервисов).
+   Сравниваются порядок BM25 (top --context-limit в промпт) и rerank
+   (top RERANK_TOP_K в промпт):
+   - recall@k по contexts вопроса
+   - токены контекста в промпте
+   - latency rerank p50/p95 (батчи RERANK_BATCH_SIZE, бюджет не применяется)
+
+2. Качество ответов (--eval-dataset, нужен запущенный RAG service и
+   TELEGRAM_DATABASE_URL): два прогона EvaluationRunner с rerank=False/True
+   на одном golden dataset, дельта средних scores и длительность.
+
+Использование:
+    python scripts/benchmarks/rerank.py --candidates 30 --context-limit 10
+    python scripts/benchmarks/rerank.py --eval-dataset telegram_bot_basic --rag-url http://localhost:8020
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'rag_service')))
+
+import config
+from embeddings import embeddings_service
+from reranker import reranker
+from sparse_encoder import sparse_encoder
+
+DATASETS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'evaluation', 'golden_datasets'))
+
+
+def load_golden(datasets_dir: str):
+    """Корпус (уникальные contexts) и запросы с id релевантных документов"""
+    documents = {}
+    queries = []
+    for path in sorted(glob.glob(os.path.join(datasets_dir, "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            dataset = json.load(f)
+        for item in dataset.get("items", []):
+            relevant = {documents.setdefault(context, len(documents)) for context in item.get("contexts", [])}
+            if relevant:
+                queries.append((item["question"], relevant))
+    return {doc_id: text for text, doc_id in documents.items()}, queries
+
+
+def bm25_candidates(query: str, doc_vectors, limit: int):
+    """Первая стадия: top-limit документов по BM25 (скалярное произведение sparse векторов)"""
+    query_vector = sparse_encoder.encode_query(query)
+    weights = dict(zip(query_vector.indices, query_vector.values)) if query_vector else {}
+    scored = []
+    for doc_id, vector in doc_vectors.items():
+        score = sum(weights.get(i, 0.0) * v for i, v in zip(vector.indices, vector.values)) if vector else 0.0
+        scored.append((score, doc_id))
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return [doc_id for _, doc_id in scored[:limit]]
+
+
+def recall(ranked, relevant, k: int) -> float:
+    return len(set(ranked[:k]) & relevant) / len(relevant)
+
+
+def context_tokens(documents, doc_ids) -> int:
+    return sum(embeddings_service.count_tokens(documents[doc_id]) for doc_id in doc_ids)
+
+
+def retrieval_benchmark(candidates: int, context_limit: int, datasets_dir: str):
+    documents, queries = load_golden(datasets_dir)
+    doc_vectors = {doc_id: sparse_encoder.encode_document(text) for doc_id, text in documents.items()}
+    top_k = min(context_limit, config.RERANK_TOP_K)
+    print(f"Документов: {len(documents)}, запросов: {len(queries)}, кандидатов: {candidates}, "
+          f"контекст: BM25 top-{context_limit} vs rerank top-{top_k}")
+
+    if not reranker._load():
+        raise RuntimeError("Reranker недоступен (onnxruntime/tokenizers/модель)")
+    reranker.warmup()
+
+    stats = {"bm25": {"recall": [], "tokens": []}, "rerank": {"recall": [], "tokens": []}}
+    latencies = []
+    for question, relevant in queries:
+        ranked = bm25_candidates(question, doc_vectors, candidates)
+
+        start = time.perf_counter()
+        scores = reranker._score(question, [documents[doc_id] for doc_id in ranked], deadline=float("inf"))
+        latencies.append((time.perf_counter() - start) * 1000)
+        reranked = [doc_id for _, doc_id in sorted(zip(scores, ranked), key=lambda item: -item[0])]
+
+        for name, order, k in (("bm25", ranked, context_limit), ("rerank", reranked, top_k)):
+            stats[name]["recall"].append(recall(order, relevant, k))
+            stats[name]["tokens"].append(context_tokens(documents, order[:k]))
+
+    print(f"\n{'mode':>6} | {'recall':>6} | {'tokens':>6}")
+    print("-" * 26)
+    for name, values in stats.items():
+        print(f"{name:>6} | {statistics.mean(values['recall']):>6.3f} | {statistics.mean(values['tokens']):>6.0f}")
+
+    latencies.sort()
+    print(f"\nRerank {candidates} пар: p50 {latencies[len(latencies) // 2]:.0f}ms, "
+          f"p95 {latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]:.0f}ms "
+          f"(batch {config.RERANK_BATCH_SIZE}, {config.RERANK_THREADS} threads)")
+
+
+async def answer_quality_benchmark(dataset_name: str, rag_url: str, workers: int):
+    from evaluation.evaluation_runner import EvaluationRunner
+
+    runs = {}
+    for rerank in (False, True):
+        async with EvaluationRunner(rag_service_url=rag_url, rerank=rerank) as runner:
+            start = time.perf_counter()
+            run = await runner.run_evaluation(
+                dataset_name=dataset_name,
+                run_name=f"rerank_benchmark_{'on' if rerank else 'off'}",
+                parallel_workers=workers
+            )
+            runs[rerank] = (run, time.perf_counter() - start)
+
+    (off, off_time), (on, on_time) = runs[False], runs[True]
+    print(f"\n{'metric':>32} | {'off':>6} | {'on':>6} | {'delta':>7}")
+    print("-" * 60)
+    for metric in sorted(set(off.scores or {}) | set(on.scores or {})):
+        before, after = (off.scores or {}).get(metric, 0.0), (on.scores or {}).get(metric, 0.0)
+        print(f"{metric:>32} | {before:>6.3f} | {after:>6.3f} | {after - before:>+7.3f}")
+    print(f"\nДлительность прогона: off {off_time:.0f}s, on {on_time:.0f}s "
+          f"(ошибок: {off.failed_items} / {on.failed_items})")
+
+
+if __name__ == "__main__":
+    import logging
+    logging.disable(logging.WARNING)
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, default=config.RERANK_CANDIDATES)
+    parser.add_argument("--context-limit", type=int, default=10)
+    parser.add_argument("--datasets", default=DATASETS_DIR)
+    parser.add_argument("--eval-dataset", help="Golden dataset в БД для сравнения качества ответов")
+    parser.add_argument("--rag-url", default="http://localhost:8020")
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    if args.eval_dataset:
+        asyncio.run(answer_quality_benchmark(args.eval_dataset, args.rag_url, args.workers))
+    else:
+        retrieval_benchmark(args.candidates, args.context_limit, args.datasets)
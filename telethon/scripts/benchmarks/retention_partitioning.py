@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Benchmark: retention через DELETE vs DETACH/DROP партиций
+
+Создает во временной схеме две одинаковые таблицы постов
+(обычную и партиционированную по месяцам), заполняет их одинаковыми
+данными и удаляет старые месяцы двумя способами:
+- DELETE ... WHERE posted_at < cutoff (текущий UnifiedRetentionService)
+- DETACH PARTITION + DROP TABLE (maintenance/post_partitions.py)
+
+Метрики: время, объем WAL, размер таблицы после очистки
+(bloat = размер на одну живую строку), dead tuples.
+
+Использование:
+    python scripts/benchmarks/retention_partitioning.py --rows 1000000 --months 12 --expire 6
+
+Требует PostgreSQL (TELEGRAM_DATABASE_URL). Схема bench_retention
+удаляется после завершения.
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+from maintenance.post_partitions import month_start, add_months, partition_name, create_partition_sql
+
+load_dotenv()
+
+SCHEMA = "bench_retention"
+
+TABLE_COLUMNS = """
+    id BIGINT NOT NULL,
+    user_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    telegram_message_id BIGINT NOT NULL,
+    text TEXT,
+    posted_at TIMESTAMP WITH TIME ZONE NOT NULL
+"""
+
+
+def fill_sql(table: str, rows: int, first_month: datetime, months: int) -> str:
+    """Равномерно распределить rows постов по months месяцам"""
+    return f"""
+        INSERT INTO {table}
+        SELECT
+            g,
+            (g % 50) + 1,
+            (g % 200) + 1,
+            g,
+            repeat('Текст поста для бенчмарка retention. ', 10),
+            TIMESTAMPTZ '{first_month.isoformat()}'
+                + (g::float / {rows} * {months * 30}) * INTERVAL '1 day'
+        FROM generate_series(1, {rows}) AS g
+    """
+
+
+def wal_lsn(conn):
+    return conn.execute(text("SELECT pg_current_wal_lsn()")).scalar()
+
+
+def wal_bytes(conn, start_lsn) -> int:
+    return conn.execute(
+        text("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), :lsn)"), {"lsn": start_lsn}
+    ).scalar()
+
+
+def table_stats(conn, table: str) -> dict:
+    """Размер таблицы (с партициями и индексами) и живые/мертвые строки"""
+    size = conn.execute(text(f"""
+        SELECT COALESCE(SUM(pg_total_relation_size(c.oid)), 0)
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = '{SCHEMA}' AND c.relkind = 'r'
+          AND (c.relname = '{table}' OR c.relname LIKE '{table}\\_p%')
+    """)).scalar()
+    live = conn.execute(text(f"SELECT COUNT(*) FROM {SCHEMA}.{table}")).scalar()
+    if _has_force_flush(conn):
+        conn.execute(text("SELECT pg_stat_force_next_flush()"))
+    dead = conn.execute(text(f"""
+        SELECT COALESCE(SUM(n_dead_tup), 0) FROM pg_stat_user_tables
+        WHERE schemaname = '{SCHEMA}'
+          AND (relname = '{table}' OR relname LIKE '{table}\\_p%')
+    """)).scalar()
+    return {"size": size, "live": live, "dead": dead}
+
+
+def _has_force_flush(conn) -> bool:
+    # pg_stat_force_next_flush появилась в PostgreSQL 15
+    return conn.execute(
+        text("SELECT 1 FROM pg_proc WHERE proname = 'pg_stat_force_next_flush'")
+    ).first() is not None
+
+
+def setup(engine, rows: int, months: int, first_month: datetime):
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+
+        conn.execute(text(f"CREATE TABLE {SCHEMA}.posts_plain ({TABLE_COLUMNS}, PRIMARY KEY (id))"))
+        conn.execute(text(f"CREATE INDEX ON {SCHEMA}.posts_plain (user_id, posted_at DESC)"))
+
+        conn.execute(text(
+            f"CREATE TABLE {SCHEMA}.posts_part ({TABLE_COLUMNS}, PRIMARY KEY (id, posted_at)) "
+            f"PARTITION BY RANGE (posted_at)"
+        ))
+        conn.execute(text(f"CREATE INDEX ON {SCHEMA}.posts_part (user_id, posted_at DESC)"))
+        for offset in range(months + 1):
+            conn.execute(text(
+                create_partition_sql(f"{SCHEMA}.posts_part", add_months(first_month, offset))
+            ))
+
+        conn.execute(text(fill_sql(f"{SCHEMA}.posts_plain", rows, first_month, months)))
+        conn.execute(text(fill_sql(f"{SCHEMA}.posts_part", rows, first_month, months)))
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"VACUUM ANALYZE {SCHEMA}.posts_plain"))
+        conn.execute(text(f"VACUUM ANALYZE {SCHEMA}.posts_part"))
+
+
+def run_delete(engine, cutoff: datetime) -> dict:
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        lsn = wal_lsn(conn)
+        start = time.perf_counter()
+        deleted = conn.execute(
+            text(f"DELETE FROM {SCHEMA}.posts_plain WHERE posted_at < :cutoff"),
+            {"cutoff": cutoff}
+        ).rowcount
+        duration = time.perf_counter() - start
+        return {"deleted": deleted, "seconds": duration, "wal": wal_bytes(conn, lsn),
+                **table_stats(conn, "posts_plain")}
+
+
+def run_partition_drop(engine, first_month: datetime, expire_months: int) -> dict:
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        lsn = wal_lsn(conn)
+        start = time.perf_counter()
+        deleted = 0
+        for offset in range(expire_months):
+            month = add_months(first_month, offset)
+            name = partition_name(f"{SCHEMA}.posts_part", month)
+            deleted += conn.execute(text(f"SELECT COUNT(*) FROM {name}")).scalar()
+            conn.execute(text(f"ALTER TABLE {SCHEMA}.posts_part DETACH PARTITION {name}"))
+            conn.execute(text(f"DROP TABLE {name}"))
+        duration = time.perf_counter() - start
+        return {"deleted": deleted, "seconds": duration, "wal": wal_bytes(conn, lsn),
+                **table_stats(conn, "posts_part")}
+
+
+def print_report(plain: dict, part: dict):
+    def mb(value):
+        return f"{value / 1024 / 1024:.1f} MB"
+
+    def per_row(stats):
+        return f"{stats['size'] / max(stats['live'], 1):.0f} B"
+
+    print()
+    print("=" * 72)
+    print(f"{'':<24}{'DELETE':>22}{'DETACH/DROP':>22}")
+    print("-" * 72)
+    print(f"{'Удалено постов':<24}{plain['deleted']:>22}{part['deleted']:>22}")
+    print(f"{'Время':<24}{plain['seconds']:>21.2f}s{part['seconds']:>21.2f}s")
+    print(f"{'WAL':<24}{mb(plain['wal']):>22}{mb(part['wal']):>22}")
+    print(f"{'Размер после':<24}{mb(plain['size']):>22}{mb(part['size']):>22}")
+    print(f"{'Байт на живую строку':<24}{per_row(plain):>22}{per_row(part):>22}")
+    print(f"{'Dead tuples':<24}{plain['dead']:>22}{part['dead']:>22}")
+    print("=" * 72)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark: retention DELETE vs partition drop')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='Количество постов')
+    parser.add_argument('--months', type=int, default=12, help='Период данных (месяцев)')
+    parser.add_argument('--expire', type=int, default=6, help='Сколько старых месяцев удалить')
+    parser.add_argument('--dsn', default=os.getenv("TELEGRAM_DATABASE_URL"), help='PostgreSQL DSN')
+    parser.add_argument('--keep', action='store_true', help='Не удалять схему после бенчмарка')
+    args = parser.parse_args()
+
+    if not args.dsn or not args.dsn.startswith("postgresql"):
+        print("❌ Нужен PostgreSQL DSN (--dsn или TELEGRAM_DATABASE_URL)")
+        sys.exit(1)
+
+    engine = create_engine(args.dsn)
+    first_month = add_months(month_start(datetime.now(timezone.utc)), -args.months)
+    cutoff = add_months(first_month, args.expire)
+
+    print(f"🔄 Подготовка: {args.rows} постов за {args.months} месяцев, удаляем {args.expire}")
+    setup(engine, args.rows, args.months, first_month)
+
+    try:
+        print("🔄 DELETE ... WHERE posted_at < cutoff")
+        plain = run_delete(engine, cutoff)
+
+        print("🔄 DETACH PARTITION + DROP TABLE")
+        part = run_partition_drop(engine, first_month, args.expire)
+
+        print_report(plain, part)
+    finally:
+        if not args.keep:
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+
+if __name__ == "__main__":
+    main()
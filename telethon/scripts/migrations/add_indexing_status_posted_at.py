@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Миграция: indexing_status.posted_at (копия posts.posted_at)
+
+Дата: 2025-10-21
+Описание: Добавляет indexing_status.posted_at и заполняет его из posts.
+          Колонка есть в models.py (IndexingStatus.posted_at) и пишется
+          индексатором и парсером - без нее любой запрос к indexing_status
+          падает ("column indexing_status.posted_at does not exist").
+          create_all существующие таблицы не меняет, поэтому миграцию нужно
+          применить ДО деплоя кода с этой колонкой.
+
+Не требует остановки сервисов и партиционирования:
+- ADD COLUMN nullable - без перезаписи таблицы
+- заполнение батчами по диапазонам id (отдельная транзакция на батч),
+  новые строки сервисы пишут уже с posted_at
+- повторный запуск безопасен (IF NOT EXISTS, заполняются только NULL)
+
+Строки без поста (posted_at не заполнить) остаются с NULL - их удаляет
+partition_posts_table.py, для которого posted_at входит в PRIMARY KEY.
+
+Применение:
+    python scripts/migrations/add_indexing_status_posted_at.py
+
+Совместимость: PostgreSQL
+"""
+
+import sys
+import logging
+from pathlib import Path
+
+# Добавляем корневую директорию в PYTHONPATH
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from sqlalchemy import text
+from database import engine
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+BATCH_SIZE = 10000
+
+
+def add_column():
+    """Добавить колонку (nullable - без перезаписи таблицы)"""
+    with engine.begin() as conn:
+        conn.execute(text(
+            "ALTER TABLE indexing_status ADD COLUMN IF NOT EXISTS posted_at TIMESTAMP WITH TIME ZONE"
+        ))
+    logger.info("✅ Колонка indexing_status.posted_at TIMESTAMP WITH TIME ZONE")
+
+
+def backfill(batch_size: int = BATCH_SIZE) -> int:
+    """
+    Заполнить posted_at из posts батчами по id
+
+    Returns:
+        Количество заполненных строк
+    """
+    with engine.connect() as conn:
+        min_id, max_id = conn.execute(text(
+            "SELECT MIN(id), MAX(id) FROM indexing_status WHERE posted_at IS NULL"
+        )).one()
+
+    if min_id is None:
+        logger.info("✅ indexing_status.posted_at уже заполнено")
+        return 0
+
+    total = 0
+    for start in range(min_id, max_id + 1, batch_size):
+        with engine.begin() as conn:
+            result = conn.execute(
+                text("""
+                    UPDATE indexing_status s
+                    SET posted_at = p.posted_at
+                    FROM posts p
+                    WHERE p.id = s.post_id
+                      AND s.posted_at IS NULL
+                      AND s.id >= :start AND s.id < :end
+                """),
+                {"start": start, "end": start + batch_size}
+            )
+        total += result.rowcount
+        logger.info(f"   id {start}..{start + batch_size - 1}: {result.rowcount} строк")
+
+    logger.info(f"✅ indexing_status.posted_at заполнено: {total} строк")
+    return total
+
+
+def migrate_postgresql():
+    """Миграция для PostgreSQL"""
+    logger.info("🔄 Запуск миграции для PostgreSQL...")
+
+    add_column()
+    backfill()
+
+    logger.info("✅ Миграция PostgreSQL завершена")
+
+
+def main():
+    """Основная функция миграции"""
+    try:
+        logger.info("=" * 60)
+        logger.info("🚀 Миграция: indexing_status.posted_at")
+        logger.info("=" * 60)
+
+        db_url = str(engine.url)
+        logger.info(f"📊 База данных: {db_url.split('://')[0]}")
+
+        if 'postgresql' not in db_url:
+            raise Exception(f"Неподдерживаемая БД: {db_url}")
+
+        migrate_postgresql()
+
+        logger.info("=" * 60)
+        logger.info("✅ Миграция успешно завершена!")
+        logger.info("=" * 60)
+        logger.info("\n📝 Проверка:")
+        logger.info("  docker exec supabase-db psql -U postgres -d postgres -c \"\\d indexing_status\"")
+
+    except Exception as e:
+        logger.error(f"❌ Критическая ошибка миграции: {str(e)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Миграция: Поля почти-дубликатов постов (near_duplicates.py)
+
+Дата: 2025-10-20
+Описание: Добавляет в posts MinHash текста и ссылку на первый пост
+          цепочки репостов. Парсер заполняет их для новых постов;
+          индекс дубликатов пользователя восстанавливается из minhash
+          (посты без сигнатуры считаются по тексту при загрузке).
+
+Колонки:
+- posts.minhash BYTEA - MinHash сигнатура (64 значения по 32 бита, 256 байт)
+- posts.canonical_post_id INTEGER - canonical пост (без FK: партиционированная
+  posts имеет PK (id, posted_at))
+
+Индексы:
+- ix_posts_canonical: (canonical_post_id) WHERE canonical_post_id IS NOT NULL
+
+Индекс создается через CREATE INDEX CONCURRENTLY; для партиционированной
+posts (partition_posts_table.py) CONCURRENTLY не поддерживается - обычный
+CREATE INDEX (частичный индекс по NULL-колонке строится быстро).
+
+Совместимость: PostgreSQL
+"""
+
+import sys
+import logging
+from pathlib import Path
+
+# Добавляем корневую директорию в PYTHONPATH
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from sqlalchemy import text
+from database import engine
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+COLUMNS = [
+    ("minhash", "BYTEA"),
+    ("canonical_post_id", "INTEGER"),
+]
+
+INDEX_NAME = "ix_posts_canonical"
+INDEX_COLUMNS = "ON posts (canonical_post_id) WHERE canonical_post_id IS NOT NULL"
+
+
+def check_table_partitioned(conn, table: str) -> bool:
+    """Проверить партиционирована ли таблица"""
+    result = conn.execute(
+        text("""
+            SELECT 1 FROM pg_partitioned_table pt
+            JOIN pg_class c ON c.oid = pt.partrelid
+            WHERE c.relname = :table
+        """),
+        {"table": table}
+    )
+    return result.first() is not None
+
+
+def check_index_valid(conn, index_name: str) -> bool:
+    """Проверить что индекс существует и валиден (после прерванного CONCURRENTLY - INVALID)"""
+    result = conn.execute(
+        text("""
+            SELECT i.indisvalid
+            FROM pg_class c
+            JOIN pg_index i ON i.indexrelid = c.oid
+            WHERE c.relname = :name
+        """),
+        {"name": index_name}
+    ).first()
+    return bool(result and result[0])
+
+
+def add_columns(conn):
+    """Добавить колонки (nullable - без перезаписи таблицы)"""
+    for column, column_type in COLUMNS:
+        conn.execute(text(f"ALTER TABLE posts ADD COLUMN IF NOT EXISTS {column} {column_type}"))
+        logger.info(f"✅ Колонка posts.{column} {column_type}")
+
+
+def create_index(conn):
+    """Создать частичный индекс canonical_post_id"""
+    if check_index_valid(conn, INDEX_NAME):
+        logger.info(f"✅ Индекс '{INDEX_NAME}' уже существует")
+        return
+
+    if check_table_partitioned(conn, "posts"):
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {INDEX_NAME} {INDEX_COLUMNS}"))
+    else:
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}"))
+        conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME} {INDEX_COLUMNS}"))
+    logger.info(f"✅ Создан индекс: {INDEX_NAME}")
+
+
+def migrate_postgresql():
+    """Миграция для PostgreSQL"""
+    logger.info("🔄 Запуск миграции для PostgreSQL...")
+
+    with engine.begin() as conn:
+        add_columns(conn)
+
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        create_index(conn)
+
+    logger.info("✅ Миграция PostgreSQL завершена")
+
+
+def main():
+    """Основная функция миграции"""
+    try:
+        logger.info("=" * 60)
+        logger.info("🚀 Миграция: Поля почти-дубликатов постов")
+        logger.info("=" * 60)
+
+        db_url = str(engine.url)
+        logger.info(f"📊 База данных: {db_url.split('://')[0]}")
+
+        if 'postgresql' not in db_url:
+            raise Exception(f"Неподдерживаемая БД: {db_url}")
+
+        migrate_postgresql()
+
+        logger.info("=" * 60)
+        logger.info("✅ Миграция успешно завершена!")
+        logger.info("=" * 60)
+        logger.info("\n📝 Проверка:")
+        logger.info("  docker exec supabase-db psql -U postgres -d postgres -c \"\\d posts\"")
+
+    except Exception as e:
+        logger.error(f"❌ Критическая ошибка миграции: {str(e)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Миграция: Составные индексы и уникальный ключ дедупликации для posts
+
+Дата: 2025-10-19
+Описание: Добавляет индексы под горячие запросы (дайджесты, retention,
+          поиск по датам, retry тегирования) и уникальный ключ
+          (user_id, channel_id, telegram_message_id), который парсер
+          проверяет для каждого сообщения.
+
+Индексы:
+- uix_user_channel_message: UNIQUE (user_id, channel_id, telegram_message_id)
+- ix_posts_user_posted_at: (user_id, posted_at DESC)
+- ix_posts_channel_posted_at: (channel_id, posted_at)
+- ix_posts_tagging_pending: (tagging_status) WHERE tagging_status IN ('pending','failed','retrying')
+- ix_indexing_status_user_status: indexing_status (user_id, status)
+
+Перед созданием уникального ключа удаляются дубликаты постов
+(остается пост с минимальным id) вместе с их записями indexing_status.
+
+Индексы создаются через CREATE INDEX CONCURRENTLY - без блокировки записи.
+
+Совместимость: PostgreSQL
+"""
+
+import sys
+import logging
+from pathlib import Path
+
+# Добавляем корневую директорию в PYTHONPATH
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from sqlalchemy import text
+from database import engine
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+INDEXES = [
+    (
+        "ix_posts_user_posted_at",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_posts_user_posted_at "
+        "ON posts (user_id, posted_at DESC)"
+    ),
+    (
+        "ix_posts_channel_posted_at",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_posts_channel_posted_at "
+        "ON posts (channel_id, posted_at)"
+    ),
+    (
+        "ix_posts_tagging_pending",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_posts_tagging_pending "
+        "ON posts (tagging_status) "
+        "WHERE tagging_status IN ('pending', 'failed', 'retrying')"
+    ),
+    (
+        "ix_indexing_status_user_status",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_indexing_status_user_status "
+        "ON indexing_status (user_id, status)"
+    ),
+]
+
+UNIQUE_NAME = "uix_user_channel_message"
+
+
+def check_constraint_exists(conn, constraint_name: str) -> bool:
+    """Проверить существует ли constraint"""
+    result = conn.execute(
+        text("SELECT 1 FROM pg_constraint WHERE conname = :name"),
+        {"name": constraint_name}
+    )
+    return result.first() is not None
+
+
+def check_index_valid(conn, index_name: str) -> bool:
+    """
+    Проверить что индекс существует и валиден
+
+    CREATE INDEX CONCURRENTLY при ошибке оставляет INVALID индекс,
+    который IF NOT EXISTS не пересоздаст.
+    """
+    result = conn.execute(
+        text("""
+            SELECT i.indisvalid
+            FROM pg_class c
+            JOIN pg_index i ON i.indexrelid = c.oid
+            WHERE c.relname = :name
+        """),
+        {"name": index_name}
+    ).first()
+    return bool(result and result[0])
+
+
+def remove_duplicate_posts(conn) -> int:
+    """Удалить дубликаты постов (оставляем минимальный id)"""
+    logger.info("🔄 Поиск дубликатов постов...")
+
+    duplicates = conn.execute(text("""
+        SELECT id FROM (
+            SELECT id, ROW_NUMBER() OVER (
+                PARTITION BY user_id, channel_id, telegram_message_id
+                ORDER BY id
+            ) AS rn
+            FROM posts
+        ) ranked
+        WHERE rn > 1
+    """)).scalars().all()
+
+    if not duplicates:
+        logger.info("✅ Дубликатов не найдено")
+        return 0
+
+    logger.info(f"📊 Найдено {len(duplicates)} дубликатов")
+
+    conn.execute(
+        text("DELETE FROM indexing_status WHERE post_id = ANY(:ids)"),
+        {"ids": duplicates}
+    )
+    result = conn.execute(
+        text("DELETE FROM posts WHERE id = ANY(:ids)"),
+        {"ids": duplicates}
+    )
+
+    logger.info(f"✅ Удалено {result.rowcount} дубликатов")
+    return result.rowcount
+
+
+def create_index(conn, index_name: str, ddl: str):
+    """Создать индекс (CONCURRENTLY, пересоздает INVALID)"""
+    if check_index_valid(conn, index_name):
+        logger.info(f"✅ Индекс '{index_name}' уже существует")
+        return
+
+    # INVALID индекс после прерванного CONCURRENTLY
+    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}"))
+    conn.execute(text(ddl))
+    logger.info(f"✅ Создан индекс: {index_name}")
+
+
+def add_unique_constraint(conn):
+    """Добавить уникальный ключ дедупликации постов"""
+    if check_constraint_exists(conn, UNIQUE_NAME):
+        logger.info(f"✅ Constraint '{UNIQUE_NAME}' уже существует")
+        return
+
+    # Сначала строим индекс без блокировки записи, затем привязываем к нему constraint
+    create_index(
+        conn,
+        UNIQUE_NAME,
+        f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {UNIQUE_NAME} "
+        f"ON posts (user_id, channel_id, telegram_message_id)"
+    )
+    conn.execute(text(
+        f"ALTER TABLE posts ADD CONSTRAINT {UNIQUE_NAME} UNIQUE USING INDEX {UNIQUE_NAME}"
+    ))
+    logger.info(f"✅ Добавлен constraint: {UNIQUE_NAME}")
+
+
+def migrate_postgresql():
+    """Миграция для PostgreSQL"""
+    logger.info("🔄 Запуск миграции для PostgreSQL...")
+
+    # Дедупликация в одной транзакции
+    with engine.begin() as conn:
+        remove_duplicate_posts(conn)
+
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        add_unique_constraint(conn)
+
+        for index_name, ddl in INDEXES:
+            create_index(conn, index_name, ddl)
+
+        # Обновляем статистику, чтобы планировщик сразу начал использовать индексы
+        conn.execute(text("ANALYZE posts"))
+        conn.execute(text("ANALYZE indexing_status"))
+        logger.info("✅ Статистика обновлена (ANALYZE)")
+
+    logger.info("✅ Миграция PostgreSQL завершена")
+
+
+def main():
+    """Основная функция миграции"""
+    try:
+        logger.info("=" * 60)
+        logger.info("🚀 Миграция: Индексы и уникальный ключ для posts")
+        logger.info("=" * 60)
+
+        db_url = str(engine.url)
+        logger.info(f"📊 База данных: {db_url.split('://')[0]}")
+
+        if 'postgresql' not in db_url:
+            raise Exception(f"Неподдерживаемая БД: {db_url}")
+
+        migrate_postgresql()
+
+        logger.info("=" * 60)
+        logger.info("✅ Миграция успешно завершена!")
+        logger.info("=" * 60)
+        logger.info("\n📝 Проверка:")
+        logger.info("  docker exec supabase-db psql -U postgres -d postgres -c \"\\d posts\"")
+
+    except Exception as e:
+        logger.error(f"❌ Критическая ошибка миграции: {str(e)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
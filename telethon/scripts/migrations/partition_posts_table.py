@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Миграция: Партиционирование posts и indexing_status по posted_at (месяц)
+
+Дата: 2025-10-19
+Описание: Переводит posts и indexing_status на RANGE-партиционирование
+          по posted_at. После миграции retention удаляет старые данные
+          целыми партициями (DETACH + DROP) вместо больших DELETE
+          (см. maintenance/post_partitions.py, UnifiedRetentionService).
+
+Что делает (migrate):
+1. Добавляет indexing_status.posted_at и заполняет из posts
+   (add_indexing_status_posted_at.py - если еще не применена)
+2. Переименовывает индексы старых таблиц (суффикс _legacy)
+3. Создает posts_partitioned / indexing_status_partitioned
+   с месячными партициями + default партицией
+4. Копирует данные помесячно (отдельная транзакция на месяц)
+5. Под ACCESS EXCLUSIVE блокировкой сверяет количество строк и
+   меняет таблицы местами: posts → posts_legacy, posts_partitioned → posts
+
+Ограничения PostgreSQL для партиционированных таблиц:
+- PRIMARY KEY posts: (id, posted_at)
+- UNIQUE ключи включают posted_at:
+  uix_user_channel_message (user_id, channel_id, telegram_message_id, posted_at),
+  uix_user_post (user_id, post_id, posted_at)
+- PRIMARY KEY indexing_status: (id, posted_at); строки indexing_status
+  без поста (posted_at не заполнить) удаляются при миграции
+- FK indexing_status.post_id → posts.id удаляется, как и в models.py
+  (строки удаляются вместе с партициями и явно в retention)
+
+finalize удаляет *_legacy таблицы. Если от них зависят другие объекты
+(FK других таблиц, views), finalize их перечисляет и останавливается:
+перенесите зависимости на новые таблицы или запустите finalize --cascade
+(DROP ... CASCADE удалит и зависимые объекты).
+
+ВАЖНО: запускать в окне обслуживания - остановите telethon, telethon-bot
+и rag-service, чтобы данные не менялись во время копирования.
+
+Применение:
+    python scripts/migrations/partition_posts_table.py migrate
+    python scripts/migrations/partition_posts_table.py finalize  # удалить *_legacy после проверки
+    python scripts/migrations/partition_posts_table.py finalize --cascade  # вместе с зависимыми объектами
+
+Совместимость: PostgreSQL 11+
+"""
+
+import sys
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Добавляем корневую директорию в PYTHONPATH
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from sqlalchemy import text
+from database import engine
+
+# Соседняя миграция (scripts/migrations не пакет)
+sys.path.insert(0, str(Path(__file__).parent))
+import add_indexing_status_posted_at as posted_at_migration
+
+from maintenance.post_partitions import (
+    month_start, add_months, partition_name,
+    create_partition_sql, create_default_partition_sql,
+    DEFAULT_MONTHS_AHEAD
+)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+POSTS_DDL = [
+    "CREATE TABLE posts_partitioned (LIKE posts INCLUDING DEFAULTS) PARTITION BY RANGE (posted_at)",
+    "ALTER TABLE posts_partitioned ADD CONSTRAINT posts_pkey PRIMARY KEY (id, posted_at)",
+    "ALTER TABLE posts_partitioned ADD CONSTRAINT uix_user_channel_message "
+    "UNIQUE (user_id, channel_id, telegram_message_id, posted_at)",
+    "ALTER TABLE posts_partitioned ADD CONSTRAINT posts_user_id_fkey "
+    "FOREIGN KEY (user_id) REFERENCES users(id)",
+    "ALTER TABLE posts_partitioned ADD CONSTRAINT posts_channel_id_fkey "
+    "FOREIGN KEY (channel_id) REFERENCES channels(id)",
+    "CREATE INDEX ix_posts_id ON posts_partitioned (id)",
+    "CREATE INDEX ix_posts_user_posted_at ON posts_partitioned (user_id, posted_at DESC)",
+    "CREATE INDEX ix_posts_channel_posted_at ON posts_partitioned (channel_id, posted_at)",
+    "CREATE INDEX ix_posts_tagging_pending ON posts_partitioned (tagging_status) "
+    "WHERE tagging_status IN ('pending', 'failed', 'retrying')",
+]
+
+INDEXING_STATUS_DDL = [
+    "CREATE TABLE indexing_status_partitioned (LIKE indexing_status INCLUDING DEFAULTS) "
+    "PARTITION BY RANGE (posted_at)",
+    "ALTER TABLE indexing_status_partitioned ADD CONSTRAINT indexing_status_pkey PRIMARY KEY (id, posted_at)",
+    "CREATE UNIQUE INDEX uix_user_post ON indexing_status_partitioned (user_id, post_id, posted_at)",
+    "ALTER TABLE indexing_status_partitioned ADD CONSTRAINT indexing_status_user_id_fkey "
+    "FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE",
+    "CREATE INDEX ix_indexing_status_id ON indexing_status_partitioned (id)",
+    "CREATE INDEX ix_indexing_status_user_id ON indexing_status_partitioned (user_id)",
+    "CREATE INDEX ix_indexing_status_post_id ON indexing_status_partitioned (post_id)",
+    "CREATE INDEX ix_indexing_status_status ON indexing_status_partitioned (status)",
+    "CREATE INDEX ix_indexing_status_user_status ON indexing_status_partitioned (user_id, status)",
+]
+
+TABLES = {
+    "posts": POSTS_DDL,
+    "indexing_status": INDEXING_STATUS_DDL,
+}
+
+
+def check_table_partitioned(conn, table: str) -> bool:
+    """Проверить партиционирована ли таблица"""
+    result = conn.execute(
+        text("""
+            SELECT 1 FROM pg_partitioned_table pt
+            JOIN pg_class c ON c.oid = pt.partrelid
+            WHERE c.relname = :table
+        """),
+        {"table": table}
+    )
+    return result.first() is not None
+
+
+def check_table_exists(conn, table: str) -> bool:
+    """Проверить существует ли таблица"""
+    return conn.execute(text("SELECT to_regclass(:name)"), {"name": table}).scalar() is not None
+
+
+def add_indexing_status_posted_at():
+    """Добавить indexing_status.posted_at, заполнить из posts и удалить строки без поста"""
+    posted_at_migration.add_column()
+    posted_at_migration.backfill()
+
+    with engine.begin() as conn:
+        # Строки, добавленные после заполнения батчами
+        conn.execute(text("""
+            UPDATE indexing_status s
+            SET posted_at = p.posted_at
+            FROM posts p
+            WHERE p.id = s.post_id AND s.posted_at IS NULL
+        """))
+        # posted_at входит в PRIMARY KEY: статусы удаленных постов не переносятся
+        orphans = conn.execute(text("DELETE FROM indexing_status WHERE posted_at IS NULL"))
+    if orphans.rowcount:
+        logger.info(f"🗑️ indexing_status: удалено {orphans.rowcount} строк без поста")
+
+
+def rename_legacy_indexes(conn, table: str):
+    """Освободить имена индексов/constraint'ов для новой таблицы"""
+    index_names = conn.execute(
+        text("SELECT indexname FROM pg_indexes WHERE tablename = :table"),
+        {"table": table}
+    ).scalars().all()
+
+    for name in index_names:
+        if name.endswith("_legacy"):
+            continue
+        # Для индексов UNIQUE/PRIMARY KEY constraint переименовывается вместе с индексом
+        conn.execute(text(f"ALTER INDEX {name} RENAME TO {name}_legacy"))
+        logger.info(f"   {name} → {name}_legacy")
+
+
+def create_partitioned_table(conn, table: str, first_month: datetime, last_month: datetime):
+    """Создать партиционированную копию таблицы с партициями"""
+    for ddl in TABLES[table]:
+        conn.execute(text(ddl))
+
+    parent = f"{table}_partitioned"
+    month = first_month
+    count = 0
+    while month <= last_month:
+        # Партиции именуются по итоговой таблице (posts_p2025_10), а не по временному имени
+        conn.execute(text(create_partition_sql(table, month, parent=parent)))
+        month = add_months(month, 1)
+        count += 1
+
+    conn.execute(text(create_default_partition_sql(table, parent=parent)))
+    logger.info(f"✅ {parent}: создано {count} месячных партиций + default")
+
+
+def copy_month(table: str, month: datetime) -> int:
+    """Скопировать один месяц данных (отдельная транзакция)"""
+    with engine.begin() as conn:
+        result = conn.execute(
+            text(f"""
+                INSERT INTO {table}_partitioned
+                SELECT * FROM {table}
+                WHERE posted_at >= :start AND posted_at < :end
+            """),
+            {"start": month, "end": add_months(month, 1)}
+        )
+    return result.rowcount
+
+
+def copy_data(table: str, first_month: datetime, last_month: datetime):
+    """Помесячное копирование + строки вне диапазона (default партиция)"""
+    total = 0
+    month = first_month
+    while month <= last_month:
+        copied = copy_month(table, month)
+        total += copied
+        if copied:
+            logger.info(f"   {partition_name(table, month)}: {copied} строк")
+        month = add_months(month, 1)
+
+    with engine.begin() as conn:
+        result = conn.execute(text(f"""
+            INSERT INTO {table}_partitioned
+            SELECT * FROM {table}
+            WHERE posted_at IS NULL OR posted_at < :start OR posted_at >= :end
+        """), {"start": first_month, "end": add_months(last_month, 1)})
+        total += result.rowcount
+
+    logger.info(f"✅ {table}: скопировано {total} строк")
+
+
+def swap_tables():
+    """Сверить данные и поменять таблицы местами (одна транзакция)"""
+    with engine.begin() as conn:
+        conn.execute(text("LOCK TABLE posts, indexing_status IN ACCESS EXCLUSIVE MODE"))
+
+        for table in TABLES:
+            old_count = conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+            new_count = conn.execute(text(f"SELECT COUNT(*) FROM {table}_partitioned")).scalar()
+            if old_count != new_count:
+                raise Exception(
+                    f"{table}: количество строк не совпадает ({old_count} != {new_count}). "
+                    f"Данные менялись во время копирования - остановите сервисы и повторите"
+                )
+            logger.info(f"✅ {table}: {new_count} строк совпадает")
+
+        sequence = conn.execute(text("SELECT pg_get_serial_sequence('posts', 'id')")).scalar()
+        status_sequence = conn.execute(text("SELECT pg_get_serial_sequence('indexing_status', 'id')")).scalar()
+
+        conn.execute(text(
+            "ALTER TABLE indexing_status DROP CONSTRAINT IF EXISTS indexing_status_post_id_fkey"
+        ))
+
+        for table in TABLES:
+            conn.execute(text(f"ALTER TABLE {table} RENAME TO {table}_legacy"))
+            conn.execute(text(f"ALTER TABLE {table}_partitioned RENAME TO {table}"))
+
+        # Иначе DROP TABLE posts_legacy удалит sequence, которую использует новая таблица
+        if sequence:
+            conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY posts.id"))
+        if status_sequence:
+            conn.execute(text(f"ALTER SEQUENCE {status_sequence} OWNED BY indexing_status.id"))
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE posts"))
+        conn.execute(text("ANALYZE indexing_status"))
+
+    logger.info("✅ Таблицы переключены: posts, indexing_status партиционированы")
+
+
+def migrate():
+    """Применить миграцию"""
+    logger.info("=" * 60)
+    logger.info("🚀 Миграция: Партиционирование posts / indexing_status")
+    logger.info("=" * 60)
+
+    with engine.connect() as conn:
+        if check_table_partitioned(conn, "posts"):
+            logger.info("✅ posts уже партиционирована")
+            return
+
+        for table in TABLES:
+            if check_table_exists(conn, f"{table}_partitioned"):
+                raise Exception(
+                    f"{table}_partitioned уже существует (прерванная миграция?). "
+                    f"Удалите ее вручную: DROP TABLE {table}_partitioned CASCADE"
+                )
+
+        min_posted_at = conn.execute(text("SELECT MIN(posted_at) FROM posts")).scalar()
+
+    now = datetime.now(timezone.utc)
+    first_month = month_start(min_posted_at or now)
+    last_month = add_months(month_start(now), DEFAULT_MONTHS_AHEAD)
+    logger.info(f"📅 Диапазон партиций: {first_month:%Y-%m} .. {last_month:%Y-%m}")
+
+    # 1. Ключ партиционирования для indexing_status
+    add_indexing_status_posted_at()
+
+    # 2-3. Новые таблицы (DDL транзакционный - при ошибке ничего не останется)
+    with engine.begin() as conn:
+        for table in TABLES:
+            logger.info(f"🔄 Переименование индексов {table}:")
+            rename_legacy_indexes(conn, table)
+            create_partitioned_table(conn, table, first_month, last_month)
+
+    # 4. Копирование
+    for table in TABLES:
+        logger.info(f"🔄 Копирование {table}...")
+        copy_data(table, first_month, last_month)
+
+    # 5. Переключение
+    swap_tables()
+
+    logger.info("=" * 60)
+    logger.info("✅ Миграция успешно завершена!")
+    logger.info("=" * 60)
+    logger.info("\n📝 Старые таблицы сохранены: posts_legacy, indexing_status_legacy")
+    logger.info("   После проверки удалите их:")
+    logger.info("   python scripts/migrations/partition_posts_table.py finalize")
+
+
+def legacy_dependents(conn, table: str) -> list:
+    """Объекты, которые не дают удалить таблицу без CASCADE (FK других таблиц, views)"""
+    return conn.execute(text("""
+        SELECT format('FK %s.%s', conrelid::regclass, conname)
+        FROM pg_constraint
+        WHERE contype = 'f' AND confrelid = CAST(:table AS regclass) AND conrelid <> confrelid
+        UNION
+        SELECT format('VIEW %s', r.ev_class::regclass)
+        FROM pg_depend d
+        JOIN pg_rewrite r ON r.oid = d.objid
+        WHERE d.classid = 'pg_rewrite'::regclass
+          AND d.refobjid = CAST(:table AS regclass)
+          AND r.ev_class <> d.refobjid
+    """), {"table": table}).scalars().all()
+
+
+def finalize(cascade: bool = False):
+    """
+    Удалить старые (непартиционированные) таблицы
+
+    Args:
+        cascade: Удалить вместе с зависимыми объектами (DROP ... CASCADE)
+    """
+    with engine.begin() as conn:
+        if not check_table_partitioned(conn, "posts"):
+            raise Exception("posts не партиционирована - сначала выполните migrate")
+
+        tables = [t for t in ("indexing_status_legacy", "posts_legacy") if check_table_exists(conn, t)]
+
+        dependents = {}
+        for table in tables:
+            # Views на posts после переименования ссылаются на posts_legacy
+            found = legacy_dependents(conn, table)
+            if found:
+                dependents[table] = found
+
+        if dependents:
+            for table, found in dependents.items():
+                logger.warning(f"⚠️ От {table} зависят: {', '.join(found)}")
+            if not cascade:
+                raise Exception(
+                    "От *_legacy таблиц зависят другие объекты (см. выше). Перенесите их на "
+                    "posts/indexing_status или запустите finalize --cascade"
+                )
+
+        for table in tables:
+            conn.execute(text(f"DROP TABLE {table}{' CASCADE' if cascade else ''}"))
+            logger.info(f"🗑️ Удалена таблица {table}")
+
+    logger.info("✅ Finalize завершен")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Migration: Partition posts by posted_at')
+    parser.add_argument('action', choices=['migrate', 'finalize'],
+                       help='Действие: migrate (применить) или finalize (удалить *_legacy таблицы)')
+    parser.add_argument('--cascade', action='store_true',
+                       help='finalize: удалить *_legacy вместе с зависимыми объектами')
+
+    args = parser.parse_args()
+
+    try:
+        if args.action == 'migrate':
+            migrate()
+        elif args.action == 'finalize':
+            finalize(cascade=args.cascade)
+    except Exception as e:
+        logger.error(f"❌ Критическая ошибка миграции: {str(e)}")
+        sys.exit(1)
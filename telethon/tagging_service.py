@@ -4,6 +4,7 @@ import json
 import os
 import logging
 import re
+from contextlib import nullcontext
 from typing import List, Optional, Dict
 from datetime import datetime, timezone
 from database import SessionLocal
@@ -15,6 +16,13 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Общий с rag-service регулятор GigaChat (Redis): тегирование - фоновый приоритет
+try:
+    from rag_service.gigachat_governor import gigachat_governor, PRIORITY_BACKGROUND
+except ImportError:
+    gigachat_governor = None
+    PRIORITY_BACKGROUND = None
+
 
 class TaggingService:
     """Сервис для автоматического тегирования постов с использованием OpenRouter или GigaChat API"""
@@ -173,25 +181,34 @@ class TaggingService:
 Пример:
 ["технологии", "искусственный интеллект", "новости"]"""
 
+            # Слот только на сам запрос: повторы ниже берут новый слот
+            slot = (
+                gigachat_governor.slot(PRIORITY_BACKGROUND)
+                if gigachat_governor and current_provider == "gigachat"
+                else nullcontext()
+            )
             async with httpx.AsyncClient(transport=self.transport, timeout=30.0) as client:
-                response = await client.post(
-                    current_api_url,
-                    headers={
-                        "Authorization": f"Bearer {current_api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": current_model,
-                        "messages": [
-                            {
-                                "role": "user",
-                                "content": prompt
-                            }
-                        ],
-                        "temperature": 0.3,
-                        "max_tokens": 150
-                    }
-                )
+                async with slot as lease:
+                    response = await client.post(
+                        current_api_url,
+                        headers={
+                            "Authorization": f"Bearer {current_api_key}",
+                            "Content-Type": "application/json"
+                        },
+                        json={
+                            "model": current_model,
+                            "messages": [
+                                {
+                                    "role": "user",
+                                    "content": prompt
+                                }
+                            ],
+                            "temperature": 0.3,
+                            "max_tokens": 150
+                        }
+                    )
+                    if lease:
+                        lease.observe(response)
                 
                 if response.status_code != 200:
                     error_msg = f"API Error {response.status_code}: {response.text[:200]}"
@@ -455,6 +472,17 @@ class TaggingService:
                 db.commit()
                 return False
             
+            # Почти-дубликат: теги canonical поста, без запроса к LLM
+            if post.canonical_post_id:
+                canonical = db.query(Post).filter(Post.id == post.canonical_post_id).first()
+                if canonical and canonical.tagging_status == "success" and canonical.tags is not None:
+                    post.tags = canonical.tags
+                    post.tagging_status = "success"
+                    post.tagging_error = None
+                    db.commit()
+                    logger.info(f"✅ TaggingService: Пост {post_id} - теги canonical поста {canonical.id}: {post.tags}")
+                    return True
+            
             # Обновляем счетчик попыток и время
             post.tagging_attempts += 1
             post.last_tagging_attempt = datetime.now(timezone.utc)
@@ -22,6 +22,8 @@ os.environ['MASTER_API_HASH'] = 'test_api_hash'
 os.environ['ENCRYPTION_KEY'] = 'WX7wmC8298QkVh1acJr0h8roQ16M4am8qh1h4q35BqQ='
 os.environ['REDIS_HOST'] = 'localhost'
 os.environ['REDIS_PORT'] = '6379'
+os.environ['GIGACHAT_GOVERNOR_REDIS'] = 'false'  # Регулятор GigaChat - локально для процесса
+os.environ['TELEGRAM_SENDER_REDIS'] = 'false'  # Outbound очередь Telegram - локально для процесса
 
 from models import Base, User, Channel, Post, Group, InviteCode, SubscriptionHistory
 from database import get_db
@@ -54,8 +54,7 @@ class TestRAGCompleteFlow:
         indexer.embeddings.generate_embedding = AsyncMock(
             return_value=([0.1] * 1024, "gigachat")
         )
-        indexer.embeddings.count_tokens = MagicMock(return_value=50)
-        indexer.embeddings.chunk_text = MagicMock(return_value=[("chunk", 0, 100)])
+        indexer.embeddings.chunk_text_with_count = MagicMock(return_value=([("chunk", 0, 100)], 50))
         indexer.embeddings.get_chunking_params = MagicMock(return_value=(500, 50))
         
         # Mock _enrich_search_results чтобы избежать БД запросов
@@ -180,6 +180,43 @@ class TestAIDigestGenerator:
             assert 'inferred_topics' in summary
             assert 'combined_topics' in summary
     
+    @pytest.mark.asyncio
+    async def test_fallback_digest_collapses_near_duplicates(self, digest_generator, db):
+        """Почти-дубликаты - один раз, даже если canonical пост вне выборки"""
+        from models import Post
+        from digest_generator import collapse_near_duplicates
+        
+        user = UserFactory.create(db, telegram_id=24000002)
+        news, mirror = ChannelFactory.create(db), ChannelFactory.create(db)
+        now = datetime.now(timezone.utc)
+        
+        # Canonical пост вне периода дайджеста, две копии внутри
+        canonical = PostFactory.create(db, user_id=user.id, channel_id=news.id, text="Ставка: оригинал",
+                                       posted_at=now - timedelta(days=10))
+        first_copy = PostFactory.create(db, user_id=user.id, channel_id=mirror.id, text="Ставка: первая копия",
+                                        posted_at=now - timedelta(days=2), canonical_post_id=canonical.id)
+        PostFactory.create(db, user_id=user.id, channel_id=news.id, text="Ставка: вторая копия",
+                           posted_at=now - timedelta(days=1), canonical_post_id=canonical.id)
+        # Canonical удален retention
+        PostFactory.create(db, user_id=user.id, channel_id=news.id, text="Хоккей: копия",
+                           posted_at=now - timedelta(days=1), canonical_post_id=999999)
+        
+        digest = await digest_generator._generate_fallback_digest(user.id, now - timedelta(days=7), now)
+        
+        assert "Ставка: первая копия" in digest
+        assert "Ставка: вторая копия" not in digest
+        assert "Ставка: оригинал" not in digest
+        assert "Хоккей: копия" in digest
+        
+        # Canonical и первая копия в канале вне фильтра - остается вторая копия
+        posts = collapse_near_duplicates(db.query(Post).filter(
+            Post.user_id == user.id,
+            Post.channel_id == news.id,
+            Post.posted_at >= now - timedelta(days=7)
+        )).order_by(Post.posted_at).all()
+        assert [post.text for post in posts] == ["Ставка: вторая копия", "Хоккей: копия"]
+        assert first_copy.id not in {post.id for post in posts}
+    
     def test_format_ai_digest(self, digest_generator):
         """Тест форматирования финального дайджеста"""
         topic_summaries = [
@@ -208,3 +245,80 @@ class TestAIDigestGenerator:
         assert "Блокчейн" in formatted
         assert "Революция" in formatted
 
+    
+    @pytest.mark.asyncio
+    async def test_generate_ai_digest_concurrent_pipeline(self, digest_generator):
+        """Тест: batch embeddings, параллельный поиск, лимит саммари и порядок тем"""
+        import asyncio
+        
+        topics = ["AI", "крипта", "авто", "спорт"]
+        date_from = datetime.now(timezone.utc) - timedelta(days=1)
+        date_to = datetime.now(timezone.utc)
+        
+        digest_generator.search_service.embeddings.generate_embeddings_batch = AsyncMock(
+            return_value=[([float(i)], "gigachat") for i in range(len(topics))]
+        )
+        digest_generator.search_service.search = AsyncMock(side_effect=lambda **kwargs: [
+            {"text": f"Post {kwargs['query']}", "channel_username": "news"}
+        ])
+        
+        in_flight = 0
+        max_in_flight = 0
+        
+        async def fake_summarize(topic, posts, style):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            # Первая тема отвечает дольше всех - порядок не должен сломаться
+            await asyncio.sleep(0.05 if topic == "AI" else 0.01)
+            in_flight -= 1
+            return {"topic": topic, "summary": f"summary {topic}", "post_count": len(posts), "sources": []}
+        
+        with patch.object(digest_generator, '_get_user_interests', AsyncMock(return_value=topics)), \
+             patch.object(digest_generator, '_summarize_topic', side_effect=fake_summarize), \
+             patch('ai_digest_generator.config.DIGEST_SUMMARY_CONCURRENCY', 2), \
+             patch.object(digest_generator, '_format_ai_digest', return_value="digest") as mock_format:
+            digest = await digest_generator.generate_ai_digest(
+                user_id=1,
+                date_from=date_from,
+                date_to=date_to,
+                topics_limit=4
+            )
+        
+        assert digest == "digest"
+        
+        # Один batch на все темы, вектор передан в поиск
+        digest_generator.search_service.embeddings.generate_embeddings_batch.assert_awaited_once_with(topics)
+        vectors = [call.kwargs["query_vector"] for call in digest_generator.search_service.search.call_args_list]
+        assert sorted(vectors) == [[0.0], [1.0], [2.0], [3.0]]
+        
+        assert max_in_flight == 2
+        summaries = mock_format.call_args.args[0]
+        assert [s["topic"] for s in summaries] == topics
+    
+    def test_assign_posts_to_topics(self, digest_generator):
+        """Тест: пост остается только в теме с лучшим score"""
+        shared_text = "Общий пост " * 50
+        topic_posts = [
+            [
+                {"post_id": 1, "score": 0.9, "text": shared_text},
+                {"post_id": 2, "score": 0.8, "text": "AI"},
+                {"post_id": 2, "score": 0.85, "text": "AI chunk 2"}
+            ],
+            [
+                {"post_id": 1, "score": 0.7, "text": shared_text},
+                {"post_id": 3, "score": 0.6, "text": "крипта"}
+            ]
+        ]
+        
+        assigned, tokens_saved = digest_generator._assign_posts_to_topics(topic_posts, max_topics_per_post=1)
+        
+        assert [p["post_id"] for p in assigned[0]] == [1, 2]
+        assert assigned[0][1]["text"] == "AI chunk 2"  # лучший чанк поста
+        assert [p["post_id"] for p in assigned[1]] == [3]
+        assert tokens_saved > 0
+        
+        # Ограничение 2 темы - пост остается в обеих
+        assigned, tokens_saved = digest_generator._assign_posts_to_topics(topic_posts, max_topics_per_post=2)
+        assert [p["post_id"] for p in assigned[1]] == [1, 3]
+        assert tokens_saved == 0
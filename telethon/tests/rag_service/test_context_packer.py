@@ -0,0 +1,87 @@
+"""
+Тесты для Context Packer
+Склейка соседних chunks, MMR без почти-повторов и бюджет токенов
+"""
+
+import pytest
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../rag_service'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from context_packer import ContextPacker, context_budget, merge_adjacent_chunks
+from embeddings import embeddings_service
+
+
+def _chunk(post_id, text, chunk_index=0, start_pos=None, end_pos=None, **fields):
+    return {
+        "post_id": post_id,
+        "text": text,
+        "score": 0.9,
+        "chunk_info": {"chunk_index": chunk_index, "start_pos": start_pos, "end_pos": end_pos},
+        **fields
+    }
+
+
+@pytest.mark.unit
+@pytest.mark.rag
+class TestContextPacker:
+    """Тесты для ContextPacker"""
+
+    def test_merge_adjacent_chunks_without_overlap_repeat(self):
+        """Тест: соседние chunks склеиваются по позициям, overlap не повторяется"""
+        source = "Первое предложение поста. Второе предложение поста. Третье предложение поста."
+        results = [
+            _chunk(1, source[26:], chunk_index=1, start_pos=26, end_pos=len(source)),
+            _chunk(2, "Другой пост"),
+            _chunk(1, source[:52], chunk_index=0, start_pos=0, end_pos=52),
+            _chunk(1, "Страница по ссылке", chunk_index=2, source="link", source_url="https://example.com")
+        ]
+
+        passages = merge_adjacent_chunks(results)
+
+        # Порядок - по лучшему chunk'у, ссылка - отдельный фрагмент
+        assert [(p["post_id"], p.get("source", "post")) for p in passages] == [(1, "post"), (2, "post"), (1, "link")]
+        assert passages[0]["text"] == source
+        assert passages[0]["merged_chunks"] == 2
+        assert passages[0]["chunk_info"]["start_pos"] == 0
+        assert passages[0]["chunk_info"]["end_pos"] == len(source)
+
+    def test_pack_drops_near_duplicates(self):
+        """Тест: почти-повтор (репост с припиской) не попадает в промпт"""
+        news = "Компания выпустила новую модель нейросети для перевода текстов на сорок языков"
+        results = [
+            _chunk(1, news),
+            _chunk(2, "Репост: " + news),
+            _chunk(3, "Курс биткоина обновил исторический максимум на фоне притока в фонды")
+        ]
+
+        packed = ContextPacker(mmr_lambda=0.7, dedup_threshold=0.8).pack(results, budget_tokens=1000)
+
+        assert [p["post_id"] for p in packed] == [1, 3]
+
+    def test_pack_fits_budget(self):
+        """Тест: фрагменты с заголовками укладываются в бюджет, длинный текст обрезается"""
+        long_text = " ".join(f"Предложение номер {i} про новости рынка." for i in range(200))
+        results = [_chunk(i, f"{i} {long_text}") for i in range(5)]
+        formatter = lambda index, passage: f"Источник {index}: @channel\n{passage['text']}"
+
+        packed = ContextPacker(dedup_threshold=1.1).pack(
+            results, budget_tokens=300, max_passage_tokens=120, formatter=formatter
+        )
+
+        assert 2 <= len(packed) < len(results)
+        used = sum(p["packed_tokens"] for p in packed) + embeddings_service.count_tokens("\n\n") * (len(packed) - 1)
+        assert used <= 300
+        for i, passage in enumerate(packed, 1):
+            assert passage["text"].endswith("…")
+            assert passage["packed_tokens"] == embeddings_service.count_tokens(formatter(i, passage))
+
+    def test_context_budget_per_model(self, monkeypatch):
+        """Тест: бюджет - минимум по моделям, которым может уйти промпт"""
+        monkeypatch.setattr("config.CONTEXT_TOKEN_BUDGETS", {"GigaChat": 3000})
+
+        assert context_budget(4000, "google/gemini-2.0-flash-exp:free") == 4000
+        assert context_budget(4000, "google/gemini-2.0-flash-exp:free", "GigaChat") == 3000
+        assert context_budget(4000, "google/gemini-2.0-flash-exp:free", None) == 4000
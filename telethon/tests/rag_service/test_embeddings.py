@@ -53,6 +53,56 @@ class TestEmbeddingsService:
             assert len(chunk_text) > 0
             assert end > start
     
+    def test_chunk_text_with_count_offsets_and_boundaries(self, embeddings_service):
+        """Chunks - точные срезы исходного текста, разрез по границе предложения"""
+        paragraph = "Сбер отчитался за квартал. Прибыль выросла на 12%! Что дальше?\n\n"
+        text = paragraph * 40
+        
+        chunks, token_count = embeddings_service.chunk_text_with_count(text, 100, 20)
+        
+        assert token_count == len(embeddings_service.token_offsets(text))
+        assert len(chunks) > 1
+        covered = 0
+        for chunk_text, start, end in chunks:
+            assert text[start:end] == chunk_text
+            assert start <= covered  # без пропусков
+            covered = max(covered, end)
+        assert covered == len(text)
+        
+        # Все chunks, кроме последнего, заканчиваются на границе предложения или абзаца
+        for chunk_text, _, _ in chunks[:-1]:
+            assert chunk_text.endswith((". ", "! ", "? ", "\n"))
+    
+    def test_chunk_text_with_count_multibyte_tokens(self, embeddings_service):
+        """Токены, режущие UTF-8 символ, не сдвигают позиции chunks"""
+        class ByteTokenizer:
+            """3 байта на токен - кириллица режется посередине символа"""
+            def encode(self, text, disallowed_special=()):
+                self.data = text.encode("utf-8")
+                return list(range(0, len(self.data), 3))
+            
+            def decode_tokens_bytes(self, tokens):
+                return [self.data[i:i + 3] for i in tokens]
+        
+        embeddings_service.tokenizer = ByteTokenizer()
+        text = "Ёлка, ёж и №5. " * 100
+        
+        chunks, token_count = embeddings_service.chunk_text_with_count(text, 60, 10)
+        
+        assert token_count == -(-len(text.encode("utf-8")) // 3)
+        for chunk_text, start, end in chunks:
+            assert text[start:end] == chunk_text
+            assert len(chunk_text.encode("utf-8")) <= 60 * 3
+        assert chunks[-1][2] == len(text)
+    
+    def test_chunk_text_with_count_short_text(self, embeddings_service):
+        text = "Короткий пост"
+        
+        chunks, token_count = embeddings_service.chunk_text_with_count(text, 500, 50)
+        
+        assert chunks == [(text, 0, len(text))]
+        assert token_count > 0
+    
     @pytest.mark.asyncio
     async def test_generate_embedding_gigachat(self, embeddings_service):
         """Тест генерации embedding через GigaChat"""
@@ -70,7 +120,7 @@ class TestEmbeddingsService:
         })
         
         # Mock все зависимости через patch на уровне импортов
-        with patch('rate_limiter.gigachat_rate_limiter') as mock_rate_limiter, \
+        with patch('rate_limiter.gigachat_governor') as mock_rate_limiter, \
              patch('observability.langfuse_client.langfuse_client', None), \
              patch('httpx.AsyncClient') as mock_httpx:
             
@@ -165,6 +215,35 @@ class TestEmbeddingsService:
                 embedding, provider = result
                 assert len(embedding) == 1024
     
+    @pytest.mark.asyncio
+    async def test_generate_embeddings_batch_single_gigachat_request(self, embeddings_service):
+        """Тест что batch уходит в GigaChat одним запросом с сохранением порядка"""
+        texts = ["Text 1", "", "Text 3"]
+        embeddings_service.gigachat_enabled = True
+        
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        # Порядок в ответе может отличаться - ориентируемся на index
+        mock_response.json = MagicMock(return_value={
+            "data": [
+                {"embedding": [0.3] * 4, "index": 1},
+                {"embedding": [0.1] * 4, "index": 0}
+            ]
+        })
+        
+        with patch('httpx.AsyncClient') as mock_httpx:
+            mock_client = AsyncMock()
+            mock_client.__aenter__ = AsyncMock(return_value=mock_client)
+            mock_client.__aexit__ = AsyncMock()
+            mock_client.post = AsyncMock(return_value=mock_response)
+            mock_httpx.return_value = mock_client
+            
+            embeddings = await embeddings_service.generate_embeddings_gigachat_batch(texts)
+        
+        assert mock_client.post.await_count == 1
+        assert mock_client.post.call_args.kwargs["json"]["input"] == ["Text 1", "Text 3"]
+        assert embeddings == [[0.1] * 4, None, [0.3] * 4]
+    
     def test_get_chunking_params(self, embeddings_service):
         """Тест получения параметров chunking для разных провайдеров"""
         # GigaChat params
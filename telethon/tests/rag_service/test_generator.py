@@ -105,6 +105,66 @@ class TestRAGGenerator:
                 # Должен быть ответ даже если GigaChat не работает
                 assert result is not None
     
+    @pytest.mark.asyncio
+    async def test_generate_answer_with_rerank(self, rag_generator):
+        """Rerank: поиск с запасом кандидатов, в промпт - лучшие RERANK_TOP_K"""
+        candidates = [
+            {"post_id": i, "text": f"Пост {i}", "channel_username": "news", "posted_at": None,
+             "url": None, "score": 0.9 - i * 0.01}
+            for i in range(30)
+        ]
+        rag_generator.enabled = True
+        rag_generator._log_query_to_history = AsyncMock()
+        rag_generator._generate_with_openrouter = AsyncMock(return_value="Ответ")
+        
+        with patch('generator.ENHANCED_SEARCH_AVAILABLE', False), \
+             patch('generator.search_service') as mock_search, \
+             patch('generator.reranker') as mock_reranker, \
+             patch('generator.config.RERANK_CANDIDATES', 30), \
+             patch('generator.config.RERANK_TOP_K', 3):
+            mock_search.search = AsyncMock(return_value=candidates)
+            mock_reranker.rerank = AsyncMock(return_value=[candidates[7], candidates[2], candidates[15]])
+            
+            result = await rag_generator.generate_answer("Вопрос", user_id=1, context_limit=10, rerank=True)
+            
+            assert mock_search.search.call_args.kwargs["limit"] == 30
+            assert mock_reranker.rerank.call_args.kwargs["top_k"] == 3
+            assert [s["post_id"] for s in result["sources"]] == [7, 2, 15]
+            
+            # Fallback (бюджет/ошибка) - исходный порядок поиска, context_limit документов
+            mock_reranker.rerank = AsyncMock(return_value=None)
+            result = await rag_generator.generate_answer("Вопрос", user_id=1, context_limit=10, rerank=True)
+            
+            assert [s["post_id"] for s in result["sources"]] == list(range(10))
+
+    @pytest.mark.asyncio
+    async def test_generate_answer_packs_context(self, rag_generator):
+        """Context packing: соседние chunks склеиваются, почти-повтор не попадает в промпт"""
+        text = "Компания выпустила новую модель нейросети. Модель переводит тексты на сорок языков."
+        common = {"channel_username": "news", "posted_at": None, "url": None, "score": 0.9}
+        results = [
+            {"post_id": 1, "text": text[:43], "chunk_info": {"chunk_index": 0, "start_pos": 0, "end_pos": 43}, **common},
+            {"post_id": 2, "text": "Репост: " + text, **common},
+            {"post_id": 1, "text": text[28:], "chunk_info": {"chunk_index": 1, "start_pos": 28, "end_pos": len(text)}, **common},
+            {"post_id": 3, "text": "Курс биткоина обновил исторический максимум", **common}
+        ]
+        rag_generator.enabled = True
+        rag_generator._log_query_to_history = AsyncMock()
+        rag_generator._generate_with_openrouter = AsyncMock(return_value="Ответ")
+
+        with patch('generator.ENHANCED_SEARCH_AVAILABLE', False), \
+             patch('generator.search_service') as mock_search, \
+             patch('generator.config.CONTEXT_PACKING_ENABLED', True):
+            mock_search.search = AsyncMock(return_value=results)
+
+            result = await rag_generator.generate_answer("Вопрос", user_id=1, context_limit=10)
+
+        prompt = rag_generator._generate_with_openrouter.call_args.args[0]
+        assert [s["post_id"] for s in result["sources"]] == [1, 3]
+        assert prompt.count("Модель переводит") == 1
+        assert text in prompt
+        assert result["context_tokens"] > 0
+
     @pytest.mark.asyncio
     async def test_log_query_to_history(self, rag_generator, db):
         """Тест сохранения запроса в историю"""
@@ -0,0 +1,139 @@
+"""
+Тесты для GigaChat Governor
+Адаптивный rate limit, конкурентность и приоритеты запросов к GigaChat
+"""
+
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import httpx
+import pytest
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../rag_service'))
+
+from gigachat_governor import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_DIGEST,
+    PRIORITY_INTERACTIVE,
+    GigaChatBusyError,
+    GigaChatGovernor,
+    gigachat_priority
+)
+
+
+def _governor(**kwargs):
+    params = dict(
+        use_redis=False, rate=100.0, min_rate=0.5, max_rate=200.0, rate_step=1.0,
+        max_concurrency=1, latency_target=10.0, max_queue_wait=5.0, throttle_pause=0.5
+    )
+    params.update(kwargs)
+    return GigaChatGovernor(**params)
+
+
+def _rate_limited_error(retry_after=None):
+    headers = {"Retry-After": retry_after} if retry_after else {}
+    request = httpx.Request("POST", "http://gpt2giga-proxy:8090/v1/embeddings")
+    response = httpx.Response(429, headers=headers, request=request)
+    return httpx.HTTPStatusError("429 Too Many Requests", request=request, response=response)
+
+
+@pytest.mark.unit
+@pytest.mark.rag
+class TestGigaChatGovernor:
+    """Тесты для GigaChatGovernor (локальный режим)"""
+
+    @pytest.mark.asyncio
+    async def test_interactive_served_before_background(self):
+        """Освободившийся слот получает интерактивный запрос, даже если пришел позже"""
+        governor = _governor()
+        order = []
+
+        async def request(priority, name):
+            async with governor.slot(priority):
+                order.append(name)
+
+        async with governor.slot(PRIORITY_DIGEST):
+            background = asyncio.create_task(request(PRIORITY_BACKGROUND, "background"))
+            await asyncio.sleep(0.05)
+            interactive = asyncio.create_task(request(PRIORITY_INTERACTIVE, "interactive"))
+            await asyncio.sleep(0.05)
+
+        await asyncio.gather(background, interactive)
+        assert order == ["interactive", "background"]
+
+    @pytest.mark.asyncio
+    async def test_priority_from_context(self):
+        governor = _governor()
+
+        with gigachat_priority(PRIORITY_INTERACTIVE):
+            async with governor.slot() as lease:
+                assert lease.priority == PRIORITY_INTERACTIVE
+
+        async with governor.slot() as lease:
+            assert lease.priority == PRIORITY_DIGEST
+
+    @pytest.mark.asyncio
+    async def test_429_halves_rate_and_pauses(self):
+        """429 (raise_for_status) снижает частоту и откладывает следующий старт на Retry-After"""
+        governor = _governor(rate=2.0)
+
+        with pytest.raises(httpx.HTTPStatusError):
+            async with governor.slot():
+                raise _rate_limited_error(retry_after="1")
+
+        assert governor.rate == 1.0
+        assert governor._local.next_slot - time.monotonic() > 0.8
+
+    @pytest.mark.asyncio
+    async def test_observe_response(self):
+        governor = _governor(rate=2.0)
+
+        async with governor.slot() as lease:
+            lease.observe(MagicMock(status_code=429, headers={}))
+
+        assert lease.throttled is True
+        assert governor.rate == 1.0
+
+    @pytest.mark.asyncio
+    async def test_success_and_latency_feedback(self):
+        """Успешный ответ - аддитивный рост до max_rate, медленный - снижение"""
+        governor = _governor(rate=199.5, latency_target=0.01)
+
+        async with governor.slot():
+            pass
+        assert governor.rate == 200.0
+
+        async with governor.slot():
+            await asyncio.sleep(0.02)
+        assert governor.rate == 160.0
+
+    @pytest.mark.asyncio
+    async def test_queue_wait_limit(self):
+        governor = _governor(max_queue_wait=0.2)
+
+        async with governor.slot():
+            with pytest.raises(GigaChatBusyError):
+                async with governor.slot(PRIORITY_BACKGROUND):
+                    pass
+
+        # Отказавшийся запрос не блокирует следующие
+        assert not governor._local.waiting[PRIORITY_BACKGROUND]
+        async with governor.slot(PRIORITY_BACKGROUND):
+            pass
+
+    @pytest.mark.asyncio
+    async def test_redis_error_falls_back_to_local(self):
+        redis_client = MagicMock()
+        redis_client.register_script = MagicMock(
+            return_value=AsyncMock(side_effect=ConnectionError("redis down"))
+        )
+        redis_client.zrem = AsyncMock(side_effect=ConnectionError("redis down"))
+        governor = _governor(redis_client=redis_client, use_redis=True)
+
+        async with governor.slot() as lease:
+            assert lease.wait_time < 1
+
+        assert governor._backend() is governor._local
@@ -12,7 +12,7 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../rag_service'))
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
 
-from indexer import IndexerService
+from indexer import IndexerService, SOURCE_LINK, SOURCE_POST, chunk_point_id, split_post_sections
 from tests.utils.factories import UserFactory, ChannelFactory, PostFactory
 
 
@@ -37,10 +37,9 @@ class TestIndexerService:
             service.embeddings.generate_embedding = AsyncMock(
                 return_value=([0.1] * 1024, "gigachat")
             )
-            service.embeddings.count_tokens = MagicMock(return_value=100)
-            service.embeddings.chunk_text = MagicMock(return_value=[
-                ("Chunk text", 0, 100)
-            ])
+            service.embeddings.chunk_text_with_count = MagicMock(return_value=(
+                [("Chunk text", 0, 100)], 100
+            ))
             service.embeddings.get_chunking_params = MagicMock(return_value=(500, 50))
             
             return service
@@ -86,11 +85,11 @@ class TestIndexerService:
         )
         
         # Mock chunking (3 chunks)
-        indexer_service.embeddings.chunk_text = MagicMock(return_value=[
+        indexer_service.embeddings.chunk_text_with_count = MagicMock(return_value=([
             ("Chunk 1", 0, 500),
             ("Chunk 2", 450, 950),  # Overlap
             ("Chunk 3", 900, 1400)
-        ])
+        ], 1400))
         
         # Мокаем весь метод index_post для теста
         indexer_service.index_post = AsyncMock(return_value=(True, None))
@@ -173,3 +172,115 @@ class TestIndexerService:
         # Проверяем что метод был вызван
         indexer_service.index_post.assert_called_once_with(post.id, db)
 
+    
+    def test_split_post_sections(self):
+        """enriched_content разбивается на текст поста и страницы по ссылкам"""
+        post = MagicMock(
+            text="Разбор отчета https://example.com/report",
+            enriched_content=(
+                "Разбор отчета https://example.com/report\n\n"
+                "[Содержимое ссылки: https://example.com/report]\n"
+                "Выручка выросла на 12%, маржа сохранилась."
+            )
+        )
+        
+        sections = split_post_sections(post)
+        
+        assert sections == [
+            (SOURCE_POST, post.text, None),
+            (SOURCE_LINK, "Выручка выросла на 12%, маржа сохранилась.", "https://example.com/report")
+        ]
+        
+        post.enriched_content = None
+        assert split_post_sections(post) == [(SOURCE_POST, post.text, None)]
+    
+    @pytest.mark.asyncio
+    async def test_index_post_enriched_content(self, indexer_service, db):
+        """Chunks страницы по ссылке индексируются с source=link, при переиндексации старые chunks удаляются"""
+        from models import IndexingStatus
+        
+        user = UserFactory.create(db, telegram_id=13500001)
+        channel = ChannelFactory.create(db)
+        post = PostFactory.create(
+            db,
+            user_id=user.id,
+            channel_id=channel.id,
+            text="Новый релиз https://example.com/release"
+        )
+        
+        indexer_service.qdrant = AsyncMock()
+        indexer_service.qdrant.upsert_point = AsyncMock(return_value="point_id")
+        indexer_service.embeddings.chunk_text_with_count = MagicMock(
+            side_effect=lambda text, max_tokens, overlap_tokens: ([(text, 0, len(text))], 10)
+        )
+        
+        # Первая индексация - до обогащения
+        success, _ = await indexer_service.index_post(post.id, db)
+        assert success is True
+        assert indexer_service.qdrant.upsert_point.call_count == 1
+        indexer_service.qdrant.delete_post_points.assert_not_called()
+        
+        status = db.query(IndexingStatus).filter(IndexingStatus.post_id == post.id).one()
+        assert status.status == "success"
+        
+        post.enriched_content = (
+            f"{post.text}\n\n[Содержимое ссылки: https://example.com/release]\nChangelog релиза 2.0"
+        )
+        db.commit()
+        indexer_service.qdrant.upsert_point.reset_mock()
+        
+        # Переиндексация после обогащения
+        success, _ = await indexer_service.index_post(post.id, db)
+        
+        assert success is True
+        payloads = [call.kwargs["payload"] for call in indexer_service.qdrant.upsert_point.call_args_list]
+        assert [p["source"] for p in payloads] == [SOURCE_POST, SOURCE_LINK]
+        assert payloads[1]["source_url"] == "https://example.com/release"
+        assert payloads[1]["text"] == "Changelog релиза 2.0"
+        assert all(p["total_chunks"] == 2 for p in payloads)
+        
+        # Точка прошлой разбивки (один chunk) удаляется, новые сохраняются
+        delete_call = indexer_service.qdrant.delete_post_points.call_args
+        assert delete_call.kwargs["keep_point_ids"] == [
+            chunk_point_id(post.id, 0, 2), chunk_point_id(post.id, 1, 2)
+        ]
+    
+    @pytest.mark.asyncio
+    async def test_index_near_duplicate_copies_canonical(self, indexer_service, db):
+        """Почти-дубликат получает chunks canonical поста без генерации embeddings"""
+        user = UserFactory.create(db, telegram_id=13600001)
+        channel = ChannelFactory.create(db, channel_username="repost_channel")
+        canonical = PostFactory.create(db, user_id=user.id, channel_id=channel.id, text="Оригинал новости")
+        duplicate = PostFactory.create(db, user_id=user.id, channel_id=channel.id, text="Оригинал новости!")
+        duplicate.canonical_post_id = canonical.id
+        db.commit()
+        
+        indexer_service.qdrant = AsyncMock()
+        indexer_service.qdrant.get_post_points = AsyncMock(return_value=[
+            {"id": "c0", "vector": [0.1] * 4, "sparse_vector": None,
+             "payload": {"post_id": canonical.id, "text": "Оригинал новости", "chunk_index": 0,
+                         "total_chunks": 1, "source": SOURCE_POST}}
+        ])
+        
+        success, _ = await indexer_service.index_post(duplicate.id, db)
+        
+        assert success is True
+        indexer_service.embeddings.generate_embedding.assert_not_called()
+        points = indexer_service.qdrant.upsert_points_batch.call_args.args[1]
+        assert points[0]["id"] == chunk_point_id(duplicate.id, 0, 1)
+        assert points[0]["vector"] == [0.1] * 4
+        assert points[0]["payload"]["post_id"] == duplicate.id
+        assert points[0]["payload"]["canonical_post_id"] == canonical.id
+        assert points[0]["payload"]["channel_username"] == "repost_channel"
+        assert points[0]["payload"]["text"] == "Оригинал новости"
+        
+        # canonical еще не проиндексирован - обычная индексация
+        indexer_service.qdrant.get_post_points = AsyncMock(return_value=[])
+        indexer_service.qdrant.upsert_point = AsyncMock(return_value="point_id")
+        
+        success, _ = await indexer_service.index_post(duplicate.id, db)
+        
+        assert success is True
+        indexer_service.embeddings.generate_embedding.assert_awaited_once()
+        payload = indexer_service.qdrant.upsert_point.call_args.kwargs["payload"]
+        assert payload["canonical_post_id"] == canonical.id
@@ -0,0 +1,64 @@
+"""
+Тесты для Interest Vectors
+Вектор интересов пользователя для рекомендаций
+"""
+
+import pytest
+from unittest.mock import patch
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../rag_service'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from interest_vectors import InterestVectorStore
+
+
+@pytest.mark.unit
+@pytest.mark.rag
+class TestInterestVectorStore:
+    """Тесты для InterestVectorStore (хранение в памяти)"""
+    
+    @pytest.fixture
+    def store(self):
+        with patch('interest_vectors.config.INTEREST_HALF_LIFE_DAYS', 1), \
+             patch('interest_vectors.config.INTEREST_MIN_WEIGHT', 0.25):
+            return InterestVectorStore(use_redis=False)
+    
+    @pytest.mark.asyncio
+    async def test_centroid_weighted(self, store):
+        """Центроид - взвешенная сумма нормированных векторов"""
+        await store.add(1, [[2.0, 0.0]], weight=1.0)
+        await store.add(1, [[0.0, 5.0], [0.0, 1.0]], weight=2.0)
+        
+        vector = await store.get(1)
+        
+        assert vector[0] == pytest.approx(1.0, rel=1e-3)
+        assert vector[1] == pytest.approx(2.0, rel=1e-3)
+        assert await store.get(2) is None
+    
+    @pytest.mark.asyncio
+    async def test_old_signals_decay(self, store):
+        """Старые интересы затухают и вытесняются новыми"""
+        with patch('interest_vectors.time.time', return_value=0.0):
+            await store.add(1, [[1.0, 0.0]], weight=1.0)
+        with patch('interest_vectors.time.time', return_value=86400.0):
+            await store.add(1, [[0.0, 1.0]], weight=1.0)
+            vector = await store.get(1)
+        
+        assert vector == pytest.approx([0.5, 1.0])
+        
+        # Через 3 полураспада вес 1.5 * 0.125 < INTEREST_MIN_WEIGHT
+        with patch('interest_vectors.time.time', return_value=4 * 86400.0):
+            assert await store.get(1) is None
+    
+    @pytest.mark.asyncio
+    async def test_dimension_change_resets(self, store):
+        """Смена размерности embeddings (другой провайдер) - вектор заново"""
+        await store.add(1, [[1.0, 0.0]])
+        await store.add(1, [[0.0, 0.0, 3.0]])
+        
+        assert await store.get(1) == pytest.approx([0.0, 0.0, 1.0])
+        
+        await store.reset(1)
+        assert await store.get(1) is None
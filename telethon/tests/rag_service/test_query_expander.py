@@ -0,0 +1,76 @@
+"""
+Тесты для Query Expander
+Расширение запросов через tag relationships
+"""
+
+import pytest
+from unittest.mock import AsyncMock, patch
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../rag_service'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from query_expander import QueryExpander
+
+
+@pytest.mark.unit
+@pytest.mark.rag
+class TestQueryExpander:
+    """Тесты для QueryExpander"""
+    
+    @pytest.fixture
+    def neo4j(self):
+        with patch('query_expander.neo4j_client') as mock_neo4j:
+            mock_neo4j.enabled = True
+            mock_neo4j.get_tag_relationships_batch = AsyncMock(return_value={
+                "нейросети": [{"tag": "ml"}, {"tag": "chatgpt"}],
+                "новости": []
+            })
+            mock_neo4j.get_top_tag_relationships = AsyncMock(return_value=[])
+            yield mock_neo4j
+    
+    @pytest.fixture
+    def expander(self, neo4j):
+        with patch.dict(os.environ, {"QUERY_EXPANSION_TOP_EDGES": "0"}):
+            return QueryExpander()
+    
+    @pytest.mark.asyncio
+    async def test_keywords_batched_and_cached(self, expander, neo4j):
+        """Ключевые слова - одним batch запросом, повтор - из кэша без Neo4j"""
+        expanded = await expander.expand_query("нейросети новости", max_terms=3)
+        
+        assert expanded == "нейросети новости ml chatgpt"
+        neo4j.get_tag_relationships_batch.assert_awaited_once_with(
+            tag_names=["нейросети", "новости"], limit=3
+        )
+        
+        assert await expander.expand_query("новости нейросети", max_terms=3) == "новости нейросети ml chatgpt"
+        assert neo4j.get_tag_relationships_batch.await_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_neo4j_error_not_cached(self, expander, neo4j):
+        """Ошибка Neo4j - исходный запрос, следующий вызов снова идет в граф"""
+        neo4j.get_tag_relationships_batch.return_value = {}
+        
+        assert await expander.expand_query("нейросети") == "нейросети"
+        assert await expander.expand_query("нейросети") == "нейросети"
+        assert neo4j.get_tag_relationships_batch.await_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_snapshot_serves_strong_tags(self, expander, neo4j):
+        """In-memory копия отвечает за тег, если в ней есть его top связей"""
+        expander.snapshot_edges = 3
+        neo4j.get_top_tag_relationships.return_value = [
+            {"tag1": "нейросети", "tag2": "ml", "weight": 10},
+            {"tag1": "chatgpt", "tag2": "нейросети", "weight": 8},
+            {"tag1": "крипто", "tag2": "биткоин", "weight": 5}
+        ]
+        await expander.refresh_snapshot()
+        
+        assert await expander.expand_query("нейросети", max_terms=2) == "нейросети ml chatgpt"
+        neo4j.get_tag_relationships_batch.assert_not_awaited()
+        
+        # У "крипто" в копии одна связь из двух нужных - запрос в граф
+        await expander.expand_query("крипто", max_terms=2)
+        neo4j.get_tag_relationships_batch.assert_awaited_once_with(tag_names=["крипто"], limit=2)
@@ -0,0 +1,84 @@
+"""
+Тесты для Cross-Encoder Reranker
+Переранжирование кандидатов поиска, батчи и бюджет latency
+"""
+
+import time
+
+import pytest
+from unittest.mock import MagicMock
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../rag_service'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from reranker import CrossEncoderReranker
+
+
+def _results(*texts):
+    return [{"post_id": i, "text": text, "score": 0.9 - i * 0.01} for i, text in enumerate(texts)]
+
+
+@pytest.mark.unit
+@pytest.mark.rag
+class TestCrossEncoderReranker:
+    """Тесты для CrossEncoderReranker (модель заменена оценкой по длине текста)"""
+    
+    @pytest.fixture
+    def reranker(self):
+        reranker = CrossEncoderReranker()
+        reranker.batch_size = 2
+        reranker.timeout = 1.0
+        reranker._load = MagicMock(return_value=True)
+        reranker._score_batch = MagicMock(
+            side_effect=lambda query, texts: [float(len(text)) for text in texts]
+        )
+        return reranker
+    
+    @pytest.mark.asyncio
+    async def test_rerank_orders_and_cuts(self, reranker):
+        results = _results("a", "ccc", "bb", "eeeee", "dddd")
+        
+        reranked = await reranker.rerank("вопрос", results, top_k=3)
+        
+        assert [r["text"] for r in reranked] == ["eeeee", "dddd", "ccc"]
+        assert reranked[0]["rerank_score"] == 5.0
+        assert reranked[0]["score"] == results[3]["score"]
+        # 5 пар батчами по 2
+        assert reranker._score_batch.call_count == 3
+        assert "rerank_score" not in results[0]
+    
+    @pytest.mark.asyncio
+    async def test_rerank_timeout_fallback(self, reranker):
+        """Бюджет исчерпан - None (исходный порядок), поток не продолжает батчи"""
+        reranker.timeout = 0.05
+        
+        def slow(query, texts):
+            time.sleep(0.1)
+            return [0.0] * len(texts)
+        
+        reranker._score_batch = MagicMock(side_effect=slow)
+        
+        start = time.monotonic()
+        reranked = await reranker.rerank("вопрос", _results("a", "b", "c", "d", "e", "f"), top_k=3)
+        
+        assert reranked is None
+        assert time.monotonic() - start < 0.1
+        time.sleep(0.15)
+        assert reranker._score_batch.call_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_rerank_unavailable(self, reranker):
+        reranker._load = MagicMock(return_value=False)
+        reranker._load_failed = True
+        
+        assert await reranker.rerank("вопрос", _results("a", "b"), top_k=1) is None
+        assert await reranker.rerank("вопрос", [], top_k=1) is None
+        reranker._score_batch.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_rerank_error(self, reranker):
+        reranker._score_batch = MagicMock(side_effect=RuntimeError("onnx"))
+        
+        assert await reranker.rerank("вопрос", _results("a", "b"), top_k=1) is None
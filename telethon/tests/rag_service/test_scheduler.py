@@ -0,0 +1,235 @@
+"""
+Тесты для Digest Scheduler
+Pre-generation дайджестов до слота и доставка сохраненного результата
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+
+import pytz
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../rag_service'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from scheduler import DigestScheduler
+from models import DigestSettings, PrecomputedDigest
+from tests.utils.factories import UserFactory, ChannelFactory, PostFactory
+
+
+@pytest.mark.unit
+@pytest.mark.rag
+class TestDigestScheduler:
+    """Тесты для DigestScheduler"""
+    
+    @pytest.fixture
+    def scheduler(self, db):
+        """Планировщик без запуска APScheduler, SessionLocal → тестовая БД"""
+        with patch('scheduler.SessionLocal', return_value=db):
+            yield DigestScheduler()
+    
+    def _create_settings(self, db, telegram_id: int, ai_summarize: bool = False) -> int:
+        user = UserFactory.create(db, telegram_id=telegram_id)
+        db.add(DigestSettings(
+            user_id=user.id,
+            enabled=True,
+            frequency="daily",
+            time="09:00",
+            timezone="UTC",
+            ai_summarize=ai_summarize
+        ))
+        db.commit()
+        return user.id
+    
+    @pytest.mark.asyncio
+    async def test_pregeneration_spread_evenly_before_slot(self, scheduler):
+        """Пользователи одного слота равномерно распределяются по окну pre-generation"""
+        slot = (datetime.now(pytz.UTC) + timedelta(hours=3)).replace(second=0, microsecond=0)
+        
+        with patch.object(scheduler, '_spread_pregeneration', wraps=scheduler._spread_pregeneration) as spread:
+            for user_id in range(1, 5):
+                await scheduler.schedule_digest(
+                    user_id=user_id,
+                    time=slot.strftime("%H:%M"),
+                    timezone="UTC",
+                    spread=False
+                )
+            scheduler.spread_pregeneration()
+        
+        # Слот распределяется один раз после планирования всех пользователей
+        assert spread.call_count == 1
+        
+        run_dates = sorted(
+            scheduler.scheduler.get_job(f"digest_pregen_user_{user_id}").trigger.run_date
+            for user_id in range(1, 5)
+        )
+        
+        assert run_dates[0] >= slot - scheduler.pregen_window
+        assert run_dates[-1] < slot - scheduler.pregen_margin
+        
+        gaps = {(b - a).total_seconds() for a, b in zip(run_dates, run_dates[1:])}
+        assert len(gaps) == 1  # одинаковый шаг
+    
+    @pytest.mark.asyncio
+    async def test_pregenerate_stores_digest(self, scheduler, db):
+        """Pre-generation сохраняет дайджест по (user, period)"""
+        user_id = self._create_settings(db, telegram_id=25000001)
+        slot_at = datetime.now(pytz.UTC) + timedelta(minutes=30)
+        
+        with patch.object(scheduler, '_generate', AsyncMock(return_value={
+            "digest": "<b>Дайджест</b>", "posts_count": 3, "ai_generated": True
+        })):
+            await scheduler._pregenerate_digest(user_id, slot_at)
+        
+        stored = db.query(PrecomputedDigest).filter(PrecomputedDigest.user_id == user_id).one()
+        assert stored.digest == "<b>Дайджест</b>"
+        assert stored.ai_generated is True
+        assert stored.period_key == f"daily:{slot_at.date().isoformat()}"
+        assert stored.delivered_at is None
+    
+    @pytest.mark.asyncio
+    async def test_send_digest_delivers_precomputed(self, scheduler, db):
+        """Доставка отправляет сохраненный дайджест без повторной генерации"""
+        user_id = self._create_settings(db, telegram_id=25000002)
+        now = datetime.now(pytz.UTC)
+        
+        db.add(PrecomputedDigest(
+            user_id=user_id,
+            period_key=f"daily:{now.date().isoformat()}",
+            slot_at=now,
+            date_from=now - timedelta(days=1),
+            covered_until=now - timedelta(minutes=20),
+            last_post_id=0,
+            digest="готовый дайджест"
+        ))
+        db.commit()
+        
+        generate = AsyncMock()
+        deliver = AsyncMock(return_value=True)
+        with patch.object(scheduler, '_generate', generate), \
+             patch.object(scheduler, '_deliver_to_telegram', deliver):
+            await scheduler._send_digest(user_id)
+        
+        generate.assert_not_awaited()
+        assert deliver.call_args.args[2] == "готовый дайджест"
+        
+        stored = db.query(PrecomputedDigest).filter(PrecomputedDigest.user_id == user_id).one()
+        assert stored.delivered_at is not None
+    
+    @pytest.mark.asyncio
+    async def test_send_digest_tops_up_stale_ai_digest(self, scheduler, db):
+        """Новые посты после генерации дописываются к AI-дайджесту"""
+        user_id = self._create_settings(db, telegram_id=25000003, ai_summarize=True)
+        channel = ChannelFactory.create(db)
+        now = datetime.now(pytz.UTC)
+        covered_until = now - timedelta(minutes=20)
+        
+        db.add(PrecomputedDigest(
+            user_id=user_id,
+            period_key=f"daily:{now.date().isoformat()}",
+            slot_at=now,
+            date_from=now - timedelta(days=1),
+            covered_until=covered_until,
+            last_post_id=0,
+            digest="утренний дайджест",
+            ai_generated=True
+        ))
+        db.commit()
+        
+        # Пост пришел после генерации
+        PostFactory.create(db, user_id=user_id, channel_id=channel.id, posted_at=now - timedelta(minutes=5))
+        
+        generate = AsyncMock(return_value={"digest": "свежие новости", "posts_count": 1})
+        deliver = AsyncMock(return_value=True)
+        with patch.object(scheduler, '_generate', generate), \
+             patch.object(scheduler, '_deliver_to_telegram', deliver), \
+             patch('scheduler.config.DIGEST_TOPUP_MIN_POSTS', 1):
+            await scheduler._send_digest(user_id)
+        
+        # Генерация только по новому окну
+        assert generate.call_args.args[2] == covered_until
+        
+        sent = deliver.call_args.args[2]
+        assert sent.startswith("утренний дайджест")
+        assert "свежие новости" in sent
+        
+        stored = db.query(PrecomputedDigest).filter(PrecomputedDigest.user_id == user_id).one()
+        assert stored.topped_up is True
+        assert stored.last_post_id > 0
+    
+    @pytest.mark.asyncio
+    async def test_send_digest_lists_few_new_posts_without_llm(self, scheduler, db):
+        """Меньше DIGEST_TOPUP_MIN_POSTS новых постов - список без генерации"""
+        user_id = self._create_settings(db, telegram_id=25000004, ai_summarize=True)
+        channel = ChannelFactory.create(db)
+        now = datetime.now(pytz.UTC)
+        
+        db.add(PrecomputedDigest(
+            user_id=user_id,
+            period_key=f"daily:{now.date().isoformat()}",
+            slot_at=now,
+            date_from=now - timedelta(days=1),
+            covered_until=now - timedelta(minutes=20),
+            last_post_id=0,
+            digest="утренний дайджест",
+            posts_count=5,
+            ai_generated=True
+        ))
+        db.commit()
+        
+        PostFactory.create(db, user_id=user_id, channel_id=channel.id, text="Срочно: <курс> вырос",
+                           telegram_message_id=1, posted_at=now - timedelta(minutes=5))
+        
+        generate = AsyncMock()
+        deliver = AsyncMock(return_value=True)
+        with patch.object(scheduler, '_generate', generate), \
+             patch.object(scheduler, '_deliver_to_telegram', deliver), \
+             patch('scheduler.config.DIGEST_TOPUP_MIN_POSTS', 10):
+            await scheduler._send_digest(user_id)
+        
+        generate.assert_not_awaited()
+        sent = deliver.call_args.args[2]
+        assert sent.startswith("утренний дайджест")
+        assert '<a href="https://t.me/channel/1">' in sent
+        assert "Срочно: &lt;курс&gt; вырос" in sent
+        
+        stored = db.query(PrecomputedDigest).filter(PrecomputedDigest.user_id == user_id).one()
+        assert stored.topped_up is True
+        assert stored.posts_count == 6
+    
+    def test_new_posts_list_loads_channels_in_one_query(self, scheduler, db):
+        """Каналы постов списка подгружаются тем же запросом (без N+1)"""
+        from sqlalchemy import event
+        
+        user_id = self._create_settings(db, telegram_id=25000005)
+        settings = db.query(DigestSettings).filter(DigestSettings.user_id == user_id).one()
+        now = datetime.now(pytz.UTC)
+        stored = PrecomputedDigest(
+            user_id=user_id,
+            covered_until=now - timedelta(minutes=20),
+            date_from=now - timedelta(days=1),
+            last_post_id=0
+        )
+        
+        last_post_id = 0
+        for i in range(3):
+            channel = ChannelFactory.create(db)
+            post = PostFactory.create(db, user_id=user_id, channel_id=channel.id, text=f"Пост {i}",
+                                      telegram_message_id=i + 1, posted_at=now - timedelta(minutes=5 - i))
+            last_post_id = post.id
+        db.expire_all()
+        settings.timezone  # настройки - не часть проверяемого запроса
+        
+        statements = []
+        bind = db.get_bind()
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(bind, "before_cursor_execute", listener)
+        try:
+            text = scheduler._new_posts_list(db, settings, stored, last_post_id)
+        finally:
+            event.remove(bind, "before_cursor_execute", listener)
+        
+        assert text.count("• ") == 3
+        assert len(statements) == 1
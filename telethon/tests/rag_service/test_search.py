@@ -152,6 +152,83 @@ class TestSearchService:
             limit=10
         )
     
+    @pytest.mark.asyncio
+    async def test_search_multi_single_batch_and_enrichment(self, search_service, db):
+        """Тест multi-поиска: один batch в Qdrant и одно обогащение объединения"""
+        user = UserFactory.create(db, telegram_id=14350001)
+        channel = ChannelFactory.create(db, channel_username="multi_news")
+        post_a = PostFactory.create(db, user_id=user.id, channel_id=channel.id, text="AI post")
+        post_b = PostFactory.create(db, user_id=user.id, channel_id=channel.id, text="Crypto post")
+        post_a_id, post_b_id = post_a.id, post_b.id
+        
+        search_service.embeddings.generate_embeddings_batch = AsyncMock(
+            return_value=[([0.2] * 4, "gigachat")]
+        )
+        search_service.qdrant.search_batch = AsyncMock(return_value=[
+            [{"id": "a", "score": 0.9, "payload": {"post_id": post_a_id}},
+             {"id": "b", "score": 0.5, "payload": {"post_id": post_b_id}}],
+            [{"id": "b", "score": 0.8, "payload": {"post_id": post_b_id}}]
+        ])
+        
+        with patch('search.SessionLocal', return_value=db), \
+             patch.object(search_service, '_load_posts', wraps=search_service._load_posts) as load_posts:
+            results = await search_service.search_multi(
+                queries=["AI", "крипта"],
+                user_id=user.id,
+                query_vectors=[[0.1] * 4, None]
+            )
+        
+        # Вектор сгенерирован только для второго запроса
+        search_service.embeddings.generate_embeddings_batch.assert_awaited_once_with(["крипта"])
+        search_service.qdrant.search_batch.assert_awaited_once()
+        load_posts.assert_called_once()
+        assert set(load_posts.call_args.args[0]) == {post_a_id, post_b_id}
+        
+        assert [r["post_id"] for r in results[0]] == [post_a_id, post_b_id]
+        assert [r["post_id"] for r in results[1]] == [post_b_id]
+        assert results[1][0]["channel_username"] == "multi_news"
+    
+    def test_link_chunks_weighted(self, search_service):
+        """Chunk страницы по ссылке уступает близкому по score chunk'у текста поста"""
+        posts = {
+            1: {"text": "Пост 1", "channel_id": 1, "channel_username": "news", "posted_at": None,
+                "url": None, "tags": [], "views": 0},
+            2: {"text": "Пост 2", "channel_id": 1, "channel_username": "news", "posted_at": None,
+                "url": None, "tags": [], "views": 0}
+        }
+        search_results = [
+            {"id": "a", "score": 0.82, "payload": {"post_id": 1, "source": "link",
+                                                    "source_url": "https://example.com"}},
+            {"id": "b", "score": 0.80, "payload": {"post_id": 2}}
+        ]
+        
+        with patch('search.config.LINK_CHUNK_SCORE_WEIGHT', 0.85):
+            results = search_service._build_enriched(search_results, posts)
+        
+        assert [r["post_id"] for r in results] == [2, 1]
+        assert results[0]["source"] == "post"
+        assert results[1]["source_url"] == "https://example.com"
+        assert results[1]["score"] == pytest.approx(0.82 * 0.85)
+    
+    def test_near_duplicates_collapsed(self, search_service):
+        """Почти-дубликаты схлопываются в лучший по рангу пост группы"""
+        post = {"text": "Пост", "channel_id": 1, "channel_username": "news", "posted_at": None,
+                "url": None, "tags": [], "views": 0}
+        posts = {1: post, 2: post, 3: post, 4: post}
+        search_results = [
+            {"id": "a", "score": 0.9, "payload": {"post_id": 2, "canonical_post_id": 1}},
+            {"id": "b", "score": 0.85, "payload": {"post_id": 1}},
+            {"id": "c", "score": 0.8, "payload": {"post_id": 4}},
+            {"id": "d", "score": 0.75, "payload": {"post_id": 3, "canonical_post_id": 1}},
+            {"id": "e", "score": 0.7, "payload": {"post_id": 2, "canonical_post_id": 1, "chunk_index": 1}}
+        ]
+        
+        results = search_service._build_enriched(search_results, posts)
+        
+        assert [r["post_id"] for r in results] == [2, 4, 2]
+        assert results[0]["duplicate_post_ids"] == [1, 3]
+        assert results[1]["duplicate_post_ids"] == []
+    
     @pytest.mark.asyncio
     async def test_search_similar_posts(self, search_service, db):
         """Тест поиска похожих постов"""
@@ -190,6 +267,32 @@ class TestSearchService:
         
         assert len(results) > 0
     
+    @pytest.mark.asyncio
+    async def test_search_similar_posts_uses_stored_vectors(self, search_service):
+        """Похожие посты - recommend по точкам поста в Qdrant, без embedding текста"""
+        post = MagicMock(user_id=1, text="Пост", canonical_post_id=7)
+        session = MagicMock()
+        session.query.return_value.filter.return_value.first.return_value = post
+        search_service.qdrant.get_post_points = AsyncMock(return_value=[
+            {"id": "p1", "vector": [1.0, 0.0]}, {"id": "p2", "vector": [0.0, 1.0]}
+        ])
+        search_service.qdrant.recommend = AsyncMock(return_value=[])
+        search_service._enrich_search_results = AsyncMock(return_value=[
+            {"post_id": 3, "score": 0.9}, {"post_id": 3, "score": 0.8}, {"post_id": 4, "score": 0.7}
+        ])
+        
+        with patch('search.SessionLocal', return_value=session), \
+             patch('search.interest_vectors') as mock_interests:
+            mock_interests.add = AsyncMock()
+            results = await search_service.search_similar_posts(5, limit=2)
+        
+        assert [r["post_id"] for r in results] == [3, 4]
+        kwargs = search_service.qdrant.recommend.call_args.kwargs
+        assert kwargs["positive_ids"] == ["p1", "p2"]
+        assert kwargs["exclude_post_ids"] == [5, 7]
+        mock_interests.add.assert_awaited_once()
+        search_service.embeddings.generate_embedding.assert_not_called()
+    
     @pytest.mark.asyncio
     async def test_get_popular_tags(self, search_service, db):
         """Тест получения популярных тегов"""
@@ -0,0 +1,46 @@
+"""
+Тесты для Sparse Encoder
+BM25 sparse векторы для гибридного поиска
+"""
+
+import pytest
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../rag_service'))
+
+from sparse_encoder import SparseEncoder, token_index, tokenize
+
+
+@pytest.mark.unit
+@pytest.mark.rag
+class TestSparseEncoder:
+    """Тесты для SparseEncoder"""
+    
+    def test_tokenize_normalizes_word_forms(self):
+        """Формы слова дают один токен, стоп-слова отбрасываются"""
+        assert tokenize("Релиз релиза релизом") == ["релиз"] * 3
+        assert tokenize("версия и версии") == ["верс", "верс"]
+        assert tokenize("Ёлка") == tokenize("елки")
+    
+    def test_tokenize_keeps_tickers_and_hashtags(self):
+        tokens = tokenize("$SBER #AI @durov Python-3.13")
+        
+        assert tokens == ["sber", "$sber", "ai", "#ai", "durov", "@durov", "python-3.13"]
+    
+    def test_encode_document_bm25_tf(self):
+        encoder = SparseEncoder(avg_doc_tokens=4)
+        vector = encoder.encode_document("релиз релиз релиз python")
+        weights = dict(zip(vector.indices, vector.values))
+        
+        # TF насыщается: 3 повтора весят больше одного, но меньше чем втрое
+        assert weights[token_index("python")] < weights[token_index("релиз")] < 3 * weights[token_index("python")]
+        assert vector.indices == sorted(vector.indices)
+    
+    def test_encode_query(self):
+        encoder = SparseEncoder()
+        vector = encoder.encode_query("релиз релиза")
+        
+        assert vector.indices == [token_index("релиз")]
+        assert vector.values == [1.0]
+        assert encoder.encode_query("и в на") is None
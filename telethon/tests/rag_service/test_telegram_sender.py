@@ -0,0 +1,214 @@
+"""
+Тесты для Telegram Sender
+Outbound очередь Bot API против локального fake Bot API (httpx.MockTransport)
+"""
+
+import asyncio
+import json
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import httpx
+import pytest
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../rag_service'))
+
+from telegram_sender import (
+    TelegramSender,
+    PRIORITY_BULK,
+    PRIORITY_NOTIFICATION
+)
+
+
+class FakeBotAPI:
+    """Fake Bot API: записывает sendMessage, может отвечать 429/500"""
+
+    def __init__(self):
+        self.sent = []
+        self.fail_with = []  # очередь ответов (status, body) перед успешными
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+
+        if self.fail_with:
+            status, body = self.fail_with.pop(0)
+            return httpx.Response(status, json=body)
+
+        self.sent.append((time.monotonic(), payload["chat_id"], payload["text"]))
+        return httpx.Response(200, json={"ok": True, "result": {"message_id": len(self.sent)}})
+
+    @property
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(lambda request: self.handler(request))
+
+
+@pytest.mark.unit
+@pytest.mark.rag
+class TestTelegramSender:
+    """Тесты для TelegramSender"""
+
+    @pytest.fixture
+    def api(self):
+        return FakeBotAPI()
+
+    @pytest.fixture
+    def make_sender(self, api):
+        """Sender поверх fake Bot API (workers останавливает тест: await sender.stop())"""
+        def factory(**kwargs):
+            params = {
+                "bot_token": "test-token",
+                "global_rate": 1000,
+                "per_chat_interval": 0,
+                "transport": api.transport,
+                "use_redis": False
+            }
+            params.update(kwargs)
+            return TelegramSender(**params)
+
+        return factory
+
+    @pytest.mark.asyncio
+    async def test_global_rate_bounds_throughput(self, api, make_sender):
+        """Рассылка по многим чатам не превышает global_rate"""
+        sender = make_sender(global_rate=50, burst=5)
+
+        start = time.monotonic()
+        results = await asyncio.gather(*[
+            sender.send_message(1000 + i, f"msg {i}") for i in range(30)
+        ])
+        elapsed = time.monotonic() - start
+
+        assert all(results)
+        assert len(api.sent) == 30
+        # 5 сразу (burst) + 25 по 1/50 сек
+        assert elapsed >= 25 / 50 * 0.9
+
+        await sender.stop()
+
+    @pytest.mark.asyncio
+    async def test_per_chat_pacing(self, api, make_sender):
+        """Сообщения в один чат разнесены на per_chat_interval"""
+        sender = make_sender(per_chat_interval=0.1)
+
+        assert await sender.send_parts(42, ["a", "b", "c"])
+
+        times = [t for t, _, _ in api.sent]
+        assert [text for _, _, text in api.sent] == ["a", "b", "c"]
+        assert times[1] - times[0] >= 0.09
+        assert times[2] - times[1] >= 0.09
+
+        await sender.stop()
+
+    @pytest.mark.asyncio
+    async def test_retry_after_on_429(self, api, make_sender):
+        """429 повторяется после parameters.retry_after"""
+        sender = make_sender()
+        api.fail_with = [(429, {"ok": False, "parameters": {"retry_after": 0.2}})]
+
+        start = time.monotonic()
+        assert await sender.send_message(7, "hello")
+
+        assert len(api.sent) == 1
+        assert api.sent[0][0] - start >= 0.19
+
+        await sender.stop()
+
+    @pytest.mark.asyncio
+    async def test_permanent_error_not_retried(self, api, make_sender):
+        """400/403 не повторяются"""
+        sender = make_sender()
+        api.fail_with = [(403, {"ok": False, "description": "Forbidden: bot was blocked by the user"})]
+
+        assert await sender.send_message(7, "hello") is False
+        assert api.sent == []
+
+        await sender.stop()
+
+    @pytest.mark.asyncio
+    async def test_resend_skips_delivered_parts(self, api, make_sender):
+        """Повторная отправка с тем же ключом не дублирует доставленные части"""
+        sender = make_sender(max_retries=1)
+
+        # Вторая часть падает окончательно
+        original = api.handler
+
+        def fail_second(request):
+            if json.loads(request.content)["text"] == "part 2" and not getattr(fail_second, "done", False):
+                fail_second.done = True
+                return httpx.Response(400, json={"ok": False})
+            return original(request)
+
+        api.handler = fail_second
+
+        parts = ["part 1", "part 2", "part 3"]
+        assert await sender.send_parts(5, parts, key_prefix="digest:1:abc") is False
+        assert await sender.send_parts(5, parts, key_prefix="digest:1:abc") is True
+
+        assert [text for _, _, text in api.sent] == parts
+
+        await sender.stop()
+
+    @pytest.mark.asyncio
+    async def test_notifications_before_bulk(self, api, make_sender):
+        """Уведомления обгоняют уже стоящую в очереди массовую рассылку"""
+        sender = make_sender(global_rate=20, burst=1, workers=1)
+
+        bulk = [
+            asyncio.create_task(sender.send_message(100 + i, f"bulk {i}", priority=PRIORITY_BULK))
+            for i in range(5)
+        ]
+        await asyncio.sleep(0)
+        notification = asyncio.create_task(
+            sender.send_message(999, "mention", priority=PRIORITY_NOTIFICATION)
+        )
+
+        await asyncio.gather(notification, *bulk)
+
+        texts = [text for _, _, text in api.sent]
+        # Worker успел взять не больше двух bulk (отправленный и ждущий токен),
+        # остальные - после уведомления
+        assert texts.index("mention") <= 2
+        assert texts[-1].startswith("bulk")
+
+        await sender.stop()
+
+    @pytest.mark.asyncio
+    async def test_shared_state_deduplicates_across_senders(self, api, make_sender):
+        """Два процесса с общим состоянием (Redis) не дублируют одну часть"""
+        first = make_sender(per_chat_interval=0.1)
+        second = make_sender(per_chat_interval=0.1)
+        second._local = first._local
+
+        results = await asyncio.gather(
+            first.send_message(5, "part 1", idempotency_key="digest:1:abc:0"),
+            second.send_message(5, "part 1", idempotency_key="digest:1:abc:0"),
+            second.send_message(5, "part 2", idempotency_key="digest:1:abc:1")
+        )
+
+        assert all(results)
+        assert [text for _, _, text in api.sent] == ["part 1", "part 2"]
+        # Pacing по чату общий для обоих отправителей
+        assert api.sent[1][0] - api.sent[0][0] >= 0.09
+
+        await first.stop()
+        await second.stop()
+
+    @pytest.mark.asyncio
+    async def test_redis_error_falls_back_to_local(self, api, make_sender):
+        redis_client = MagicMock()
+        redis_client.register_script = MagicMock(
+            return_value=AsyncMock(side_effect=ConnectionError("redis down"))
+        )
+        for method in ("exists", "set", "delete"):
+            setattr(redis_client, method, AsyncMock(side_effect=ConnectionError("redis down")))
+        sender = make_sender(redis_client=redis_client, use_redis=True)
+
+        assert await sender.send_message(7, "hello", idempotency_key="k")
+        assert await sender.send_message(7, "hello", idempotency_key="k")
+
+        assert len(api.sent) == 1
+        assert sender._backend() is sender._local
+
+        await sender.stop()
@@ -4,6 +4,7 @@
 """
 
 import pytest
+import pytest_asyncio
 from datetime import datetime, timezone, timedelta
 from unittest.mock import AsyncMock, MagicMock, patch
 
@@ -181,3 +182,134 @@ class TestQdrantClient:
         assert info is not None
         assert info['vectors_count'] == 150
 
+
+
+@pytest.mark.unit
+@pytest.mark.rag
+class TestHybridSearch:
+    """Sparse+dense поиск на локальном Qdrant (in-memory)"""
+    
+    @pytest.fixture
+    def qdrant_client(self):
+        from qdrant_client import QdrantClient as QdrantClientBase
+        
+        with patch('vector_db.QdrantClientBase'):
+            client = QdrantClient()
+        client.client = QdrantClientBase(":memory:")
+        return client
+    
+    @pytest_asyncio.fixture
+    async def indexed(self, qdrant_client):
+        import uuid
+        from sparse_encoder import sparse_encoder
+        
+        # Dense векторы: пост 2 ближе всего к запросу [1, 0, 0], пост 3 - точное совпадение по тикеру
+        posts = {
+            1: ([0.0, 1.0, 0.0], "Погода в Москве на выходных"),
+            2: ([0.95, 0.3, 0.0], "Рынок акций вырос на новостях"),
+            3: ([0.0, 0.2, 1.0], "$SBER отчитался о рекордной прибыли")
+        }
+        for post_id, (vector, text) in posts.items():
+            await qdrant_client.upsert_point(
+                user_id=1,
+                point_id=str(uuid.uuid5(uuid.NAMESPACE_DNS, f"post_{post_id}")),
+                vector=vector,
+                payload={"post_id": post_id, "text": text},
+                sparse_vector=sparse_encoder.encode_document(text)
+            )
+        return qdrant_client
+    
+    @pytest.mark.asyncio
+    async def test_sparse_finds_exact_match_below_dense_threshold(self, indexed):
+        results = await indexed.search(
+            user_id=1,
+            query_vector=[1.0, 0.0, 0.0],
+            limit=3,
+            score_threshold=0.9,
+            query_text="$SBER прибыль"
+        )
+        
+        post_ids = [r["payload"]["post_id"] for r in results]
+        assert set(post_ids) == {2, 3}
+        # score - cosine с dense вектором, fusion_score - RRF
+        scores = {r["payload"]["post_id"]: r["score"] for r in results}
+        assert scores[2] > 0.9 > scores[3]
+        assert all("fusion_score" in r for r in results)
+    
+    @pytest.mark.asyncio
+    async def test_hybrid_score_is_server_dense_score_without_vectors(self, indexed):
+        """score гибридной выдачи = score dense поиска; векторы точек не запрашиваются"""
+        dense = indexed.client.query_points(
+            collection_name="telegram_posts_1", query=[1.0, 0.0, 0.0], limit=3, with_payload=True
+        )
+        dense_scores = {point.payload["post_id"]: point.score for point in dense.points}
+
+        query_points = indexed.client.query_points
+        query_batch_points = indexed.client.query_batch_points
+        with patch.object(indexed.client, 'query_points', wraps=query_points) as fused, \
+                patch.object(indexed.client, 'query_batch_points', wraps=query_batch_points) as rescored:
+            results = await indexed.search(
+                user_id=1,
+                query_vector=[1.0, 0.0, 0.0],
+                limit=3,
+                query_text="$SBER прибыль"
+            )
+
+        assert not fused.call_args.kwargs.get("with_vectors")
+        assert rescored.call_count == 1
+        assert all(not request.with_vector for request in rescored.call_args.kwargs["requests"])
+        for r in results:
+            assert r["score"] == pytest.approx(dense_scores[r["payload"]["post_id"]])
+
+    @pytest.mark.asyncio
+    async def test_search_batch_hybrid(self, indexed):
+        results = await indexed.search_batch(
+            user_id=1,
+            query_vectors=[[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]],
+            limit=2,
+            score_threshold=0.99,
+            query_texts=["SBER", "погоды москвы"]
+        )
+        
+        assert [r["payload"]["post_id"] for r in results[0]] == [3]
+        assert [r["payload"]["post_id"] for r in results[1]] == [1]
+    
+    @pytest.mark.asyncio
+    async def test_dense_only_collection_not_hybrid(self, qdrant_client):
+        with patch('vector_db.config.SPARSE_SEARCH_ENABLED', False):
+            await qdrant_client.ensure_collection(2, vector_size=3)
+        
+        assert qdrant_client.has_sparse_vectors("telegram_posts_2") is False
+        assert qdrant_client._point_vector("telegram_posts_2", [1.0, 0.0, 0.0], MagicMock()) == [1.0, 0.0, 0.0]
+    
+    @pytest.mark.asyncio
+    async def test_delete_post_points_keeps_current_chunks(self, indexed):
+        import uuid
+        
+        keep = str(uuid.uuid5(uuid.NAMESPACE_DNS, "post_3_chunk_0"))
+        await indexed.upsert_point(user_id=1, point_id=keep, vector=[0.0, 0.2, 1.0],
+                                   payload={"post_id": 3, "text": "$SBER"})
+        
+        assert await indexed.delete_post_points(1, 3, keep_point_ids=[keep]) is True
+        
+        points, _ = indexed.client.scroll("telegram_posts_1", limit=10)
+        assert sorted(str(p.id) for p in points if p.payload["post_id"] == 3) == [keep]
+        assert len(points) == 3
+    
+    @pytest.mark.asyncio
+    async def test_recommend_by_point_ids_excludes_post(self, indexed):
+        import uuid
+        
+        # Почти-дубликат поста 2 - исключается вместе с ним по canonical_post_id
+        await indexed.upsert_point(user_id=1, point_id=str(uuid.uuid5(uuid.NAMESPACE_DNS, "post_4")),
+                                   vector=[0.9, 0.3, 0.0], payload={"post_id": 4, "canonical_post_id": 2})
+        
+        results = await indexed.recommend(
+            user_id=1,
+            positive_ids=[str(uuid.uuid5(uuid.NAMESPACE_DNS, "post_2"))],
+            limit=5,
+            exclude_post_ids=[2]
+        )
+        
+        assert [r["payload"]["post_id"] for r in results] == [1, 3]
+        assert results[0]["score"] > results[1]["score"]
@@ -249,8 +249,10 @@ class TestAdminStatsAPI:
             yield db
         from main import get_db
         app.dependency_overrides[get_db] = override_get_db
+        main_module.admin_stats_cache.clear()
         yield db
         app.dependency_overrides.clear()
+        main_module.admin_stats_cache.clear()
     
     @pytest.fixture
     def mock_admin_auth(self):
@@ -281,4 +283,35 @@ class TestAdminStatsAPI:
             assert 'users' in data
             assert 'subscriptions' in data
             assert data['users']['total'] >= 2
-
+            assert data['subscriptions']['premium'] >= 1
+    
+    def test_stats_summary_cached_until_fresh(self, client, mock_db, mock_admin_auth):
+        """Тест что summary кэшируется, а ?fresh=1 пересчитывает"""
+        admin = UserFactory.create_admin(mock_db, telegram_id=16700011)
+        params = {"admin_id": admin.telegram_id, "token": "test_token"}
+        
+        first = client.get("/api/admin/stats/summary", params=params).json()
+        
+        UserFactory.create(mock_db, telegram_id=16700012, subscription_type="basic")
+        
+        cached = client.get("/api/admin/stats/summary", params=params).json()
+        assert cached == first
+        
+        fresh = client.get("/api/admin/stats/summary", params={**params, "fresh": 1}).json()
+        assert fresh['users']['total'] == first['users']['total'] + 1
+        assert fresh['subscriptions']['basic'] == first['subscriptions']['basic'] + 1
+    
+    def test_get_subscriptions_stats_api(self, client, mock_db, mock_admin_auth):
+        """Тест GET /api/admin/stats/subscriptions"""
+        admin = UserFactory.create_admin(mock_db, telegram_id=16700021)
+        UserFactory.create(mock_db, telegram_id=16700022, subscription_type="trial")
+        
+        response = client.get(
+            "/api/admin/stats/subscriptions",
+            params={"admin_id": admin.telegram_id, "token": "test_token"}
+        )
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert set(data) == set(main_module.SUBSCRIPTION_TYPES)
+        assert data['trial'] >= 1
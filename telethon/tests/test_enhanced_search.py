@@ -0,0 +1,91 @@
+"""
+Тесты для Enhanced Search
+Слияние результатов поиска и deadline этапов hybrid search
+"""
+
+import asyncio
+import importlib
+
+import pytest
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'rag_service'))
+
+
+def _import_enhanced_search():
+    """
+    Импорт rag_service.enhanced_search из пакета сервиса
+
+    При общем прогоне имя rag_service уже занято пакетом tests/rag_service -
+    на время импорта оно освобождается и затем восстанавливается.
+    """
+    shadowing = sys.modules.pop('rag_service', None)
+    try:
+        return importlib.import_module('rag_service.enhanced_search')
+    finally:
+        sys.modules.pop('rag_service', None)
+        if shadowing is not None:
+            sys.modules['rag_service'] = shadowing
+
+
+EnhancedSearchService = _import_enhanced_search().EnhancedSearchService
+
+
+def _result(post_id, score, chunk_index=0, source="post"):
+    return {
+        "post_id": post_id,
+        "score": score,
+        "source": source,
+        "chunk_info": {"chunk_index": chunk_index}
+    }
+
+
+@pytest.mark.unit
+@pytest.mark.rag
+class TestEnhancedSearch:
+    """Тесты для EnhancedSearchService"""
+
+    def test_merge_results_keeps_best_score_per_chunk(self):
+        """Один chunk - один раз, с лучшим score; порядок по убыванию score"""
+        base = [_result(1, 0.6), _result(1, 0.5, chunk_index=1), _result(2, 0.9)]
+        expanded = [_result(1, 0.8), _result(1, 0.4, chunk_index=1), _result(1, 0.7, source="link")]
+
+        merged = EnhancedSearchService._merge_results(base, expanded)
+
+        assert [(r["post_id"], r["source"], r["chunk_info"]["chunk_index"], r["score"]) for r in merged] == [
+            (2, "post", 0, 0.9),
+            (1, "post", 0, 0.8),
+            (1, "link", 0, 0.7),
+            (1, "post", 1, 0.5)
+        ]
+
+    @pytest.mark.asyncio
+    async def test_with_deadline_returns_default_on_timeout(self):
+        """Этап, не уложившийся в deadline, возвращает default и попадает в timed_out"""
+        service = EnhancedSearchService()
+        timed_out = []
+
+        async def slow_stage():
+            await asyncio.sleep(1)
+            return ["late"]
+
+        default = {"user_interests": [], "trending_tags": []}
+        result = await service._with_deadline(slow_stage(), 0.05, "graph_signals", default, timed_out)
+
+        assert result is default
+        assert timed_out == ["graph_signals"]
+
+    @pytest.mark.asyncio
+    async def test_with_deadline_error_not_counted_as_timeout(self):
+        """Ошибка этапа - default без записи в timed_out"""
+        service = EnhancedSearchService()
+        timed_out = []
+
+        async def failing_stage():
+            raise RuntimeError("neo4j unavailable")
+
+        assert await service._with_deadline(failing_stage(), 1.0, "graph_expand", [], timed_out) == []
+        assert await service._with_deadline(asyncio.sleep(0, result="ok"), 1.0, "expansion", None, timed_out) == "ok"
+        assert timed_out == []
@@ -0,0 +1,104 @@
+"""
+Тесты для Group Digest Cache
+Кеш дайджестов и анализов упоминаний по диапазону сообщений
+"""
+
+import asyncio
+
+import fakeredis
+import pytest
+
+from group_digest_cache import GroupDigestCache
+from tests.utils.mocks import create_mock_telethon_message
+
+
+def _messages(ids, text="Обсуждаем релиз"):
+    return [create_mock_telethon_message(text=f"{text} {i}", message_id=i) for i in ids]
+
+
+@pytest.mark.unit
+@pytest.mark.groups
+class TestGroupDigestCache:
+    """Тесты для GroupDigestCache"""
+
+    @pytest.fixture(params=["redis", "memory"])
+    def cache(self, request):
+        cache = GroupDigestCache(redis_client=fakeredis.FakeRedis(decode_responses=True))
+        if request.param == "memory":
+            cache.redis_client = None
+        return cache
+
+    def test_range_key(self, cache):
+        """Ключ зависит от диапазона и текста, но не от порядка выборки"""
+        messages = _messages(range(10, 20))
+
+        key = cache.range_key(messages)
+
+        assert key.startswith("10-19:")
+        assert cache.range_key(list(reversed(messages))).startswith("10-19:")
+        assert cache.range_key(_messages(range(10, 20), text="Правка")) != key
+
+    def test_range_key_requires_ids(self, cache):
+        message = create_mock_telethon_message()
+        message.id = None
+
+        assert cache.range_key([message]) is None
+        assert cache.range_key([]) is None
+
+    @pytest.mark.asyncio
+    async def test_get_or_compute_hit(self, cache):
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            return {"html_digest": "<b>digest</b>"}
+
+        first = await cache.get_or_compute("digest", "group_digest:v:1:1-10:abc", compute)
+        second = await cache.get_or_compute("digest", "group_digest:v:1:1-10:abc", compute)
+
+        assert len(calls) == 1
+        assert "cached" not in first
+        assert second == {"html_digest": "<b>digest</b>", "cached": True}
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_coalesced(self, cache):
+        """Одинаковый контекст упоминания для нескольких пользователей - один анализ"""
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"urgency": "high"}
+
+        results = await asyncio.gather(*[
+            cache.get_or_compute("mention", "group_mention:v:1:alice:1-5:abc", compute)
+            for _ in range(3)
+        ])
+
+        assert len(calls) == 1
+        assert [r["urgency"] for r in results] == ["high"] * 3
+
+    @pytest.mark.asyncio
+    async def test_errors_not_cached(self, cache):
+        async def failing():
+            raise RuntimeError("n8n unavailable")
+
+        with pytest.raises(RuntimeError):
+            await cache.get_or_compute("digest", "group_digest:v:1:1-2:abc", failing)
+
+        assert cache.get("group_digest:v:1:1-2:abc") is None
+
+    def test_windows_roundtrip_and_eviction(self, cache, monkeypatch):
+        monkeypatch.setattr("group_digest_cache.MAX_WINDOWS_PER_GROUP", 2)
+        windows = [
+            {"start_id": start_id, "count": 10, "fingerprint": "f", "summary": f"s{start_id}"}
+            for start_id in (100, 200, 300)
+        ]
+
+        cache.save_windows(1, "v", windows[:2])
+        cache.save_windows(1, "v", windows[2:])
+
+        loaded = cache.load_windows(1, "v")
+        assert sorted(loaded) == [200, 300]
+        assert loaded[300]["summary"] == "s300"
+        assert cache.load_windows(1, "other-version") == {}
@@ -3,6 +3,8 @@
 Real-time мониторинг упоминаний в Telegram группах
 """
 
+import asyncio
+
 import pytest
 from datetime import datetime, timezone
 from unittest.mock import AsyncMock, MagicMock, patch
@@ -208,3 +210,101 @@ class TestGroupMonitorService:
         assert 23600001 in status['monitored_users']
         assert 23600002 in status['monitored_users']
 
+    
+    @pytest.mark.asyncio
+    async def test_context_from_ring_buffer(self, monitor_service):
+        """Контекст из буфера NewMessage - без запросов к Telegram"""
+        mock_client = create_mock_telethon_client()
+        mock_client.get_messages = AsyncMock()
+        chat_id = -1001234567890
+        
+        for i in range(100, 120):
+            message = create_mock_telethon_message(text=f"Msg {i}", message_id=i)
+            # Handler каждого пользователя группы получает то же сообщение
+            monitor_service._buffer_message(23600001, chat_id, message)
+            monitor_service._buffer_message(23600002, chat_id, message)
+        
+        result = await monitor_service._get_context_messages(
+            client=mock_client,
+            chat_id=chat_id,
+            message_id=110,
+            context_size=3,
+            user_telegram_id=23600003
+        )
+        
+        assert [msg.id for msg in result] == list(range(107, 114))
+        mock_client.get_messages.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_basic_group_buffer_per_account(self, monitor_service):
+        """Обычная группа: id сообщений свои у каждого аккаунта - буферы раздельные"""
+        mock_client = create_mock_telethon_client()
+        mock_client.get_messages = AsyncMock(return_value=[])
+        chat_id = -4567
+        
+        for i in range(100, 120):
+            monitor_service._buffer_message(23600001, chat_id, create_mock_telethon_message(text=f"A {i}", message_id=i))
+        # У второго аккаунта те же сообщения с другими id
+        for i in range(500, 520):
+            monitor_service._buffer_message(23600002, chat_id, create_mock_telethon_message(text=f"B {i}", message_id=i))
+        
+        first = await monitor_service._get_context_messages(
+            client=mock_client, chat_id=chat_id, message_id=110, context_size=3, user_telegram_id=23600001
+        )
+        second = await monitor_service._get_context_messages(
+            client=mock_client, chat_id=chat_id, message_id=510, context_size=3, user_telegram_id=23600002
+        )
+        
+        assert [msg.id for msg in first] == list(range(107, 114))
+        assert [msg.id for msg in second] == list(range(507, 514))
+        mock_client.get_messages.assert_not_called()
+        
+        monitor_service.active_monitors[23600001] = mock_client
+        await monitor_service.stop_monitoring(23600001)
+        assert (23600001, chat_id) not in monitor_service.message_buffers
+        assert (23600002, chat_id) in monitor_service.message_buffers
+    
+    @pytest.mark.asyncio
+    async def test_context_single_fetch_on_buffer_miss(self, monitor_service):
+        """Не хватает истории в буфере - один запрос вокруг упоминания"""
+        mock_client = create_mock_telethon_client()
+        fetched = [create_mock_telethon_message(text=f"Msg {i}", message_id=i) for i in range(112, 101, -1)]
+        mock_client.get_messages = AsyncMock(return_value=fetched)
+        
+        monitor_service._buffer_message(23600001, -100, create_mock_telethon_message(message_id=107))
+        
+        result = await monitor_service._get_context_messages(
+            client=mock_client,
+            chat_id=-100,
+            message_id=107,
+            context_size=5,
+            user_telegram_id=23600001
+        )
+        
+        assert [msg.id for msg in result] == list(range(102, 113))
+        mock_client.get_messages.assert_awaited_once_with(-100, limit=11, offset_id=107, add_offset=-6)
+    
+    @pytest.mark.asyncio
+    async def test_mentions_in_thread_debounced(self, monitor_service):
+        """Серия упоминаний в одной ветке - один анализ"""
+        monitor_service.mention_debounce = 0.05
+        
+        def mention_event(message_id, chat_id=-100):
+            event = MagicMock()
+            event.chat_id = chat_id
+            event.message = create_mock_telethon_message(text="@testuser ?", message_id=message_id)
+            event.message.reply_to = None
+            return event
+        
+        with patch.object(monitor_service, '_process_mention', new=AsyncMock()) as process:
+            for message_id in (10, 11, 12):
+                monitor_service._schedule_mention(23700001, mention_event(message_id))
+            monitor_service._schedule_mention(23700001, mention_event(50, chat_id=-200))
+            
+            await asyncio.sleep(0.1)
+        
+        assert process.await_count == 2
+        calls = {call.args[1].chat_id: call for call in process.await_args_list}
+        assert calls[-100].args[1].message.id == 12
+        assert calls[-100].kwargs["first_message_id"] == 10
+        assert calls[-200].kwargs["first_message_id"] == 50
@@ -0,0 +1,202 @@
+"""
+Unit tests для Message Condenser
+"""
+
+import asyncio
+
+import pytest
+
+from langchain_agents.condenser import (
+    DialogueMessage,
+    MessageCondenser,
+    estimate_tokens,
+    extract_links,
+    extract_speaker_stats,
+    split_windows
+)
+
+
+def _dialogue(count: int, text: str = "обсуждаем релиз и сроки по задачам команды") -> list:
+    users = ["alice", "bob", "carol"]
+    return [
+        DialogueMessage(index=i, username=users[i % 3], timestamp=f"{9 + i // 60:02d}:{i % 60:02d}", text=text)
+        for i in range(1, count + 1)
+    ]
+
+
+class TestExtraction:
+    """Детерминированное извлечение статистики и ссылок"""
+
+    def test_speaker_stats(self):
+        messages = _dialogue(7)
+
+        stats = extract_speaker_stats(messages)
+
+        assert stats[0] == {"username": "bob", "message_count": 3, "first_seen": "09:01", "last_seen": "09:07"}
+        assert sum(s["message_count"] for s in stats) == 7
+
+    def test_links_and_mentions(self):
+        messages = [
+            DialogueMessage(1, "alice", "10:00", "см. https://example.com/doc, и https://t.me/channel/5"),
+            DialogueMessage(2, "bob", "10:01", "@carol_dev посмотри https://example.com/doc."),
+            DialogueMessage(3, "carol", "10:02", "почта a@b.ru - не упоминание")
+        ]
+
+        links = extract_links(messages)
+
+        assert links["external_links"] == ["https://example.com/doc"]
+        assert links["telegram_links"] == ["https://t.me/channel/5"]
+        assert links["mentions"] == ["@carol_dev"]
+
+    def test_split_windows_respects_budget(self):
+        lines = [msg.format() for msg in _dialogue(100)]
+
+        windows = split_windows(lines, window_tokens=200)
+
+        assert sum(len(w) for w in windows) == 100
+        assert all(sum(estimate_tokens(line) for line in w) <= 200 for w in windows)
+
+
+class TestMessageCondenser:
+    """Map-reduce сжатие"""
+
+    @pytest.mark.asyncio
+    async def test_small_dialogue_not_condensed(self):
+        summarize_calls = []
+
+        async def summarize(fragment):
+            summarize_calls.append(fragment)
+            return "summary"
+
+        condenser = MessageCondenser(summarize=summarize, condense_threshold_tokens=10000)
+
+        result = await condenser.condense(_dialogue(10))
+
+        assert result.condensed is False
+        assert summarize_calls == []
+        assert "[1] bob (09:01):" in result.text
+
+    @pytest.mark.asyncio
+    async def test_large_dialogue_condensed_in_parallel(self):
+        active = 0
+        peak = 0
+
+        async def summarize(fragment):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return "- кратко"
+
+        condenser = MessageCondenser(
+            summarize=summarize,
+            condense_threshold_tokens=500,
+            window_tokens=300,
+            target_tokens=2000,
+            concurrency=3
+        )
+
+        result = await condenser.condense(_dialogue(300))
+
+        assert result.condensed is True
+        assert result.windows > 3
+        assert peak == 3
+        assert result.tokens < result.source_tokens
+        # Статистика считается по всем сообщениям, а не по сжатому тексту
+        assert sum(s["message_count"] for s in result.speaker_stats) == 300
+        assert "alice (100)" in result.text
+        assert result.text.count("- кратко") == result.windows
+
+    @pytest.mark.asyncio
+    async def test_reduce_until_target(self):
+        async def summarize(fragment):
+            # Сжатие в 2 раза - одного прохода мало
+            return fragment[:len(fragment) // 2]
+
+        condenser = MessageCondenser(
+            summarize=summarize,
+            condense_threshold_tokens=500,
+            window_tokens=400,
+            target_tokens=600
+        )
+
+        result = await condenser.condense(_dialogue(400))
+
+        assert result.condensed is True
+        assert result.tokens <= 600 + 200  # target + заголовок участников
+
+    @pytest.mark.asyncio
+    async def test_failed_window_falls_back_to_raw_excerpt(self):
+        async def summarize(fragment):
+            if "[1]" in fragment.split("\n", 1)[0]:
+                raise RuntimeError("LLM недоступна")
+            return "- кратко"
+
+        condenser = MessageCondenser(
+            summarize=summarize,
+            condense_threshold_tokens=500,
+            window_tokens=300,
+            target_tokens=3000
+        )
+
+        result = await condenser.condense(_dialogue(200))
+
+        assert result.condensed is True
+        assert "[1] bob (09:01):" in result.text
+
+    @pytest.mark.asyncio
+    async def test_cached_windows_reused_for_overlapping_range(self):
+        """Перекрывающийся период: LLM сжимает только новые сообщения"""
+        calls = []
+
+        async def summarize(fragment):
+            calls.append(fragment)
+            return "- кратко"
+
+        def dialogue(first_id, count):
+            return [
+                DialogueMessage(
+                    index=i, username="alice", timestamp="", text=f"сообщение номер {first_id + i}",
+                    message_id=first_id + i
+                )
+                for i in range(count)
+            ]
+
+        condenser = MessageCondenser(
+            summarize=summarize,
+            condense_threshold_tokens=100,
+            window_tokens=200,
+            target_tokens=5000
+        )
+
+        first = await condenser.condense(dialogue(1, 100))
+        cached = {window["start_id"]: window for window in first.window_summaries}
+        first_calls = len(calls)
+
+        # Те же 100 сообщений + 20 новых в конце
+        calls.clear()
+        second = await condenser.condense(dialogue(1, 120), cached_windows=cached)
+
+        assert first.reused_windows == 0
+        assert second.reused_windows == first.windows
+        assert 0 < len(calls) < first_calls
+        assert all("сообщение номер 1:" not in fragment for fragment in calls)
+
+    @pytest.mark.asyncio
+    async def test_edited_message_invalidates_cached_window(self):
+        async def summarize(fragment):
+            return "- кратко"
+
+        condenser = MessageCondenser(summarize=summarize, condense_threshold_tokens=50, window_tokens=100)
+        messages = [
+            DialogueMessage(i, "bob", "", f"текст сообщения {i}", message_id=i) for i in range(1, 40)
+        ]
+
+        first = await condenser.condense(messages)
+        cached = {window["start_id"]: window for window in first.window_summaries}
+        messages[0].text = "исправленный текст"
+
+        second = await condenser.condense(messages, cached_windows=cached)
+
+        assert second.reused_windows == first.windows - 1
@@ -0,0 +1,161 @@
+"""
+Unit tests для DAG executor агентов
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from langchain_agents.dag import AgentNode, run_graph, validate_graph
+from langchain_agents.orchestrator import DigestOrchestrator
+
+
+def _stub_agent(result, delay: float = 0.05, calls=None, name=None):
+    """Заглушка LLM агента: ждет delay и возвращает result"""
+    async def ainvoke(input_data, **kwargs):
+        if calls is not None:
+            calls.append((name, set(input_data)))
+        await asyncio.sleep(delay)
+        return {"pydantic_result": result, "processed_result": {}}
+    return ainvoke
+
+
+class TestRunGraph:
+    """Тесты для run_graph"""
+
+    def test_validate_graph_rejects_cycle(self):
+        nodes = [
+            AgentNode("a", None, "a", ["b"]),
+            AgentNode("b", None, "b", ["a"])
+        ]
+        with pytest.raises(ValueError):
+            validate_graph(nodes)
+
+    def test_validate_graph_rejects_unknown_dependency(self):
+        with pytest.raises(ValueError):
+            validate_graph([AgentNode("a", None, "a", ["missing"])])
+
+    @pytest.mark.asyncio
+    async def test_dependents_see_results_and_skip_propagates(self):
+        """Зависимый агент видит результаты, пропущенный не блокирует граф"""
+        seen = {}
+
+        async def execute(node, input_data):
+            seen[node.name] = set(input_data)
+            return f"{node.name}-result"
+
+        nodes = [
+            AgentNode("root", None, "root_out"),
+            AgentNode("optional", None, "optional_out", ["root"], condition=lambda data: False),
+            AgentNode("leaf", None, "leaf_out", ["root", "optional"])
+        ]
+        input_data = {"messages": "..."}
+
+        states = await run_graph(nodes, input_data, execute)
+
+        assert states == {"root": "done", "optional": "skipped", "leaf": "done"}
+        assert "root_out" in seen["leaf"]
+        assert "optional_out" not in input_data
+        assert input_data["leaf_out"] == "leaf-result"
+
+
+class TestOrchestratorGraph:
+    """Граф агентов DigestOrchestrator со stub LLM"""
+
+    @pytest.fixture
+    def orchestrator(self):
+        orchestrator = DigestOrchestrator()
+        self.calls = []
+
+        stubs = {
+            "topic_extractor": {"topics": []},
+            "emotion_analyzer": {"overall_tone": "neutral"},
+            "speaker_analyzer": {"speakers": []},
+            "context_summarizer": {"summary": {}},
+            "key_moments": {"key_decisions": []},
+            "timeline_builder": {"timeline_events": []},
+            "context_links": {"external_links": []},
+            "supervisor_synthesizer": {"html_digest": "<b>digest</b>", "metadata": {}}
+        }
+        for node in orchestrator.agent_graph:
+            if node.name in stubs:
+                node.agent.ainvoke = _stub_agent(stubs[node.name], calls=self.calls, name=node.name)
+
+        return orchestrator
+
+    def _set_detail_level(self, orchestrator, level: str):
+        orchestrator.assessor.ainvoke = _stub_agent(
+            {"detail_level": level, "dialogue_type": "discussion"},
+            calls=self.calls,
+            name="dialogue_assessor"
+        )
+
+    @pytest.mark.asyncio
+    async def test_independent_agents_run_concurrently(self, orchestrator):
+        """Comprehensive: 9 агентов за 4 уровня графа вместо 8 последовательных фаз"""
+        self._set_detail_level(orchestrator, "comprehensive")
+
+        start = time.perf_counter()
+        result = await orchestrator.generate_digest([], hours=24, user_id=1, group_id=1)
+        elapsed = time.perf_counter() - start
+
+        assert result["success"] is True
+        # message_condenser + 9 агентов
+        assert len(result["agents_status"]) == 10
+        assert all(status.status == "success" for status in result["agents_status"])
+        # assessor → 5 параллельно (с timeline) → 2 параллельно → supervisor
+        assert elapsed < 0.05 * 6
+
+    @pytest.mark.asyncio
+    async def test_timeline_starts_with_first_wave_after_assessor(self, orchestrator):
+        """Timeline строится из dialogue_facts: не ждет topics/speakers"""
+        self._set_detail_level(orchestrator, "comprehensive")
+
+        await orchestrator.generate_digest([], hours=24, user_id=1, group_id=1)
+
+        timeline_input = dict(self.calls)["timeline_builder"]
+        assert {"assessment", "dialogue_facts"} <= timeline_input
+        assert "topics" not in timeline_input
+        assert "speakers" not in timeline_input
+
+    @pytest.mark.asyncio
+    async def test_conditional_agents_skipped_for_standard(self, orchestrator):
+        self._set_detail_level(orchestrator, "standard")
+
+        result = await orchestrator.generate_digest([], hours=24, user_id=1, group_id=1)
+
+        names = {status.agent_name for status in result["agents_status"]}
+        assert "key_moments" not in names
+        assert "timeline_builder" not in names
+        assert result["success"] is True
+
+    @pytest.mark.asyncio
+    async def test_supervisor_receives_all_results(self, orchestrator):
+        self._set_detail_level(orchestrator, "comprehensive")
+
+        await orchestrator.generate_digest([], hours=24, user_id=1, group_id=1)
+
+        supervisor_input = dict(self.calls)["supervisor_synthesizer"]
+        for key in ["assessment", "topics", "emotions", "speakers", "summary",
+                    "key_moments", "timeline", "context_links", "agents_status"]:
+            assert key in supervisor_input
+
+    @pytest.mark.asyncio
+    async def test_agent_timeout_recorded(self, orchestrator, monkeypatch):
+        """Timeout из config.agent_timeouts отражается в agents_status"""
+        self._set_detail_level(orchestrator, "standard")
+        orchestrator.context_links.ainvoke = _stub_agent({}, delay=1.0)
+
+        from langchain_agents import orchestrator as orchestrator_module
+        timeouts = dict(orchestrator_module.config.agent_timeouts, context_links=0.05)
+        monkeypatch.setattr(
+            type(orchestrator_module.config), "agent_timeouts", property(lambda self: timeouts)
+        )
+
+        result = await orchestrator.generate_digest([], hours=24, user_id=1, group_id=1)
+
+        status = {s.agent_name: s for s in result["agents_status"]}["context_links"]
+        assert status.status == "error"
+        assert "timeout" in status.error_message
+        assert result["success"] is True
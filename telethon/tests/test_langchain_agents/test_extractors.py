@@ -0,0 +1,151 @@
+"""
+Unit tests для детерминированных extractors
+"""
+
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from langchain_agents.extractors import (
+    DialogueMessage,
+    build_context_links,
+    build_speakers,
+    build_timeline,
+    extract_dialogue_facts
+)
+from langchain_agents.schemas import Speaker, SpeakersOutput
+
+
+START = datetime(2025, 1, 1, 10, 0, tzinfo=timezone.utc)
+
+
+def _msg(index, username, text, minutes, reply_to=None):
+    sent_at = START + timedelta(minutes=minutes)
+    return DialogueMessage(
+        index=index,
+        username=username,
+        timestamp=sent_at.strftime("%H:%M"),
+        text=text,
+        message_id=100 + index,
+        reply_to=100 + reply_to if reply_to else None,
+        sent_at=sent_at
+    )
+
+
+@pytest.fixture
+def dialogue():
+    return [
+        _msg(1, "alice", "Когда релиз?", 0),
+        _msg(2, "bob", "В пятницу, план тут https://docs.example.com/plan", 1, reply_to=1),
+        _msg(3, "carol", "Согласна с bob", 2, reply_to=1),
+        _msg(4, "alice", "@bob_dev а миграции? https://docs.example.com/plan", 3, reply_to=2),
+        _msg(5, "bob", "Готовы, см. https://t.me/team_channel/5", 4, reply_to=4),
+        # Пауза > 30 минут - новая фаза
+        _msg(6, "carol", "Выкатила на стейдж", 60),
+        _msg(7, "alice", "Отлично", 61, reply_to=6)
+    ]
+
+
+class TestDialogueFacts:
+    """Один проход по сообщениям"""
+
+    def test_speakers_and_reply_graph(self, dialogue):
+        facts = extract_dialogue_facts(dialogue)
+        speakers = {s["username"]: s for s in facts.speakers}
+
+        assert facts.message_count == 7
+        assert speakers["alice"]["message_count"] == 3
+        assert speakers["alice"]["questions"] == 2
+        assert speakers["alice"]["replies_received"] == 3
+        assert speakers["bob"]["replies_sent"] == 2
+        assert speakers["bob"]["links_shared"] == 2
+        assert {"from": "bob", "to": "alice", "count": 2} in facts.reply_edges
+        assert facts.reply_count == 5
+
+    def test_links_mentions_and_phases(self, dialogue):
+        facts = extract_dialogue_facts(dialogue)
+
+        assert [(l["url"], l["count"], l["first_sender"]) for l in facts.external_links] == [
+            ("https://docs.example.com/plan", 2, "bob")
+        ]
+        assert [l["url"] for l in facts.telegram_links] == ["https://t.me/team_channel/5"]
+        assert facts.mentions == [{"username": "@bob_dev", "count": 1}]
+        assert [p.message_count for p in facts.phases] == [5, 2]
+
+
+class TestBuilders:
+    """Выходы агентов по их Pydantic схемам"""
+
+    def test_context_links(self, dialogue):
+        output = build_context_links(extract_dialogue_facts(dialogue))
+
+        assert output.external_links[0].title == "docs.example.com/plan"
+        assert output.external_links[0].relevance == "medium"
+        assert output.telegram_links[0].link_type == "telegram"
+        assert output.mentions == ["@bob_dev"]
+
+    def test_timeline(self, dialogue):
+        output = build_timeline(extract_dialogue_facts(dialogue))
+
+        assert output.discussion_phases == [
+            "10:00-10:04: 5 сообщ. (alice, bob, carol)",
+            "11:00-11:01: 2 сообщ. (carol, alice)"
+        ]
+        assert [e.timestamp for e in output.timeline_events] == ["10:00", "11:00"]
+        assert output.timeline_events[0].significance == "high"
+
+    def test_speakers_merge_llm_roles(self, dialogue):
+        facts = extract_dialogue_facts(dialogue)
+        roles = {
+            "bob": Speaker(
+                username="bob", role="эксперт", activity_level="low", message_count=99,
+                key_contributions=["Назвал дату релиза"]
+            )
+        }
+
+        output = build_speakers(facts, roles)
+        speakers = {s.username: s for s in output.speakers}
+
+        # Роль и вклад из LLM, счетчики из фактов
+        assert speakers["bob"].role == "эксперт"
+        assert speakers["bob"].message_count == 2
+        assert speakers["bob"].key_contributions == ["Назвал дату релиза"]
+        # Без интерпретации LLM - эвристика
+        assert speakers["alice"].role == "leader"
+        assert output.group_dynamics.dominant_speaker == "alice"
+        assert output.group_dynamics.most_questions == "alice"
+        assert output.group_dynamics.collaboration_level == "high"
+
+
+class TestAgents:
+    """Агенты с dialogue_facts"""
+
+    @pytest.mark.asyncio
+    async def test_links_and_timeline_skip_llm(self, dialogue):
+        from langchain_agents.context_links import ContextLinksAgent
+        from langchain_agents.timeline import TimelineBuilderAgent
+
+        input_data = {"messages": "...", "dialogue_facts": extract_dialogue_facts(dialogue)}
+
+        with patch("langchain_agents.base.BaseAgent.ainvoke", new=AsyncMock()) as llm_path:
+            links = await ContextLinksAgent().ainvoke(input_data)
+            timeline = await TimelineBuilderAgent().ainvoke(input_data)
+
+        llm_path.assert_not_called()
+        assert links["processed_result"]["external_links"][0]["url"] == "https://docs.example.com/plan"
+        assert len(timeline["pydantic_result"].timeline_events) == 2
+
+    @pytest.mark.asyncio
+    async def test_speaker_analyzer_falls_back_to_heuristic_roles(self, dialogue):
+        from langchain_agents.speaker_analyzer import SpeakerAnalyzerAgent
+
+        input_data = {"messages": "...", "dialogue_facts": extract_dialogue_facts(dialogue)}
+        failed = {"error": "timeout", "fallback": True}
+
+        with patch("langchain_agents.base.BaseAgent.ainvoke", new=AsyncMock(return_value=failed)):
+            result = await SpeakerAnalyzerAgent().ainvoke(input_data)
+
+        assert isinstance(result["pydantic_result"], SpeakersOutput)
+        assert result["processed_result"]["participants_count"] == 3
+        assert result["processed_result"]["group_dynamics"]["dominant_speaker"] == "alice"
@@ -0,0 +1,182 @@
+"""
+Тесты для Link Enrichment
+Фоновое обогащение постов контентом ссылок, кеш по нормализованному URL
+"""
+
+import asyncio
+import time
+from unittest.mock import AsyncMock, patch
+
+import fakeredis
+import pytest
+
+from link_enrichment import (
+    STATUS_FAILED,
+    STATUS_OK,
+    LinkContentCache,
+    LinkEnrichmentWorker,
+    extract_urls,
+    normalize_url
+)
+from models import IndexingStatus, Post
+from tests.utils.factories import UserFactory, ChannelFactory, PostFactory
+
+
+def _worker(**kwargs):
+    params = dict(
+        cache=LinkContentCache(redis_client=fakeredis.FakeRedis(decode_responses=True)),
+        concurrency=2,
+        per_domain=1,
+        domain_delay=0.0
+    )
+    params.update(kwargs)
+    worker = LinkEnrichmentWorker(**params)
+    worker.enabled = True
+    return worker
+
+
+@pytest.mark.unit
+class TestLinkEnrichment:
+    """Тесты для LinkEnrichmentWorker и LinkContentCache"""
+
+    def test_normalize_url(self):
+        expected = "https://example.com/article?id=7&page=2"
+
+        assert normalize_url("https://example.com/article?page=2&id=7") == expected
+        assert normalize_url("HTTPS://WWW.Example.com:443/article/?id=7&utm_source=tg&page=2#comments") == expected
+        assert normalize_url("https://example.com/article?id=7&fbclid=abc&page=2).") == expected
+        assert normalize_url("https://example.com:8080/") == "https://example.com:8080/"
+
+    def test_extract_urls_strips_punctuation(self):
+        urls = extract_urls("Подробнее: https://example.com/a. И еще (https://site.ru/b)")
+
+        assert urls == ["https://example.com/a", "https://site.ru/b"]
+
+    @pytest.mark.asyncio
+    async def test_same_url_crawled_once(self):
+        """Варианты одного URL: одновременные запросы объединяются, повторные - из кеша"""
+        worker = _worker()
+
+        async def crawl(url):
+            await asyncio.sleep(0.05)
+            return STATUS_OK, "Полный текст статьи"
+
+        worker._crawl = AsyncMock(side_effect=crawl)
+
+        results = await asyncio.gather(
+            worker.get_content("https://example.com/news?utm_source=a"),
+            worker.get_content("https://www.example.com/news/")
+        )
+        cached = await worker.get_content("https://example.com/news#top")
+
+        assert results == ["Полный текст статьи", "Полный текст статьи"]
+        assert cached == "Полный текст статьи"
+        worker._crawl.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_failure_negative_cached(self):
+        worker = _worker()
+        worker._crawl = AsyncMock(return_value=(STATUS_FAILED, ""))
+
+        assert await worker.get_content("https://down.example.com/page") is None
+        assert await worker.get_content("https://down.example.com/page") is None
+
+        worker._crawl.assert_awaited_once()
+        key = LinkContentCache.key(normalize_url("https://down.example.com/page"))
+        assert 0 < worker.cache.redis_client.ttl(key) <= worker.cache.negative_ttl
+
+    @pytest.mark.asyncio
+    async def test_per_domain_politeness(self):
+        """Запросы к одному домену - последовательно с паузой, к разным - параллельно"""
+        worker = _worker(domain_delay=0.2)
+        started = {}
+
+        async def crawl(url):
+            started[url] = time.monotonic()
+            return STATUS_OK, url
+
+        worker._crawl = AsyncMock(side_effect=crawl)
+
+        await asyncio.gather(
+            worker.get_content("https://a.example.com/1"),
+            worker.get_content("https://a.example.com/2"),
+            worker.get_content("https://b.example.com/1")
+        )
+
+        same_domain_gap = abs(started["https://a.example.com/2"] - started["https://a.example.com/1"])
+        assert same_domain_gap >= 0.19
+        assert abs(started["https://b.example.com/1"] - started["https://a.example.com/1"]) < 0.1
+
+    @pytest.mark.asyncio
+    async def test_enqueue_enriches_and_reindexes(self, db):
+        """Пост из очереди обогащается; уже проиндексированный - переиндексируется"""
+        user = UserFactory.create(db, telegram_id=11900001)
+        channel = ChannelFactory.create(db)
+        indexed = PostFactory.create(db, user_id=user.id, channel_id=channel.id,
+                                     text="Отчет: https://example.com/report")
+        fresh = PostFactory.create(db, user_id=user.id, channel_id=channel.id,
+                                   text="Разбор: https://example.com/review")
+        db.add(IndexingStatus(user_id=user.id, post_id=indexed.id, status="success"))
+        db.commit()
+        indexed_id, fresh_id = indexed.id, fresh.id
+
+        on_enriched = AsyncMock()
+        worker = _worker(on_enriched=on_enriched)
+        worker._crawl = AsyncMock(return_value=(STATUS_OK, "Контент страницы"))
+
+        with patch('link_enrichment.SessionLocal', return_value=db):
+            assert worker.enqueue(indexed.id, indexed.text) is True
+            assert worker.enqueue(fresh.id, fresh.text) is True
+            assert worker.enqueue(fresh.id, "Пост без ссылок") is False
+            await worker.join()
+        await worker.stop()
+
+        # Воркер закрывает свою сессию - читаем посты заново
+        indexed = db.query(Post).filter(Post.id == indexed_id).first()
+        fresh = db.query(Post).filter(Post.id == fresh_id).first()
+        assert indexed.enriched_content == (
+            "Отчет: https://example.com/report\n\n"
+            "[Содержимое ссылки: https://example.com/report]\nКонтент страницы"
+        )
+        assert "Контент страницы" in fresh.enriched_content
+        on_enriched.assert_awaited_once_with([indexed_id])
+
+    @pytest.mark.asyncio
+    async def test_pending_survives_restart_and_full_queue(self, db):
+        """Посты из переполненной очереди и после рестарта не теряются"""
+        user = UserFactory.create(db, telegram_id=11900002)
+        channel = ChannelFactory.create(db)
+        posts = [
+            PostFactory.create(db, user_id=user.id, channel_id=channel.id,
+                               text=f"Ссылка: https://example.com/{i}")
+            for i in range(3)
+        ]
+        post_ids = [post.id for post in posts]
+        cache = LinkContentCache(redis_client=fakeredis.FakeRedis(decode_responses=True))
+
+        # Процесс упал до обработки очереди
+        stopped = _worker(cache=cache, queue_size=1)
+        for post in posts:
+            assert stopped.enqueue(post.id, post.text) is True
+        await stopped.stop()
+        assert set(cache.pending()) == set(post_ids)
+
+        # Новый процесс с той же очередью (queue_size=1 - остальные дозагружаются)
+        worker = _worker(cache=cache, queue_size=1)
+        worker._crawl = AsyncMock(return_value=(STATUS_OK, "Контент страницы"))
+        with patch('link_enrichment.SessionLocal', return_value=db):
+            worker.start()
+            await worker.join()
+        await worker.stop()
+
+        assert worker._crawl.await_count == 3
+        assert cache.pending() == {}
+        for post_id in post_ids:
+            assert "Контент страницы" in db.query(Post).filter(Post.id == post_id).first().enriched_content
+
+    def test_enqueue_disabled(self):
+        worker = _worker()
+        worker.enabled = False
+
+        assert worker.enqueue(1, "https://example.com") is False
+        assert worker.queue is None
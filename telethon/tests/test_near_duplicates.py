@@ -0,0 +1,132 @@
+"""
+Тесты для Near-Duplicate Detection
+SimHash почти-дубликатов постов при парсинге
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from near_duplicates import (
+    NUM_PERMUTATIONS,
+    MinHashIndex,
+    NearDuplicateDetector,
+    from_bytes,
+    minhash,
+    similarity,
+    to_bytes
+)
+from models import Post
+from tests.utils.factories import UserFactory, ChannelFactory, PostFactory
+
+NEWS = (
+    "Центральный банк сохранил ключевую ставку на уровне шестнадцати процентов "
+    "и пообещал вернуться к снижению ставки не раньше следующего заседания совета директоров"
+)
+SPORT = (
+    "Сборная по хоккею выиграла турнир в Минске и вышла в финал чемпионата "
+    "после серии буллитов в напряженном матче с командой Казахстана"
+)
+
+
+@pytest.mark.unit
+class TestNearDuplicates:
+    """Тесты для minhash, MinHashIndex и NearDuplicateDetector"""
+
+    def test_minhash_similarity(self):
+        repost = "🔥 " + NEWS.upper() + "!!! Подписывайтесь: @finance_news https://t.me/finance_news/1"
+        edited = NEWS.replace("шестнадцати", "семнадцати")
+
+        assert minhash(NEWS) == minhash(NEWS.replace("ё", "е") + ".")
+        assert similarity(minhash(NEWS), minhash(repost)) >= 0.7
+        assert similarity(minhash(NEWS), minhash(edited)) >= 0.7
+        assert similarity(minhash(NEWS), minhash(SPORT)) < 0.2
+
+    def test_minhash_min_tokens(self):
+        assert minhash("Доброе утро!", min_tokens=10) is None
+        assert minhash("", min_tokens=0) is None
+        assert len(minhash(NEWS, min_tokens=10)) == NUM_PERMUTATIONS
+
+    def test_bytes_roundtrip(self):
+        signature = minhash(NEWS)
+        stored = to_bytes(signature)
+
+        assert len(stored) == NUM_PERMUTATIONS * 4
+        assert from_bytes(stored) == signature
+
+    def test_index_find_and_evict(self):
+        index = MinHashIndex(threshold=0.7)
+        index.add(1, minhash(NEWS), None, 100.0)
+        index.add(2, minhash(SPORT), None, 200.0)
+
+        repost = minhash(f"Репост: {NEWS}")
+        assert index.find(repost) == 1
+        assert index.find(repost, exclude_post_id=1) is None
+        assert index.find(minhash("Совсем другой текст про погоду в Москве на выходных и дожди")) is None
+
+        # Дубликат указывает на canonical пост цепочки
+        index.add(3, repost, 1, 300.0)
+        index.evict(before_ts=250.0)
+        assert len(index) == 1
+        assert index.find(minhash(f"Репост: {NEWS} Подписывайтесь")) == 1  # пост 3 остался, canonical - 1
+
+    def test_index_evicts_regardless_of_insert_order(self):
+        """Свежий пост, добавленный первым, не блокирует вытеснение старых"""
+        index = MinHashIndex(threshold=0.7)
+        index.add(1, minhash(SPORT), None, 500.0)
+        index.add(2, minhash(NEWS), None, 100.0)
+        index.add(3, minhash(f"Репост: {NEWS}"), 2, 150.0)
+
+        index.evict(before_ts=200.0)
+
+        assert len(index) == 1
+        assert index.find(minhash(NEWS)) is None
+        assert index.find(minhash(SPORT)) == 1
+
+    def test_detector_check(self, db):
+        user = UserFactory.create(db, telegram_id=14000001)
+        channel = ChannelFactory.create(db)
+        detector = NearDuplicateDetector(threshold=0.7, window_days=7, min_tokens=10)
+        detector.enabled = True
+
+        # Как в парсере: пост проверяется сразу после сохранения
+        original = PostFactory.create(db, user_id=user.id, channel_id=channel.id, text=NEWS)
+        assert detector.check(db, original) is None
+
+        repost = PostFactory.create(db, user_id=user.id, channel_id=channel.id,
+                                    text=f"Репост: {NEWS} https://t.me/source/15")
+        assert detector.check(db, repost) == original.id
+
+        short = PostFactory.create(db, user_id=user.id, channel_id=channel.id, text="Доброе утро!")
+        assert detector.check(db, short) is None
+
+        assert original.minhash is not None and original.canonical_post_id is None
+        assert repost.canonical_post_id == original.id
+        assert short.minhash is None
+
+    def test_detector_loads_index_from_db(self, db):
+        """Индекс восстанавливается из posts: minhash или текст, только за окно"""
+        user = UserFactory.create(db, telegram_id=14100001)
+        channel = ChannelFactory.create(db)
+        old = PostFactory.create(db, user_id=user.id, channel_id=channel.id, text=NEWS,
+                                 posted_at=datetime.now(timezone.utc) - timedelta(days=30))
+        recent = PostFactory.create(db, user_id=user.id, channel_id=channel.id, text=NEWS,
+                                    posted_at=datetime.now(timezone.utc) - timedelta(days=1))
+        # Пост без сигнатуры (до включения дедупликации)
+        assert recent.minhash is None
+
+        detector = NearDuplicateDetector(threshold=0.7, window_days=7, min_tokens=10)
+        detector.enabled = True
+        new_post = PostFactory.create(db, user_id=user.id, channel_id=channel.id, text=NEWS + ".")
+
+        assert detector.check(db, new_post) == recent.id
+        assert old.id != recent.id
+
+        # Другой пользователь - свой индекс
+        other_user = UserFactory.create(db, telegram_id=14100002)
+        other_post = PostFactory.create(db, user_id=other_user.id, channel_id=channel.id, text=NEWS)
+        assert detector.check(db, other_post) is None
+
+        db.commit()
+        stored = db.query(Post).filter(Post.id == new_post.id).one()
+        assert from_bytes(stored.minhash) == minhash(NEWS)
@@ -102,9 +102,65 @@ class TestParserService:
         assert post is not None
         assert post.posted_at.tzinfo == timezone.utc
     
+    @pytest.mark.asyncio
+    async def test_rollback_resets_near_duplicate_index(self, parser_service, db):
+        """Откат парсинга канала не оставляет посты в индексе почти-дубликатов"""
+        from sqlalchemy.orm import sessionmaker
+        from models import Channel, Post, User
+        from near_duplicates import NearDuplicateDetector
+        
+        user = UserFactory.create(db, telegram_id=11100002, is_authenticated=True)
+        channel = ChannelFactory.create(db, channel_username="cbr_news")
+        channel.add_user(db, user, is_active=True)
+        db.commit()
+        
+        # rollback парсера откатывает только свою транзакцию (savepoint), не данные теста;
+        # savepoint открывается внутри транзакции теста, уже начатой записью выше
+        db = sessionmaker(bind=db.get_bind(), join_transaction_mode="create_savepoint")()
+        user = db.get(User, user.id)
+        channel = db.get(Channel, channel.id)
+        
+        news = (
+            "Центральный банк сохранил ключевую ставку на уровне шестнадцати процентов "
+            "и пообещал вернуться к снижению ставки не раньше следующего заседания совета директоров"
+        )
+        sport = (
+            "Сборная по хоккею выиграла турнир в Минске и вышла в финал чемпионата "
+            "после серии буллитов в напряженном матче с командой Казахстана"
+        )
+        now = datetime.now(timezone.utc)
+        news_message = create_mock_telethon_message(text=news, message_id=1, date=now - timedelta(minutes=2))
+        sport_message = create_mock_telethon_message(text=sport, message_id=2, date=now - timedelta(minutes=1))
+        
+        detector = NearDuplicateDetector(threshold=0.7, window_days=7, min_tokens=10)
+        detector.enabled = True
+        mock_client = create_mock_telethon_client()
+        
+        async def failing_iter_messages(*args, **kwargs):
+            yield news_message
+            raise ConnectionError("network error")
+        
+        async def iter_messages(*args, **kwargs):
+            yield sport_message
+            yield news_message
+        
+        with patch('parser_service.near_duplicate_detector', detector), \
+             patch('parser_service.neo4j_client', None):
+            mock_client.iter_messages = failing_iter_messages
+            with pytest.raises(ConnectionError):
+                await parser_service.parse_channel_posts(channel, user, mock_client, db)
+            
+            mock_client.iter_messages = iter_messages
+            assert await parser_service.parse_channel_posts(channel, user, mock_client, db) == 2
+        
+        posts = db.query(Post).filter(Post.user_id == user.id).all()
+        assert len(posts) == 2
+        assert all(post.canonical_post_id is None for post in posts)
+        db.close()
+    
     @pytest.mark.asyncio
     async def test_enrich_post_with_links(self, parser_service, db):
-        """Тест обогащения поста контентом из ссылок (Crawl4AI)"""
+        """Тест обогащения поста контентом из ссылок (Crawl4AI, фоновый воркер)"""
         user = UserFactory.create(db, telegram_id=11200001)
         channel = ChannelFactory.create(db)
         
@@ -120,11 +176,13 @@ class TestParserService:
         mock_crawl_response.status_code = 200
         mock_crawl_response.json = MagicMock(return_value={
             "success": True,
-            "markdown": "# Article Title\n\nFull content from the article...",
-            "word_count": 500
+            "results": [{
+                "markdown": {"raw_markdown": "# Article Title\n\nFull content from the article... " * 5}
+            }]
         })
         
-        with patch('httpx.AsyncClient') as mock_httpx:
+        with patch('httpx.AsyncClient') as mock_httpx, \
+             patch('link_enrichment.SessionLocal', return_value=db):
             mock_client = AsyncMock()
             mock_client.__aenter__ = AsyncMock(return_value=mock_client)
             mock_client.__aexit__ = AsyncMock()
@@ -132,12 +190,17 @@ class TestParserService:
             mock_httpx.return_value = mock_client
             
             # Обогащаем пост
-            await parser_service._enrich_post_with_links(post, db)
+            post_id = post.id
+            await parser_service.link_enrichment.enrich_post(post_id, "https://example.com/article")
             
-            # Проверяем что enriched_content заполнен
-            db.refresh(post)
+            # Проверяем что enriched_content заполнен (воркер закрывает свою сессию - читаем заново)
+            from models import Post
+            post = db.query(Post).filter(Post.id == post_id).first()
             assert post.enriched_content is not None
             assert "Full content" in post.enriched_content
+            
+            # Проверяем что был POST запрос
+            mock_client.post.assert_called_once()
     
     @pytest.mark.asyncio
     async def test_notify_rag_service_after_parsing(self, parser_service):
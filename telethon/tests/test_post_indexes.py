@@ -0,0 +1,98 @@
+"""
+Регрессионные тесты индексов posts / indexing_status
+
+Проверяем через EXPLAIN QUERY PLAN, что планировщик использует
+составные индексы для горячих запросов (дайджесты, retention, retry тегирования).
+"""
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from tests.utils.factories import UserFactory, ChannelFactory, PostFactory
+
+
+def explain(db, sql: str, **params) -> str:
+    """Вернуть план запроса одной строкой"""
+    rows = db.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params).fetchall()
+    return " | ".join(row[-1] for row in rows)
+
+
+@pytest.mark.unit
+class TestPostIndexes:
+    """EXPLAIN-регрессия для индексов posts"""
+
+    def test_user_posted_at_index_used_for_digest_query(self, db):
+        """Дайджест / поиск по датам: WHERE user_id AND posted_at ORDER BY posted_at DESC"""
+        plan = explain(
+            db,
+            "SELECT id FROM posts WHERE user_id = :uid AND posted_at >= :since "
+            "ORDER BY posted_at DESC",
+            uid=1, since="2025-01-01"
+        )
+
+        assert "ix_posts_user_posted_at" in plan
+        assert "TEMP B-TREE" not in plan  # сортировка берется из индекса
+
+    def test_user_posted_at_index_used_for_retention_query(self, db):
+        """Retention: WHERE user_id AND posted_at < cutoff"""
+        plan = explain(
+            db,
+            "SELECT id FROM posts WHERE user_id = :uid AND posted_at < :cutoff",
+            uid=1, cutoff="2025-01-01"
+        )
+
+        assert "ix_posts_user_posted_at" in plan
+
+    def test_channel_posted_at_index_used_for_orphaned_cleanup(self, db):
+        """Orphaned channels cleanup: WHERE channel_id AND posted_at < cutoff"""
+        plan = explain(
+            db,
+            "SELECT id FROM posts WHERE channel_id = :cid AND posted_at < :cutoff",
+            cid=1, cutoff="2025-01-01"
+        )
+
+        assert "ix_posts_channel_posted_at" in plan
+
+    def test_partial_tagging_index_used_for_retry_query(self, db):
+        """Retry тегирования: WHERE tagging_status IN ('pending','failed','retrying')"""
+        plan = explain(
+            db,
+            "SELECT id FROM posts WHERE tagging_status IN ('pending', 'failed', 'retrying')"
+        )
+
+        assert "ix_posts_tagging_pending" in plan
+
+    def test_dedup_key_used_for_parser_lookup(self, db):
+        """Парсер: проверка существования поста по (user_id, channel_id, telegram_message_id)"""
+        plan = explain(
+            db,
+            "SELECT id FROM posts WHERE user_id = :uid AND channel_id = :cid "
+            "AND telegram_message_id = :mid",
+            uid=1, cid=1, mid=1
+        )
+
+        # SQLite именует индекс UNIQUE constraint как sqlite_autoindex_posts_N
+        assert "SCAN" not in plan
+        assert "INDEX" in plan
+
+    def test_indexing_status_user_status_index_used(self, db):
+        """Статистика индексации: WHERE user_id AND status"""
+        plan = explain(
+            db,
+            "SELECT COUNT(*) FROM indexing_status WHERE user_id = :uid AND status = :status",
+            uid=1, status="success"
+        )
+
+        assert "ix_indexing_status_user_status" in plan
+
+    def test_duplicate_post_rejected(self, db):
+        """Уникальный ключ не дает сохранить дубликат поста"""
+        user = UserFactory.create(db, telegram_id=910001)
+        channel = ChannelFactory.create(db, channel_username="dedup_channel")
+
+        PostFactory.create(db, user_id=user.id, channel_id=channel.id, telegram_message_id=42)
+
+        with pytest.raises(IntegrityError):
+            PostFactory.create(db, user_id=user.id, channel_id=channel.id, telegram_message_id=42)
+        db.rollback()
@@ -124,6 +124,27 @@ class TestTaggingService:
             assert post.tagging_status == "success"
             assert post.tagging_attempts == 1
     
+    @pytest.mark.asyncio
+    async def test_update_post_tags_near_duplicate(self, tagging_service, db):
+        """Почти-дубликат получает теги canonical поста без запроса к LLM"""
+        user = UserFactory.create(db, telegram_id=12050001)
+        channel = ChannelFactory.create(db)
+        canonical = PostFactory.create(db, user_id=user.id, channel_id=channel.id,
+                                       text="Курс биткоина обновил максимум", tags=["crypto", "bitcoin"])
+        post = PostFactory.create(db, user_id=user.id, channel_id=channel.id,
+                                  text="Курс биткоина обновил максимум!", tagging_status="pending", tags=None)
+        post.canonical_post_id = canonical.id
+        db.commit()
+        
+        with patch.object(tagging_service, 'generate_tags_for_text', new=AsyncMock()) as generate:
+            result = await tagging_service.update_post_tags(post.id, db)
+        
+        assert result is True
+        generate.assert_not_called()
+        db.refresh(post)
+        assert post.tags == ["crypto", "bitcoin"]
+        assert post.tagging_status == "success"
+    
     @pytest.mark.asyncio
     async def test_retry_failed_posts(self, tagging_service, db):
         """Тест retry для failed постов"""
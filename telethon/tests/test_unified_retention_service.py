@@ -12,7 +12,13 @@ from unittest.mock import Mock, patch, AsyncMock
 from sqlalchemy.orm import Session
 
 from maintenance.unified_retention_service import UnifiedRetentionService
-from models import User, Channel, Post, DigestSettings
+from maintenance.post_partitions import (
+    month_start, add_months, partition_name, parse_partition_name, create_partition_sql
+)
+from maintenance.store_cleanup import StoreCleanup
+from maintenance.batch_delete import DeleteThrottle
+from models import User, Channel, Post, DigestSettings, IndexingStatus, RetentionCursor
+from tests.utils.factories import UserFactory, ChannelFactory, PostFactory
 
 
 class TestUnifiedRetentionService:
@@ -309,6 +315,342 @@ class TestUnifiedRetentionService:
             mock_db.query.return_value.filter.return_value.delete.assert_called_once()
             mock_db.commit.assert_called_once()
 
+    @pytest.mark.asyncio
+    async def test_cleanup_expired_partitions_not_partitioned(self, retention_service, mock_db):
+        """Without partitioned posts the partition pass is a no-op"""
+        with patch('maintenance.unified_retention_service.SessionLocal', return_value=mock_db):
+            result = await retention_service.cleanup_expired_partitions(dry_run=False)
+        
+        assert result["partitioned"] is False
+        assert result["posts_deleted"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_cleanup_expired_partitions_uses_max_retention(self, retention_service, mock_db):
+        """Partitions are dropped only past the longest retention of all users"""
+        drop_result = {
+            "partitions": [{"partition": "posts_p2024_01", "posts": 7}],
+            "posts_deleted": 7
+        }
+        
+        with patch('maintenance.unified_retention_service.SessionLocal', return_value=mock_db), \
+             patch('maintenance.unified_retention_service.is_partitioned', return_value=True), \
+             patch('maintenance.unified_retention_service.ensure_partitions') as mock_ensure, \
+             patch('maintenance.unified_retention_service.drop_partitions_before', return_value=drop_result) as mock_drop, \
+             patch.object(retention_service, 'calculate_max_retention_period', AsyncMock(return_value=365)):
+            result = await retention_service.cleanup_expired_partitions(dry_run=False)
+        
+        assert result["partitioned"] is True
+        assert result["retention_days"] == 365
+        assert result["posts_deleted"] == 7
+        mock_ensure.assert_called_once()
+        
+        cutoff = mock_drop.call_args[0][1]
+        expected = datetime.now(timezone.utc) - timedelta(days=365)
+        assert abs((cutoff - expected).total_seconds()) < 60
+    
+    @pytest.mark.asyncio
+    async def test_cleanup_expired_partitions_aborts_on_retention_error(self, retention_service, mock_db):
+        """If the max retention cannot be computed, no partition is dropped"""
+        with patch('maintenance.unified_retention_service.SessionLocal', return_value=mock_db), \
+             patch('maintenance.unified_retention_service.is_partitioned', return_value=True), \
+             patch('maintenance.unified_retention_service.drop_partitions_before') as mock_drop, \
+             patch.object(retention_service, 'calculate_max_retention_period',
+                          AsyncMock(side_effect=RuntimeError("db error"))):
+            result = await retention_service.cleanup_expired_partitions(dry_run=False)
+        
+        assert "error" in result
+        assert result["posts_deleted"] == 0
+        mock_drop.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_calculate_max_retention_period_aggregate(self, retention_service, db):
+        """Max retention is one aggregate over all users, including digest settings"""
+        assert await retention_service.calculate_max_retention_period(db) == retention_service.max_retention_days
+        
+        UserFactory.create(db, telegram_id=27000001, retention_days=30)
+        assert await retention_service.calculate_max_retention_period(db) == retention_service.min_retention_days
+        
+        UserFactory.create(db, telegram_id=27000002, retention_days=400, is_active=False)
+        assert await retention_service.calculate_max_retention_period(db) == 400
+        
+        huge = UserFactory.create(db, telegram_id=27000003, retention_days=5000)
+        assert await retention_service.calculate_max_retention_period(db) == retention_service.max_retention_days
+        
+        db.delete(huge)
+        db.add(DigestSettings(user_id=UserFactory.create(db, telegram_id=27000004).id,
+                              enabled=True, frequency="monthly"))
+        db.commit()
+        assert await retention_service.calculate_max_retention_period(db) == 400
+    
+    @pytest.mark.asyncio
+    async def test_cleanup_all_users_skips_users_covered_by_partitions(self, retention_service, mock_db, sample_user):
+        """Users with the max retention rely on partition drop, others get targeted deletes"""
+        short_user = Mock(spec=User)
+        short_user.id = 2
+        short_user.telegram_id = 987654321
+        mock_db.query.return_value.filter.return_value.all.return_value = [sample_user, short_user]
+        
+        partition_result = {
+            "partitioned": True,
+            "retention_days": 365,
+            "partitions": [{"partition": "posts_p2024_01", "posts": 10}],
+            "posts_deleted": 10
+        }
+        user_result = {"user_id": 2, "retention_days": 90, "posts_deleted": 3}
+        
+        with patch('maintenance.unified_retention_service.SessionLocal', return_value=mock_db), \
+             patch.object(retention_service, 'cleanup_expired_partitions', AsyncMock(return_value=partition_result)), \
+             patch.object(retention_service, 'cleanup_orphaned_channels', AsyncMock(return_value=0)), \
+             patch.object(retention_service, 'calculate_retention_period', AsyncMock(side_effect=[365, 90])), \
+             patch.object(retention_service, 'cleanup_user_posts', AsyncMock(return_value=user_result)) as mock_cleanup:
+            result = await retention_service.cleanup_all_users(dry_run=True)
+        
+        assert result["users_processed"] == 2
+        assert result["total_posts_deleted"] == 13
+        assert result["partitions"] == partition_result["partitions"]
+        mock_cleanup.assert_called_once_with(2, True, retention_days=90)
+
+
+class TestPostPartitions:
+    """Helpers for monthly posts partitions"""
+    
+    def test_month_arithmetic(self):
+        month = month_start(datetime(2025, 11, 17, 12, 30, tzinfo=timezone.utc))
+        
+        assert month == datetime(2025, 11, 1, tzinfo=timezone.utc)
+        assert add_months(month, 2) == datetime(2026, 1, 1, tzinfo=timezone.utc)
+        assert add_months(month, -11) == datetime(2024, 12, 1, tzinfo=timezone.utc)
+    
+    def test_partition_name_roundtrip(self):
+        month = datetime(2025, 3, 1, tzinfo=timezone.utc)
+        name = partition_name("posts", month)
+        
+        assert name == "posts_p2025_03"
+        assert parse_partition_name("posts", name) == (month, datetime(2025, 4, 1, tzinfo=timezone.utc))
+        assert parse_partition_name("posts", "posts_default") is None
+        assert parse_partition_name("posts", "indexing_status_p2025_03") is None
+    
+    def test_create_partition_sql_bounds(self):
+        sql = create_partition_sql("posts", datetime(2025, 12, 15, tzinfo=timezone.utc))
+        
+        assert "posts_p2025_12 PARTITION OF posts" in sql
+        assert "FROM ('2025-12-01T00:00:00+00:00') TO ('2026-01-01T00:00:00+00:00')" in sql
+
+
+class TestStoreCleanup:
+    """Qdrant / Neo4j cleanup for expired posts"""
+    
+    @pytest.fixture
+    def qdrant(self):
+        client = Mock()
+        collection = Mock()
+        collection.name = "telegram_posts_1"
+        client.get_collections.return_value.collections = [collection]
+        client.count.return_value.count = 3
+        return client
+    
+    @pytest.fixture
+    def neo4j(self):
+        client = Mock()
+        client.enabled = True
+        client.driver = Mock()
+        client.delete_post_nodes = AsyncMock(return_value=2)
+        client.count_post_nodes = AsyncMock(return_value=2)
+        return client
+    
+    @pytest.mark.asyncio
+    async def test_qdrant_delete_by_range_and_legacy_ids(self, qdrant):
+        """Range filter by posted_at_ts plus post_id batches for points without posted_at_ts"""
+        cleanup = StoreCleanup(qdrant=qdrant, neo4j=Mock(enabled=False), batch_size=2)
+        cutoff = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        
+        deleted = await cleanup.purge_qdrant({1: [10, 11, 12], 2: [20]}, cutoff)
+        
+        # telegram_posts_2 does not exist; collection 1: range + 2 id batches
+        assert qdrant.delete.call_count == 3
+        assert deleted == 9
+        
+        range_filter = qdrant.delete.call_args_list[0].kwargs["points_selector"].filter
+        assert range_filter.must[0].key == "posted_at_ts"
+        assert range_filter.must[0].range.lt == int(cutoff.timestamp())
+        
+        legacy_filter = qdrant.delete.call_args_list[1].kwargs["points_selector"].filter
+        assert legacy_filter.must[0].match.any == [10, 11]
+    
+    @pytest.mark.asyncio
+    async def test_qdrant_dry_run_only_counts(self, qdrant):
+        cleanup = StoreCleanup(qdrant=qdrant, neo4j=Mock(enabled=False))
+        
+        deleted = await cleanup.purge_qdrant({1: [10]}, datetime.now(timezone.utc), dry_run=True)
+        
+        assert deleted == 6
+        qdrant.delete.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_purge_reports_per_store_and_isolates_errors(self, qdrant, neo4j):
+        """A failing store is reported without blocking the other one"""
+        qdrant.get_collections.side_effect = Exception("qdrant down")
+        cleanup = StoreCleanup(qdrant=qdrant, neo4j=neo4j)
+        
+        result = await cleanup.purge({1: [10, 11]}, datetime.now(timezone.utc))
+        
+        assert result["neo4j"] == 2
+        assert result["qdrant"] == 0
+        assert result["errors"] == ["Qdrant: qdrant down"]
+        neo4j.delete_post_nodes.assert_awaited_once_with([10, 11], batch_size=cleanup.batch_size)
+    
+    @pytest.mark.asyncio
+    async def test_cleanup_user_posts_purges_stores_and_indexing_status(self, db):
+        """Expired posts are removed from every store; fresh posts stay"""
+        user = UserFactory.create(db, telegram_id=920001)
+        channel = ChannelFactory.create(db, channel_username="retention_stores")
+        old_post = PostFactory.create(
+            db, user_id=user.id, channel_id=channel.id,
+            posted_at=datetime.now(timezone.utc) - timedelta(days=400)
+        )
+        new_post = PostFactory.create(db, user_id=user.id, channel_id=channel.id)
+        for post in (old_post, new_post):
+            db.add(IndexingStatus(user_id=user.id, post_id=post.id, status="success"))
+        db.commit()
+        old_post_id = old_post.id
+        
+        store_cleanup = Mock()
+        store_cleanup.enabled = True
+        store_cleanup.purge = AsyncMock(return_value={"neo4j": 1, "qdrant": 2, "errors": []})
+        service = UnifiedRetentionService(base_retention_days=90, store_cleanup=store_cleanup)
+        
+        with patch('maintenance.unified_retention_service.SessionLocal', return_value=db):
+            dry = await service.cleanup_user_posts(user.id, dry_run=True, retention_days=90)
+            result = await service.cleanup_user_posts(user.id, dry_run=False, retention_days=90)
+        
+        assert dry["stores"] == {"postgres": 1, "indexing_status": 1, "neo4j": 1, "qdrant": 2}
+        assert result["stores"] == {"postgres": 1, "indexing_status": 1, "neo4j": 1, "qdrant": 2}
+        
+        user_posts, _, dry_run = store_cleanup.purge.call_args.args
+        assert user_posts == {user.id: [old_post_id]}
+        assert dry_run is False
+        
+        assert db.query(Post).filter(Post.user_id == user.id).count() == 1
+        assert db.query(IndexingStatus).filter(IndexingStatus.user_id == user.id).count() == 1
+
+
+class TestBatchedRetention:
+    """Chunked, resumable, throttled deletes"""
+    
+    @pytest.fixture
+    def service(self):
+        store_cleanup = Mock()
+        store_cleanup.enabled = False
+        service = UnifiedRetentionService(base_retention_days=90, store_cleanup=store_cleanup)
+        service.batch_size = 2
+        service.throttle = DeleteThrottle()
+        return service
+    
+    def _create_old_posts(self, db, count: int, telegram_id: int):
+        user = UserFactory.create(db, telegram_id=telegram_id)
+        channel = ChannelFactory.create(db, channel_username=f"batched_{telegram_id}")
+        posts = [
+            PostFactory.create(
+                db, user_id=user.id, channel_id=channel.id,
+                posted_at=datetime.now(timezone.utc) - timedelta(days=200 + i)
+            )
+            for i in range(count)
+        ]
+        return user.id, [post.id for post in posts]
+    
+    @pytest.mark.asyncio
+    async def test_deletes_in_batches_and_clears_cursor(self, service, db):
+        user_id, _ = self._create_old_posts(db, 5, telegram_id=930001)
+        
+        with patch('maintenance.unified_retention_service.SessionLocal', return_value=db):
+            result = await service.cleanup_user_posts(user_id, retention_days=90)
+        
+        assert result["posts_deleted"] == 5
+        assert result["batches"] == 3
+        assert result["rows_per_second"] > 0
+        assert "lock_wait_seconds" in result
+        assert db.query(Post).filter(Post.user_id == user_id).count() == 0
+        assert db.get(RetentionCursor, user_id) is None
+    
+    @pytest.mark.asyncio
+    async def test_resumes_from_persisted_cursor(self, service, db):
+        """An interrupted run continues after last_post_id with its own cutoff"""
+        user_id, post_ids = self._create_old_posts(db, 4, telegram_id=930002)
+        cutoff = datetime.now(timezone.utc) - timedelta(days=150)
+        db.add(RetentionCursor(user_id=user_id, cutoff=cutoff, last_post_id=post_ids[1], deleted=2))
+        db.commit()
+        
+        with patch('maintenance.unified_retention_service.SessionLocal', return_value=db):
+            result = await service.cleanup_user_posts(user_id, retention_days=90)
+        
+        assert result["posts_deleted"] == 2
+        remaining = {row[0] for row in db.query(Post.id).filter(Post.user_id == user_id).all()}
+        assert remaining == set(post_ids[:2])
+        assert db.get(RetentionCursor, user_id) is None
+    
+    @pytest.mark.asyncio
+    async def test_cursor_discarded_when_retention_grew(self, service, db):
+        """A stale cursor with a later cutoff must not delete posts the user now keeps"""
+        user_id, _ = self._create_old_posts(db, 2, telegram_id=930003)
+        db.add(RetentionCursor(user_id=user_id, cutoff=datetime.now(timezone.utc), last_post_id=0))
+        db.commit()
+        
+        with patch('maintenance.unified_retention_service.SessionLocal', return_value=db):
+            result = await service.cleanup_user_posts(user_id, retention_days=365)
+        
+        assert result["posts_deleted"] == 0
+        assert db.query(Post).filter(Post.user_id == user_id).count() == 2
+    
+    @pytest.mark.asyncio
+    async def test_throttle_caps_rows_per_second(self):
+        throttle = DeleteThrottle(batch_sleep=0.0, max_rows_per_second=1000)
+        delays = []
+        
+        async def fake_sleep(delay):
+            delays.append(delay)
+        
+        with patch('maintenance.batch_delete.asyncio.sleep', fake_sleep):
+            await throttle.pace(100)
+            await throttle.pace(100)
+        
+        assert delays[0] == pytest.approx(0.1, abs=0.01)
+        assert delays[1] == pytest.approx(0.2, abs=0.01)
+    
+    @pytest.mark.asyncio
+    async def test_users_processed_with_concurrency_limit(self, service):
+        users = []
+        for i in range(4):
+            user = Mock(spec=User)
+            user.id = i + 1
+            user.telegram_id = 1000 + i
+            users.append(user)
+        db = Mock(spec=Session)
+        db.query.return_value.filter.return_value.all.return_value = users
+        
+        running = 0
+        max_running = 0
+        
+        async def fake_cleanup(user_id, dry_run, retention_days=None):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return {"user_id": user_id, "posts_deleted": 1, "batches": 1, "lock_wait_seconds": 0.01}
+        
+        service.user_concurrency = 2
+        with patch('maintenance.unified_retention_service.SessionLocal', return_value=db), \
+             patch.object(service, 'cleanup_expired_partitions', AsyncMock(return_value={"partitioned": False})), \
+             patch.object(service, 'cleanup_orphaned_channels', AsyncMock(return_value=0)), \
+             patch.object(service, 'cleanup_user_posts', side_effect=fake_cleanup):
+            result = await service.cleanup_all_users(dry_run=False)
+        
+        assert max_running == 2
+        assert result["users_processed"] == 4
+        assert result["total_posts_deleted"] == 4
+        assert result["throughput"]["batches"] == 4
+        assert [s["user_id"] for s in result["user_stats"]] == [1, 2, 3, 4]
+
 
 class TestUnifiedRetentionServiceIntegration:
     """Integration tests for UnifiedRetentionService"""